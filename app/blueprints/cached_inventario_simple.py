@@ -7,35 +7,45 @@ Para registrar en la aplicación principal
 from flask import Blueprint, jsonify, request
 from app.models.inventario import Inventario
 from app.models.lote_inventario import LoteInventario
+from app.services.servicio_fifo import ServicioFIFO
 from app.extensions import db
+from app.utils.cache import (
+    AUSENTE,
+    TAG_ESTADISTICAS,
+    obtener_cache,
+    tag_inventario,
+)
 from sqlalchemy import func
 import time
 import json
 import hashlib
 from datetime import datetime
 
-# Sistema de caché simple en memoria para desarrollo
-_cache = {}
-_cache_ttl = {}
 
+def simple_cache(key, value=None, ttl=300, tags=None):
+    """
+    Lee (value=None) o guarda un valor en la caché de la aplicación.
 
-def simple_cache(key, value=None, ttl=300):
-    """Sistema de caché simple para desarrollo"""
+    La caché es la de app.utils.cache: LRU por proceso y, si está
+    configurado, un nivel compartido entre workers. Las etiquetas (tags)
+    permiten invalidar la entrada con invalidar_tags.
+    """
+    cache = obtener_cache()
     if value is not None:
-        # Set value
-        _cache[key] = value
-        _cache_ttl[key] = datetime.now().timestamp() + ttl
+        cache.set(key, value, ttl, tags or ())
         return True
-    else:
-        # Get value
-        if key in _cache:
-            if datetime.now().timestamp() < _cache_ttl.get(key, 0):
-                return _cache[key]
-            else:
-                # Expired
-                _cache.pop(key, None)
-                _cache_ttl.pop(key, None)
-        return None
+    valor = cache.get(key)
+    return None if valor is AUSENTE else valor
+
+
+def simple_cache_o_calcular(key, calcular, ttl=300, tags=None, beta=1.0):
+    """
+    Devuelve (valor, desde_cache) calculándolo una sola vez aunque lleguen
+    varias peticiones a la vez (ver CacheEscalonado.obtener_o_calcular).
+    """
+    return obtener_cache().obtener_o_calcular(
+        key, calcular, ttl, tags=tags or (), beta=beta
+    )
 
 
 def cache_key(*args):
@@ -49,17 +59,8 @@ cached_inventario_bp = Blueprint(
 )
 
 
-@cached_inventario_bp.route("/inventario/stats")
-def get_inventario_stats():
-    """Estadísticas de inventario con caché de 5 minutos"""
-    cache_key_str = cache_key("inventario_stats")
-    cached_result = simple_cache(cache_key_str)
-
-    if cached_result is not None:
-        cached_result["from_cache"] = True
-        return jsonify(cached_result)
-
-    # Calcular estadísticas
+def _calcular_inventario_stats():
+    """Agregados de /inventario/stats (sin caché)"""
     total_inventarios = Inventario.query.count()
     total_lotes = LoteInventario.query.filter(
         LoteInventario.activo == True, LoteInventario.cantidad_actual > 0
@@ -91,19 +92,30 @@ def get_inventario_stats():
         Inventario.stock_actual <= Inventario.stock_minimo, Inventario.stock_actual > 0
     ).count()
 
-    result = {
+    return {
         "total_inventarios": total_inventarios,
         "total_lotes": total_lotes,
         "stock_total": float(stock_total),
         "valor_total": float(valor_total),
         "articulos_bajo_stock": articulos_bajo_stock,
-        "from_cache": False,
     }
 
-    # Guardar en caché
-    simple_cache(cache_key_str, result, ttl=300)
 
-    return jsonify(result)
+@cached_inventario_bp.route("/inventario/stats")
+def get_inventario_stats():
+    """
+    Estadísticas de inventario con caché de 5 minutos.
+
+    Al caducar, una sola petición recalcula; el resto recibe el valor
+    anterior mientras tanto.
+    """
+    result, desde_cache = simple_cache_o_calcular(
+        cache_key("inventario_stats"),
+        _calcular_inventario_stats,
+        ttl=300,
+        tags=[TAG_ESTADISTICAS],
+    )
+    return jsonify({**result, "from_cache": desde_cache})
 
 
 @cached_inventario_bp.route("/inventario/<int:inventario_id>/stock")
@@ -118,13 +130,15 @@ def get_inventario_stock(inventario_id):
 
     inventario = Inventario.query.get_or_404(inventario_id)
 
+    # Totales desde stock_resumen; solo se cargan los lotes que se muestran
+    resumen = ServicioFIFO.obtener_resumen_stock(inventario_id)
     lotes = (
         LoteInventario.query.filter(
             LoteInventario.inventario_id == inventario_id,
-            LoteInventario.cantidad_actual > 0,
-            LoteInventario.activo == True,
+            LoteInventario.filtro_consumible(),
         )
-        .order_by(LoteInventario.fecha_entrada.asc())
+        .order_by(LoteInventario.fecha_entrada.asc(), LoteInventario.id.asc())
+        .limit(5)
         .all()
     )
 
@@ -132,8 +146,8 @@ def get_inventario_stock(inventario_id):
         "inventario_id": inventario_id,
         "codigo": inventario.codigo,
         "descripcion": inventario.descripcion,
-        "stock_total": sum(lote.cantidad_actual for lote in lotes),
-        "lotes_count": len(lotes),
+        "stock_total": resumen["total_actual"],
+        "lotes_count": resumen["numero_lotes"],
         "lotes": [
             {
                 "id": lote.id,
@@ -148,13 +162,13 @@ def get_inventario_stock(inventario_id):
                     else None
                 ),
             }
-            for lote in lotes[:5]  # Primeros 5 lotes
+            for lote in lotes  # Primeros 5 lotes
         ],
         "from_cache": False,
     }
 
     # Guardar en caché
-    simple_cache(cache_key_str, result, ttl=120)
+    simple_cache(cache_key_str, result, ttl=120, tags=[tag_inventario(inventario_id)])
 
     return jsonify(result)
 
@@ -217,7 +231,7 @@ def get_lotes_fifo(inventario_id, cantidad):
     }
 
     # Guardar en caché
-    simple_cache(cache_key_str, result, ttl=60)
+    simple_cache(cache_key_str, result, ttl=60, tags=[tag_inventario(inventario_id)])
 
     return jsonify(result)
 
@@ -225,30 +239,36 @@ def get_lotes_fifo(inventario_id, cantidad):
 # Endpoints de gestión de caché
 @cached_inventario_bp.route("/cache/stats")
 def get_cache_stats():
-    """Estadísticas del sistema de caché simple"""
-    total_keys = len(_cache)
-    expired_keys = 0
-    current_time = datetime.now().timestamp()
-
-    for key, expiry in _cache_ttl.items():
-        if current_time > expiry:
-            expired_keys += 1
+    """Estadísticas del sistema de caché"""
+    cache = obtener_cache()
+    total_keys = len(cache.local)
+    expired_keys = cache.local.contar_expiradas()
+    contadores = cache.estadisticas()
 
     return jsonify(
         {
             "total_keys": total_keys,
             "expired_keys": expired_keys,
             "active_keys": total_keys - expired_keys,
-            "cache_type": "simple_memory",
+            "cache_type": cache.tipo,
+            "hits": contadores["aciertos"],
+            "misses": contadores["fallos"],
+            "hit_ratio": contadores["ratio_aciertos"],
+            "evictions": contadores["expulsiones"],
+            "expirations": contadores["expiradas"],
+            "bytes": contadores["bytes"],
+            "max_bytes": contadores["max_bytes"],
+            "max_keys": contadores["max_entradas"],
+            "shared_hits": contadores.get("aciertos_compartido"),
+            "shared_misses": contadores.get("fallos_compartido"),
         }
     )
 
 
 @cached_inventario_bp.route("/cache/clear", methods=["POST"])
 def clear_cache():
-    """Limpiar todo el caché"""
-    _cache.clear()
-    _cache_ttl.clear()
+    """Limpiar todo el caché (también el nivel compartido entre workers)"""
+    obtener_cache().clear()
     return jsonify({"message": "Cache cleared successfully", "keys_cleared": "all"})
 
 
@@ -259,6 +279,6 @@ def test_endpoint():
         {
             "message": "Blueprint de caché funcionando correctamente",
             "timestamp": datetime.now().isoformat(),
-            "cache_keys": len(_cache),
+            "cache_keys": len(obtener_cache().local),
         }
     )
@@ -304,6 +304,28 @@ def api_performance_metrics():
         return jsonify({"error": str(e)}), 500
 
 
+@dashboard_bp.route("/api/performance/sql")
+def api_performance_sql():
+    """Consultas SQL por endpoint (instrumentación de SQLAlchemy)"""
+    try:
+        from app.utils.instrumentacion_sql import resumen_sql
+
+        limit = request.args.get("limit", 20, type=int)
+        endpoints = list(resumen_sql(top=3).items())[:limit]
+        return jsonify(
+            {
+                "timestamp": datetime.now().isoformat(),
+                "endpoints": [
+                    dict(datos, endpoint=endpoint) for endpoint, datos in endpoints
+                ],
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Error en performance sql: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @dashboard_bp.route("/api/inventory/stats")
 def api_inventory_stats():
     """Obtiene estadísticas detalladas de inventario"""
@@ -470,7 +492,7 @@ def api_cache_clear():
 def api_fifo_stats():
     """Obtiene estadísticas del sistema FIFO"""
     try:
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         fifo_opt = FIFOOptimizado()
 
@@ -14,7 +14,7 @@ import time
 from typing import List, Dict, Any
 
 # Importar el sistema FIFO optimizado
-from fifo_optimizado import FIFOOptimizado
+from app.services.fifo_optimizado import FIFOOptimizado
 
 # Crear instancia global del servicio optimizado
 fifo_optimizado = FIFOOptimizado()
@@ -180,7 +180,7 @@ def obtener_lotes_disponibles(inventario_id):
             if lote.cantidad_disponible > 0:
                 lote_info = {
                     "id": lote.id,
-                    "codigo": lote.codigo,
+                    "codigo": lote.codigo_lote,
                     "cantidad_disponible": float(lote.cantidad_disponible),
                     "fecha_entrada": (
                         lote.fecha_entrada.isoformat() if lote.fecha_entrada else None
@@ -190,8 +190,8 @@ def obtener_lotes_disponibles(inventario_id):
                         if lote.fecha_vencimiento
                         else None
                     ),
-                    "proveedor": lote.proveedor,
-                    "documento_referencia": lote.documento_referencia,
+                    "proveedor_id": lote.proveedor_id,
+                    "documento_origen": lote.documento_origen,
                 }
                 lotes_info.append(lote_info)
                 total_disponible += lote.cantidad_disponible
@@ -235,7 +235,8 @@ def obtener_estadisticas_fifo():
         # Estadísticas de base de datos
         total_lotes = LoteInventario.query.count()
         lotes_disponibles = LoteInventario.query.filter(
-            LoteInventario.cantidad_disponible > 0
+            LoteInventario.activo == True,
+            LoteInventario.cantidad_actual - LoteInventario.cantidad_reservada > 0,
         ).count()
 
         return jsonify(
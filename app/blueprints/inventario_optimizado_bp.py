@@ -177,7 +177,7 @@ def crear_movimiento():
 def obtener_lotes_articulo(inventario_id):
     """Obtener lotes de un artículo usando FIFO optimizado"""
     try:
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         fifo_opt = FIFOOptimizado()
         lotes = fifo_opt._obtener_lotes_optimizado(inventario_id)
@@ -326,7 +326,7 @@ def health_check():
     """Health check del sistema optimizado"""
     try:
         from app.extensions import db
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
         from sqlalchemy import text
 
         # Verificar base de datos
@@ -249,7 +249,7 @@ def obtener_lotes_articulo(inventario_id):
     ```
     """
     try:
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         fifo_opt = FIFOOptimizado()
         lotes = fifo_opt._obtener_lotes_optimizado(inventario_id)
@@ -485,9 +485,17 @@ def crear_movimientos_batch():
     - Validación individual de cada movimiento
     - Rollback automático en errores críticos
 
+    **Modos (campo opcional "modo"):**
+    - `por_fila` (por defecto): cada movimiento en su SAVEPOINT; los que
+      fallan se descartan y el resto se confirma
+    - `todo_o_nada`: cualquier error anula el batch completo
+
+    Todo el batch se confirma con un único commit.
+
     **Estructura del request:**
     ```json
     {
+        "modo": "por_fila",
         "movimientos": [
             {
                 "inventario_id": 1,
@@ -568,7 +576,9 @@ def crear_movimientos_batch():
             )
 
         # Procesar batch
-        resultado = controller_opt.crear_movimientos_batch_optimizado(movimientos)
+        resultado = controller_opt.crear_movimientos_batch_optimizado(
+            movimientos, modo=data.get("modo", "por_fila")
+        )
 
         return jsonify(resultado), 200
 
@@ -620,7 +630,7 @@ def health_check():
     """
     try:
         from app.extensions import db
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         # Verificar base de datos
         try:
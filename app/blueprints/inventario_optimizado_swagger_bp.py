@@ -358,7 +358,7 @@ def obtener_lotes_articulo(inventario_id):
     ```
     """
     try:
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         fifo_opt = FIFOOptimizado()
         lotes = fifo_opt._obtener_lotes_optimizado(inventario_id)
@@ -576,7 +576,12 @@ def crear_movimiento():
                     api.fields.Nested("movimiento_request"),
                     required=True,
                     description="Lista de movimientos a procesar",
-                )
+                ),
+                "modo": api.fields.String(
+                    enum=["por_fila", "todo_o_nada"],
+                    default="por_fila",
+                    description="Descartar solo los movimientos erróneos o el batch completo",
+                ),
             },
         ),
         responses={
@@ -627,9 +632,17 @@ def crear_movimientos_batch():
     - Validación individual de cada movimiento
     - Rollback automático en errores críticos
 
+    **Modos (campo opcional "modo"):**
+    - `por_fila` (por defecto): cada movimiento en su SAVEPOINT; los que
+      fallan se descartan y el resto se confirma
+    - `todo_o_nada`: cualquier error anula el batch completo
+
+    Todo el batch se confirma con un único commit.
+
     **Ejemplo de request:**
     ```json
     {
+        "modo": "por_fila",
         "movimientos": [
             {
                 "inventario_id": 1,
@@ -695,7 +708,9 @@ def crear_movimientos_batch():
             )
 
         # Procesar batch
-        resultado = controller_opt.crear_movimientos_batch_optimizado(movimientos)
+        resultado = controller_opt.crear_movimientos_batch_optimizado(
+            movimientos, modo=data.get("modo", "por_fila")
+        )
 
         return jsonify(resultado), 200
 
@@ -747,7 +762,7 @@ def health_check():
     """
     try:
         from app.extensions import db
-        from fifo_optimizado import FIFOOptimizado
+        from app.services.fifo_optimizado import FIFOOptimizado
 
         # Verificar base de datos
         try:
@@ -8,7 +8,7 @@ from flask_login import login_required, current_user
 from app.extensions import db
 from app.models import Inventario
 from app.models.lote_inventario import LoteInventario, MovimientoLote
-from app.services.servicio_fifo import ServicioFIFO
+from app.services.servicio_fifo import ServicioFIFO, ConflictoConcurrenciaFIFO
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 import logging
@@ -436,18 +436,18 @@ def api_consumir_fifo():
                 400,
             )
 
-        # Consumir usando FIFO
-        consumos, faltante = ServicioFIFO.consumir_fifo(
-            inventario_id=inventario_id,
-            cantidad_total=cantidad,
-            orden_trabajo_id=orden_trabajo_id,
-            documento_referencia=documento_referencia,
-            usuario_id=current_user.username,
-            observaciones=observaciones,
+        # Consumir usando FIFO (se repite si otro proceso modifica los lotes)
+        consumos, faltante = ServicioFIFO.ejecutar_en_transaccion(
+            lambda: ServicioFIFO.consumir_fifo(
+                inventario_id=inventario_id,
+                cantidad_total=cantidad,
+                orden_trabajo_id=orden_trabajo_id,
+                documento_referencia=documento_referencia,
+                usuario_id=current_user.username,
+                observaciones=observaciones,
+            )
         )
 
-        db.session.commit()
-
         # Preparar respuesta
         consumos_data = []
         for lote, cantidad_consumida in consumos:
@@ -474,6 +474,9 @@ def api_consumir_fifo():
             jsonify({"success": False, "error": f"Error en los datos: {str(e)}"}),
             400,
         )
+    except ConflictoConcurrenciaFIFO as e:
+        logger.warning(f"Conflicto de concurrencia al consumir FIFO: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 409
     except Exception as e:
         logger.error(f"Error al consumir FIFO: {str(e)}")
         db.session.rollback()
@@ -699,18 +702,18 @@ def api_reservar_stock():
                 400,
             )
 
-        # Reservar usando FIFO
-        reservas, faltante = ServicioFIFO.reservar_stock(
-            inventario_id=inventario_id,
-            cantidad_total=cantidad,
-            orden_trabajo_id=orden_trabajo_id,
-            documento_referencia=documento_referencia,
-            usuario_id=current_user.username,
-            observaciones=observaciones,
+        # Reservar usando FIFO (se repite si otro proceso modifica los lotes)
+        reservas, faltante = ServicioFIFO.ejecutar_en_transaccion(
+            lambda: ServicioFIFO.reservar_stock(
+                inventario_id=inventario_id,
+                cantidad_total=cantidad,
+                orden_trabajo_id=orden_trabajo_id,
+                documento_referencia=documento_referencia,
+                usuario_id=current_user.username,
+                observaciones=observaciones,
+            )
         )
 
-        db.session.commit()
-
         # Preparar respuesta
         reservas_data = []
         for lote, cantidad_reservada in reservas:
@@ -737,6 +740,9 @@ def api_reservar_stock():
             jsonify({"success": False, "error": f"Error en los datos: {str(e)}"}),
             400,
         )
+    except ConflictoConcurrenciaFIFO as e:
+        logger.warning(f"Conflicto de concurrencia al reservar stock: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 409
     except Exception as e:
         logger.error(f"Error al reservar stock: {str(e)}")
         db.session.rollback()
@@ -765,14 +771,14 @@ def api_liberar_reservas():
         observaciones = data.get("observaciones", "")
 
         # Liberar reservas usando FIFO
-        liberaciones = ServicioFIFO.liberar_reservas(
-            orden_trabajo_id=orden_trabajo_id,
-            usuario_id=current_user.username,
-            observaciones=observaciones,
+        liberaciones = ServicioFIFO.ejecutar_en_transaccion(
+            lambda: ServicioFIFO.liberar_reservas(
+                orden_trabajo_id=orden_trabajo_id,
+                usuario_id=current_user.username,
+                observaciones=observaciones,
+            )
         )
 
-        db.session.commit()
-
         # Preparar respuesta
         liberaciones_data = []
         for lote, cantidad_liberada in liberaciones:
@@ -798,6 +804,9 @@ def api_liberar_reservas():
             jsonify({"success": False, "error": f"Error en los datos: {str(e)}"}),
             400,
         )
+    except ConflictoConcurrenciaFIFO as e:
+        logger.warning(f"Conflicto de concurrencia al liberar reservas: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 409
     except Exception as e:
         logger.error(f"Error al liberar reservas: {str(e)}")
         db.session.rollback()
@@ -2,28 +2,87 @@
 """
 🚀 BLUEPRINT DE MÉTRICAS DE PERFORMANCE
 Sistema de monitoreo en tiempo real
+
+El registro de una llamada (record_metric) solo toma el reloj y añade una
+tupla a una cola sin lock; los histogramas se actualizan al consolidar la
+cola (en cada lectura y en cada ciclo del muestreador). La memoria y CPU del
+proceso las toma un hilo muestreador cada METRICAS_MUESTREO_SEGUNDOS y se
+asocian a cada métrica al consolidar, por marca de tiempo.
+
+Las estadísticas por minuto y por hora del dashboard salen de anillos de
+cubetas por época (O(cubetas) por consulta), que el muestreador vuelca cada
+METRICAS_HISTORIAL_SEGUNDOS a METRICAS_HISTORIAL_PATH para que sobrevivan a
+un reinicio.
+
+El historial largo por operación (1m -> 1h -> 1d) lo escribe un hilo aparte
+en METRICAS_ROLLUP_DIR (ver app.utils.almacen_rollups) y se consulta por
+rangos en /history y /history/compare.
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
+import atexit
+import hmac
+import os
 import time
 import psutil
 import threading
-from datetime import datetime, timedelta
+from datetime import datetime
 from collections import deque, defaultdict
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional, Any
 from functools import wraps
 import json
+from app.utils.histograma import Histograma, HistogramaVentana
+from app.utils.cache import obtener_cache
+from app.utils.instrumentacion_sql import (
+    instantanea_sql,
+    limpiar_estadisticas_sql,
+    resumen_sql,
+)
+from app.utils.metricas_multiproceso import (
+    TIPO_CONTENIDO,
+    clave_muestra,
+    obtener_almacen,
+    texto_openmetrics,
+)
+from app.utils.almacen_rollups import AlmacenRollups, EscritorRollups
+from app.utils.perfilador_lentas import obtener_perfilador
+from app.utils.series_temporales import AnilloTemporal, Cubeta, HistorialArchivo
+
+# Ventanas móviles de los histogramas: nombre -> (segundos, ranuras)
+VENTANAS = {"5m": (300, 10), "1h": (3600, 12)}
+
+# Series del dashboard: nombre -> (ancho en segundos, ranuras, con histograma)
+SERIES = {"minutes": (60, 60, False), "hours": (3600, 24, True)}
 
 # Sistema de métricas global
-_metrics = deque(maxlen=1000)
-_operation_stats = defaultdict(list)
+_metrics = deque(maxlen=1000)  # Últimas métricas individuales (acotado)
+_operation_stats = {}  # operación -> EstadisticasOperacion
 _throughput_counters = defaultdict(int)
 _start_time = datetime.now()
-_process = psutil.Process()
 _lock = threading.Lock()
 
 
+def _nuevas_series():
+    return {nombre: AnilloTemporal(*config) for nombre, config in SERIES.items()}
+
+
+_series = _nuevas_series()
+# Lo registrado desde el último volcado al historial en disco
+_series_pendientes = _nuevas_series()
+_historial = None  # HistorialArchivo
+_intervalo_historial = 60.0
+_ultimo_volcado = 0.0
+# (minuto, operación) -> Cubeta aún no escrita en el almacén de rollups
+_minutos_operacion = {}
+_escritor_rollups = None  # EscritorRollups
+
+# Llamadas aún no consolidadas: (timestamp, operación, duración, registros,
+# éxito, error[, datos HTTP]). deque.append es atómico, por lo que no hace
+# falta lock.
+_pendientes = deque(maxlen=100000)
+
+
 @dataclass
 class PerformanceMetric:
     """Métrica individual de performance"""
@@ -38,6 +97,198 @@ class PerformanceMetric:
     error_message: Optional[str] = None
 
 
+class EstadisticasHTTP:
+    """Códigos de estado, bytes y tiempo de BD de las peticiones a un endpoint"""
+
+    def __init__(self):
+        self.codigos = defaultdict(int)
+        self.bytes_total = 0
+        self.consultas_total = 0
+        self.tiempo_bd = Histograma()
+
+    def registrar(self, status, bytes_enviados, tiempo_bd, consultas):
+        self.codigos[status] += 1
+        self.bytes_total += bytes_enviados
+        self.consultas_total += consultas
+        self.tiempo_bd.registrar(tiempo_bd)
+
+    def resumen(self):
+        total = self.tiempo_bd.total
+        tiempo_bd = self.tiempo_bd.resumen()
+        return {
+            "status_codes": {str(c): n for c, n in sorted(self.codigos.items())},
+            "bytes_total": self.bytes_total,
+            "bytes_avg": self.bytes_total / total if total else 0.0,
+            "queries_total": self.consultas_total,
+            "db_time_avg": tiempo_bd["avg"],
+            "db_time_p95": tiempo_bd["p95"],
+        }
+
+
+class EstadisticasOperacion:
+    """
+    Agregados de una operación en memoria constante: histograma de
+    duraciones desde el arranque, histogramas de las ventanas móviles y
+    contadores. Registrar una llamada es O(1).
+    """
+
+    def __init__(self):
+        self.duraciones = Histograma()
+        self.ventanas = {
+            nombre: HistogramaVentana(segundos, ranuras)
+            for nombre, (segundos, ranuras) in VENTANAS.items()
+        }
+        self.exitos = 0
+        self.registros = 0
+        self.memoria_total = 0.0
+        self.http = None  # EstadisticasHTTP si la operación es un endpoint
+
+    def registrar(self, duracion, registros, exito, memoria_mb, ahora=None):
+        self.duraciones.registrar(duracion)
+        for ventana in self.ventanas.values():
+            ventana.registrar(duracion, ahora)
+        self.exitos += 1 if exito else 0
+        self.registros += registros
+        self.memoria_total += memoria_mb
+
+    def registrar_http(self, status, bytes_enviados, tiempo_bd, consultas):
+        if self.http is None:
+            self.http = EstadisticasHTTP()
+        self.http.registrar(status, bytes_enviados, tiempo_bd, consultas)
+
+    @property
+    def total(self):
+        return self.duraciones.total
+
+    def resumen(self, ahora=None):
+        """Resumen con las claves históricas del endpoint /stats"""
+        total = self.duraciones.total
+        histograma = self.duraciones.resumen()
+        datos = {
+            "count": total,
+            "avg_duration": histograma["avg"],
+            "min_duration": histograma["min"],
+            "max_duration": histograma["max"],
+            "p50_duration": histograma["p50"],
+            "p95_duration": histograma["p95"],
+            "p99_duration": histograma["p99"],
+            "avg_memory": self.memoria_total / total if total else 0.0,
+            "success_rate": (self.exitos / total) * 100 if total else 0.0,
+            "total_records": self.registros,
+            "windows": {
+                nombre: ventana.histograma(ahora).resumen()
+                for nombre, ventana in self.ventanas.items()
+            },
+        }
+        if self.http is not None:
+            datos["http"] = self.http.resumen()
+        return datos
+
+
+class MuestreadorProceso:
+    """
+    Hilo que toma RSS y CPU del proceso cada `intervalo` segundos y
+    consolida las métricas pendientes. Tras un fork (workers de gunicorn con
+    preload_app) se reinicia en el proceso hijo.
+    """
+
+    def __init__(self, intervalo=5.0, capacidad=720):
+        self.intervalo = intervalo
+        self._muestras = deque(maxlen=capacidad)  # (timestamp, rss_mb, cpu)
+        self._proceso = None
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def muestrear(self):
+        if self._proceso is None or self._proceso.pid != os.getpid():
+            self._proceso = psutil.Process()
+            self._proceso.cpu_percent(None)  # Primera lectura: referencia
+        self._muestras.append(
+            (
+                time.time(),
+                self._proceso.memory_info().rss / 1024 / 1024,
+                self._proceso.cpu_percent(None),
+            )
+        )
+
+    def muestra_en(self, timestamp):
+        """(rss_mb, cpu) de la última muestra anterior a timestamp"""
+        anterior = None
+        for muestra in reversed(self._muestras):
+            anterior = muestra
+            if muestra[0] <= timestamp:
+                break
+        return (anterior[1], anterior[2]) if anterior else (0.0, 0.0)
+
+    def ultima(self):
+        if not self._muestras:
+            return None
+        timestamp, rss_mb, cpu = self._muestras[-1]
+        return {
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "memory_mb": rss_mb,
+            "cpu_percent": cpu,
+        }
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, intervalo=None):
+        if intervalo:
+            self.intervalo = intervalo
+        if self.activo:
+            return
+        self._parar.clear()
+        try:
+            self.muestrear()
+        except Exception:
+            pass
+        self._hilo = threading.Thread(
+            target=self._bucle, name="muestreador-metricas", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(self.intervalo + 1)
+        self._hilo = None
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.muestrear()
+                publicar_metricas_proceso()
+                volcar_historial()
+            except Exception as e:
+                print(f"Error sampling metrics: {e}")
+
+    def _tras_fork(self):
+        estaba_activo = self._hilo is not None
+        self._hilo = None
+        self._proceso = None
+        self._muestras.clear()
+        self._parar = threading.Event()
+        if estaba_activo:
+            self.iniciar()
+
+
+def _reiniciar_pendientes():
+    # El proceso hijo no debe volcar lo que registró el padre
+    global _series_pendientes
+    _series_pendientes = _nuevas_series()
+    _minutos_operacion.clear()
+    if _escritor_rollups is not None:
+        _escritor_rollups._tras_fork()
+
+
+_muestreador = MuestreadorProceso()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_muestreador._tras_fork)
+    os.register_at_fork(after_in_child=_reiniciar_pendientes)
+
+
 def record_metric(
     operation: str,
     duration: float,
@@ -45,29 +296,228 @@ def record_metric(
     success: bool = True,
     error: str = None,
 ):
-    """Registra una métrica de performance"""
-    try:
-        memory_mb = _process.memory_info().rss / 1024 / 1024
-        cpu_percent = _process.cpu_percent()
-
-        metric = PerformanceMetric(
-            timestamp=datetime.now().isoformat(),
-            operation=operation,
-            duration=duration,
-            memory_mb=memory_mb,
-            cpu_percent=cpu_percent,
-            records_processed=records,
-            success=success,
-            error_message=error,
+    """Registra una métrica de performance (O(1), sin llamadas al sistema)"""
+    _pendientes.append((time.time(), operation, duration, records, success, error))
+
+
+def record_request(
+    endpoint: str,
+    method: str,
+    duration: float,
+    status: int,
+    bytes_sent: int = 0,
+    db_time: float = 0.0,
+    queries: int = 0,
+):
+    """Registra una petición HTTP medida por el middleware de tiempos (O(1))"""
+    error = f"HTTP {status}" if status >= 500 else None
+    _pendientes.append(
+        (
+            time.time(),
+            f"{method} {endpoint}",
+            duration,
+            0,
+            status < 500,
+            error,
+            (status, bytes_sent, db_time, queries),
         )
+    )
 
-        with _lock:
-            _metrics.append(metric)
-            _operation_stats[operation].append(metric)
+
+def consolidar_metricas():
+    """Vuelca las llamadas pendientes en los histogramas y el buffer reciente"""
+    with _lock:
+        while _pendientes:
+            try:
+                entrada = _pendientes.popleft()
+            except IndexError:
+                break
+            timestamp, operation, duration, records, success, error = entrada[:6]
+            memory_mb, cpu_percent = _muestreador.muestra_en(timestamp)
+            _metrics.append(
+                PerformanceMetric(
+                    timestamp=datetime.fromtimestamp(timestamp).isoformat(),
+                    operation=operation,
+                    duration=duration,
+                    memory_mb=memory_mb,
+                    cpu_percent=cpu_percent,
+                    records_processed=records,
+                    success=success,
+                    error_message=error,
+                )
+            )
+            estadisticas = _operation_stats.get(operation)
+            if estadisticas is None:
+                estadisticas = _operation_stats[operation] = EstadisticasOperacion()
+            estadisticas.registrar(duration, records, success, memory_mb, timestamp)
+            if len(entrada) > 6:
+                estadisticas.registrar_http(*entrada[6])
             _throughput_counters[operation] += 1
+            for nombre, serie in _series.items():
+                serie.registrar(duration, success, timestamp)
+                _series_pendientes[nombre].registrar(duration, success, timestamp)
+            if _escritor_rollups is not None:
+                clave = (int(timestamp // 60), operation)
+                cubeta = _minutos_operacion.get(clave)
+                if cubeta is None:
+                    cubeta = _minutos_operacion[clave] = Cubeta(
+                        clave[0], con_histograma=True
+                    )
+                cubeta.registrar(duration, success)
+
+
+def configurar_historial(ruta, intervalo=60.0):
+    """Carga en las series el historial persistido y activa su volcado"""
+    global _historial, _intervalo_historial
+    _intervalo_historial = intervalo
+    if not ruta:
+        _historial = None
+        return
+    _historial = HistorialArchivo(ruta)
+    cargadas = _historial.cargar()
+    with _lock:
+        for nombre, cubetas in cargadas.items():
+            if nombre in _series:
+                for cubeta in cubetas:
+                    _series[nombre].fusionar_cubeta(cubeta)
+
+
+def volcar_historial(forzar=False):
+    """Suma al archivo de historial lo registrado desde el último volcado"""
+    global _series_pendientes, _ultimo_volcado
+    if _historial is None:
+        return
+    if not forzar and time.time() - _ultimo_volcado < _intervalo_historial:
+        return
+    consolidar_metricas()
+    with _lock:
+        pendientes, _series_pendientes = _series_pendientes, _nuevas_series()
+    _ultimo_volcado = time.time()
+    retencion = {
+        nombre: ancho * ranuras for nombre, (ancho, ranuras, _) in SERIES.items()
+    }
+    try:
+        _historial.volcar(pendientes, retencion)
+    except (OSError, ValueError) as e:
+        print(f"Error saving metrics history: {e}")
+        with _lock:
+            for nombre, serie in pendientes.items():
+                for cubeta in serie.cubetas():
+                    _series_pendientes[nombre].fusionar_cubeta(cubeta)
+
+
+def _extraer_minutos(forzar=False):
+    """
+    Minutos cerrados por operación [(operación, Cubeta)] para el almacén de
+    rollups; con forzar también el minuto en curso (al salir).
+    """
+    consolidar_metricas()
+    minuto_actual = int(time.time() // 60)
+    with _lock:
+        claves = [
+            clave for clave in _minutos_operacion if forzar or clave[0] < minuto_actual
+        ]
+        return [(clave[1], _minutos_operacion.pop(clave)) for clave in claves]
+
+
+def configurar_rollups(directorio, intervalo=30.0):
+    """Activa el historial por operación en disco y su hilo escritor"""
+    global _escritor_rollups
+    if _escritor_rollups is not None:
+        _escritor_rollups.detener()
+        _escritor_rollups = None
+    if not directorio:
+        return None
+    _escritor_rollups = EscritorRollups(
+        AlmacenRollups(directorio), _extraer_minutos, intervalo
+    )
+    _escritor_rollups.iniciar()
+    return _escritor_rollups
+
+
+def _cerrar_rollups():
+    if _escritor_rollups is not None:
+        _escritor_rollups.detener()
+        _escritor_rollups.volcar(forzar=True)
+
+
+def publicar_metricas_proceso():
+    """
+    Consolida y copia los agregados de este proceso (operaciones, SQL por
+    endpoint y caché) en su archivo de métricas multiproceso. Lo llaman el
+    muestreador y cada scrape de /metrics.
+    """
+    consolidar_metricas()
+    almacen = obtener_almacen()
+    if almacen is None:
+        return
+
+    with _lock:
+        operaciones = []
+        for operation, estadisticas in _operation_stats.items():
+            duraciones = Histograma()
+            duraciones.fusionar(estadisticas.duraciones)
+            fallos = estadisticas.total - estadisticas.exitos
+            http = None
+            if estadisticas.http is not None:
+                http = (dict(estadisticas.http.codigos), estadisticas.http.bytes_total)
+            operaciones.append((operation, duraciones, fallos, http))
+
+    for operation, duraciones, fallos, http in operaciones:
+        etiquetas = {"operation": operation}
+        almacen.establecer_histograma(
+            "gmao_operation_duration_seconds", etiquetas, duraciones
+        )
+        almacen.establecer("gmao_operation_failures_total", etiquetas, fallos)
+        if http is not None:
+            codigos, bytes_total = http
+            for status, cuenta in codigos.items():
+                almacen.establecer(
+                    "gmao_http_requests_total",
+                    {"operation": operation, "status": status},
+                    cuenta,
+                )
+            almacen.establecer("gmao_http_response_bytes_total", etiquetas, bytes_total)
+
+    for endpoint, (consultas, tiempo) in instantanea_sql().items():
+        etiquetas = {"endpoint": endpoint}
+        almacen.establecer_histograma("gmao_db_time_seconds", etiquetas, tiempo)
+        almacen.establecer("gmao_db_queries_total", etiquetas, consultas)
+
+    cache = obtener_cache()
+    if cache is not None:
+        stats = cache.estadisticas()
+        niveles = [("local", stats["aciertos"], stats["fallos"])]
+        if "aciertos_compartido" in stats:
+            niveles.append(
+                ("shared", stats["aciertos_compartido"], stats["fallos_compartido"])
+            )
+        for nivel, aciertos, fallos in niveles:
+            for resultado, valor in (("hit", aciertos), ("miss", fallos)):
+                almacen.establecer(
+                    "gmao_cache_requests_total",
+                    {"tier": nivel, "result": resultado},
+                    valor,
+                )
+
 
-    except Exception as e:
-        print(f"Error recording metric: {e}")
+def _ratio_aciertos_cache(valores):
+    """Añade gmao_cache_hit_ratio a partir de los contadores ya sumados"""
+    for nivel in ("local", "shared"):
+        aciertos, fallos = (
+            valores.get(
+                clave_muestra(
+                    "gmao_cache_requests_total", {"tier": nivel, "result": resultado}
+                )
+            )
+            for resultado in ("hit", "miss")
+        )
+        if aciertos is None or fallos is None:
+            continue
+        consultas = aciertos + fallos
+        valores[clave_muestra("gmao_cache_hit_ratio", {"tier": nivel})] = (
+            aciertos / consultas if consultas else 0.0
+        )
 
 
 def performance_monitor(operation_name: str):
@@ -76,7 +526,7 @@ def performance_monitor(operation_name: str):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             success = True
             error = None
             records = 0
@@ -104,8 +554,16 @@ def performance_monitor(operation_name: str):
                 error = str(e)
                 raise
             finally:
-                duration = time.time() - start_time
-                record_metric(operation_name, duration, records, success, error)
+                _pendientes.append(
+                    (
+                        time.time(),
+                        operation_name,
+                        time.perf_counter() - start_time,
+                        records,
+                        success,
+                        error,
+                    )
+                )
 
         return wrapper
 
@@ -116,9 +574,68 @@ def performance_monitor(operation_name: str):
 performance_bp = Blueprint("performance", __name__, url_prefix="/api/performance")
 
 
+# Exposición OpenMetrics para Prometheus, agregada entre workers (sin prefijo)
+openmetrics_bp = Blueprint("openmetrics", __name__)
+
+
+@performance_bp.record_once
+def _iniciar_muestreador(estado):
+    config = estado.app.config
+    configurar_historial(
+        config.get("METRICAS_HISTORIAL_PATH"),
+        config.get("METRICAS_HISTORIAL_SEGUNDOS", 60),
+    )
+    if _historial is not None:
+        atexit.register(volcar_historial, forzar=True)
+    if configurar_rollups(
+        config.get("METRICAS_ROLLUP_DIR"), config.get("METRICAS_ROLLUP_SEGUNDOS", 30)
+    ):
+        atexit.register(_cerrar_rollups)
+    _muestreador.iniciar(config.get("METRICAS_MUESTREO_SEGUNDOS", 5))
+
+
+def _token_valido():
+    token = current_app.config.get("METRICS_TOKEN")
+    return bool(token) and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+
+
+def _acceso_diagnostico():
+    """Token de METRICS_TOKEN o sesión de un administrador"""
+    if _token_valido():
+        return True
+    from flask_login import current_user
+
+    return (
+        current_user.is_authenticated
+        and (getattr(current_user, "rol", "") or "").lower() == "administrador"
+    )
+
+
+@openmetrics_bp.route("/metrics")
+def openmetrics():
+    """
+    Métricas de todos los workers en formato OpenMetrics. Con METRICS_TOKEN
+    configurado exige la cabecera "Authorization: Bearer <token>".
+    """
+    if current_app.config.get("METRICS_TOKEN") and not _token_valido():
+        return jsonify({"error": "No autorizado"}), 401
+
+    almacen = obtener_almacen()
+    if almacen is None:
+        return jsonify({"error": "Métricas multiproceso no configuradas"}), 503
+
+    publicar_metricas_proceso()
+    valores = almacen.agregado()
+    _ratio_aciertos_cache(valores)
+    return Response(texto_openmetrics(valores), content_type=TIPO_CONTENIDO)
+
+
 @performance_bp.route("/metrics")
 def get_performance_metrics():
     """Obtener todas las métricas de performance"""
+    consolidar_metricas()
     with _lock:
         # Convertir las últimas 50 métricas
         recent_metrics = list(_metrics)[-50:]
@@ -133,30 +650,27 @@ def get_performance_metrics():
     )
 
 
+def _resumen_operaciones():
+    """Copia de los resúmenes por operación (O(operaciones × cubetas))"""
+    consolidar_metricas()
+    with _lock:
+        return {
+            operation: dict(
+                estadisticas.resumen(), throughput=_throughput_counters[operation]
+            )
+            for operation, estadisticas in _operation_stats.items()
+            if estadisticas.total
+        }
+
+
 @performance_bp.route("/stats")
 def get_performance_stats():
-    """Obtener estadísticas resumidas de performance"""
-    with _lock:
-        stats = {}
-
-        for operation, metrics in _operation_stats.items():
-            if not metrics:
-                continue
-
-            durations = [m.duration for m in metrics]
-            memories = [m.memory_mb for m in metrics]
-            successes = [m.success for m in metrics]
-
-            stats[operation] = {
-                "count": len(metrics),
-                "avg_duration": sum(durations) / len(durations),
-                "min_duration": min(durations),
-                "max_duration": max(durations),
-                "avg_memory": sum(memories) / len(memories),
-                "success_rate": (sum(successes) / len(successes)) * 100,
-                "total_records": sum(m.records_processed for m in metrics),
-                "throughput": _throughput_counters[operation],
-            }
+    """
+    Obtener estadísticas resumidas de performance: duración media, mínima,
+    máxima y percentiles p50/p95/p99 desde el arranque y en las ventanas
+    móviles de 5 minutos y 1 hora.
+    """
+    stats = _resumen_operaciones()
 
     # Estadísticas del sistema
     try:
@@ -172,7 +686,16 @@ def get_performance_stats():
     return jsonify(
         {
             "operation_stats": stats,
+            "database_stats": {
+                endpoint: {
+                    clave: valor
+                    for clave, valor in datos.items()
+                    if clave not in ("top_fingerprints", "n_plus_one")
+                }
+                for endpoint, datos in resumen_sql().items()
+            },
             "system_stats": system_stats,
+            "process_stats": _muestreador.ultima(),
             "uptime_seconds": (datetime.now() - _start_time).total_seconds(),
         }
     )
@@ -181,22 +704,27 @@ def get_performance_stats():
 @performance_bp.route("/operation/<operation_name>")
 def get_operation_stats(operation_name):
     """Obtener estadísticas de una operación específica"""
+    consolidar_metricas()
     with _lock:
-        if operation_name not in _operation_stats:
+        estadisticas = _operation_stats.get(operation_name)
+        if estadisticas is None or not estadisticas.total:
             return jsonify({"error": "Operation not found"}), 404
 
-        metrics = _operation_stats[operation_name]
-        recent_metrics = metrics[-20:]  # Últimas 20 métricas
-
-        durations = [m.duration for m in metrics]
+        resumen = estadisticas.resumen()
+        # Últimas 20 métricas de la operación (del buffer acotado)
+        recent_metrics = [m for m in _metrics if m.operation == operation_name][-20:]
 
         return jsonify(
             {
                 "operation": operation_name,
-                "total_executions": len(metrics),
-                "avg_duration": sum(durations) / len(durations),
-                "min_duration": min(durations),
-                "max_duration": max(durations),
+                "total_executions": resumen["count"],
+                "avg_duration": resumen["avg_duration"],
+                "min_duration": resumen["min_duration"],
+                "max_duration": resumen["max_duration"],
+                "p50_duration": resumen["p50_duration"],
+                "p95_duration": resumen["p95_duration"],
+                "p99_duration": resumen["p99_duration"],
+                "windows": resumen["windows"],
                 "recent_metrics": [asdict(m) for m in recent_metrics],
                 "throughput": _throughput_counters[operation_name],
             }
@@ -206,59 +734,211 @@ def get_operation_stats(operation_name):
 @performance_bp.route("/dashboard")
 def get_performance_dashboard():
     """Dashboard completo de performance"""
-    with _lock:
-        # Top operaciones por duración
-        top_operations = []
-        for operation, metrics in _operation_stats.items():
-            if metrics:
-                avg_duration = sum(m.duration for m in metrics) / len(metrics)
-                top_operations.append(
-                    {
-                        "operation": operation,
-                        "avg_duration": avg_duration,
-                        "count": len(metrics),
-                        "success_rate": (sum(m.success for m in metrics) / len(metrics))
-                        * 100,
-                    }
-                )
-
-        top_operations.sort(key=lambda x: x["avg_duration"], reverse=True)
-
-        # Métricas por hora (últimas 24 horas)
-        now = datetime.now()
-        hourly_stats = defaultdict(lambda: {"count": 0, "avg_duration": 0, "errors": 0})
+    # Top operaciones por duración
+    top_operations = [
+        {
+            "operation": operation,
+            "avg_duration": resumen["avg_duration"],
+            "p95_duration": resumen["p95_duration"],
+            "count": resumen["count"],
+            "success_rate": resumen["success_rate"],
+        }
+        for operation, resumen in _resumen_operaciones().items()
+    ]
+    top_operations.sort(key=lambda x: x["avg_duration"], reverse=True)
 
-        for metric in _metrics:
-            metric_time = datetime.fromisoformat(metric.timestamp)
-            if now - metric_time <= timedelta(hours=24):
-                hour_key = metric_time.strftime("%Y-%m-%d %H:00")
-                hourly_stats[hour_key]["count"] += 1
-                hourly_stats[hour_key]["avg_duration"] += metric.duration
-                if not metric.success:
-                    hourly_stats[hour_key]["errors"] += 1
+    # Métricas por hora (últimas 24 h) y por minuto (última hora):
+    # O(cubetas), sin recorrer métricas individuales
+    with _lock:
+        hourly_stats = {
+            datetime.fromtimestamp(c.epoca * 3600).strftime("%Y-%m-%d %H:00"): {
+                "count": c.total,
+                "avg_duration": c.suma / c.total,
+                "p95_duration": c.histograma.percentil(95),
+                "max_duration": c.maximo,
+                "errors": c.errores,
+            }
+            for c in _series["hours"].cubetas()
+        }
+        minute_stats = {
+            datetime.fromtimestamp(c.epoca * 60).strftime("%Y-%m-%d %H:%M"): {
+                "count": c.total,
+                "avg_duration": c.suma / c.total,
+                "max_duration": c.maximo,
+                "errors": c.errores,
+            }
+            for c in _series["minutes"].cubetas()
+        }
 
-        # Calcular promedios
-        for hour_data in hourly_stats.values():
-            if hour_data["count"] > 0:
-                hour_data["avg_duration"] /= hour_data["count"]
+    sql = resumen_sql(top=3)
 
     return jsonify(
         {
             "top_slowest_operations": top_operations[:10],
-            "hourly_stats": dict(hourly_stats),
+            "top_db_endpoints": [
+                {
+                    "endpoint": endpoint,
+                    "requests": datos["requests"],
+                    "queries_per_request_avg": datos["queries_per_request_avg"],
+                    "db_time_avg": datos["db_time_avg"],
+                    "db_time_total": datos["db_time_total"],
+                }
+                for endpoint, datos in list(sql.items())[:10]
+            ],
+            "n_plus_one_alerts": [
+                dict(aviso, endpoint=endpoint)
+                for endpoint, datos in sql.items()
+                for aviso in datos["n_plus_one"]
+            ],
+            "hourly_stats": hourly_stats,
+            "minute_stats": minute_stats,
             "total_operations": len(_metrics),
             "active_operations": len(_operation_stats),
         }
     )
 
 
+def _instante(valor):
+    """Epoch en segundos a partir de un número o una fecha ISO"""
+    try:
+        return float(valor)
+    except ValueError:
+        return datetime.fromisoformat(valor).timestamp()
+
+
+@performance_bp.route("/history")
+def get_history():
+    """
+    Serie persistida de una operación entre `from` y `to` (epoch o ISO).
+    La resolución (1m, 1h, 1d) se elige según el rango salvo que se indique.
+    """
+    if _escritor_rollups is None:
+        return jsonify({"error": "Historial de rendimiento desactivado"}), 404
+    operation = request.args.get("operation")
+    resolucion = request.args.get("resolution")
+    try:
+        hasta = _instante(request.args.get("to", str(time.time())))
+        desde = _instante(request.args.get("from", str(hasta - 86400)))
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas"}), 400
+    if resolucion is not None and resolucion not in ("1m", "1h", "1d"):
+        return jsonify({"error": "Resolución inválida"}), 400
+
+    almacen = _escritor_rollups.almacen
+    if not operation:
+        return jsonify({"operations": almacen.operaciones(desde, hasta)})
+    resolucion = resolucion or almacen.resolucion_para(desde, hasta)
+    return jsonify(
+        {
+            "operation": operation,
+            "resolution": resolucion,
+            "from": desde,
+            "to": hasta,
+            "points": almacen.consultar(operation, desde, hasta, resolucion),
+        }
+    )
+
+
+@performance_bp.route("/history/compare")
+def compare_history():
+    """
+    Compara una operación antes y después de `release` (epoch o ISO) en
+    ventanas de `window` segundos (1 h por defecto): count, avg, p50, p95...
+    """
+    if _escritor_rollups is None:
+        return jsonify({"error": "Historial de rendimiento desactivado"}), 404
+    operation = request.args.get("operation")
+    if not operation or not request.args.get("release"):
+        return jsonify({"error": "Faltan operation y release"}), 400
+    try:
+        release = _instante(request.args["release"])
+    except ValueError:
+        return jsonify({"error": "Fecha de release inválida"}), 400
+    ventana = request.args.get("window", 3600, type=float)
+
+    almacen = _escritor_rollups.almacen
+    antes = almacen.agregado(operation, release - ventana, release)
+    despues = almacen.agregado(operation, release, release + ventana)
+    return jsonify(
+        {
+            "operation": operation,
+            "release": release,
+            "window_seconds": ventana,
+            "before": antes,
+            "after": despues,
+            "p95_change": (
+                (despues["p95"] - antes["p95"]) / antes["p95"] if antes["p95"] else None
+            ),
+        }
+    )
+
+
+@performance_bp.route("/sql")
+def get_sql_stats():
+    """
+    Consultas SQL por endpoint: número por petición, tiempo en base de datos,
+    huellas más costosas y posibles N+1 detectados.
+    """
+    top = request.args.get("top", 10, type=int)
+    endpoints = resumen_sql(top=top)
+    return jsonify(
+        {
+            "endpoints": endpoints,
+            "n_plus_one_alerts": [
+                dict(aviso, endpoint=endpoint)
+                for endpoint, datos in endpoints.items()
+                for aviso in datos["n_plus_one"]
+            ],
+        }
+    )
+
+
+@performance_bp.route("/slow")
+def get_slow_requests():
+    """
+    Peticiones más lentas capturadas por el perfilador (PERFILADOR_LENTAS),
+    con sus pilas colapsadas. Solo administradores o con METRICS_TOKEN.
+    """
+    if not _acceso_diagnostico():
+        return jsonify({"error": "No autorizado"}), 403
+
+    perfilador = obtener_perfilador()
+    return jsonify(
+        {
+            "enabled": perfilador.activo,
+            "threshold_seconds": perfilador.umbral,
+            "interval_ms": perfilador.intervalo * 1000,
+            "requests": perfilador.lentas(),
+        }
+    )
+
+
+@performance_bp.route("/slow/<int:request_id>/collapsed")
+def get_slow_request_stacks(request_id):
+    """Pilas de una petición lenta en texto colapsado (flamegraph.pl)"""
+    if not _acceso_diagnostico():
+        return jsonify({"error": "No autorizado"}), 403
+
+    registro = obtener_perfilador().obtener(request_id)
+    if registro is None:
+        return jsonify({"error": "Petición no encontrada"}), 404
+    return Response(
+        obtener_perfilador().texto_colapsado(registro),
+        content_type="text/plain; charset=utf-8",
+    )
+
+
 @performance_bp.route("/clear", methods=["POST"])
 def clear_metrics():
     """Limpiar todas las métricas"""
     with _lock:
+        _pendientes.clear()
         _metrics.clear()
         _operation_stats.clear()
         _throughput_counters.clear()
+        for serie in _series.values():
+            serie.vaciar()
+    limpiar_estadisticas_sql()
 
     return jsonify({"message": "Performance metrics cleared"})
 
@@ -273,6 +953,7 @@ def test_performance_monitoring():
         return {"items": list(range(10)), "processed": True}
 
     result = test_function()
+    consolidar_metricas()
 
     return jsonify(
         {
@@ -302,6 +983,7 @@ def monitor_database_operation(operation_name: str):
 # Obtener estadísticas actuales (para uso programático)
 def get_current_stats():
     """Obtener estadísticas actuales de performance"""
+    consolidar_metricas()
     with _lock:
         return {
             "total_metrics": len(_metrics),
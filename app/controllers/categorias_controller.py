@@ -176,6 +176,7 @@ class CategoriasController:
                 )
 
             codigo = categoria.generar_proximo_codigo()
+            db.session.commit()
 
             return jsonify(
                 {
@@ -242,7 +243,9 @@ class CategoriasController:
                         pass
 
                     backend = (
-                        db.engine.url.get_backend_name() if getattr(db, "engine", None) else None
+                        db.engine.url.get_backend_name()
+                        if getattr(db, "engine", None)
+                        else None
                     )
                     table_name = "inventario"
                     if backend in ("postgresql", "postgres"):
@@ -254,7 +257,10 @@ class CategoriasController:
                         except Exception:
                             pass
                         from sqlalchemy import text as _text
-                        with base_conn.execution_options(isolation_level="AUTOCOMMIT") as conn:
+
+                        with base_conn.execution_options(
+                            isolation_level="AUTOCOMMIT"
+                        ) as conn:
                             res = conn.execute(
                                 _text(
                                     f"SELECT COUNT(*) AS total FROM {table_name} WHERE categoria_id = :cid"
@@ -353,7 +359,9 @@ class CategoriasController:
                     pass
 
                 backend = (
-                    db.engine.url.get_backend_name() if getattr(db, "engine", None) else None
+                    db.engine.url.get_backend_name()
+                    if getattr(db, "engine", None)
+                    else None
                 )
                 table_name = "inventario"
                 if backend in ("postgresql", "postgres"):
@@ -365,7 +373,10 @@ class CategoriasController:
                     except Exception:
                         pass
                     from sqlalchemy import text as _text
-                    with base_conn.execution_options(isolation_level="AUTOCOMMIT") as conn:
+
+                    with base_conn.execution_options(
+                        isolation_level="AUTOCOMMIT"
+                    ) as conn:
                         res = conn.execute(
                             _text(
                                 f"SELECT COUNT(*) AS total FROM {table_name} WHERE categoria_id = :cid"
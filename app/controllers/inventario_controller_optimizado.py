@@ -9,15 +9,31 @@ from app.models.movimiento_inventario import MovimientoInventario
 from app.models.categoria import Categoria
 from app.extensions import db
 from app.blueprints.performance_metrics import performance_monitor
-from app.blueprints.cached_inventario_simple import simple_cache, cache_key
+from app.blueprints.cached_inventario_simple import (
+    cache_key,
+    simple_cache,
+    simple_cache_o_calcular,
+)
+from app.utils.cache import (
+    TAG_ESTADISTICAS,
+    TAG_LISTADO_INVENTARIO,
+    invalidar_tags,
+    tag_inventario,
+    tags_inventario,
+)
 from flask import request, jsonify
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from decimal import Decimal
 import logging
 from sqlalchemy import func, extract
 
 # Importar FIFO optimizado
-from fifo_optimizado import FIFOOptimizado
+from app.services.fifo_optimizado import FIFOOptimizado
+from app.services.servicio_fifo import ServicioFIFO
+from app.services.movimientos_batch import (
+    ServicioMovimientosBatch,
+    fecha_vencimiento_por_categoria,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -107,7 +123,7 @@ def listar_inventario_optimizado():
         }
 
         # Guardar en caché por 2 minutos
-        simple_cache(cache_key_str, result, ttl=120)
+        simple_cache(cache_key_str, result, ttl=120, tags=[TAG_LISTADO_INVENTARIO])
 
         return result
 
@@ -120,86 +136,84 @@ def listar_inventario_optimizado():
         }
 
 
-@performance_monitor("obtener_estadisticas_optimizado")
-def obtener_estadisticas_optimizado():
-    """Estadísticas de inventario con caché optimizado"""
-    cache_key_str = cache_key("estadisticas_inventario")
-
-    # Caché de 5 minutos para estadísticas
-    cached_result = simple_cache(cache_key_str)
-    if cached_result is not None:
-        cached_result["from_cache"] = True
-        return cached_result
-
-    try:
-        # Consultas optimizadas usando índices
-        stats = {}
-
-        # Total de artículos activos
-        stats["total_articulos"] = Inventario.query.filter_by(activo=True).count()
-
-        # Artículos bajo mínimo
-        stats["articulos_bajo_minimo"] = Inventario.query.filter(
-            Inventario.activo == True,
-            Inventario.stock_actual <= Inventario.stock_minimo,
-        ).count()
-
-        # Valor total del stock
-        valor_total = (
-            db.session.query(
-                func.sum(Inventario.stock_actual * Inventario.precio_promedio)
-            )
-            .filter(Inventario.activo == True)
-            .scalar()
-            or 0
-        )
-        stats["valor_total_stock"] = float(valor_total) if valor_total else 0
-
-        # Artículos críticos
-        stats["articulos_criticos"] = Inventario.query.filter_by(
-            activo=True, critico=True
-        ).count()
-
-        # Artículos sin stock
-        stats["articulos_sin_stock"] = Inventario.query.filter(
-            Inventario.activo == True, Inventario.stock_actual <= 0
-        ).count()
-
-        # Estadísticas por categoría (top 5)
-        categorias_stats = (
-            db.session.query(
-                Inventario.categoria,
-                func.count(Inventario.id).label("cantidad"),
-                func.sum(Inventario.stock_actual * Inventario.precio_promedio).label(
-                    "valor"
-                ),
-            )
-            .filter(Inventario.activo == True)
-            .group_by(Inventario.categoria)
-            .order_by(func.count(Inventario.id).desc())
-            .limit(5)
-            .all()
+def _calcular_estadisticas_inventario():
+    """Consultas agregadas de obtener_estadisticas_optimizado (sin caché)"""
+    # Consultas optimizadas usando índices
+    stats = {}
+
+    # Total de artículos activos
+    stats["total_articulos"] = Inventario.query.filter_by(activo=True).count()
+
+    # Artículos bajo mínimo
+    stats["articulos_bajo_minimo"] = Inventario.query.filter(
+        Inventario.activo == True,
+        Inventario.stock_actual <= Inventario.stock_minimo,
+    ).count()
+
+    # Valor total del stock
+    valor_total = (
+        db.session.query(func.sum(Inventario.stock_actual * Inventario.precio_promedio))
+        .filter(Inventario.activo == True)
+        .scalar()
+        or 0
+    )
+    stats["valor_total_stock"] = float(valor_total) if valor_total else 0
+
+    # Artículos críticos
+    stats["articulos_criticos"] = Inventario.query.filter_by(
+        activo=True, critico=True
+    ).count()
+
+    # Artículos sin stock
+    stats["articulos_sin_stock"] = Inventario.query.filter(
+        Inventario.activo == True, Inventario.stock_actual <= 0
+    ).count()
+
+    # Estadísticas por categoría (top 5)
+    categorias_stats = (
+        db.session.query(
+            Inventario.categoria,
+            func.count(Inventario.id).label("cantidad"),
+            func.sum(Inventario.stock_actual * Inventario.precio_promedio).label(
+                "valor"
+            ),
         )
+        .filter(Inventario.activo == True)
+        .group_by(Inventario.categoria)
+        .order_by(func.count(Inventario.id).desc())
+        .limit(5)
+        .all()
+    )
+
+    stats["top_categorias"] = [
+        {
+            "categoria": cat.categoria,
+            "cantidad": cat.cantidad,
+            "valor": float(cat.valor or 0),
+        }
+        for cat in categorias_stats
+    ]
 
-        stats["top_categorias"] = [
-            {
-                "categoria": cat.categoria,
-                "cantidad": cat.cantidad,
-                "valor": float(cat.valor or 0),
-            }
-            for cat in categorias_stats
-        ]
+    return {"estadisticas": stats, "timestamp": datetime.now().isoformat()}
 
-        result = {
-            "estadisticas": stats,
-            "from_cache": False,
-            "timestamp": datetime.now().isoformat(),
-        }
 
-        # Guardar en caché por 5 minutos
-        simple_cache(cache_key_str, result, ttl=300)
+@performance_monitor("obtener_estadisticas_optimizado")
+def obtener_estadisticas_optimizado():
+    """
+    Estadísticas de inventario con caché optimizado (5 minutos).
 
-        return result
+    Al caducar, una sola petición recalcula los agregados (single-flight) y
+    el resto recibe el valor anterior; con beta > 0 el recálculo puede
+    adelantarse a la caducidad para no coincidir con picos de carga.
+    """
+    try:
+        result, desde_cache = simple_cache_o_calcular(
+            cache_key("estadisticas_inventario"),
+            _calcular_estadisticas_inventario,
+            ttl=300,
+            tags=[TAG_ESTADISTICAS],
+        )
+        return {**result, "from_cache": desde_cache}
 
     except Exception as e:
         logger.error(f"Error en obtener_estadisticas_optimizado: {str(e)}")
@@ -326,18 +340,7 @@ def _procesar_entrada_optimizada(articulo, movimiento, data):
             fecha_vencimiento = datetime.fromisoformat(data["fecha_vencimiento"])
         else:
             # Vencimiento automático basado en categoría
-            categoria_lower = (articulo.categoria or "general").lower()
-            dias_vencimiento = {
-                "repuestos": 1095,  # 3 años
-                "consumibles": 365,  # 1 año
-                "herramientas": 1825,  # 5 años
-            }.get(
-                categoria_lower, 730
-            )  # 2 años por defecto
-
-            fecha_vencimiento = datetime.now(timezone.utc) + timedelta(
-                days=dias_vencimiento
-            )
+            fecha_vencimiento = fecha_vencimiento_por_categoria(articulo)
 
         # Crear lote FIFO
         lote = ServicioFIFO.crear_lote_entrada(
@@ -384,7 +387,7 @@ def _procesar_salida_optimizada(articulo, movimiento, cantidad, data):
 
         # Usar FIFO optimizado para consumo batch
         resultados = fifo_optimizado.consumir_fifo_batch(
-            [operacion], movimiento.usuario_id
+            [operacion], movimiento.usuario_id, commit=False
         )
 
         if resultados:
@@ -420,20 +423,15 @@ def _procesar_salida_optimizada(articulo, movimiento, cantidad, data):
         }
 
 
-def _limpiar_cache_inventario(inventario_id):
-    """Limpiar caché relacionado con inventario"""
+def _limpiar_cache_inventario(*inventario_ids):
+    """
+    Limpiar caché relacionado con inventario (artículos, listados y
+    estadísticas). El commit de la sesión ya invalida estas etiquetas; esta
+    llamada cubre escrituras confirmadas fuera de ella.
+    """
     try:
-        # Limpiar cachés específicos que podrían estar afectados
-        cache_patterns = [
-            "inventario_list_",
-            "estadisticas_inventario",
-            f"inventario_{inventario_id}_",
-            "lotes_",
-        ]
-
-        # Esta implementación simple solo registra la limpieza
-        # En una implementación completa, buscaríamos todas las claves que coincidan
-        logger.info(f"Cache invalidado para inventario {inventario_id}")
+        invalidar_tags(tags_inventario(i for i in inventario_ids if i is not None))
+        logger.debug(f"Cache invalidado para inventario {inventario_ids}")
 
     except Exception as e:
         logger.warning(f"Error al limpiar caché: {str(e)}")
@@ -458,16 +456,10 @@ def obtener_articulo_optimizado(inventario_id):
                 "timestamp": datetime.now().isoformat(),
             }
 
-        # Obtener lotes disponibles usando FIFO optimizado
-        lotes_disponibles = fifo_optimizado._obtener_lotes_optimizado(inventario_id)
-
-        # Estadísticas de lotes
-        total_lotes = len(lotes_disponibles)
-        cantidad_total_lotes = sum(
-            float(lote.cantidad_disponible)
-            for lote in lotes_disponibles
-            if lote.cantidad_disponible > 0
-        )
+        # Estadísticas de lotes desde stock_resumen (lectura por clave primaria)
+        resumen = ServicioFIFO.obtener_resumen_stock(inventario_id)
+        total_lotes = resumen["numero_lotes"]
+        cantidad_total_lotes = resumen["total_disponible"]
 
         result = {
             "articulo": {
@@ -498,7 +490,9 @@ def obtener_articulo_optimizado(inventario_id):
         }
 
         # Guardar en caché por 3 minutos
-        simple_cache(cache_key_str, result, ttl=180)
+        simple_cache(
+            cache_key_str, result, ttl=180, tags=[tag_inventario(inventario_id)]
+        )
 
         return result
 
@@ -512,59 +506,39 @@ def obtener_articulo_optimizado(inventario_id):
 
 
 @performance_monitor("crear_movimientos_batch_optimizado")
-def crear_movimientos_batch_optimizado(movimientos):
+def crear_movimientos_batch_optimizado(movimientos, modo="por_fila"):
     """
     Procesa múltiples movimientos en batch para máximo rendimiento
 
     Args:
         movimientos: Lista de diccionarios con datos de movimientos
+        modo: "por_fila" (cada movimiento en su SAVEPOINT, los erróneos se
+            descartan) o "todo_o_nada" (cualquier error anula el batch)
 
     Returns:
         dict: Resultado del procesamiento batch
     """
     start_time = datetime.now()
-    resultados = []
-    exitosos = 0
-    errores = 0
 
     try:
-        for i, movimiento_data in enumerate(movimientos):
-            try:
-                # Procesar cada movimiento individualmente
-                resultado = crear_movimiento_optimizado(movimiento_data)
-
-                if "error" in resultado:
-                    errores += 1
-                    resultados.append(
-                        {"index": i, "success": False, "error": resultado["error"]}
-                    )
-                else:
-                    exitosos += 1
-                    resultados.append(
-                        {
-                            "index": i,
-                            "success": True,
-                            "movimiento_id": resultado.get("movimiento_id"),
-                            "lote_id": resultado.get("lote_id"),
-                        }
-                    )
-
-            except Exception as e:
-                errores += 1
-                logger.error(f"Error procesando movimiento {i}: {str(e)}")
-                resultados.append({"index": i, "success": False, "error": str(e)})
+        resultado = ServicioMovimientosBatch.procesar(
+            movimientos, modo=modo, fifo=fifo_optimizado
+        )
+
+        _limpiar_cache_inventario(
+            *{m.get("inventario_id") for m in movimientos if isinstance(m, dict)}
+        )
 
         # Calcular tiempo total
         tiempo_total = (datetime.now() - start_time).total_seconds() * 1000
 
-        return {
-            "total_procesados": len(movimientos),
-            "exitosos": exitosos,
-            "errores": errores,
-            "tiempo_total_ms": round(tiempo_total, 2),
-            "resultados": resultados,
-            "timestamp": datetime.now().isoformat(),
-        }
+        resultado.update(
+            {
+                "tiempo_total_ms": round(tiempo_total, 2),
+                "timestamp": datetime.now().isoformat(),
+            }
+        )
+        return resultado
 
     except Exception as e:
         logger.error(f"Error en procesamiento batch: {str(e)}")
@@ -4,8 +4,13 @@ from app.models.usuario import Usuario
 from app.models.plan_mantenimiento import PlanMantenimiento
 from app.controllers.planes_controller import calcular_proxima_ejecucion
 from app.extensions import db
+from app.services import numeracion
+from app.utils.cache import TAG_LISTADO_ORDENES, obtener_cache
 from datetime import datetime, timezone
 from io import BytesIO
+import base64
+import json
+import math
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 
@@ -67,28 +72,19 @@ def listar_ordenes(estado=None, limit=None):
     ]
 
 
-def listar_ordenes_paginado(
-    page=1, per_page=10, q=None, estado=None, tipo=None, prioridad=None
-):
-    """Listar órdenes de trabajo con paginación y filtros"""
-    from sqlalchemy.orm import joinedload
+# Segundos que se reutiliza el total de un listado; además se invalida al
+# confirmar cambios en órdenes (ver app.services.invalidacion_cache)
+TTL_TOTAL_ORDENES = 60
 
-    # Cargar las relaciones de forma eager para evitar N+1 queries
-    query = OrdenTrabajo.query.options(
-        joinedload(OrdenTrabajo.activo), joinedload(OrdenTrabajo.tecnico)
-    )
 
-    # Filtro por estado
+def _filtrar_ordenes(query, q=None, estado=None, tipo=None, prioridad=None):
+    """Aplica los filtros del listado a una consulta sobre OrdenTrabajo"""
     if estado:
-        query = query.filter_by(estado=estado)
-
-    # Filtro por tipo
+        query = query.filter(OrdenTrabajo.estado == estado)
     if tipo:
-        query = query.filter_by(tipo=tipo)
-
-    # Filtro por prioridad
+        query = query.filter(OrdenTrabajo.tipo == tipo)
     if prioridad:
-        query = query.filter_by(prioridad=prioridad)
+        query = query.filter(OrdenTrabajo.prioridad == prioridad)
 
     # Filtro de búsqueda general
     if q:
@@ -107,12 +103,81 @@ def listar_ordenes_paginado(
                 Usuario.nombre.ilike(search_term),
             )
         )
+    return query
 
-    # Ordenamiento por número de orden ascendente (OT-001, OT-002, etc.)
-    query = query.order_by(OrdenTrabajo.numero_orden.asc())
 
-    # Paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+def codificar_cursor(numero_orden, id):
+    """Cursor opaco con la clave (numero_orden, id) de la última orden de una página"""
+    datos = json.dumps([numero_orden, id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """(numero_orden, id) de un cursor; ValueError si no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        numero_orden, id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(numero_orden), int(id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor de paginación no válido") from e
+
+
+def total_ordenes(q=None, estado=None, tipo=None, prioridad=None):
+    """
+    COUNT del listado filtrado, cacheado TTL_TOTAL_ORDENES segundos. Con
+    búsqueda libre (q) se calcula siempre: cada texto sería una entrada
+    distinta que desplazaría de la caché a las útiles.
+    """
+
+    def calcular():
+        consulta = db.session.query(db.func.count(OrdenTrabajo.id)).select_from(
+            OrdenTrabajo
+        )
+        return _filtrar_ordenes(consulta, q, estado, tipo, prioridad).scalar()
+
+    if q:
+        return calcular()
+    clave = "ordenes:total:" + json.dumps([estado, tipo, prioridad])
+    total, _ = obtener_cache().obtener_o_calcular(
+        clave, calcular, TTL_TOTAL_ORDENES, tags=(TAG_LISTADO_ORDENES,)
+    )
+    return total
+
+
+def listar_ordenes_paginado(
+    page=1, per_page=10, q=None, estado=None, tipo=None, prioridad=None, cursor=None
+):
+    """
+    Listar órdenes de trabajo con paginación y filtros
+
+    Orden estable por (numero_orden, id). Con `cursor` (el next_cursor de la
+    página anterior) la página se lee por clave, (numero_orden, id) > cursor,
+    y cuesta lo mismo sea cual sea su profundidad; sin él se salta con OFFSET
+    (acceso directo a una página). El total sale de total_ordenes.
+    """
+    from sqlalchemy.orm import joinedload
+
+    page = max(page or 1, 1)
+    per_page = per_page if per_page and per_page > 0 else 10
+
+    # Cargar las relaciones de forma eager para evitar N+1 queries
+    query = OrdenTrabajo.query.options(
+        joinedload(OrdenTrabajo.activo), joinedload(OrdenTrabajo.tecnico)
+    )
+    query = _filtrar_ordenes(query, q, estado, tipo, prioridad)
+
+    # Ordenamiento por número de orden ascendente (OT-001, OT-002, etc.)
+    query = query.order_by(OrdenTrabajo.numero_orden.asc(), OrdenTrabajo.id.asc())
+    if cursor:
+        clave = db.tuple_(OrdenTrabajo.numero_orden, OrdenTrabajo.id)
+        query = query.filter(clave > db.tuple_(*decodificar_cursor(cursor)))
+    else:
+        query = query.offset((page - 1) * per_page)
+
+    # Una fila de más indica si hay página siguiente
+    filas = query.limit(per_page + 1).all()
+    ordenes = filas[:per_page]
+    has_next = len(filas) > per_page
 
     ordenes_data = [
         {
@@ -144,17 +209,23 @@ def listar_ordenes_paginado(
             "tecnico_id": o.tecnico_id,
             "tecnico_nombre": o.tecnico.nombre if o.tecnico else None,
         }
-        for o in pagination.items
+        for o in ordenes
     ]
 
+    total = total_ordenes(q, estado, tipo, prioridad)
     return {
         "items": ordenes_data,
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "total": pagination.total,
-        "pages": pagination.pages,
-        "has_next": pagination.has_next,
-        "has_prev": pagination.has_prev,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": math.ceil(total / per_page),
+        "has_next": has_next,
+        "has_prev": page > 1,
+        "next_cursor": (
+            codificar_cursor(ordenes[-1].numero_orden, ordenes[-1].id)
+            if has_next
+            else None
+        ),
     }
 
 
@@ -194,8 +265,7 @@ def obtener_orden(id):
 def crear_orden(data):
     """Crear nueva orden de trabajo"""
     # Generar número de orden único
-    ultimo_numero = db.session.query(db.func.max(OrdenTrabajo.id)).scalar() or 0
-    numero_orden = f"OT-{ultimo_numero + 1:06d}"
+    numero_orden = numeracion.numero_orden()
 
     # Validar que el activo existe si se proporciona
     if data.get("activo_id"):
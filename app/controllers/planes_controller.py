@@ -4,6 +4,11 @@ from app.extensions import db
 from datetime import datetime, timedelta
 from flask import request
 from sqlalchemy import func
+from app.models.carga_tecnico import ESTADOS_ABIERTOS, CargaTecnico
+from app.services.carga_tecnicos import obtener_asignador
+from app.services.invalidacion_cache import registrar_invalidacion_ordenes
+from app.services import numeracion
+from app.utils import recurrencia
 import calendar
 
 
@@ -228,35 +233,11 @@ def calcular_proxima_ejecucion(data, fecha_base=None):
 
 def generar_codigo_plan():
     """Generar código único para plan de mantenimiento en formato PM-YYYY-NNNN"""
-    año_actual = datetime.now().year
-    prefijo = f"PM-{año_actual}-"
+    codigo = numeracion.codigo_plan()
 
-    # Buscar el último código del año actual
-    ultimo_plan = (
-        PlanMantenimiento.query.filter(
-            PlanMantenimiento.codigo_plan.like(f"{prefijo}%")
-        )
-        .order_by(PlanMantenimiento.codigo_plan.desc())
-        .first()
-    )
-
-    if ultimo_plan:
-        # Extraer el número secuencial del último código
-        try:
-            ultimo_numero = int(ultimo_plan.codigo_plan.split("-")[-1])
-            siguiente_numero = ultimo_numero + 1
-        except (ValueError, IndexError):
-            siguiente_numero = 1
-    else:
-        siguiente_numero = 1
-
-    # Formatear con 4 dígitos
-    codigo = f"{prefijo}{siguiente_numero:04d}"
-
-    # Verificar que el código no exista (por seguridad)
+    # Saltar códigos introducidos a mano que coincidan con la serie
     while PlanMantenimiento.query.filter_by(codigo_plan=codigo).first():
-        siguiente_numero += 1
-        codigo = f"{prefijo}{siguiente_numero:04d}"
+        codigo = numeracion.codigo_plan()
 
     return codigo
 
@@ -721,142 +702,194 @@ def obtener_estadisticas_planes():
     }
 
 
-def generar_ordenes_automaticas():
+TIPO_ORDEN_PREVENTIVA = "Mantenimiento Preventivo"
+
+
+def _planes_con_orden_abierta(filtros_planes):
     """
-    Genera órdenes de trabajo automáticamente para planes vencidos
+    Ids de los planes (que cumplen filtros_planes) con una orden preventiva
+    pendiente o en proceso, en una sola consulta.
+
+    Las órdenes se asocian por plan_mantenimiento_id; las antiguas, que no lo
+    tienen, por activo y "Plan: <código>" en la descripción.
     """
     from app.models.orden_trabajo import OrdenTrabajo
-    from app.models.activo import Activo
 
-    print("🔄 Iniciando generación automática de órdenes...")
+    ids_planes = db.select(PlanMantenimiento.id).where(*filtros_planes)
+    activos_planes = db.select(PlanMantenimiento.activo_id).where(*filtros_planes)
+    abiertas = (
+        db.session.query(
+            OrdenTrabajo.plan_mantenimiento_id,
+            OrdenTrabajo.activo_id,
+            OrdenTrabajo.descripcion,
+        )
+        .filter(
+            OrdenTrabajo.tipo == TIPO_ORDEN_PREVENTIVA,
+            OrdenTrabajo.estado.in_(ESTADOS_ABIERTOS),
+            db.or_(
+                OrdenTrabajo.plan_mantenimiento_id.in_(ids_planes),
+                db.and_(
+                    OrdenTrabajo.plan_mantenimiento_id.is_(None),
+                    db.or_(
+                        OrdenTrabajo.activo_id.in_(activos_planes),
+                        OrdenTrabajo.activo_id.is_(None),
+                    ),
+                ),
+            ),
+        )
+        .all()
+    )
 
-    ahora = datetime.now()
-    ordenes_generadas = []
+    con_orden = set()
+    antiguas = {}  # activo_id -> [descripción]
+    for plan_id, activo_id, descripcion in abiertas:
+        if plan_id is not None:
+            con_orden.add(plan_id)
+        else:
+            antiguas.setdefault(activo_id, []).append(descripcion or "")
+    return con_orden, antiguas
 
-    # DEBUG: Mostrar fecha/hora actual
-    print(f"🕐 Fecha/hora actual del servidor: {ahora}")
-    print(f"🕐 Fecha/hora ISO: {ahora.isoformat()}")
 
-    # DEBUG: Obtener TODOS los planes activos primero para diagnóstico
-    todos_planes = PlanMantenimiento.query.filter(
-        PlanMantenimiento.estado == "Activo"
-    ).all()
+def _proxima_ejecucion_o_respaldo(plan, ahora):
+    """Próxima ejecución del plan; si su regla falla, mañana o en una semana"""
+    try:
+        return recurrencia.proxima_ejecucion(plan, ahora)
+    except Exception as e:
+        print(f"⚠️ Error calculando próxima ejecución para plan {plan.codigo_plan}: {e}")
+        if plan.tipo_frecuencia == "diaria" or plan.frecuencia == "Diario":
+            return ahora + timedelta(days=1)
+        return ahora + timedelta(days=7)  # Por defecto semanal
 
-    print(f"📋 Total planes activos: {len(todos_planes)}")
-    for p in todos_planes:
-        print(f"   Plan {p.codigo_plan}:")
-        print(f"      - Próxima ejecución: {p.proxima_ejecucion}")
-        print(f"      - Generación automática: {p.generacion_automatica}")
-        print(
-            f"      - ¿Vencido? {p.proxima_ejecucion <= ahora if p.proxima_ejecucion else 'Sin fecha'}"
-        )
 
-    # Buscar planes vencidos que estén activos Y tengan generación automática habilitada
-    planes_vencidos = PlanMantenimiento.query.filter(
-        PlanMantenimiento.estado == "Activo",
-        PlanMantenimiento.proxima_ejecucion <= ahora,
-        PlanMantenimiento.generacion_automatica
-        == True,  # Solo planes con generación automática
-    ).all()
+def generar_ordenes_automaticas(despues_de_id=None, limite=None):
+    """
+    Genera órdenes de trabajo automáticamente para planes vencidos
 
-    print(
-        f"📋 Encontrados {len(planes_vencidos)} planes vencidos que cumplen todas las condiciones"
-    )
+    Trabaja por conjuntos con un número fijo de consultas, sea cual sea el
+    número de planes: planes vencidos con su activo, órdenes abiertas por
+    plan, carga de los técnicos (tabla carga_tecnico) y último id, más la
+    inserción en bloque de las órdenes, la de sus cargas y la actualización
+    de los planes al confirmar. Los técnicos se asignan desde el montículo
+    por carga de la transacción, que suma cada orden creada.
 
-    for plan in planes_vencidos:
-        try:
-            # Verificar si ya existe una orden pendiente para este plan
-            orden_existente = OrdenTrabajo.query.filter(
-                OrdenTrabajo.tipo == "Mantenimiento Preventivo",
-                OrdenTrabajo.activo_id == plan.activo_id,
-                OrdenTrabajo.descripcion.contains(f"Plan: {plan.codigo_plan}"),
-                OrdenTrabajo.estado.in_(["Pendiente", "En Proceso"]),
-            ).first()
+    Args:
+        despues_de_id: Revisar solo planes con id mayor (lote siguiente)
+        limite: Máximo de planes revisados en esta llamada (None = todos)
 
-            if orden_existente:
-                print(f"⚠️ Ya existe orden pendiente para plan {plan.codigo_plan}")
-                continue
+    El resultado incluye `planes_revisados` y `ultimo_plan_id` para que el
+    planificador (app.services.planificador) continúe por lotes.
+    """
+    from app.models.orden_trabajo import OrdenTrabajo
 
-            # Obtener información del activo
-            activo = None
-            if plan.activo_id:
-                activo = Activo.query.get(plan.activo_id)
+    print("🔄 Iniciando generación automática de órdenes...")
 
-            # Asignar técnico de manera equilibrada
-            tecnico_id = asignar_tecnico_equilibrado()
+    ahora = datetime.now()
+    filtros = (
+        PlanMantenimiento.estado == "Activo",
+        PlanMantenimiento.proxima_ejecucion <= ahora,
+        PlanMantenimiento.generacion_automatica == True,
+    )
+    if despues_de_id is not None:
+        filtros += (PlanMantenimiento.id > despues_de_id,)
+
+    # Planes vencidos con generación automática y el nombre de su activo
+    consulta = (
+        db.session.query(PlanMantenimiento, Activo.nombre)
+        .outerjoin(Activo, Activo.id == PlanMantenimiento.activo_id)
+        .filter(*filtros)
+        .order_by(PlanMantenimiento.id)
+    )
+    if limite:
+        consulta = consulta.limit(limite)
+    planes_vencidos = consulta.all()
+    print(f"📋 Encontrados {len(planes_vencidos)} planes vencidos")
+    if not planes_vencidos:
+        return {
+            "success": True,
+            "ordenes_generadas": 0,
+            "detalles": [],
+            "planes_revisados": 0,
+            "ultimo_plan_id": despues_de_id,
+        }
 
-            # Crear nueva orden de trabajo
-            nueva_orden = OrdenTrabajo(
-                tipo="Mantenimiento Preventivo",
-                prioridad="Media",  # Puede ajustarse según el plan
-                estado="Pendiente",
-                descripcion=f"Mantenimiento preventivo - Plan: {plan.codigo_plan} - {plan.nombre}",
-                fecha_creacion=ahora,
-                fecha_programada=ahora.date(),
-                activo_id=plan.activo_id,
-                tecnico_id=tecnico_id,  # Asignación automática de técnico
-                tiempo_estimado=(
-                    plan.tiempo_estimado if hasattr(plan, "tiempo_estimado") else None
-                ),
-                observaciones=f"Orden generada automáticamente desde plan preventivo.\n\nInstrucciones:\n{plan.instrucciones or 'Sin instrucciones específicas'}",
-            )
+    ultimo_plan_id = planes_vencidos[-1][0].id
+    con_orden, antiguas = _planes_con_orden_abierta(
+        filtros + (PlanMantenimiento.id <= ultimo_plan_id,)
+    )
 
-            # Generar número de orden único
-            nueva_orden.numero_orden = generar_numero_orden()
+    tecnicos = obtener_asignador()
+    if not tecnicos:
+        print("⚠️ No hay técnicos disponibles para asignación")
 
-            db.session.add(nueva_orden)
+    filas = []
+    ordenes_generadas = []
+    planes_generados = []
+    for plan, activo_nombre in planes_vencidos:
+        marca = f"Plan: {plan.codigo_plan}"
+        if plan.id in con_orden or any(
+            marca in descripcion for descripcion in antiguas.get(plan.activo_id, ())
+        ):
+            continue
 
-            # Actualizar fecha de última ejecución y calcular próxima
-            plan.ultima_ejecucion = ahora
-
-            # Recalcular próxima ejecución
-            datos_plan = {
-                "tipo_frecuencia": plan.tipo_frecuencia,
-                "intervalo_dias": plan.frecuencia_dias,
-                "intervalo_semanas": plan.intervalo_semanas,
-                "dias_semana": plan.dias_semana,
-                "tipo_mensual": plan.tipo_mensual,
-                "dia_mes": plan.dia_mes,
-                "semana_mes": plan.semana_mes,
-                "dia_semana_mes": plan.dia_semana_mes,
-                "intervalo_meses": plan.intervalo_meses,
-                "frecuencia": plan.frecuencia,
-            }
+        tecnico_id = tecnicos.asignar()[0] if tecnicos else None
+
+        fila = {
+            "tipo": TIPO_ORDEN_PREVENTIVA,
+            "prioridad": "Media",
+            "estado": "Pendiente",
+            "descripcion": f"Mantenimiento preventivo - {marca} - {plan.nombre}",
+            "fecha_creacion": ahora,
+            "fecha_programada": ahora.date(),
+            "activo_id": plan.activo_id,
+            "tecnico_id": tecnico_id,
+            "plan_mantenimiento_id": plan.id,
+            "tiempo_estimado": plan.tiempo_estimado,
+            "observaciones": (
+                "Orden generada automáticamente desde plan preventivo.\n\n"
+                "Instrucciones:\n"
+                f"{plan.instrucciones or 'Sin instrucciones específicas'}"
+            ),
+        }
+        filas.append(fila)
 
-            try:
-                nueva_proxima = calcular_proxima_ejecucion(datos_plan, ahora)
-                plan.proxima_ejecucion = nueva_proxima
-                print(
-                    f"✅ Plan {plan.codigo_plan}: próxima ejecución actualizada a {nueva_proxima}"
-                )
-            except Exception as e:
-                print(
-                    f"⚠️ Error calculando próxima ejecución para plan {plan.codigo_plan}: {e}"
-                )
-                # Si hay error, programar para el próximo día por defecto
-                if plan.tipo_frecuencia == "diaria" or plan.frecuencia == "Diario":
-                    plan.proxima_ejecucion = ahora + timedelta(days=1)
-                else:
-                    plan.proxima_ejecucion = ahora + timedelta(
-                        days=7
-                    )  # Por defecto semanal
+        plan.ultima_ejecucion = ahora
+        planes_generados.append(plan)
 
-            ordenes_generadas.append(
-                {
-                    "numero_orden": nueva_orden.numero_orden,
-                    "plan_codigo": plan.codigo_plan,
-                    "activo_nombre": activo.nombre if activo else "Sin activo",
-                    "descripcion": nueva_orden.descripcion,
-                }
-            )
+        ordenes_generadas.append(
+            {
+                "plan_codigo": plan.codigo_plan,
+                "activo_nombre": activo_nombre or "Sin activo",
+                "descripcion": fila["descripcion"],
+            }
+        )
 
-        except Exception as e:
-            print(f"❌ Error generando orden para plan {plan.codigo_plan}: {e}")
-            db.session.rollback()
-            continue
+    # Próximas ejecuciones de todos los planes en una evaluación vectorizada;
+    # si una regla falla, plan a plan con el respaldo de siempre
+    try:
+        proximas = recurrencia.siguientes(
+            [recurrencia.regla_de_plan(plan) for plan in planes_generados], ahora
+        )
+        for plan, proxima in zip(planes_generados, proximas.astype("datetime64[s]")):
+            plan.proxima_ejecucion = proxima.item()
+    except Exception as e:
+        print(f"⚠️ Error calculando próximas ejecuciones en bloque: {e}")
+        for plan in planes_generados:
+            plan.proxima_ejecucion = _proxima_ejecucion_o_respaldo(plan, ahora)
 
-    # Guardar todos los cambios
+    # Inserción en bloque y guardado de los planes actualizados
     try:
+        # Un bloque de números para todo el lote
+        numeros = numeracion.numeros_orden(len(filas))
+        for fila, detalle, numero in zip(filas, ordenes_generadas, numeros):
+            fila["numero_orden"] = detalle["numero_orden"] = numero
+        if filas:
+            db.session.execute(db.insert(OrdenTrabajo), filas)
+            registrar_invalidacion_ordenes()
+            # El INSERT masivo no pasa por after_flush: cargas a mano
+            cambios = {}
+            for fila in filas:
+                cambios[fila["tecnico_id"]] = cambios.get(fila["tecnico_id"], 0) + 1
+            CargaTecnico.aplicar_cambios(cambios)
         db.session.commit()
         print(f"🎉 Generación completada: {len(ordenes_generadas)} órdenes creadas")
     except Exception as e:
@@ -868,18 +901,14 @@ def generar_ordenes_automaticas():
         "success": True,
         "ordenes_generadas": len(ordenes_generadas),
         "detalles": ordenes_generadas,
+        "planes_revisados": len(planes_vencidos),
+        "ultimo_plan_id": ultimo_plan_id,
     }
 
 
 def generar_numero_orden():
     """Generar un número de orden único"""
-    from app.models.orden_trabajo import OrdenTrabajo
-
-    # Obtener el último ID para generar el número
-    ultimo_numero = db.session.query(db.func.max(OrdenTrabajo.id)).scalar() or 0
-    numero_orden = f"OT-{ultimo_numero + 1:06d}"
-
-    return numero_orden
+    return numeracion.numero_orden()
 
 
 def asignar_tecnico_equilibrado():
@@ -890,47 +919,19 @@ def asignar_tecnico_equilibrado():
 
     Retorna el ID del técnico asignado o None si no hay técnicos disponibles
     """
-    from app.models.usuario import Usuario
-    from app.models.orden_trabajo import OrdenTrabajo
+    # Montículo por carga de la transacción: en un lote, cada llamada ya
+    # cuenta las órdenes asignadas antes aunque no estén confirmadas
+    asignado = obtener_asignador().asignar()
 
-    # Obtener todos los técnicos activos (soporta tanto mayúsculas como minúsculas)
-    tecnicos = Usuario.query.filter(
-        Usuario.activo == True,
-        db.or_(
-            Usuario.rol.in_(["tecnico", "supervisor"]),  # Minúsculas (actual)
-            Usuario.rol.in_(["Técnico", "Supervisor"]),  # Mayúsculas (legacy)
-        ),
-    ).all()
-
-    if not tecnicos:
+    if asignado is None:
         print("⚠️ No hay técnicos disponibles para asignación")
         return None
 
-    print(f"👥 Encontrados {len(tecnicos)} técnicos disponibles")
+    tecnico_id, nombre, carga = asignado
 
-    # Calcular carga de trabajo de cada técnico
-    # (contar órdenes Pendientes y En Proceso)
-    cargas = []
-    for tecnico in tecnicos:
-        carga = OrdenTrabajo.query.filter(
-            OrdenTrabajo.tecnico_id == tecnico.id,
-            OrdenTrabajo.estado.in_(["Pendiente", "En Proceso"]),
-        ).count()
+    print(f"✅ Técnico asignado: {nombre} (carga actual: {carga})")
 
-        cargas.append(
-            {"tecnico_id": tecnico.id, "nombre": tecnico.nombre, "carga": carga}
-        )
-        print(f"   👤 {tecnico.nombre}: {carga} órdenes activas")
-
-    # Ordenar por carga (menor a mayor) y tomar el menos cargado
-    cargas.sort(key=lambda x: x["carga"])
-    tecnico_asignado = cargas[0]
-
-    print(
-        f"✅ Técnico asignado: {tecnico_asignado['nombre']} (carga actual: {tecnico_asignado['carga']})"
-    )
-
-    return tecnico_asignado["tecnico_id"]
+    return tecnico_id
 
 
 def generar_orden_individual(plan_id, usuario="Sistema"):
@@ -939,7 +940,6 @@ def generar_orden_individual(plan_id, usuario="Sistema"):
     """
     from app.models.orden_trabajo import OrdenTrabajo
     from app.models.activo import Activo
-    import json
 
     print(f"🔧 Generando orden individual para plan ID: {plan_id}")
 
@@ -1003,17 +1003,6 @@ def generar_orden_individual(plan_id, usuario="Sistema"):
     # Actualizar próxima ejecución del plan
     try:
         # Usar la configuración del plan para calcular próxima ejecución
-        configuracion = {
-            "tipo_frecuencia": plan.tipo_frecuencia,
-            "dias_semana": json.loads(plan.dias_semana) if plan.dias_semana else [],
-            "intervalo_semanas": plan.intervalo_semanas or 1,
-            "tipo_mensual": plan.tipo_mensual,
-            "dia_mes": plan.dia_mes,
-            "semana_mes": plan.semana_mes,
-            "dia_semana_mes": plan.dia_semana_mes,
-            "intervalo_meses": plan.intervalo_meses or 1,
-        }
-
         print(f"🔍 DEBUG - Configuración del plan {plan.codigo_plan}:")
         print(f"   tipo_frecuencia: {plan.tipo_frecuencia}")
         print(
@@ -1021,7 +1010,7 @@ def generar_orden_individual(plan_id, usuario="Sistema"):
         )
         print(f"   fecha_base (ahora): {ahora.strftime('%Y-%m-%d %H:%M:%S')}")
 
-        nueva_proxima = calcular_proxima_ejecucion(configuracion, ahora)
+        nueva_proxima = recurrencia.proxima_ejecucion(plan, ahora)
         plan.proxima_ejecucion = nueva_proxima
         plan.ultima_ejecucion = ahora
 
@@ -1138,20 +1127,7 @@ def generar_ordenes_manuales(usuario="Sistema"):
             # Actualizar próxima ejecución del plan
             try:
                 # Usar la configuración del plan para calcular próxima ejecución
-                configuracion = {
-                    "tipo_frecuencia": plan.tipo_frecuencia,
-                    "dias_semana": (
-                        json.loads(plan.dias_semana) if plan.dias_semana else []
-                    ),
-                    "intervalo_semanas": plan.intervalo_semanas or 1,
-                    "tipo_mensual": plan.tipo_mensual,
-                    "dia_mes": plan.dia_mes,
-                    "semana_mes": plan.semana_mes,
-                    "dia_semana_mes": plan.dia_semana_mes,
-                    "intervalo_meses": plan.intervalo_meses or 1,
-                }
-
-                nueva_proxima = calcular_proxima_ejecucion(configuracion, ahora)
+                nueva_proxima = recurrencia.proxima_ejecucion(plan, ahora)
                 plan.proxima_ejecucion = nueva_proxima
                 plan.ultima_ejecucion = ahora
 
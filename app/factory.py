@@ -1,5 +1,8 @@
 from flask import Flask, render_template, request, jsonify
 from app.extensions import db
+from app.utils.cache import configurar_cache
+from app.utils.instrumentacion_sql import instalar_instrumentacion_sql
+from app.utils.metricas_multiproceso import configurar_metricas_multiproceso
 from flask_login import LoginManager
 import logging
 import os
@@ -242,6 +245,124 @@ def create_app(config_name=None):
 
     app.config["ADMIN_EMAILS"] = os.getenv("ADMIN_EMAILS", "")
 
+    # Concurrencia FIFO: "optimista" (columna version), "pesimista"
+    # (FOR UPDATE) o "skip_locked" (FOR UPDATE SKIP LOCKED, solo PostgreSQL)
+    app.config["FIFO_BLOQUEO"] = os.getenv("FIFO_BLOQUEO", "optimista")
+    app.config["FIFO_MAX_REINTENTOS"] = int(os.getenv("FIFO_MAX_REINTENTOS", "5"))
+
+    # Caché de resultados: LRU por proceso y, opcionalmente, un nivel
+    # compartido entre workers ("sqlite" en el host o "redis")
+    app.config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "memoria")
+    app.config["CACHE_SQLITE_PATH"] = os.getenv(
+        "CACHE_SQLITE_PATH", os.path.join(app.instance_path, "cache_gmao.sqlite3")
+    )
+    app.config["CACHE_REDIS_URL"] = os.getenv(
+        "CACHE_REDIS_URL", "redis://localhost:6379/0"
+    )
+    app.config["CACHE_MAX_ENTRADAS"] = int(os.getenv("CACHE_MAX_ENTRADAS", "1000"))
+    app.config["CACHE_MAX_BYTES"] = int(
+        os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    app.config["CACHE_BARRIDO_SEGUNDOS"] = float(
+        os.getenv("CACHE_BARRIDO_SEGUNDOS", "60")
+    )
+    app.config["CACHE_TTL_LOCAL"] = float(os.getenv("CACHE_TTL_LOCAL", "5"))
+    if os.getenv("PYTEST_CURRENT_TEST"):
+        app.config["CACHE_BACKEND"] = "memoria"
+
+    # Detección de consultas N+1 (por defecto solo en modo debug)
+    if os.getenv("SQL_DETECTAR_N_MAS_1"):
+        app.config["SQL_DETECTAR_N_MAS_1"] = os.getenv(
+            "SQL_DETECTAR_N_MAS_1"
+        ).lower() in ("1", "true", "yes")
+    app.config["SQL_N_MAS_1_UMBRAL"] = int(os.getenv("SQL_N_MAS_1_UMBRAL", "10"))
+
+    # Intervalo del muestreo de memoria/CPU del proceso para las métricas
+    app.config["METRICAS_MUESTREO_SEGUNDOS"] = float(
+        os.getenv("METRICAS_MUESTREO_SEGUNDOS", "5")
+    )
+    # Historial por minuto/hora del dashboard persistido en disco ("" = no)
+    app.config["METRICAS_HISTORIAL_PATH"] = os.getenv(
+        "METRICAS_HISTORIAL_PATH",
+        os.path.join(app.instance_path, "metricas_historial.json"),
+    )
+    app.config["METRICAS_HISTORIAL_SEGUNDOS"] = float(
+        os.getenv("METRICAS_HISTORIAL_SEGUNDOS", "60")
+    )
+    # Historial por operación con rollups 1m/1h/1d en disco ("" = no)
+    app.config["METRICAS_ROLLUP_DIR"] = os.getenv(
+        "METRICAS_ROLLUP_DIR", os.path.join(app.instance_path, "metricas_rollup")
+    )
+    app.config["METRICAS_ROLLUP_SEGUNDOS"] = float(
+        os.getenv("METRICAS_ROLLUP_SEGUNDOS", "30")
+    )
+    # Middleware de tiempos por endpoint y fracción de peticiones medidas
+    app.config["METRICAS_PETICIONES"] = os.getenv(
+        "METRICAS_PETICIONES", "true"
+    ).lower() in ("1", "true", "yes")
+    app.config["METRICAS_PETICIONES_MUESTREO"] = float(
+        os.getenv("METRICAS_PETICIONES_MUESTREO", "1.0")
+    )
+    # Perfilador de peticiones lentas (muestreo de pilas, desactivado)
+    app.config["PERFILADOR_LENTAS"] = os.getenv(
+        "PERFILADOR_LENTAS", "false"
+    ).lower() in ("1", "true", "yes")
+    app.config["PERFILADOR_UMBRAL_SEGUNDOS"] = float(
+        os.getenv("PERFILADOR_UMBRAL_SEGUNDOS", "1.0")
+    )
+    app.config["PERFILADOR_INTERVALO_MS"] = float(
+        os.getenv("PERFILADOR_INTERVALO_MS", "5")
+    )
+    app.config["PERFILADOR_MAX_PETICIONES"] = int(
+        os.getenv("PERFILADOR_MAX_PETICIONES", "20")
+    )
+    # Archivos mmap por worker que /metrics suma (mismo directorio para todos)
+    app.config["METRICAS_MULTIPROCESO_DIR"] = os.getenv(
+        "METRICAS_MULTIPROCESO_DIR", os.path.join(app.instance_path, "metricas")
+    )
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    if os.getenv("PYTEST_CURRENT_TEST"):
+        import tempfile
+
+        app.config["METRICAS_MULTIPROCESO_DIR"] = tempfile.mkdtemp(
+            prefix="gmao_metricas_"
+        )
+        app.config["METRICAS_HISTORIAL_PATH"] = ""
+        app.config["METRICAS_ROLLUP_DIR"] = ""
+
+    # Planificador de trabajos en segundo plano (app.services.planificador):
+    # "proceso" = hilo en cada worker del servidor web con un único líder,
+    # "externo" = scripts/planificador.py, "desactivado" = generación en la
+    # petición
+    app.config["PLANIFICADOR_MODO"] = os.getenv("PLANIFICADOR_MODO", "proceso")
+    app.config["PLANIFICADOR_SEGUNDOS"] = float(
+        os.getenv("PLANIFICADOR_SEGUNDOS", "30")
+    )
+    app.config["PLANIFICADOR_CERROJO"] = os.getenv(
+        "PLANIFICADOR_CERROJO", os.path.join(app.instance_path, "planificador.lock")
+    )
+    # Planes revisados por lote (cada lote se confirma y guarda su cursor)
+    app.config["PLANIFICADOR_LOTE"] = int(os.getenv("PLANIFICADOR_LOTE", "200"))
+    # Hora diaria de cada trabajo ("" = solo a petición)
+    app.config["PLANIFICADOR_HORA_ORDENES"] = os.getenv(
+        "PLANIFICADOR_HORA_ORDENES", "06:00"
+    )
+    app.config["PLANIFICADOR_HORA_CONTEOS"] = os.getenv(
+        "PLANIFICADOR_HORA_CONTEOS", "07:00"
+    )
+    app.config["PLANIFICADOR_HORA_HORIZONTE"] = os.getenv(
+        "PLANIFICADOR_HORA_HORIZONTE", "02:00"
+    )
+    app.config["PLANIFICADOR_HORA_PURGA"] = os.getenv(
+        "PLANIFICADOR_HORA_PURGA", "03:00"
+    )
+    app.config["PLANIFICADOR_CONTEOS"] = int(os.getenv("PLANIFICADOR_CONTEOS", "10"))
+    app.config["PLANIFICADOR_RETENCION_DIAS"] = int(
+        os.getenv("PLANIFICADOR_RETENCION_DIAS", "30")
+    )
+    if os.getenv("PYTEST_CURRENT_TEST"):
+        app.config["PLANIFICADOR_MODO"] = "desactivado"
+
     # Permitir override del URI de base de datos vía variable de entorno en testing
     # Si estamos bajo pytest, mantenemos memoria por consistencia con tests
     env_uri = os.getenv("SQLALCHEMY_DATABASE_URI")
@@ -249,6 +370,16 @@ def create_app(config_name=None):
         app.config["SQLALCHEMY_DATABASE_URI"] = env_uri
 
     db.init_app(app)
+    configurar_cache(app)
+    configurar_metricas_multiproceso(app)
+    from app.services.carga_tecnicos import instalar_carga_tecnicos
+    from app.services.invalidacion_cache import instalar_invalidacion_cache
+    from app.services.ocurrencias_planes import instalar_ocurrencias_planes
+
+    instalar_invalidacion_cache()
+    instalar_carga_tecnicos()
+    instalar_ocurrencias_planes()
+    instalar_instrumentacion_sql(app)
     # Asegurar compatibilidad con tests que esperan db.app
     try:
         db.app = app
@@ -372,6 +503,7 @@ def create_app(config_name=None):
     from app.routes.calendario import calendario_bp
     from app.routes.usuarios import usuarios_bp
     from app.routes.solicitudes import solicitudes_bp
+    from app.routes.trabajos import trabajos_bp
 
     # Registrar controladores
     from app.controllers.usuarios_controller import usuarios_controller
@@ -390,6 +522,7 @@ def create_app(config_name=None):
     app.register_blueprint(calendario_bp)
     app.register_blueprint(usuarios_bp)
     app.register_blueprint(solicitudes_bp)
+    app.register_blueprint(trabajos_bp)
     app.register_blueprint(solicitudes_admin_bp)
     app.register_blueprint(usuarios_controller)
 
@@ -410,9 +543,19 @@ def create_app(config_name=None):
 
     # Registrar blueprint de métricas de performance (OPTIMIZACIÓN)
     try:
-        from app.blueprints.performance_metrics import performance_bp
+        from app.blueprints.performance_metrics import openmetrics_bp, performance_bp
 
         app.register_blueprint(performance_bp)
+        app.register_blueprint(openmetrics_bp)
+
+        # Tiempos de todas las peticiones en el mismo almacén de métricas
+        from app.utils.middleware_tiempos import instalar_middleware_tiempos
+
+        instalar_middleware_tiempos(app)
+
+        from app.utils.perfilador_lentas import instalar_perfilador_lentas
+
+        instalar_perfilador_lentas(app)
         app.logger.info("Blueprint de métricas de performance registrado")
     except ImportError as e:
         app.logger.warning(f"Blueprint de performance no disponible: {e}")
@@ -572,6 +715,7 @@ def create_app(config_name=None):
                 "/activos/api",
                 "/proveedores/api",
                 "/admin/solicitudes/api",
+                "/trabajos/api",
             )
             if request.path and any(
                 request.path.startswith(p) for p in api_like_prefixes
@@ -639,4 +783,11 @@ def create_app(config_name=None):
     except ImportError as e:
         print(f"[ERROR] Error importando blueprint de estadísticas: {e}")
 
+    # Planificador del proceso, sin hilo: lo arranca solo el servidor web
+    # (post_worker_init de gunicorn, run.py), no flask db ni los scripts
+    if app.config["PLANIFICADOR_MODO"] == "proceso":
+        from app.services.planificador import registrar_planificador
+
+        registrar_planificador(app)
+
     return app
@@ -17,6 +17,11 @@ from .archivo_adjunto import ArchivoAdjunto
 from .solicitud_servicio import SolicitudServicio
 from .categoria import Categoria
 from .control_generacion import ControlGeneracion
+from .stock_resumen import StockResumen
+from .carga_tecnico import CargaTecnico
+from .contador import Contador
+from .plan_ocurrencia import PlanOcurrencia
+from .ejecucion_trabajo import EjecucionTrabajo
 
 # Exportar para fácil importación
 __all__ = [
@@ -36,4 +41,9 @@ __all__ = [
     "SolicitudServicio",
     "Categoria",
     "ControlGeneracion",
+    "StockResumen",
+    "CargaTecnico",
+    "Contador",
+    "PlanOcurrencia",
+    "EjecucionTrabajo",
 ]
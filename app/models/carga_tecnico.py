@@ -0,0 +1,170 @@
+"""
+Órdenes abiertas por técnico, mantenidas al cambiar las órdenes de trabajo
+"""
+
+from app.extensions import db
+from app.models.orden_trabajo import OrdenTrabajo
+from datetime import datetime, timezone
+from sqlalchemy import bindparam
+from sqlalchemy.orm.util import identity_key
+
+# Estados en los que una orden cuenta como carga del técnico
+ESTADOS_ABIERTOS = ("Pendiente", "En Proceso")
+
+
+class CargaTecnico(db.Model):
+    """
+    Número de órdenes pendientes o en proceso de cada técnico. Se actualiza
+    en la misma transacción que las órdenes (ver app.services.carga_tecnicos),
+    así que conocer la carga de todos los técnicos es una lectura de esta
+    tabla en lugar de un COUNT por técnico sobre orden_trabajo.
+
+    Un técnico sin fila no tiene órdenes abiertas.
+    """
+
+    __tablename__ = "carga_tecnico"
+
+    tecnico_id = db.Column(db.Integer, db.ForeignKey("usuario.id"), primary_key=True)
+    ordenes_abiertas = db.Column(db.Integer, nullable=False, default=0)
+    fecha_actualizacion = db.Column(
+        db.DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self):
+        return f"<CargaTecnico {self.tecnico_id} - {self.ordenes_abiertas}>"
+
+    @staticmethod
+    def conteos_ordenes(tecnico_ids=None):
+        """
+        Consulta GROUP BY con las órdenes abiertas de cada técnico.
+
+        Args:
+            tecnico_ids: Técnicos a calcular (None = todos)
+        """
+        consulta = db.session.query(
+            OrdenTrabajo.tecnico_id, db.func.count(OrdenTrabajo.id)
+        ).filter(
+            OrdenTrabajo.tecnico_id.isnot(None),
+            OrdenTrabajo.estado.in_(ESTADOS_ABIERTOS),
+        )
+        if tecnico_ids is not None:
+            consulta = consulta.filter(OrdenTrabajo.tecnico_id.in_(list(tecnico_ids)))
+        return consulta.group_by(OrdenTrabajo.tecnico_id)
+
+    @staticmethod
+    def aplicar_cambios(cambios, conexion=None):
+        """
+        Suma a cada técnico la variación de sus órdenes abiertas.
+
+        Se hace con un único INSERT ... ON CONFLICT DO UPDATE SET
+        ordenes_abiertas = ordenes_abiertas + delta (seguro ante escrituras
+        concurrentes), sin pasar por el ORM, para poder llamarse desde
+        after_flush. En otros motores, UPDATE de las filas existentes e
+        INSERT de las que faltan.
+
+        Args:
+            cambios: Dict tecnico_id -> variación (+1 al abrir, -1 al cerrar)
+            conexion: Conexión de la transacción (por defecto la de la sesión)
+        """
+        cambios = {t: d for t, d in cambios.items() if t is not None and d}
+        if not cambios:
+            return
+        conexion = conexion if conexion is not None else db.session.connection()
+        tabla = CargaTecnico.__table__
+        ahora = datetime.now(timezone.utc)
+        filas = [
+            {
+                "tecnico_id": t,
+                "ordenes_abiertas": cambios[t],
+                "fecha_actualizacion": ahora,
+            }
+            for t in sorted(cambios)
+        ]
+
+        dialecto = conexion.dialect.name
+        if dialecto in ("postgresql", "sqlite"):
+            if dialecto == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            sentencia = insert(tabla)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[tabla.c.tecnico_id],
+                set_={
+                    "ordenes_abiertas": tabla.c.ordenes_abiertas
+                    + sentencia.excluded.ordenes_abiertas,
+                    "fecha_actualizacion": sentencia.excluded.fecha_actualizacion,
+                },
+            )
+            conexion.execute(sentencia, filas)
+        else:
+            existentes = {
+                fila[0]
+                for fila in conexion.execute(
+                    db.select(tabla.c.tecnico_id).where(
+                        tabla.c.tecnico_id.in_(list(cambios))
+                    )
+                )
+            }
+            if existentes:
+                conexion.execute(
+                    tabla.update()
+                    .where(tabla.c.tecnico_id == bindparam("b_tecnico_id"))
+                    .values(
+                        ordenes_abiertas=tabla.c.ordenes_abiertas
+                        + bindparam("b_delta"),
+                        fecha_actualizacion=ahora,
+                    ),
+                    [
+                        {"b_tecnico_id": t, "b_delta": cambios[t]}
+                        for t in sorted(existentes)
+                    ],
+                )
+            nuevas = [f for f in filas if f["tecnico_id"] not in existentes]
+            if nuevas:
+                conexion.execute(tabla.insert(), nuevas)
+
+        # Las filas ya cargadas en la sesión quedan desactualizadas
+        for tecnico_id in cambios:
+            carga = db.session.identity_map.get(identity_key(CargaTecnico, tecnico_id))
+            if carga is not None:
+                db.session.expire(carga)
+
+    @staticmethod
+    def recalcular(tecnico_ids=None):
+        """
+        Reconstruye las cargas desde orden_trabajo y devuelve las diferencias.
+
+        Args:
+            tecnico_ids: Técnicos a reconstruir (None = todos)
+
+        Returns:
+            List[dict]: Un elemento por técnico cuya carga no coincidía, con
+            la guardada ("antes", None si no existía la fila) y la calculada
+            ("despues")
+        """
+        calculadas = dict(CargaTecnico.conteos_ordenes(tecnico_ids).all())
+
+        consulta = CargaTecnico.query
+        if tecnico_ids is not None:
+            consulta = consulta.filter(CargaTecnico.tecnico_id.in_(list(tecnico_ids)))
+        guardadas = {c.tecnico_id: c for c in consulta}
+
+        diferencias = []
+        for tecnico_id in sorted(set(calculadas) | set(guardadas)):
+            despues = calculadas.get(tecnico_id, 0)
+            carga = guardadas.get(tecnico_id)
+            antes = carga.ordenes_abiertas if carga is not None else None
+            if carga is None:
+                carga = CargaTecnico(tecnico_id=tecnico_id)
+                db.session.add(carga)
+            if antes != despues:
+                carga.ordenes_abiertas = despues
+                diferencias.append(
+                    {"tecnico_id": tecnico_id, "antes": antes, "despues": despues}
+                )
+
+        db.session.flush()
+        return diferencias
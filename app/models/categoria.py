@@ -62,12 +62,20 @@ class Categoria(db.Model):
         return f"<Categoria {self.nombre} ({self.prefijo})>"
 
     def generar_proximo_codigo(self):
-        """Genera el próximo código para esta categoría"""
+        """
+        Genera el próximo código para esta categoría.
+
+        El número sale de la serie "categoria-<id>" de app.services.numeracion
+        dentro de la transacción en curso; ultimo_numero se actualiza con él y
+        se guarda junto con el resto de cambios del llamador (no hace commit).
+        La serie se inicializa con ultimo_numero la primera vez.
+        """
+        from app.services.numeracion import numero_categoria
+
         año = datetime.now().year
-        self.ultimo_numero += 1
-        codigo = f"{self.prefijo}-{año}-{self.ultimo_numero:03d}"
-        db.session.commit()
-        return codigo
+        numero = numero_categoria(self)
+        self.ultimo_numero = numero
+        return f"{self.prefijo}-{año}-{numero:03d}"
 
     def to_dict(self):
         return {
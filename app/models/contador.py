@@ -0,0 +1,21 @@
+"""
+Contadores de numeración (OT-, SOL-, PM-, códigos de categoría)
+"""
+
+from app.extensions import db
+
+
+class Contador(db.Model):
+    """
+    Último número entregado de cada serie. Lo usa app.services.numeracion
+    en los motores sin secuencias (SQLite); en PostgreSQL cada serie es una
+    secuencia y esta tabla queda vacía.
+    """
+
+    __tablename__ = "contador"
+
+    clave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<Contador {self.clave} - {self.valor}>"
@@ -0,0 +1,88 @@
+"""
+Ejecuciones de los trabajos en segundo plano (generación de órdenes, conteos...)
+"""
+
+import json
+from datetime import datetime
+
+from app.extensions import db
+
+# Estados de una ejecución
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+
+class EjecucionTrabajo(db.Model):
+    """
+    Una fila por ejecución de un trabajo del planificador
+    (app.services.planificador). La restricción única sobre
+    (trabajo, programado_para) hace que cada franja programada se ejecute
+    una sola vez aunque varios procesos la detecten; las ejecuciones a
+    petición usan el instante de la solicitud como franja.
+
+    `cursor` guarda, en JSON, hasta dónde llegó el último lote confirmado,
+    de forma que una ejecución interrumpida continúa desde ahí.
+    """
+
+    __tablename__ = "ejecucion_trabajo"
+
+    id = db.Column(db.Integer, primary_key=True)
+    trabajo = db.Column(db.String(50), nullable=False)
+    programado_para = db.Column(db.DateTime, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default=PENDIENTE)
+    solicitado_por = db.Column(db.String(100))  # None = programada
+    fecha_creacion = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    inicio = db.Column(db.DateTime)
+    fin = db.Column(db.DateTime)
+    latido = db.Column(db.DateTime)  # Último progreso confirmado
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    procesados = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    cursor = db.Column(db.Text)  # JSON
+    resultado = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    nodo = db.Column(db.String(100))  # host:pid que la ejecutó
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "trabajo", "programado_para", name="uq_ejecucion_trabajo_franja"
+        ),
+        db.Index("ix_ejecucion_trabajo_estado", "estado", "programado_para"),
+    )
+
+    def __repr__(self):
+        return f"<EjecucionTrabajo {self.trabajo} {self.programado_para} {self.estado}>"
+
+    @property
+    def progreso(self):
+        """Porcentaje completado (None si no se conoce el total)"""
+        if self.estado == COMPLETADO:
+            return 100.0
+        if not self.total:
+            return None
+        return round(min(self.procesados * 100.0 / self.total, 100.0), 1)
+
+    def to_dict(self):
+        def fecha(valor):
+            return valor.isoformat() if valor else None
+
+        return {
+            "id": self.id,
+            "trabajo": self.trabajo,
+            "programado_para": fecha(self.programado_para),
+            "estado": self.estado,
+            "solicitado_por": self.solicitado_por,
+            "fecha_creacion": fecha(self.fecha_creacion),
+            "inicio": fecha(self.inicio),
+            "fin": fecha(self.fin),
+            "latido": fecha(self.latido),
+            "intentos": self.intentos,
+            "procesados": self.procesados,
+            "total": self.total,
+            "progreso": self.progreso,
+            "resultado": json.loads(self.resultado) if self.resultado else None,
+            "error": self.error,
+            "nodo": self.nodo,
+        }
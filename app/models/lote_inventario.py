@@ -57,6 +57,10 @@ class LoteInventario(db.Model):
     activo = db.Column(db.Boolean, default=True)
     observaciones = db.Column(db.Text, nullable=True)
 
+    # Bloqueo optimista: cada UPDATE del ORM comprueba y aumenta la versión,
+    # y lanza StaleDataError si otra transacción modificó el lote antes
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
     # Metadatos
     fecha_creacion = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     usuario_creacion = db.Column(db.String(50))
@@ -69,6 +73,28 @@ class LoteInventario(db.Model):
     inventario = db.relationship("Inventario", backref="lotes")
     movimientos = db.relationship("MovimientoLote", backref="lote", lazy=True)
 
+    __mapper_args__ = {"version_id_col": version}
+
+    # Índices de las rutas calientes (migración d7e2b5f8a914). El índice FIFO
+    # es parcial: solo contiene lotes consumibles, con el mismo predicado que
+    # filtro_consumible() para que el planificador pueda usarlo
+    __table_args__ = (
+        db.Index(
+            "ix_lote_inventario_fifo",
+            "inventario_id",
+            "fecha_entrada",
+            "id",
+            postgresql_where=db.text("activo AND cantidad_actual > 0"),
+            sqlite_where=db.text("activo = 1 AND cantidad_actual > 0"),
+        ),
+        db.Index(
+            "ix_lote_inventario_vencimiento",
+            "fecha_vencimiento",
+            postgresql_where=db.text("fecha_vencimiento IS NOT NULL"),
+            sqlite_where=db.text("fecha_vencimiento IS NOT NULL"),
+        ),
+    )
+
     def __repr__(self):
         return f"<LoteInventario {self.codigo_lote or self.id} - {self.cantidad_actual}/{self.cantidad_inicial}>"
 
@@ -175,7 +201,38 @@ class LoteInventario(db.Model):
         return cantidad_a_liberar
 
     @staticmethod
-    def obtener_lotes_fifo(inventario_id, cantidad_necesaria, incluir_vencidos=False):
+    def filtro_consumible():
+        """
+        Condición de lote consumible (activo y con cantidad_actual > 0).
+
+        El 0 se emite como literal y no como parámetro: así la condición
+        coincide con el predicado del índice parcial ix_lote_inventario_fifo
+        también en planes preparados.
+        """
+        return db.and_(
+            LoteInventario.activo == True,
+            LoteInventario.cantidad_actual > db.literal_column("0"),
+        )
+
+    @staticmethod
+    def _filtro_vigentes(query):
+        """Excluye de la consulta los lotes vencidos"""
+        ahora = datetime.now(timezone.utc)
+        return query.filter(
+            db.or_(
+                LoteInventario.fecha_vencimiento.is_(None),
+                LoteInventario.fecha_vencimiento > ahora,
+            )
+        )
+
+    @staticmethod
+    def obtener_lotes_fifo(
+        inventario_id,
+        cantidad_necesaria,
+        incluir_vencidos=False,
+        modo="sql",
+        bloqueo=None,
+    ):
         """
         Obtiene los lotes necesarios siguiendo orden FIFO para una cantidad específica.
 
@@ -183,28 +240,48 @@ class LoteInventario(db.Model):
             inventario_id: ID del artículo de inventario
             cantidad_necesaria: Cantidad total necesaria
             incluir_vencidos: Si True, incluye lotes vencidos (default: False)
+            modo: "sql" calcula la asignación en la base de datos con una suma
+                acumulada (solo se cargan los lotes que se van a tocar);
+                "python" carga todos los lotes activos y los recorre en memoria
+            bloqueo: None (sin bloqueo), "pesimista" (SELECT ... FOR UPDATE)
+                o "skip_locked" (FOR UPDATE SKIP LOCKED: salta los lotes que
+                otra transacción está consumiendo, relajando el orden FIFO).
+                Con bloqueo se bloquean todos los lotes disponibles del
+                artículo en orden FIFO y se usa el modo "python", porque la
+                suma acumulada se calcula antes de esperar el bloqueo
 
         Returns:
             Tuple[List[Tuple[LoteInventario, float]], float]:
             Lista de tuplas (lote, cantidad_a_consumir) y cantidad pendiente
         """
-        query = LoteInventario.query.filter_by(
-            inventario_id=inventario_id, activo=True
-        ).filter(LoteInventario.cantidad_actual > 0)
+        if float(cantidad_necesaria) <= 0:
+            return [], float(cantidad_necesaria)
 
-        # Excluir lotes vencidos a menos que se solicite explícitamente
-        if not incluir_vencidos:
-            ahora = datetime.now(timezone.utc)
-            query = query.filter(
-                db.or_(
-                    LoteInventario.fecha_vencimiento.is_(None),
-                    LoteInventario.fecha_vencimiento > ahora,
-                )
+        if modo == "sql" and not bloqueo:
+            lotes = LoteInventario._lotes_fifo_acumulados(
+                inventario_id, cantidad_necesaria, incluir_vencidos
+            )
+        else:
+            query = LoteInventario.query.filter(
+                LoteInventario.inventario_id == inventario_id,
+                LoteInventario.filtro_consumible(),
             )
 
-        lotes = query.order_by(
-            LoteInventario.fecha_entrada.asc()  # FIFO: primero los más antiguos
-        ).all()
+            # Excluir lotes vencidos a menos que se solicite explícitamente
+            if not incluir_vencidos:
+                query = LoteInventario._filtro_vigentes(query)
+
+            query = query.order_by(
+                LoteInventario.fecha_entrada.asc(),  # FIFO: primero los más antiguos
+                LoteInventario.id.asc(),
+            )
+            if bloqueo:
+                # Releer los valores bloqueados aunque el lote ya esté en sesión
+                query = query.with_for_update(
+                    skip_locked=(bloqueo == "skip_locked")
+                ).populate_existing()
+
+            lotes = query.all()
 
         resultado = []
         cantidad_pendiente = float(cantidad_necesaria)
@@ -223,6 +300,44 @@ class LoteInventario(db.Model):
 
         return resultado, cantidad_pendiente
 
+    @staticmethod
+    def _lotes_fifo_acumulados(inventario_id, cantidad_necesaria, incluir_vencidos):
+        """
+        Lotes que cubren cantidad_necesaria, calculados con
+        SUM(disponible) OVER (ORDER BY fecha_entrada, id).
+
+        Se devuelve cada lote cuyo acumulado anterior todavía no cubre la
+        cantidad pedida, es decir, hasta el primero que la completa.
+        Funciona en PostgreSQL y en SQLite >= 3.25 (funciones de ventana).
+        """
+        disponible = LoteInventario.cantidad_actual - db.func.coalesce(
+            LoteInventario.cantidad_reservada, 0
+        )
+        candidatos = db.session.query(
+            LoteInventario.id.label("id"),
+            disponible.label("disponible"),
+            db.func.sum(disponible)
+            .over(order_by=(LoteInventario.fecha_entrada, LoteInventario.id))
+            .label("acumulado"),
+        ).filter(
+            LoteInventario.inventario_id == inventario_id,
+            LoteInventario.filtro_consumible(),
+            disponible > 0,
+        )
+        if not incluir_vencidos:
+            candidatos = LoteInventario._filtro_vigentes(candidatos)
+        candidatos = candidatos.subquery()
+
+        return (
+            LoteInventario.query.join(candidatos, LoteInventario.id == candidatos.c.id)
+            .filter(
+                candidatos.c.acumulado - candidatos.c.disponible
+                < Decimal(str(cantidad_necesaria))
+            )
+            .order_by(candidatos.c.acumulado.asc(), LoteInventario.id.asc())
+            .all()
+        )
+
 
 class MovimientoLote(db.Model):
     """
@@ -257,5 +372,12 @@ class MovimientoLote(db.Model):
     # Control
     usuario_id = db.Column(db.String(50))
 
+    # Reservas y consumos por orden de trabajo (liberar_reservas, trazabilidad)
+    __table_args__ = (
+        db.Index(
+            "ix_movimiento_lote_orden_tipo", "orden_trabajo_id", "tipo_movimiento"
+        ),
+    )
+
     def __repr__(self):
         return f"<MovimientoLote {self.tipo_movimiento} - {self.cantidad} - Lote {self.lote_id}>"
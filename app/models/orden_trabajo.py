@@ -43,3 +43,15 @@ class OrdenTrabajo(db.Model):
 
     # Relación con recambios utilizados
     # Nota: La relación inversa está definida en OrdenRecambio.orden_trabajo
+
+    # Filtros del listado paginado y claves de búsqueda por activo/técnico.
+    # El de estado incluye la clave de orden del listado, (numero_orden, id),
+    # para recorrer por cursor las órdenes de un estado sin ordenar en memoria.
+    __table_args__ = (
+        db.Index("ix_orden_trabajo_estado", "estado", "numero_orden", "id"),
+        db.Index("ix_orden_trabajo_tipo", "tipo"),
+        db.Index("ix_orden_trabajo_prioridad", "prioridad"),
+        db.Index("ix_orden_trabajo_tecnico_id", "tecnico_id"),
+        db.Index("ix_orden_trabajo_activo_id", "activo_id"),
+        db.Index("ix_orden_trabajo_fecha_programada", "fecha_programada"),
+    )
@@ -0,0 +1,92 @@
+"""
+Ejecuciones previstas de los planes de mantenimiento en un horizonte móvil
+"""
+
+from datetime import date, timedelta
+
+from app.extensions import db
+from app.utils import recurrencia
+
+# Días materializados a partir de hoy
+HORIZONTE_DIAS = 365
+
+
+class PlanOcurrencia(db.Model):
+    """
+    Una fila por plan activo y fecha en que le toca ejecutarse, desde su
+    próxima ejecución hasta HORIZONTE_DIAS días después de hoy. Permite
+    responder "qué planes caen en este rango" con una consulta por fecha
+    en lugar de ver solo proxima_ejecucion.
+
+    Se regenera por plan al crearlo, editarlo o ejecutarlo (ver
+    app.services.ocurrencias_planes) y completa cada día con
+    PlanOcurrencia.regenerar_todo() para que el horizonte avance (trabajo
+    "horizonte_planes" de app.services.planificador).
+    """
+
+    __tablename__ = "plan_ocurrencia"
+
+    plan_id = db.Column(
+        db.Integer,
+        db.ForeignKey("plan_mantenimiento.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    fecha = db.Column(db.Date, primary_key=True)
+
+    __table_args__ = (db.Index("ix_plan_ocurrencia_fecha", "fecha", "plan_id"),)
+
+    def __repr__(self):
+        return f"<PlanOcurrencia {self.plan_id} - {self.fecha}>"
+
+    @staticmethod
+    def calcular(planes, hoy=None):
+        """
+        Filas {plan_id, fecha} de los planes activos: la próxima ejecución
+        (aunque esté vencida) y las fechas de su frecuencia hasta el horizonte.
+        """
+        hoy = hoy or date.today()
+        activos = [p for p in planes if p.estado == "Activo" and p.proxima_ejecucion]
+        hasta = hoy + timedelta(days=HORIZONTE_DIAS)
+        claves = {
+            (plan.id, fecha)
+            for plan, fecha in recurrencia.ocurrencias_planes(activos, hoy, hasta)
+        }
+        for plan in activos:
+            proxima = plan.proxima_ejecucion
+            proxima = proxima.date() if hasattr(proxima, "date") else proxima
+            if proxima < hoy:
+                claves.add((plan.id, proxima))
+        return [{"plan_id": p, "fecha": f} for p, f in sorted(claves)]
+
+    @staticmethod
+    def regenerar(planes, borrados=(), conexion=None, hoy=None):
+        """
+        Sustituye las filas de esos planes (y borra las de los planes
+        eliminados) con un DELETE y un INSERT múltiple, sin pasar por el ORM
+        para poder llamarse desde after_flush.
+
+        Returns:
+            int: Filas insertadas
+        """
+        conexion = conexion if conexion is not None else db.session.connection()
+        tabla = PlanOcurrencia.__table__
+        ids = [p.id for p in planes] + list(borrados)
+        if not ids:
+            return 0
+        conexion.execute(tabla.delete().where(tabla.c.plan_id.in_(ids)))
+        filas = PlanOcurrencia.calcular(planes, hoy)
+        if filas:
+            conexion.execute(tabla.insert(), filas)
+        return len(filas)
+
+    @staticmethod
+    def regenerar_todo(hoy=None):
+        """Reconstruye la tabla completa (avance diario del horizonte)"""
+        from app.models.plan_mantenimiento import PlanMantenimiento
+
+        conexion = db.session.connection()
+        conexion.execute(PlanOcurrencia.__table__.delete())
+        filas = PlanOcurrencia.calcular(PlanMantenimiento.query.all(), hoy)
+        if filas:
+            conexion.execute(PlanOcurrencia.__table__.insert(), filas)
+        return len(filas)
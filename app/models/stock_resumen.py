@@ -0,0 +1,271 @@
+"""
+Resumen de stock por artículo, mantenido por el servicio FIFO
+"""
+
+from app.extensions import db
+from app.models.lote_inventario import LoteInventario
+from datetime import datetime, timezone
+from decimal import Decimal
+from sqlalchemy import bindparam
+from sqlalchemy.orm.util import identity_key
+
+# Campos que se actualizan sumando deltas
+CAMPOS_ACUMULABLES = ("total_actual", "total_reservado", "numero_lotes", "valor_fifo")
+
+
+def _decimal(valor, precision):
+    """Normaliza a la precisión de la columna (SQLite suma en coma flotante)"""
+    return Decimal(str(valor or 0)).quantize(Decimal(precision))
+
+
+class StockResumen(db.Model):
+    """
+    Totales de los lotes consumibles (activos con cantidad_actual > 0) de un
+    artículo. Se actualiza en la misma transacción que los lotes, de modo que
+    consultar el stock de un artículo es una lectura por clave primaria.
+    """
+
+    __tablename__ = "stock_resumen"
+
+    inventario_id = db.Column(
+        db.Integer, db.ForeignKey("inventario.id"), primary_key=True
+    )
+    total_actual = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    total_reservado = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    numero_lotes = db.Column(db.Integer, nullable=False, default=0)
+    valor_fifo = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    proximo_vencimiento = db.Column(db.DateTime, nullable=True)
+    fecha_actualizacion = db.Column(
+        db.DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self):
+        return f"<StockResumen {self.inventario_id} - {self.total_actual}>"
+
+    @property
+    def total_disponible(self):
+        """Cantidad no reservada"""
+        return float(self.total_actual) - float(self.total_reservado)
+
+    def to_dict(self):
+        return {
+            "inventario_id": self.inventario_id,
+            "total_actual": float(self.total_actual),
+            "total_reservado": float(self.total_reservado),
+            "total_disponible": self.total_disponible,
+            "numero_lotes": self.numero_lotes,
+            "valor_fifo": float(self.valor_fifo),
+            "proximo_vencimiento": (
+                self.proximo_vencimiento.isoformat()
+                if self.proximo_vencimiento
+                else None
+            ),
+        }
+
+    @staticmethod
+    def agregados_lotes(inventario_ids=None):
+        """
+        Consulta GROUP BY que calcula el resumen a partir de los lotes.
+
+        Args:
+            inventario_ids: Artículos a calcular (None = todos)
+        """
+        consulta = db.session.query(
+            LoteInventario.inventario_id.label("inventario_id"),
+            db.func.coalesce(db.func.sum(LoteInventario.cantidad_actual), 0).label(
+                "total_actual"
+            ),
+            db.func.coalesce(db.func.sum(LoteInventario.cantidad_reservada), 0).label(
+                "total_reservado"
+            ),
+            db.func.count(LoteInventario.id).label("numero_lotes"),
+            db.func.coalesce(
+                db.func.sum(
+                    LoteInventario.cantidad_actual * LoteInventario.precio_unitario
+                ),
+                0,
+            ).label("valor_fifo"),
+            db.func.min(LoteInventario.fecha_vencimiento).label("proximo_vencimiento"),
+        ).filter(LoteInventario.filtro_consumible())
+        if inventario_ids is not None:
+            consulta = consulta.filter(
+                LoteInventario.inventario_id.in_(list(inventario_ids))
+            )
+        return consulta.group_by(LoteInventario.inventario_id)
+
+    @staticmethod
+    def nuevo_cambio():
+        """Deltas vacíos para un artículo"""
+        return {
+            "total_actual": Decimal("0"),
+            "total_reservado": Decimal("0"),
+            "numero_lotes": 0,
+            "valor_fifo": Decimal("0"),
+        }
+
+    @staticmethod
+    def acumular(
+        cambios, inventario_id, precio_unitario, actual=0, reservado=0, numero_lotes=0
+    ):
+        """
+        Acumula en cambios[inventario_id] la variación producida en un lote.
+
+        Args:
+            cambios: Dict inventario_id -> deltas (ver nuevo_cambio)
+            inventario_id: Artículo del lote modificado
+            precio_unitario: Precio unitario del lote (para valor_fifo)
+            actual: Variación de cantidad_actual
+            reservado: Variación de cantidad_reservada
+            numero_lotes: +1 si el lote pasa a ser consumible, -1 si se agota
+        """
+        delta = cambios.setdefault(inventario_id, StockResumen.nuevo_cambio())
+        actual = Decimal(str(actual))
+        delta["total_actual"] += actual
+        delta["total_reservado"] += Decimal(str(reservado))
+        delta["numero_lotes"] += numero_lotes
+        delta["valor_fifo"] += actual * Decimal(str(precio_unitario or 0))
+        return cambios
+
+    @staticmethod
+    def aplicar_cambios(cambios):
+        """
+        Aplica los deltas acumulados dentro de la transacción actual.
+
+        Los totales se actualizan con UPDATE ... SET x = x + delta (seguro ante
+        escrituras concurrentes, que esperan el bloqueo de la fila) y
+        proximo_vencimiento con un MIN sobre el índice parcial de lotes.
+        Los artículos sin fila de resumen se calculan completos desde sus lotes.
+
+        Args:
+            cambios: Dict inventario_id -> deltas (ver acumular)
+        """
+        if not cambios:
+            return
+
+        # Los deltas y el MIN deben ver los lotes ya escritos
+        db.session.flush()
+
+        ids = sorted(cambios)
+        existentes = {
+            fila[0]
+            for fila in db.session.query(StockResumen.inventario_id).filter(
+                StockResumen.inventario_id.in_(ids)
+            )
+        }
+        faltantes = [i for i in ids if i not in existentes]
+        if faltantes:
+            StockResumen.recalcular(faltantes)
+
+        if not existentes:
+            return
+
+        tabla = StockResumen.__table__
+        lotes = LoteInventario.__table__
+        proximo = (
+            db.select(db.func.min(lotes.c.fecha_vencimiento))
+            .where(
+                lotes.c.inventario_id == tabla.c.inventario_id,
+                lotes.c.activo == True,
+                lotes.c.cantidad_actual > db.literal_column("0"),
+            )
+            .scalar_subquery()
+        )
+        actualizacion = (
+            tabla.update()
+            .where(tabla.c.inventario_id == bindparam("b_inventario_id"))
+            .values(
+                {
+                    **{
+                        campo: tabla.c[campo] + bindparam(f"b_{campo}")
+                        for campo in CAMPOS_ACUMULABLES
+                    },
+                    "proximo_vencimiento": proximo,
+                    "fecha_actualizacion": datetime.now(timezone.utc),
+                }
+            )
+        )
+        db.session.execute(
+            actualizacion,
+            [
+                {
+                    "b_inventario_id": inventario_id,
+                    **{
+                        f"b_{campo}": cambios[inventario_id][campo]
+                        for campo in CAMPOS_ACUMULABLES
+                    },
+                }
+                for inventario_id in sorted(existentes)
+            ],
+        )
+
+        # Las filas ya cargadas en la sesión quedan desactualizadas
+        for inventario_id in existentes:
+            resumen = db.session.identity_map.get(
+                identity_key(StockResumen, inventario_id)
+            )
+            if resumen is not None:
+                db.session.expire(resumen)
+
+    @staticmethod
+    def recalcular(inventario_ids=None):
+        """
+        Reconstruye el resumen desde los lotes y devuelve las diferencias.
+
+        Args:
+            inventario_ids: Artículos a reconstruir (None = todos)
+
+        Returns:
+            List[dict]: Un elemento por artículo cuyo resumen no coincidía,
+            con los valores guardados ("antes", None si no existía la fila)
+            y los calculados ("despues")
+        """
+        calculados = {
+            fila.inventario_id: fila
+            for fila in StockResumen.agregados_lotes(inventario_ids)
+        }
+
+        consulta = StockResumen.query
+        if inventario_ids is not None:
+            consulta = consulta.filter(
+                StockResumen.inventario_id.in_(list(inventario_ids))
+            )
+        guardados = {r.inventario_id: r for r in consulta}
+
+        diferencias = []
+        for inventario_id in sorted(set(calculados) | set(guardados)):
+            fila = calculados.get(inventario_id)
+            despues = {
+                "total_actual": _decimal(fila.total_actual if fila else 0, "0.0001"),
+                "total_reservado": _decimal(
+                    fila.total_reservado if fila else 0, "0.0001"
+                ),
+                "numero_lotes": fila.numero_lotes if fila else 0,
+                "valor_fifo": _decimal(fila.valor_fifo if fila else 0, "0.01"),
+                "proximo_vencimiento": fila.proximo_vencimiento if fila else None,
+            }
+
+            resumen = guardados.get(inventario_id)
+            if resumen is None:
+                resumen = StockResumen(inventario_id=inventario_id)
+                db.session.add(resumen)
+                antes = None
+            else:
+                antes = {
+                    "total_actual": _decimal(resumen.total_actual, "0.0001"),
+                    "total_reservado": _decimal(resumen.total_reservado, "0.0001"),
+                    "numero_lotes": resumen.numero_lotes,
+                    "valor_fifo": _decimal(resumen.valor_fifo, "0.01"),
+                    "proximo_vencimiento": resumen.proximo_vencimiento,
+                }
+
+            if antes != despues:
+                for campo, valor in despues.items():
+                    setattr(resumen, campo, valor)
+                diferencias.append(
+                    {"inventario_id": inventario_id, "antes": antes, "despues": despues}
+                )
+
+        db.session.flush()
+        return diferencias
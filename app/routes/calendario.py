@@ -1,15 +1,53 @@
 from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from app.models.orden_trabajo import OrdenTrabajo
 from app.models.plan_mantenimiento import PlanMantenimiento
 from app.models.activo import Activo
+from app.models.plan_ocurrencia import HORIZONTE_DIAS, PlanOcurrencia
+from app.utils import recurrencia
 from sqlalchemy import func, and_, or_
 import calendar
 
 calendario_bp = Blueprint("calendario", __name__, url_prefix="/calendario")
 
 
+def _ocurrencias_planes(primer_dia, ultimo_dia):
+    """
+    [(plan, fecha)] de las ejecuciones de los planes activos en el rango:
+    la próxima programada y las siguientes según su frecuencia
+    """
+    if ultimo_dia.date() <= date.today() + timedelta(days=HORIZONTE_DIAS):
+        # Dentro del horizonte materializado: una consulta por rango de fechas
+        return (
+            PlanMantenimiento.query.join(
+                PlanOcurrencia, PlanOcurrencia.plan_id == PlanMantenimiento.id
+            )
+            .filter(
+                PlanMantenimiento.estado == "Activo",
+                PlanOcurrencia.fecha.between(primer_dia.date(), ultimo_dia.date()),
+            )
+            .with_entities(PlanMantenimiento, PlanOcurrencia.fecha)
+            .order_by(PlanOcurrencia.plan_id, PlanOcurrencia.fecha)
+            .all()
+        )
+
+    planes = PlanMantenimiento.query.filter(
+        PlanMantenimiento.estado == "Activo",
+        PlanMantenimiento.proxima_ejecucion <= ultimo_dia,
+    ).all()
+    return recurrencia.ocurrencias_planes(planes, primer_dia, ultimo_dia)
+
+
+def _nombres_activos(planes):
+    ids = {plan.activo_id for plan in planes if plan.activo_id}
+    if not ids:
+        return {}
+    return dict(
+        Activo.query.with_entities(Activo.id, Activo.nombre).filter(Activo.id.in_(ids))
+    )
+
+
 @calendario_bp.route("/")
 @login_required
 def calendario_page():
@@ -58,14 +96,8 @@ def obtener_ordenes_calendario():
                 f"   - {orden.numero_orden}: ID={orden.id}, Programada={orden.fecha_programada}, Creada={orden.fecha_creacion}, Estado={orden.estado}"
             )
 
-        # Obtener planes próximos (para mostrar futuras generaciones)
-        planes_proximos = PlanMantenimiento.query.filter(
-            and_(
-                PlanMantenimiento.estado == "Activo",
-                PlanMantenimiento.proxima_ejecucion >= primer_dia,
-                PlanMantenimiento.proxima_ejecucion <= ultimo_dia,
-            )
-        ).all()
+        # Ejecuciones previstas de los planes en el mes (futuras generaciones)
+        planes_proximos = _ocurrencias_planes(primer_dia, ultimo_dia)
 
         eventos = []
 
@@ -131,19 +163,18 @@ def obtener_ordenes_calendario():
             )
 
         # Agregar planes futuros (órdenes que se generarán)
-        for plan in planes_proximos:
-            activo = Activo.query.get(plan.activo_id) if plan.activo_id else None
-
+        activos = _nombres_activos(plan for plan, _ in planes_proximos)
+        for plan, fecha in planes_proximos:
             eventos.append(
                 {
-                    "id": f"plan-{plan.id}",
+                    "id": f"plan-{plan.id}-{fecha.isoformat()}",
                     "title": f"📅 {plan.codigo_plan}",
                     "description": f"Mantenimiento preventivo: {plan.nombre}",
-                    "start": plan.proxima_ejecucion.isoformat(),
+                    "start": fecha.isoformat(),
                     "backgroundColor": "#6f42c1",  # Púrpura para planes
                     "borderColor": "#6f42c1",
                     "tipo": "plan_futuro",
-                    "activo_nombre": activo.nombre if activo else "Sin activo",
+                    "activo_nombre": activos.get(plan.activo_id, "Sin activo"),
                     "frecuencia": plan.frecuencia,
                 }
             )
@@ -196,14 +227,8 @@ def estadisticas_mes():
             .all()
         )
 
-        # Planes que ejecutarán este mes
-        planes_mes = PlanMantenimiento.query.filter(
-            and_(
-                PlanMantenimiento.estado == "Activo",
-                PlanMantenimiento.proxima_ejecucion >= primer_dia,
-                PlanMantenimiento.proxima_ejecucion <= ultimo_dia,
-            )
-        ).count()
+        # Ejecuciones de planes previstas este mes
+        planes_mes = len(_ocurrencias_planes(primer_dia, ultimo_dia))
 
         # Formatear estadísticas
         stats_formateadas = {}
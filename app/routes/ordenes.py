@@ -74,12 +74,22 @@ def listar_ordenes_api():
         tipo = request.args.get("tipo")
         prioridad = request.args.get("prioridad")
 
-        if page is not None:
-            # Usar paginación
+        if page is not None or request.args.get("cursor"):
+            # Usar paginación; con cursor (next_cursor de la página anterior)
+            # la página se lee por clave en lugar de con OFFSET
             per_page = per_page or 10
-            resultado = listar_ordenes_paginado(
-                page, per_page, q, estado, tipo, prioridad
-            )
+            try:
+                resultado = listar_ordenes_paginado(
+                    page or 1,
+                    per_page,
+                    q,
+                    estado,
+                    tipo,
+                    prioridad,
+                    cursor=request.args.get("cursor"),
+                )
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
             return jsonify(resultado)
         else:
             # Usar listado tradicional sin paginación
@@ -104,6 +114,7 @@ def listar_ordenes_api():
                         "pages": 0,
                         "has_next": False,
                         "has_prev": False,
+                        "next_cursor": None,
                     }
                 ),
                 200,
@@ -1,5 +1,5 @@
-from flask import Blueprint, request, jsonify, render_template, Response
-from flask_login import login_required
+from flask import Blueprint, request, jsonify, render_template, Response, current_app
+from flask_login import current_user, login_required
 from app.controllers.planes_controller import (
     listar_planes,
     crear_plan,
@@ -11,10 +11,16 @@ from app.controllers.planes_controller import (
     generar_ordenes_manuales,
     generar_orden_individual,
 )
+from app.routes.trabajos import respuesta_encolada
+from app.services.planificador import en_segundo_plano, encolar
 
 planes_bp = Blueprint("planes", __name__, url_prefix="/planes")
 
 
+def _usuario_actual():
+    return getattr(current_user, "username", None)
+
+
 @planes_bp.route("/")
 @login_required
 def planes_page():
@@ -191,6 +197,9 @@ def generar_ordenes():
         modo = data.get("modo", "automatico")  # "automatico" o "manual"
 
         if modo == "automatico":
+            if en_segundo_plano(current_app):
+                ejecucion, creada = encolar("generar_ordenes", _usuario_actual())
+                return respuesta_encolada(ejecucion, creada)
             resultado = generar_ordenes_automaticas()
         else:
             # Para modo manual, se espera una lista de plan_ids
@@ -221,6 +230,13 @@ def generar_ordenes():
 def generar_ordenes_manual_api():
     """Generar órdenes de trabajo para todos los planes sin generación automática"""
     try:
+        if en_segundo_plano(current_app):
+            # El planificador la ejecuta; el cliente consulta estado_url
+            ejecucion, creada = encolar("generar_ordenes_manuales", _usuario_actual())
+            return respuesta_encolada(
+                ejecucion, creada, mensaje="Generación de órdenes en curso"
+            )
+
         # Llamar a la función que genera órdenes para planes manuales
         # Esta función debería retornar el número de órdenes generadas
         resultado = generar_ordenes_manuales()
@@ -11,7 +11,7 @@ from flask import (
 from app.extensions import db
 from app.models.solicitud_servicio import SolicitudServicio
 from app.models.archivo_adjunto import ArchivoAdjunto
-from datetime import datetime
+from app.services import numeracion
 import re
 import os
 from werkzeug.utils import secure_filename
@@ -237,28 +237,7 @@ def validar_datos_solicitud(form_data):
 def generar_numero_solicitud():
     """Genera un número único para la solicitud"""
     # Formato: SOL-YYYY-NNNN (ej: SOL-2025-0001)
-    año_actual = datetime.now().year
-
-    # Buscar el último número del año
-    ultima_solicitud = (
-        SolicitudServicio.query.filter(
-            SolicitudServicio.numero_solicitud.like(f"SOL-{año_actual}-%")
-        )
-        .order_by(SolicitudServicio.id.desc())
-        .first()
-    )
-
-    if ultima_solicitud:
-        # Extraer el número secuencial
-        partes = ultima_solicitud.numero_solicitud.split("-")
-        if len(partes) == 3:
-            numero_secuencial = int(partes[2]) + 1
-        else:
-            numero_secuencial = 1
-    else:
-        numero_secuencial = 1
-
-    return f"SOL-{año_actual}-{numero_secuencial:04d}"
+    return numeracion.numero_solicitud()
 
 
 def procesar_archivos_solicitud(archivos, solicitud_id):
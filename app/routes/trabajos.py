@@ -0,0 +1,91 @@
+"""
+Estado y ejecución a petición de los trabajos del planificador
+"""
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from flask_login import current_user, login_required
+
+from app.models.ejecucion_trabajo import EjecucionTrabajo
+from app.services import planificador
+
+trabajos_bp = Blueprint("trabajos", __name__, url_prefix="/trabajos")
+
+
+def respuesta_encolada(ejecucion, creada, **extra):
+    """Respuesta 202 con la ejecución y la URL para consultar su progreso"""
+    datos = {
+        "success": True,
+        "encolado": True,
+        "nueva": creada,
+        "ejecucion": ejecucion.to_dict(),
+        "estado_url": url_for("trabajos.estado_ejecucion", ejecucion_id=ejecucion.id),
+    }
+    datos.update(extra)
+    return jsonify(datos), 202
+
+
+@trabajos_bp.route("/api", methods=["GET"])
+@login_required
+def listar_trabajos():
+    """Trabajos con su programación y su última ejecución"""
+    trabajos = planificador.crear_trabajos(current_app.config)
+    recientes = EjecucionTrabajo.query.order_by(EjecucionTrabajo.id.desc()).limit(200)
+    ultimas = {}
+    for ejecucion in recientes:
+        ultimas.setdefault(ejecucion.trabajo, ejecucion)
+
+    return jsonify(
+        {
+            "success": True,
+            "modo": current_app.config.get("PLANIFICADOR_MODO"),
+            "trabajos": [
+                {
+                    "nombre": trabajo.nombre,
+                    "descripcion": trabajo.descripcion,
+                    "hora": trabajo.hora,
+                    "cada_minutos": trabajo.cada_minutos,
+                    "ultima_ejecucion": (
+                        ultimas[trabajo.nombre].to_dict()
+                        if trabajo.nombre in ultimas
+                        else None
+                    ),
+                }
+                for trabajo in trabajos.values()
+            ],
+        }
+    )
+
+
+@trabajos_bp.route("/api/ejecuciones", methods=["GET"])
+@login_required
+def listar_ejecuciones():
+    """Últimas ejecuciones (filtro opcional ?trabajo=&estado=)"""
+    consulta = EjecucionTrabajo.query
+    if request.args.get("trabajo"):
+        consulta = consulta.filter_by(trabajo=request.args["trabajo"])
+    if request.args.get("estado"):
+        consulta = consulta.filter_by(estado=request.args["estado"])
+    limite = min(request.args.get("limite", 50, type=int), 500)
+    ejecuciones = consulta.order_by(EjecucionTrabajo.id.desc()).limit(limite)
+    return jsonify({"success": True, "ejecuciones": [e.to_dict() for e in ejecuciones]})
+
+
+@trabajos_bp.route("/api/ejecuciones/<int:ejecucion_id>", methods=["GET"])
+@login_required
+def estado_ejecucion(ejecucion_id):
+    """Estado y progreso de una ejecución"""
+    ejecucion = EjecucionTrabajo.query.get_or_404(ejecucion_id)
+    return jsonify({"success": True, "ejecucion": ejecucion.to_dict()})
+
+
+@trabajos_bp.route("/api/<nombre>/ejecutar", methods=["POST"])
+@login_required
+def ejecutar_trabajo(nombre):
+    """Encola una ejecución inmediata del trabajo"""
+    try:
+        ejecucion, creada = planificador.encolar(
+            nombre, getattr(current_user, "username", None)
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    return respuesta_encolada(ejecucion, creada)
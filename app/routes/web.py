@@ -23,6 +23,7 @@ from app.models.activo import Activo
 from app.models.inventario import Inventario
 from app.models.plan_mantenimiento import PlanMantenimiento
 from app.models.usuario import Usuario
+from app.services.carga_tecnicos import obtener_asignador
 from datetime import datetime, timedelta
 import os
 
@@ -169,31 +170,18 @@ def asignar_tecnicos_masivo():
                 }
             )
 
-        # Verificar que hay técnicos disponibles
-        tecnicos_activos = Usuario.query.filter_by(rol="tecnico", activo=True).count()
+        # Técnicos por carga: un montículo leído una vez de carga_tecnico
+        asignador = obtener_asignador(roles=("tecnico",))
 
-        if tecnicos_activos == 0:
+        if not asignador:
             return jsonify({"error": "No hay técnicos activos en el sistema"}), 400
 
         asignadas = 0
         detalles = []
 
         for orden in ordenes_sin_tecnico:
-            # Usar el mismo algoritmo de balanceo de carga
-            tecnicos = Usuario.query.filter_by(rol="tecnico", activo=True).all()
-
-            # Contar órdenes pendientes por técnico
-            carga_tecnicos = {}
-            for tecnico in tecnicos:
-                ordenes_pendientes = OrdenTrabajo.query.filter(
-                    OrdenTrabajo.tecnico_id == tecnico.id,
-                    OrdenTrabajo.estado.in_(["Pendiente", "En Proceso"]),
-                ).count()
-                carga_tecnicos[tecnico.id] = ordenes_pendientes
-
             # Asignar al técnico con menos carga
-            tecnico_id = min(carga_tecnicos, key=carga_tecnicos.get)
-            tecnico = Usuario.query.get(tecnico_id)
+            tecnico_id, nombre, _ = asignador.asignar()
 
             orden.tecnico_id = tecnico_id
             asignadas += 1
@@ -202,7 +190,7 @@ def asignar_tecnicos_masivo():
                 {
                     "orden_id": orden.id,
                     "numero_orden": orden.numero_orden,
-                    "tecnico": tecnico.nombre,
+                    "tecnico": nombre,
                 }
             )
 
@@ -0,0 +1,148 @@
+"""
+Carga de trabajo de los técnicos y asignación equilibrada de órdenes
+
+La tabla carga_tecnico se mantiene al vuelo:
+
+- Cambios hechos con el ORM (alta o borrado de una orden, cambio de estado
+  o de técnico): se detectan en after_flush y se suman en la misma
+  transacción con CargaTecnico.aplicar_cambios.
+- Escrituras con Core (INSERT/UPDATE masivos): deben llamar a
+  CargaTecnico.aplicar_cambios con los técnicos afectados.
+
+AsignadorTecnicos lee la tabla una vez y reparte desde un montículo en
+memoria (O(log T) por asignación), sumando cada orden que asigna. Se guarda
+en la sesión hasta el final de la transacción, de modo que un lote de
+asignaciones queda equilibrado aunque las órdenes aún no estén confirmadas.
+"""
+
+import heapq
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from app.extensions import db
+from app.models.carga_tecnico import ESTADOS_ABIERTOS, CargaTecnico
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.usuario import Usuario
+
+CLAVE_SESION = "asignador_tecnicos"
+
+# Roles que reciben órdenes (minúsculas actuales y mayúsculas legacy)
+ROLES_TECNICO = ("tecnico", "supervisor", "Técnico", "Supervisor")
+
+
+def cargas_tecnicos(roles=ROLES_TECNICO):
+    """
+    [(carga, tecnico_id, nombre)] de los usuarios activos con esos roles,
+    ordenados por id, en una sola lectura de carga_tecnico.
+    """
+    filas = (
+        db.session.query(
+            Usuario.id,
+            Usuario.nombre,
+            db.func.coalesce(CargaTecnico.ordenes_abiertas, 0),
+        )
+        .outerjoin(CargaTecnico, CargaTecnico.tecnico_id == Usuario.id)
+        .filter(Usuario.activo == True, Usuario.rol.in_(roles))
+        .order_by(Usuario.id)
+        .all()
+    )
+    return [(carga, tecnico_id, nombre) for tecnico_id, nombre, carga in filas]
+
+
+class AsignadorTecnicos:
+    """Montículo (carga, tecnico_id, nombre) del técnico menos cargado"""
+
+    def __init__(self, cargas):
+        self._monticulo = list(cargas)
+        heapq.heapify(self._monticulo)
+
+    def __bool__(self):
+        return bool(self._monticulo)
+
+    def asignar(self):
+        """
+        (tecnico_id, nombre, carga previa) del menos cargado, al que suma la
+        orden asignada; None si no hay técnicos. A igual carga, el de menor id.
+        """
+        if not self._monticulo:
+            return None
+        carga, tecnico_id, nombre = self._monticulo[0]
+        heapq.heapreplace(self._monticulo, (carga + 1, tecnico_id, nombre))
+        return tecnico_id, nombre, carga
+
+
+def obtener_asignador(roles=ROLES_TECNICO, sesion=None):
+    """Asignador de la transacción en curso (se crea en la primera llamada)"""
+    sesion = sesion if sesion is not None else db.session()
+    asignadores = sesion.info.setdefault(CLAVE_SESION, {})
+    asignador = asignadores.get(roles)
+    if asignador is None:
+        asignador = asignadores[roles] = AsignadorTecnicos(cargas_tecnicos(roles))
+    return asignador
+
+
+def _abierta(estado):
+    return estado in ESTADOS_ABIERTOS
+
+
+def _valores(orden, campo):
+    """(valor al empezar el flush, valor tras él) de un atributo"""
+    historial = attributes.get_history(orden, campo)
+    actual = (historial.added or historial.unchanged or [None])[0]
+    anterior = (historial.deleted or historial.unchanged or [None])[0]
+    return anterior, actual
+
+
+def _al_hacer_flush(sesion, contexto):
+    cambios = {}
+    for orden in sesion.new:
+        if isinstance(orden, OrdenTrabajo) and _abierta(orden.estado):
+            cambios[orden.tecnico_id] = cambios.get(orden.tecnico_id, 0) + 1
+    for orden in sesion.deleted:
+        if isinstance(orden, OrdenTrabajo):
+            tecnico_id = _valores(orden, "tecnico_id")[0]
+            if _abierta(_valores(orden, "estado")[0]):
+                cambios[tecnico_id] = cambios.get(tecnico_id, 0) - 1
+    for orden in sesion.dirty:
+        if not isinstance(orden, OrdenTrabajo) or not (
+            attributes.get_history(orden, "estado").has_changes()
+            or attributes.get_history(orden, "tecnico_id").has_changes()
+        ):
+            continue
+        tecnico_antes, tecnico_despues = _valores(orden, "tecnico_id")
+        estado_antes, estado_despues = _valores(orden, "estado")
+        if _abierta(estado_antes):
+            cambios[tecnico_antes] = cambios.get(tecnico_antes, 0) - 1
+        if _abierta(estado_despues):
+            cambios[tecnico_despues] = cambios.get(tecnico_despues, 0) + 1
+    CargaTecnico.aplicar_cambios(cambios, sesion.connection())
+
+
+def _al_terminar(sesion):
+    sesion.info.pop(CLAVE_SESION, None)
+
+
+def _conservar_valor_anterior(orden, valor, anterior, iniciador):
+    # Sin efecto: existe para registrarse con active_history=True
+    pass
+
+
+def instalar_carga_tecnicos():
+    """Registra los eventos de sesión (idempotente)"""
+    for nombre, funcion in (
+        ("after_flush", _al_hacer_flush),
+        ("after_commit", _al_terminar),
+        ("after_rollback", _al_terminar),
+    ):
+        if not event.contains(Session, nombre, funcion):
+            event.listen(Session, nombre, funcion)
+    # Cargar el valor anterior aunque el atributo estuviera expirado
+    for atributo in (OrdenTrabajo.estado, OrdenTrabajo.tecnico_id):
+        if not event.contains(atributo, "set", _conservar_valor_anterior):
+            event.listen(
+                atributo,
+                "set",
+                _conservar_valor_anterior,
+                active_history=True,
+            )
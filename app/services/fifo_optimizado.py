@@ -0,0 +1,348 @@
+"""
+Motor FIFO optimizado para consumos en lote.
+Agrupa las operaciones por artículo, carga los lotes una sola vez con bloqueo
+de fila y escribe los movimientos con inserciones masivas.
+"""
+
+from app.extensions import db
+from app.models.lote_inventario import LoteInventario, MovimientoLote
+from app.models.stock_resumen import StockResumen
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from app.services.servicio_fifo import ServicioFIFO
+from app.services.invalidacion_cache import registrar_invalidacion
+from app.utils.metricas_multiproceso import incrementar as incrementar_metrica
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.util import identity_key
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoteSnapshot:
+    """Copia de solo lectura de un lote, segura para cachear entre peticiones"""
+
+    id: int
+    inventario_id: int
+    codigo_lote: Optional[str]
+    fecha_entrada: Optional[datetime]
+    fecha_vencimiento: Optional[datetime]
+    cantidad_inicial: Decimal
+    cantidad_actual: Decimal
+    cantidad_reservada: Decimal
+    precio_unitario: Decimal
+    documento_origen: Optional[str]
+    proveedor_id: Optional[int]
+
+    @property
+    def cantidad_disponible(self):
+        """Cantidad disponible para consumo (actual - reservada)"""
+        return float(self.cantidad_actual) - float(self.cantidad_reservada or 0)
+
+
+@dataclass
+class ResultadoFIFO:
+    """Resultado de una operación de consumo dentro de un batch"""
+
+    inventario_id: int
+    lotes_afectados: List[Tuple[int, float]] = field(default_factory=list)
+    cantidad_procesada: float = 0.0
+    cantidad_faltante: float = 0.0
+    tiempo_ejecucion: float = 0.0
+    operaciones_realizadas: int = 0
+
+
+class FIFOOptimizado:
+    """Servicio FIFO orientado a lotes de operaciones"""
+
+    def __init__(self, cache_ttl: int = 30):
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cache_lotes: Dict[int, Tuple[float, List[LoteSnapshot]]] = {}
+        self._stats = {
+            "batches_procesados": 0,
+            "operaciones_procesadas": 0,
+            "lotes_actualizados": 0,
+            "movimientos_insertados": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "tiempo_total": 0.0,
+        }
+
+    @staticmethod
+    def _consulta_lotes_disponibles(inventario_ids, incluir_vencidos=False):
+        """Consulta de lotes consumibles en orden FIFO para varios artículos"""
+        query = select(LoteInventario).where(
+            LoteInventario.inventario_id.in_(inventario_ids),
+            LoteInventario.filtro_consumible(),
+        )
+        if not incluir_vencidos:
+            ahora = datetime.now(timezone.utc)
+            query = query.where(
+                db.or_(
+                    LoteInventario.fecha_vencimiento.is_(None),
+                    LoteInventario.fecha_vencimiento > ahora,
+                )
+            )
+        return query.order_by(
+            LoteInventario.inventario_id,
+            LoteInventario.fecha_entrada.asc(),
+            LoteInventario.id.asc(),
+        )
+
+    @staticmethod
+    def _snapshot(lote: LoteInventario) -> LoteSnapshot:
+        return LoteSnapshot(
+            id=lote.id,
+            inventario_id=lote.inventario_id,
+            codigo_lote=lote.codigo_lote,
+            fecha_entrada=lote.fecha_entrada,
+            fecha_vencimiento=lote.fecha_vencimiento,
+            cantidad_inicial=lote.cantidad_inicial,
+            cantidad_actual=lote.cantidad_actual,
+            cantidad_reservada=lote.cantidad_reservada or Decimal("0"),
+            precio_unitario=lote.precio_unitario,
+            documento_origen=lote.documento_origen,
+            proveedor_id=lote.proveedor_id,
+        )
+
+    def _obtener_lotes_optimizado(
+        self, inventario_id: int, usar_cache: bool = True
+    ) -> List[LoteSnapshot]:
+        """
+        Obtiene los lotes consumibles de un artículo en orden FIFO.
+
+        Args:
+            inventario_id: ID del artículo de inventario
+            usar_cache: Si False, ignora la copia cacheada
+
+        Returns:
+            List[LoteSnapshot]: Lotes activos con cantidad_actual > 0
+        """
+        ahora = time.monotonic()
+        if usar_cache:
+            with self._lock:
+                entrada = self._cache_lotes.get(inventario_id)
+                if entrada and entrada[0] > ahora:
+                    self._stats["cache_hits"] += 1
+                    return list(entrada[1])
+                self._stats["cache_misses"] += 1
+
+        lotes = db.session.execute(
+            self._consulta_lotes_disponibles([inventario_id])
+        ).scalars()
+        snapshots = [self._snapshot(lote) for lote in lotes]
+
+        with self._lock:
+            self._cache_lotes[inventario_id] = (ahora + self.cache_ttl, snapshots)
+        return list(snapshots)
+
+    def invalidar_cache(self, inventario_ids=None):
+        """Elimina del caché los lotes de los artículos indicados (o todos)"""
+        with self._lock:
+            if inventario_ids is None:
+                self._cache_lotes.clear()
+                return
+            for inventario_id in inventario_ids:
+                self._cache_lotes.pop(inventario_id, None)
+
+    def consumir_fifo_batch(
+        self,
+        operaciones: List[Dict[str, Any]],
+        usuario_id: Optional[str] = None,
+        commit: bool = True,
+    ) -> List[ResultadoFIFO]:
+        """
+        Consume stock FIFO para varias operaciones en una única transacción.
+
+        Las operaciones se agrupan por inventario_id: los lotes de todos los
+        artículos implicados se leen en una sola consulta con bloqueo de fila
+        (SELECT ... FOR UPDATE en PostgreSQL), el reparto se hace en memoria
+        respetando el orden de llegada y las escrituras se envían como un
+        UPDATE por clave primaria y un INSERT masivo de MovimientoLote.
+
+        El UPDATE comprueba la columna version de cada lote; si otro proceso
+        lo modificó entre la lectura y la escritura, con commit=True el batch
+        completo se repite (ServicioFIFO.ejecutar_en_transaccion) y con
+        commit=False se propaga StaleDataError para que lo gestione el llamador.
+
+        Args:
+            operaciones: Lista de dicts con inventario_id, cantidad y,
+                opcionalmente, orden_trabajo_id, documento_referencia,
+                observaciones, usuario_id y movimiento_inventario_id
+            usuario_id: ID del usuario que realiza el consumo
+            commit: Si True, confirma la transacción al terminar
+
+        Returns:
+            List[ResultadoFIFO]: Un resultado por operación, en el mismo orden
+        """
+        inicio = time.perf_counter()
+        if not operaciones:
+            return []
+
+        inventario_ids = sorted({int(op["inventario_id"]) for op in operaciones})
+        try:
+            if commit:
+                resultados, lotes_modificados, movimientos = (
+                    ServicioFIFO.ejecutar_en_transaccion(
+                        lambda: self._aplicar_batch(
+                            operaciones, inventario_ids, usuario_id
+                        )
+                    )
+                )
+            else:
+                resultados, lotes_modificados, movimientos = self._aplicar_batch(
+                    operaciones, inventario_ids, usuario_id
+                )
+
+            self.invalidar_cache(inventario_ids)
+
+            with self._lock:
+                self._stats["batches_procesados"] += 1
+                self._stats["operaciones_procesadas"] += len(operaciones)
+                self._stats["lotes_actualizados"] += len(lotes_modificados)
+                self._stats["movimientos_insertados"] += len(movimientos)
+                self._stats["tiempo_total"] += time.perf_counter() - inicio
+            incrementar_metrica(
+                "gmao_fifo_operations_total",
+                {"operation": "consumo_batch"},
+                len(operaciones),
+            )
+
+            return resultados
+
+        except Exception as e:
+            logger.error(f"Error en consumo FIFO batch: {str(e)}")
+            raise
+
+    def _aplicar_batch(self, operaciones, inventario_ids, usuario_id):
+        """Reparte y escribe un batch dentro de la transacción actual"""
+        # Una sola lectura con bloqueo para todos los artículos del batch
+        lotes_por_articulo: Dict[int, List[LoteInventario]] = {
+            inventario_id: [] for inventario_id in inventario_ids
+        }
+        lotes = db.session.execute(
+            self._consulta_lotes_disponibles(inventario_ids)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalars()
+        for lote in lotes:
+            lotes_por_articulo[lote.inventario_id].append(lote)
+
+        cantidades: Dict[int, Decimal] = {}
+        reservadas: Dict[int, Decimal] = {}
+        versiones: Dict[int, int] = {}
+        for lista in lotes_por_articulo.values():
+            for lote in lista:
+                cantidades[lote.id] = Decimal(lote.cantidad_actual)
+                versiones[lote.id] = lote.version
+                reservadas[lote.id] = Decimal(lote.cantidad_reservada or 0)
+
+        resultados: List[ResultadoFIFO] = []
+        movimientos: List[Dict[str, Any]] = []
+        lotes_modificados = set()
+        cambios_stock: Dict[int, Dict[str, Any]] = {}
+
+        for op in operaciones:
+            inicio_op = time.perf_counter()
+            inventario_id = int(op["inventario_id"])
+            pendiente = Decimal(str(abs(float(op["cantidad"]))))
+            resultado = ResultadoFIFO(inventario_id=inventario_id)
+
+            for lote in lotes_por_articulo[inventario_id]:
+                if pendiente <= 0:
+                    break
+                disponible = cantidades[lote.id] - reservadas[lote.id]
+                if disponible <= 0:
+                    continue
+
+                tomado = min(pendiente, disponible)
+                cantidades[lote.id] -= tomado
+                pendiente -= tomado
+                lotes_modificados.add(lote.id)
+                StockResumen.acumular(
+                    cambios_stock,
+                    lote.inventario_id,
+                    lote.precio_unitario,
+                    actual=-tomado,
+                    numero_lotes=-1 if cantidades[lote.id] <= 0 else 0,
+                )
+
+                movimientos.append(
+                    {
+                        "lote_id": lote.id,
+                        "orden_trabajo_id": op.get("orden_trabajo_id"),
+                        "tipo_movimiento": "consumo",
+                        "cantidad": tomado,
+                        "documento_referencia": op.get("documento_referencia"),
+                        "observaciones": op.get("observaciones"),
+                        "usuario_id": op.get("usuario_id", usuario_id),
+                        "movimiento_inventario_id": op.get("movimiento_inventario_id"),
+                    }
+                )
+                resultado.lotes_afectados.append((lote.id, float(tomado)))
+                resultado.cantidad_procesada += float(tomado)
+
+            resultado.cantidad_faltante = float(pendiente)
+            resultado.operaciones_realizadas = len(resultado.lotes_afectados)
+            resultado.tiempo_ejecucion = time.perf_counter() - inicio_op
+
+            if pendiente > 0:
+                logger.warning(
+                    f"Stock insuficiente para artículo {inventario_id}: "
+                    f"solicitado {op['cantidad']}, faltante {pendiente}"
+                )
+            resultados.append(resultado)
+
+        if lotes_modificados:
+            ahora = datetime.now(timezone.utc)
+            tabla = LoteInventario.__table__
+            # UPDATE condicionado a la versión leída (executemany)
+            actualizacion = (
+                tabla.update()
+                .where(
+                    tabla.c.id == bindparam("b_id"),
+                    tabla.c.version == bindparam("b_version"),
+                )
+                .values(
+                    cantidad_actual=bindparam("b_cantidad"),
+                    version=tabla.c.version + 1,
+                    fecha_modificacion=ahora,
+                    usuario_modificacion=usuario_id,
+                )
+            )
+            filas = db.session.execute(
+                actualizacion,
+                [
+                    {
+                        "b_id": lote_id,
+                        "b_version": versiones[lote_id],
+                        "b_cantidad": cantidades[lote_id],
+                    }
+                    for lote_id in sorted(lotes_modificados)
+                ],
+            ).rowcount
+            if filas != len(lotes_modificados):
+                raise StaleDataError(
+                    f"UPDATE de lotes afectó {filas} de "
+                    f"{len(lotes_modificados)} filas: modificación concurrente"
+                )
+            db.session.execute(insert(MovimientoLote), movimientos)
+            StockResumen.aplicar_cambios(cambios_stock)
+            registrar_invalidacion(cambios_stock)
+
+            # El UPDATE masivo no sincroniza los objetos ya cargados
+            for lote_id in lotes_modificados:
+                lote = db.session.identity_map.get(
+                    identity_key(LoteInventario, lote_id)
+                )
+                if lote is not None:
+                    db.session.expire(lote)
+
+        return resultados, lotes_modificados, movimientos
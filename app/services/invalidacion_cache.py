@@ -0,0 +1,116 @@
+"""
+Invalidación de la caché de inventario ligada a las transacciones
+
+Cada escritura que afecta al stock de un artículo (movimientos, lotes,
+conteos, descuentos de recambios, cambios del propio artículo) anota su
+inventario_id en la sesión. Al confirmarse la transacción se invalidan las
+etiquetas inventario:{id}, inventario:list y stats; si se deshace, no se
+invalida nada (deshacer solo un SAVEPOINT conserva lo anotado).
+
+- Cambios hechos con el ORM: se detectan automáticamente en after_flush.
+- Escrituras con Core (UPDATE/INSERT masivos): deben llamar a
+  registrar_invalidacion con los artículos afectados.
+
+Del mismo modo, crear, borrar o modificar órdenes de trabajo invalida la
+etiqueta ordenes:list (totales del listado paginado); las inserciones con
+Core llaman a registrar_invalidacion_ordenes.
+
+Invalidar tras el commit evita que otra petición vuelva a cachear el valor
+antiguo entre la invalidación y la confirmación.
+"""
+
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models.inventario import ConteoInventario, Inventario
+from app.models.lote_inventario import LoteInventario
+from app.models.movimiento_inventario import MovimientoInventario
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.stock_resumen import StockResumen
+from app.utils.cache import TAG_LISTADO_ORDENES, invalidar_tags, tags_inventario
+
+logger = logging.getLogger(__name__)
+
+CLAVE_SESION = "inventario_ids_invalidar"
+CLAVE_SESION_ORDENES = "ordenes_invalidar"
+
+# Modelos cuyo cambio invalida la caché del artículo referenciado
+MODELOS_INVENTARIO = (
+    ConteoInventario,
+    LoteInventario,
+    MovimientoInventario,
+    StockResumen,
+)
+
+
+def registrar_invalidacion(inventario_ids, sesion=None):
+    """Anota artículos cuya caché se invalidará al confirmar la transacción"""
+    sesion = sesion if sesion is not None else db.session()
+    sesion.info.setdefault(CLAVE_SESION, set()).update(
+        int(i) for i in inventario_ids if i is not None
+    )
+
+
+def registrar_invalidacion_ordenes(sesion=None):
+    """Anota que los totales de órdenes se invalidarán al confirmar"""
+    sesion = sesion if sesion is not None else db.session()
+    sesion.info[CLAVE_SESION_ORDENES] = True
+
+
+def _inventario_id(objeto):
+    if isinstance(objeto, Inventario):
+        return objeto.id
+    if isinstance(objeto, MODELOS_INVENTARIO):
+        return objeto.inventario_id
+    return None
+
+
+def _al_hacer_flush(sesion, flush_context):
+    ids = {
+        _inventario_id(objeto)
+        for objeto in (*sesion.new, *sesion.dirty, *sesion.deleted)
+    }
+    ids.discard(None)
+    if ids:
+        registrar_invalidacion(ids, sesion)
+    if any(
+        isinstance(objeto, OrdenTrabajo)
+        for objeto in (*sesion.new, *sesion.dirty, *sesion.deleted)
+    ):
+        registrar_invalidacion_ordenes(sesion)
+
+
+def _al_confirmar(sesion):
+    ids = sesion.info.pop(CLAVE_SESION, None)
+    tags = tags_inventario(ids) if ids else set()
+    if sesion.info.pop(CLAVE_SESION_ORDENES, False):
+        tags.add(TAG_LISTADO_ORDENES)
+    if not tags:
+        return
+    try:
+        invalidar_tags(tags)
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la caché de inventario: {e}")
+
+
+def _al_terminar_transaccion(sesion, transaccion):
+    # Deshacer un SAVEPOINT no descarta lo anotado por la transacción externa;
+    # si esta se confirma, invalidar de más solo cuesta un recálculo
+    if transaccion.parent is not None:
+        return
+    sesion.info.pop(CLAVE_SESION, None)
+    sesion.info.pop(CLAVE_SESION_ORDENES, None)
+
+
+def instalar_invalidacion_cache():
+    """Registra los eventos de sesión (idempotente)"""
+    for nombre, funcion in (
+        ("after_flush", _al_hacer_flush),
+        ("after_commit", _al_confirmar),
+        ("after_transaction_end", _al_terminar_transaccion),
+    ):
+        if not event.contains(Session, nombre, funcion):
+            event.listen(Session, nombre, funcion)
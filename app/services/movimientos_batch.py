@@ -0,0 +1,409 @@
+"""
+Procesamiento de movimientos de inventario en lote con una sola transacción.
+
+Valida todas las líneas antes de escribir, carga los artículos en una
+consulta, inserta movimientos y lotes de forma masiva, consume las salidas
+con FIFOOptimizado y actualiza el stock con un único UPDATE ... FROM (VALUES).
+"""
+
+from app.extensions import db
+from app.models.inventario import Inventario
+from app.models.lote_inventario import LoteInventario
+from app.models.movimiento_inventario import MovimientoInventario
+from app.models.stock_resumen import StockResumen
+from app.services.fifo_optimizado import FIFOOptimizado
+from app.services.invalidacion_cache import registrar_invalidacion
+from app.services.servicio_fifo import ServicioFIFO, es_conflicto_concurrencia
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from sqlalchemy import bindparam, insert, text
+from sqlalchemy.orm.util import identity_key
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIPOS_ENTRADA = ("entrada", "compra", "ajuste_positivo")
+TIPOS_SALIDA = ("salida", "consumo", "ajuste_negativo")
+
+# todo_o_nada: cualquier error descarta el batch completo
+# por_fila: cada línea en su SAVEPOINT; las que fallan se descartan y el resto
+# se confirma
+MODOS_BATCH = ("todo_o_nada", "por_fila")
+
+# Vida útil por defecto de los lotes según la categoría del artículo
+DIAS_VENCIMIENTO_CATEGORIA = {
+    "repuestos": 1095,  # 3 años
+    "consumibles": 365,  # 1 año
+    "herramientas": 1825,  # 5 años
+}
+DIAS_VENCIMIENTO_DEFECTO = 730  # 2 años
+
+
+def fecha_vencimiento_por_categoria(articulo, ahora=None):
+    """Fecha de vencimiento automática de un lote nuevo del artículo"""
+    categoria = (articulo.categoria or "general").lower()
+    dias = DIAS_VENCIMIENTO_CATEGORIA.get(categoria, DIAS_VENCIMIENTO_DEFECTO)
+    return (ahora or datetime.now(timezone.utc)) + timedelta(days=dias)
+
+
+@dataclass
+class LineaBatch:
+    """Línea de movimiento validada"""
+
+    indice: int
+    datos: Dict[str, Any]
+    inventario_id: int
+    cantidad: Decimal
+    es_entrada: bool
+    fecha_vencimiento: Optional[datetime] = None
+    movimiento_id: Optional[int] = None
+    lote_id: Optional[int] = None
+    resultado_fifo: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def delta_stock(self):
+        return self.cantidad if self.es_entrada else -self.cantidad
+
+
+class ServicioMovimientosBatch:
+    @staticmethod
+    def _validar(movimientos, articulos):
+        """
+        Valida todas las líneas sin escribir nada.
+
+        Returns:
+            Tuple[List[LineaBatch], Dict[int, str]]: Líneas válidas y errores
+            por índice
+        """
+        lineas, errores = [], {}
+        saldos = {i: Decimal(a.stock_actual or 0) for i, a in articulos.items()}
+
+        for indice, datos in enumerate(movimientos):
+            try:
+                for campo in ("inventario_id", "cantidad", "tipo_movimiento"):
+                    if campo not in datos:
+                        raise ValueError(f"Campo requerido: {campo}")
+
+                inventario_id = int(datos["inventario_id"])
+                cantidad = abs(Decimal(str(float(datos["cantidad"]))))
+                if cantidad <= 0:
+                    raise ValueError("La cantidad debe ser mayor a cero")
+
+                tipo = str(datos["tipo_movimiento"]).lower()
+                es_entrada = tipo in TIPOS_ENTRADA
+                if not (es_entrada or tipo in TIPOS_SALIDA):
+                    raise ValueError(
+                        f"Tipo de movimiento inválido: {datos['tipo_movimiento']}"
+                    )
+
+                if inventario_id not in articulos:
+                    raise ValueError(f"Artículo con ID {inventario_id} no encontrado")
+
+                fecha_vencimiento = None
+                if es_entrada:
+                    if datos.get("fecha_vencimiento"):
+                        fecha_vencimiento = datetime.fromisoformat(
+                            datos["fecha_vencimiento"]
+                        )
+                    else:
+                        fecha_vencimiento = fecha_vencimiento_por_categoria(
+                            articulos[inventario_id]
+                        )
+                elif saldos[inventario_id] < cantidad:
+                    raise ValueError(
+                        f"Stock insuficiente. Disponible: {saldos[inventario_id]}"
+                    )
+
+                linea = LineaBatch(
+                    indice=indice,
+                    datos=datos,
+                    inventario_id=inventario_id,
+                    cantidad=cantidad,
+                    es_entrada=es_entrada,
+                    fecha_vencimiento=fecha_vencimiento,
+                )
+                saldos[inventario_id] += linea.delta_stock
+                lineas.append(linea)
+
+            except (ValueError, TypeError) as e:
+                errores[indice] = str(e)
+
+        return lineas, errores
+
+    @staticmethod
+    def _fila_movimiento(linea, ahora):
+        datos = linea.datos
+        return {
+            "fecha": ahora,
+            "tipo": datos["tipo_movimiento"],
+            "cantidad": int(linea.delta_stock),  # Campo es Integer en el modelo
+            "precio_unitario": datos.get("precio_unitario"),
+            "documento_referencia": datos.get("documento_referencia"),
+            "orden_trabajo_id": datos.get("orden_trabajo_id"),
+            "proveedor_id": datos.get("proveedor_id"),
+            "usuario_id": datos.get("usuario_id", "sistema"),
+            "observaciones": datos.get("observaciones"),
+            "inventario_id": linea.inventario_id,
+        }
+
+    @staticmethod
+    def _fila_lote(linea, ahora):
+        datos = linea.datos
+        precio = Decimal(str(datos.get("precio_unitario") or 0))
+        return {
+            "inventario_id": linea.inventario_id,
+            "codigo_lote": datos.get("codigo_lote")
+            or f"L{ahora.strftime('%Y%m%d%H%M%S')}-{linea.indice}",
+            "fecha_entrada": ahora,
+            "fecha_vencimiento": linea.fecha_vencimiento,
+            "cantidad_inicial": linea.cantidad,
+            "cantidad_actual": linea.cantidad,
+            "cantidad_reservada": Decimal("0"),
+            "precio_unitario": precio,
+            "costo_total": linea.cantidad * precio,
+            "documento_origen": datos.get("documento_referencia"),
+            "proveedor_id": datos.get("proveedor_id"),
+            "movimiento_entrada_id": linea.movimiento_id,
+            "activo": True,
+            "observaciones": f"Lote optimizado: {datos.get('observaciones') or ''}",
+            "version": 1,
+            "fecha_creacion": ahora,
+            "usuario_creacion": datos.get("usuario_id", "sistema"),
+        }
+
+    @staticmethod
+    def _operacion_salida(linea):
+        datos = linea.datos
+        return {
+            "inventario_id": linea.inventario_id,
+            "cantidad": linea.cantidad,
+            "orden_trabajo_id": datos.get("orden_trabajo_id"),
+            "documento_referencia": datos.get("documento_referencia"),
+            "observaciones": f"Salida optimizada: {datos.get('observaciones') or ''}",
+            "usuario_id": datos.get("usuario_id", "sistema"),
+            "movimiento_inventario_id": linea.movimiento_id,
+        }
+
+    @staticmethod
+    def _insertar_movimientos(lineas, ahora):
+        """INSERT masivo de MovimientoInventario; asigna movimiento_id a cada línea"""
+        # En PostgreSQL se agrupa en INSERT ... VALUES ... RETURNING por bloques;
+        # SQLite no garantiza el orden de RETURNING y SQLAlchemy inserta fila a
+        # fila, siempre dentro de la misma transacción.
+        ids = db.session.scalars(
+            insert(MovimientoInventario).returning(
+                MovimientoInventario.id, sort_by_parameter_order=True
+            ),
+            [ServicioMovimientosBatch._fila_movimiento(l, ahora) for l in lineas],
+        ).all()
+        for linea, movimiento_id in zip(lineas, ids):
+            linea.movimiento_id = movimiento_id
+
+    @staticmethod
+    def _crear_lotes(entradas, ahora):
+        """INSERT masivo de los lotes de entrada y actualización de stock_resumen"""
+        if not entradas:
+            return
+        filas = [ServicioMovimientosBatch._fila_lote(l, ahora) for l in entradas]
+        ids = db.session.scalars(
+            insert(LoteInventario).returning(
+                LoteInventario.id, sort_by_parameter_order=True
+            ),
+            filas,
+        ).all()
+
+        cambios = {}
+        for linea, fila, lote_id in zip(entradas, filas, ids):
+            linea.lote_id = lote_id
+            StockResumen.acumular(
+                cambios,
+                linea.inventario_id,
+                fila["precio_unitario"],
+                actual=linea.cantidad,
+                numero_lotes=1,
+            )
+        StockResumen.aplicar_cambios(cambios)
+
+    @staticmethod
+    def _consumir_salidas(salidas, fifo):
+        """Consumo FIFO de todas las salidas con una lectura y escrituras masivas"""
+        if not salidas:
+            return
+        resultados = fifo.consumir_fifo_batch(
+            [ServicioMovimientosBatch._operacion_salida(l) for l in salidas],
+            commit=False,
+        )
+        for linea, resultado in zip(salidas, resultados):
+            linea.resultado_fifo = {
+                "lotes_afectados": len(resultado.lotes_afectados),
+                "cantidad_faltante": resultado.cantidad_faltante,
+            }
+
+    @staticmethod
+    def actualizar_stock(deltas: Dict[int, Decimal]):
+        """
+        Suma deltas a Inventario.stock_actual con una sola sentencia:
+        WITH v(id, delta) AS (VALUES ...) UPDATE inventario ... FROM v
+
+        Funciona en PostgreSQL y SQLite >= 3.33 (UPDATE ... FROM).
+        """
+        deltas = {i: d for i, d in deltas.items() if d}
+        if not deltas:
+            return
+
+        parametros: Dict[str, Any] = {"ahora": datetime.now(timezone.utc)}
+        tipos = [bindparam("ahora", type_=db.DateTime)]
+        valores = []
+        for n, (inventario_id, delta) in enumerate(sorted(deltas.items())):
+            parametros[f"id_{n}"] = inventario_id
+            parametros[f"delta_{n}"] = Decimal(delta)
+            tipos.append(bindparam(f"delta_{n}", type_=db.Numeric(14, 4)))
+            valores.append(f"(CAST(:id_{n} AS INTEGER), CAST(:delta_{n} AS NUMERIC))")
+
+        db.session.execute(
+            text(
+                f"WITH v(id, delta) AS (VALUES {', '.join(valores)}) "
+                "UPDATE inventario SET stock_actual = stock_actual + v.delta, "
+                "fecha_actualizacion = :ahora "
+                "FROM v WHERE inventario.id = v.id"
+            ).bindparams(*tipos),
+            parametros,
+        )
+
+        registrar_invalidacion(deltas)
+
+        # Los artículos ya cargados en la sesión quedan desactualizados
+        for inventario_id in deltas:
+            articulo = db.session.identity_map.get(
+                identity_key(Inventario, inventario_id)
+            )
+            if articulo is not None:
+                db.session.expire(articulo)
+
+    @staticmethod
+    def procesar(
+        movimientos: List[Dict[str, Any]],
+        modo: str = "todo_o_nada",
+        fifo: Optional[FIFOOptimizado] = None,
+    ) -> Dict[str, Any]:
+        """
+        Procesa un lote de movimientos de entrada/salida con un solo commit.
+
+        Las entradas se aplican antes que las salidas del mismo batch, de modo
+        que una salida puede consumir un lote que entra en el mismo batch.
+
+        Args:
+            movimientos: Lista de dicts con inventario_id, cantidad,
+                tipo_movimiento y los campos opcionales de crear_movimiento
+            modo: "todo_o_nada" o "por_fila" (ver MODOS_BATCH)
+            fifo: Instancia de FIFOOptimizado a usar para las salidas
+
+        Returns:
+            dict: total_procesados, exitosos, errores y resultados por línea
+        """
+        if modo not in MODOS_BATCH:
+            raise ValueError(f"Modo de batch desconocido: {modo}")
+        fifo = fifo or FIFOOptimizado()
+
+        ids = set()
+        for datos in movimientos:
+            try:
+                ids.add(int(datos["inventario_id"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        def ejecutar():
+            # Una sola consulta para todos los artículos implicados
+            articulos = {
+                a.id: a for a in Inventario.query.filter(Inventario.id.in_(ids))
+            }
+            lineas, errores = ServicioMovimientosBatch._validar(movimientos, articulos)
+            if modo == "todo_o_nada" and errores:
+                for linea in lineas:
+                    errores[linea.indice] = "Batch anulado por errores en otras líneas"
+                return [], errores
+
+            if lineas:
+                ahora = datetime.now(timezone.utc)
+                ServicioMovimientosBatch._insertar_movimientos(lineas, ahora)
+                if modo == "todo_o_nada":
+                    ServicioMovimientosBatch._crear_lotes(
+                        [l for l in lineas if l.es_entrada], ahora
+                    )
+                    ServicioMovimientosBatch._consumir_salidas(
+                        [l for l in lineas if not l.es_entrada], fifo
+                    )
+                else:
+                    lineas = ServicioMovimientosBatch._procesar_por_fila(
+                        lineas, errores, fifo, ahora
+                    )
+
+                deltas: Dict[int, Decimal] = {}
+                for linea in lineas:
+                    deltas[linea.inventario_id] = (
+                        deltas.get(linea.inventario_id, Decimal("0"))
+                        + linea.delta_stock
+                    )
+                ServicioMovimientosBatch.actualizar_stock(deltas)
+
+            return lineas, errores
+
+        lineas, errores = ServicioFIFO.ejecutar_en_transaccion(ejecutar)
+        fifo.invalidar_cache(ids)
+
+        resultados = []
+        for linea in lineas:
+            resultado = {
+                "index": linea.indice,
+                "success": True,
+                "movimiento_id": linea.movimiento_id,
+                "lote_id": linea.lote_id,
+            }
+            resultado.update(linea.resultado_fifo)
+            resultados.append(resultado)
+        for indice, error in errores.items():
+            resultados.append({"index": indice, "success": False, "error": error})
+        resultados.sort(key=lambda r: r["index"])
+
+        return {
+            "modo": modo,
+            "total_procesados": len(movimientos),
+            "exitosos": len(lineas),
+            "errores": len(errores),
+            "resultados": resultados,
+        }
+
+    @staticmethod
+    def _procesar_por_fila(lineas, errores, fifo, ahora):
+        """
+        Aplica cada línea en su propio SAVEPOINT. Los movimientos de todas las
+        líneas ya están insertados (eso abre la transacción antes del primer
+        SAVEPOINT, necesario en SQLite); los de las líneas que fallan se
+        eliminan al final con un único DELETE.
+        """
+        correctas, fallidas = [], []
+        for linea in lineas:
+            try:
+                with db.session.begin_nested():
+                    if linea.es_entrada:
+                        ServicioMovimientosBatch._crear_lotes([linea], ahora)
+                    else:
+                        ServicioMovimientosBatch._consumir_salidas([linea], fifo)
+                correctas.append(linea)
+            except Exception as e:
+                # Los conflictos de concurrencia repiten la transacción completa
+                if es_conflicto_concurrencia(e):
+                    raise
+                logger.warning(f"Movimiento {linea.indice} descartado: {str(e)}")
+                errores[linea.indice] = str(e)
+                fallidas.append(linea.movimiento_id)
+
+        if fallidas:
+            db.session.execute(
+                MovimientoInventario.__table__.delete().where(
+                    MovimientoInventario.id.in_(fallidas)
+                )
+            )
+        return correctas
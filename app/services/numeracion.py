@@ -0,0 +1,197 @@
+"""
+Numeración sin colisiones de órdenes, solicitudes, planes y artículos
+
+Cada serie ("OT", "SOL-2026", "PM-2026", "categoria-3") es un contador
+que solo avanza:
+
+- PostgreSQL: una secuencia por serie (nextval no bloquea a otras
+  transacciones y nunca repite un número, aunque deja huecos si la
+  transacción se deshace). La secuencia se crea fuera de la transacción
+  en curso, de modo que sobrevive aunque esta se deshaga.
+- Otros motores: una fila de la tabla contador que se incrementa con
+  UPDATE ... RETURNING dentro de la transacción en curso (sin commit).
+
+La primera vez que se usa una serie se inicializa con el último número ya
+existente en las tablas (función `inicial`), así que no se repiten códigos
+generados con el método anterior. Los generadores por lotes reservan un
+bloque de números con una sola sentencia (reservar).
+"""
+
+import re
+from datetime import datetime
+
+from sqlalchemy import exc
+
+from app.extensions import db
+from app.models.contador import Contador
+
+_secuencias_creadas = set()
+
+
+def _nombre_secuencia(clave):
+    return "numeracion_" + re.sub(r"[^a-z0-9]+", "_", clave.lower())
+
+
+def _valor_inicial(inicial):
+    valor = inicial() if callable(inicial) else inicial
+    return int(valor or 0)
+
+
+def _crear_secuencia(engine, nombre, inicio):
+    """
+    Crea la secuencia en una conexión propia en autocommit: dentro de la
+    transacción del llamador desaparecería si esta se deshace, y
+    _secuencias_creadas ya la daría por existente.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        try:
+            conexion.execute(
+                db.text(f"CREATE SEQUENCE IF NOT EXISTS {nombre} START WITH {inicio}")
+            )
+        except (exc.IntegrityError, exc.ProgrammingError):
+            pass  # Otro proceso la creó a la vez
+
+
+def _reservar_secuencia(conexion, clave, cantidad, inicial):
+    nombre = _nombre_secuencia(clave)
+    if nombre not in _secuencias_creadas:
+        _crear_secuencia(conexion.engine, nombre, _valor_inicial(inicial) + 1)
+        _secuencias_creadas.add(nombre)
+    filas = conexion.execute(
+        db.text("SELECT nextval(:secuencia) FROM generate_series(1, :cantidad)"),
+        {"secuencia": nombre, "cantidad": cantidad},
+    )
+    return sorted(fila[0] for fila in filas)
+
+
+def _reservar_contador(conexion, clave, cantidad, inicial):
+    tabla = Contador.__table__
+    incremento = (
+        tabla.update()
+        .where(tabla.c.clave == clave)
+        .values(valor=tabla.c.valor + cantidad)
+    )
+    if conexion.dialect.update_returning:
+        ultimo = conexion.execute(incremento.returning(tabla.c.valor)).scalar()
+    elif conexion.execute(incremento).rowcount:
+        ultimo = conexion.execute(
+            db.select(tabla.c.valor).where(tabla.c.clave == clave)
+        ).scalar()
+    else:
+        ultimo = None
+
+    if ultimo is None:
+        ultimo = _valor_inicial(inicial) + cantidad
+        try:
+            with db.session.begin_nested():
+                conexion.execute(tabla.insert().values(clave=clave, valor=ultimo))
+        except exc.IntegrityError:
+            # Otro proceso inicializó la serie: repetir el incremento
+            return _reservar_contador(conexion, clave, cantidad, None)
+    return list(range(ultimo - cantidad + 1, ultimo + 1))
+
+
+def reservar(clave, cantidad, inicial=None):
+    """
+    Reserva `cantidad` números consecutivos de una serie (en PostgreSQL,
+    distintos y crecientes pero no necesariamente consecutivos).
+
+    Args:
+        clave: Nombre de la serie
+        cantidad: Números a reservar
+        inicial: Último número ya usado (o función que lo calcula) si la
+            serie aún no existe
+
+    Returns:
+        List[int]: Números reservados, de menor a mayor
+    """
+    if cantidad <= 0:
+        return []
+    conexion = db.session.connection()
+    if conexion.dialect.name == "postgresql":
+        return _reservar_secuencia(conexion, clave, cantidad, inicial)
+    return _reservar_contador(conexion, clave, cantidad, inicial)
+
+
+def siguiente(clave, inicial=None):
+    """Siguiente número de una serie (ver reservar)"""
+    return reservar(clave, 1, inicial)[0]
+
+
+def _ultimo_numero(codigos):
+    """Mayor sufijo numérico de una lista de códigos con guiones"""
+    numeros = []
+    for codigo in codigos:
+        try:
+            numeros.append(int(str(codigo).rsplit("-", 1)[-1]))
+        except (TypeError, ValueError):
+            continue
+    return max(numeros, default=0)
+
+
+# Series de la aplicación
+
+
+def _inicial_ordenes():
+    from app.models.orden_trabajo import OrdenTrabajo
+
+    maximo_id = db.session.query(db.func.max(OrdenTrabajo.id)).scalar() or 0
+    recientes = (
+        db.session.query(OrdenTrabajo.numero_orden)
+        .filter(OrdenTrabajo.numero_orden.like("OT-%"))
+        .order_by(OrdenTrabajo.id.desc())
+        .limit(100)
+    )
+    return max(maximo_id, _ultimo_numero(n for (n,) in recientes))
+
+
+def numeros_orden(cantidad):
+    """Bloque de números de orden OT-NNNNNN para generadores por lotes"""
+    return [f"OT-{n:06d}" for n in reservar("OT", cantidad, _inicial_ordenes)]
+
+
+def numero_orden():
+    return numeros_orden(1)[0]
+
+
+def numero_solicitud(año=None):
+    """SOL-YYYY-NNNN, con la numeración reiniciada cada año"""
+    from app.models.solicitud_servicio import SolicitudServicio
+
+    año = año or datetime.now().year
+    prefijo = f"SOL-{año}-"
+
+    def inicial():
+        ultima = (
+            db.session.query(SolicitudServicio.numero_solicitud)
+            .filter(SolicitudServicio.numero_solicitud.like(f"{prefijo}%"))
+            .order_by(SolicitudServicio.id.desc())
+            .first()
+        )
+        return _ultimo_numero(ultima or ())
+
+    return f"{prefijo}{siguiente(f'SOL-{año}', inicial):04d}"
+
+
+def codigo_plan(año=None):
+    """PM-YYYY-NNNN, con la numeración reiniciada cada año"""
+    from app.models.plan_mantenimiento import PlanMantenimiento
+
+    año = año or datetime.now().year
+    prefijo = f"PM-{año}-"
+
+    def inicial():
+        ultimo = (
+            db.session.query(PlanMantenimiento.codigo_plan)
+            .filter(PlanMantenimiento.codigo_plan.like(f"{prefijo}%"))
+            .order_by(PlanMantenimiento.codigo_plan.desc())
+            .first()
+        )
+        return _ultimo_numero(ultimo or ())
+
+    return f"{prefijo}{siguiente(f'PM-{año}', inicial):04d}"
+
+
+def numero_categoria(categoria):
+    """Siguiente número de artículo de una categoría (empieza en ultimo_numero)"""
+    return siguiente(f"categoria-{categoria.id}", categoria.ultimo_numero or 0)
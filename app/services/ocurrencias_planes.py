@@ -0,0 +1,55 @@
+"""
+Mantenimiento incremental de plan_ocurrencia
+
+Los planes creados, borrados o con cambios en su frecuencia, estado o
+próxima ejecución se detectan en after_flush y sus filas se regeneran en la
+misma transacción con PlanOcurrencia.regenerar (un DELETE y un INSERT para
+todos los planes del flush). Las escrituras con Core sobre
+plan_mantenimiento deben llamar a PlanOcurrencia.regenerar por su cuenta.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.models.plan_ocurrencia import PlanOcurrencia
+
+# Atributos que cambian las fechas de un plan
+CAMPOS_PLANIFICACION = (
+    "estado",
+    "proxima_ejecucion",
+    "frecuencia",
+    "tipo_frecuencia",
+    "intervalo_semanas",
+    "dias_semana",
+    "tipo_mensual",
+    "dia_mes",
+    "semana_mes",
+    "dia_semana_mes",
+    "intervalo_meses",
+)
+
+
+def _replanificado(plan):
+    return any(
+        attributes.get_history(plan, campo).has_changes()
+        for campo in CAMPOS_PLANIFICACION
+    )
+
+
+def _al_hacer_flush(sesion, contexto):
+    planes = [p for p in sesion.new if isinstance(p, PlanMantenimiento)]
+    planes += [
+        p
+        for p in sesion.dirty
+        if isinstance(p, PlanMantenimiento) and _replanificado(p)
+    ]
+    borrados = [p.id for p in sesion.deleted if isinstance(p, PlanMantenimiento)]
+    if planes or borrados:
+        PlanOcurrencia.regenerar(planes, borrados, sesion.connection())
+
+
+def instalar_ocurrencias_planes():
+    """Registra el evento de sesión (idempotente)"""
+    if not event.contains(Session, "after_flush", _al_hacer_flush):
+        event.listen(Session, "after_flush", _al_hacer_flush)
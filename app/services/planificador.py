@@ -0,0 +1,668 @@
+"""
+Planificador de trabajos en segundo plano
+
+Saca de las peticiones HTTP los procesos largos (generación de órdenes de
+los planes, conteos aleatorios, avance del horizonte de plan_ocurrencia y
+purga de ejecuciones antiguas) y los ejecuta con una programación tipo cron:
+cada trabajo a una hora del día, cada N minutos o solo a petición.
+
+- Un único líder: todos los procesos pueden tener el hilo, pero solo el que
+  obtiene CerrojoLider (cerrojo consultivo de PostgreSQL o flock sobre un
+  archivo local con SQLite) ejecuta trabajos. Si el líder muere el cerrojo
+  se libera y otro proceso toma el relevo en el siguiente ciclo.
+- Exactamente una vez por franja: cada ejecución es una fila de
+  ejecucion_trabajo con (trabajo, programado_para) único, y se reclama con
+  un UPDATE condicionado al número de intentos leído.
+- Progreso y reanudación: la función del trabajo recibe un ContextoTrabajo
+  y confirma cada lote con contexto.avanzar(procesados, cursor). Una
+  ejecución en error o cuyo latido caduca se reintenta desde el cursor.
+
+Modos (PLANIFICADOR_MODO): "proceso" ejecuta los trabajos en un hilo de
+cada worker del servidor web, "externo" los deja a scripts/planificador.py
+(los workers solo encolan) y "desactivado" ejecuta la generación dentro de
+la petición como antes. En modo "proceso" create_app solo registra el
+planificador: el hilo lo arranca el servidor (post_worker_init de gunicorn o
+run.py), nunca flask db, los scripts ni el maestro de gunicorn.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.ejecucion_trabajo import (
+    COMPLETADO,
+    EN_CURSO,
+    ERROR,
+    PENDIENTE,
+    EjecucionTrabajo,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock, un solo proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Clave del cerrojo consultivo de PostgreSQL ("GMAO" en ASCII)
+CLAVE_CERROJO_PG = 0x474D414F
+
+MODOS = ("proceso", "externo", "desactivado")
+
+# Conexiones con cerrojo heredadas de un fork: no se cierran en el hijo
+# (cerrarlas terminaría la sesión del padre sobre el mismo socket)
+_conexiones_heredadas = []
+
+
+class CerrojoLider:
+    """
+    Liderazgo entre procesos, sin bloquear. En PostgreSQL es
+    pg_try_advisory_lock sobre una conexión propia fuera del pool (el
+    servidor lo suelta si el proceso muere); en otros motores, flock sobre
+    `ruta`, suficiente porque con SQLite todos los procesos están en la
+    misma máquina.
+    """
+
+    def __init__(self, engine=None, ruta=None):
+        self.engine = engine
+        self.ruta = ruta
+        self._conexion = None
+        self._archivo = None
+
+    @property
+    def usa_postgresql(self):
+        return self.engine is not None and self.engine.dialect.name == "postgresql"
+
+    @property
+    def es_lider(self):
+        return self._conexion is not None or self._archivo is not None
+
+    def adquirir(self):
+        """Intenta ser (o comprueba que sigue siendo) el líder"""
+        if self.usa_postgresql:
+            return self._adquirir_pg()
+        return self._adquirir_archivo()
+
+    def _adquirir_pg(self):
+        if self._conexion is not None:
+            try:
+                self._conexion.execute(text("SELECT 1"))
+                self._conexion.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Conexión del cerrojo del planificador perdida: {e}")
+                self._conexion.invalidate()
+                self._conexion.close()
+                self._conexion = None
+        conexion = self.engine.connect()
+        try:
+            obtenido = conexion.execute(
+                text("SELECT pg_try_advisory_lock(:clave)"),
+                {"clave": CLAVE_CERROJO_PG},
+            ).scalar()
+            conexion.commit()
+        except Exception:
+            conexion.close()
+            raise
+        if not obtenido:
+            conexion.close()
+            return False
+        self._conexion = conexion
+        return True
+
+    def _adquirir_archivo(self):
+        if self._archivo is not None:
+            return True
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        archivo = open(self.ruta, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                archivo.close()
+                return False
+        self._archivo = archivo
+        return True
+
+    def liberar(self):
+        if self._conexion is not None:
+            try:
+                self._conexion.execute(
+                    text("SELECT pg_advisory_unlock(:clave)"),
+                    {"clave": CLAVE_CERROJO_PG},
+                )
+                self._conexion.commit()
+            except Exception:
+                self._conexion.invalidate()
+            self._conexion.close()
+            self._conexion = None
+        if self._archivo is not None:
+            if fcntl is not None:
+                fcntl.flock(self._archivo, fcntl.LOCK_UN)
+            self._archivo.close()
+            self._archivo = None
+
+    def _tras_fork(self):
+        # El cerrojo sigue siendo del padre: el hijo solo suelta sus referencias
+        # (cerrar el descriptor no libera un flock que el padre mantiene)
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+        if self._conexion is not None:
+            _conexiones_heredadas.append(self._conexion)
+            self._conexion = None
+
+
+@dataclass
+class Trabajo:
+    """
+    Trabajo del planificador. `funcion(contexto)` devuelve un dict
+    serializable con el resultado; `hora` ("HH:MM", diaria) o `cada_minutos`
+    fijan la programación y sin ninguno solo se ejecuta a petición.
+    """
+
+    nombre: str
+    funcion: Callable
+    hora: Optional[str] = None
+    cada_minutos: Optional[int] = None
+    descripcion: str = ""
+
+    def franja(self, ahora):
+        """Última franja programada ya alcanzada (None si es a petición)"""
+        if self.hora:
+            horas, minutos = (int(parte) for parte in self.hora.split(":"))
+            franja = ahora.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+            return franja if franja <= ahora else franja - timedelta(days=1)
+        if self.cada_minutos:
+            medianoche = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+            minutos = (ahora - medianoche) // timedelta(minutes=self.cada_minutos)
+            return medianoche + timedelta(minutes=minutos * self.cada_minutos)
+        return None
+
+
+class ContextoTrabajo:
+    """Lo que recibe la función de un trabajo: su ejecución, el lote y el cursor"""
+
+    def __init__(self, ejecucion, lote, config):
+        self.ejecucion = ejecucion
+        self.lote = lote
+        self.config = config
+
+    @property
+    def cursor(self):
+        """Cursor del último lote confirmado (None si empieza de cero)"""
+        return json.loads(self.ejecucion.cursor) if self.ejecucion.cursor else None
+
+    @property
+    def solicitado_por(self):
+        return self.ejecucion.solicitado_por
+
+    def avanzar(self, procesados=0, cursor=None, total=None):
+        """Confirma el lote: suma los procesados, guarda cursor y latido (commit)"""
+        ejecucion = self.ejecucion
+        ejecucion.procesados = (ejecucion.procesados or 0) + procesados
+        if cursor is not None:
+            ejecucion.cursor = json.dumps(cursor)
+        if total is not None:
+            ejecucion.total = total
+        ejecucion.latido = datetime.now()
+        db.session.commit()
+
+
+# --- Trabajos ---------------------------------------------------------------
+
+
+def _generar_ordenes(contexto):
+    """Órdenes de los planes vencidos con generación automática, por lotes de id"""
+    from app.controllers.planes_controller import generar_ordenes_automaticas
+    from app.models.control_generacion import ControlGeneracion
+
+    cursor = contexto.cursor or {"plan_id": None, "ordenes_generadas": 0}
+    while True:
+        resultado = generar_ordenes_automaticas(
+            despues_de_id=cursor["plan_id"], limite=contexto.lote
+        )
+        if not resultado.get("success"):
+            raise RuntimeError(resultado.get("error", "Error generando órdenes"))
+        cursor = {
+            "plan_id": resultado["ultimo_plan_id"],
+            "ordenes_generadas": cursor["ordenes_generadas"]
+            + resultado["ordenes_generadas"],
+        }
+        contexto.avanzar(resultado["planes_revisados"], cursor)
+        if resultado["planes_revisados"] < contexto.lote:
+            break
+
+    ControlGeneracion.registrar_generacion(
+        "automatico",
+        cursor["ordenes_generadas"],
+        contexto.solicitado_por,
+        {"ejecucion_id": contexto.ejecucion.id},
+    )
+    return {"ordenes_generadas": cursor["ordenes_generadas"]}
+
+
+def _generar_ordenes_manuales(contexto):
+    """Órdenes de todos los planes activos vencidos (botón de generación manual)"""
+    from app.controllers.planes_controller import generar_ordenes_manuales
+
+    resultado = generar_ordenes_manuales(contexto.solicitado_por or "Sistema")
+    if not resultado.get("success"):
+        raise RuntimeError(resultado.get("error", "Error generando órdenes"))
+    contexto.avanzar(resultado["ordenes_generadas"])
+    return {
+        "ordenes_generadas": resultado["ordenes_generadas"],
+        "detalles": resultado["detalles"],
+    }
+
+
+def _conteos_aleatorios(contexto):
+    """Conteos aleatorios de inventario para el control continuo"""
+    from app.controllers.inventario_controller import generar_conteos_aleatorios
+
+    conteos = generar_conteos_aleatorios(contexto.config["PLANIFICADOR_CONTEOS"])
+    contexto.avanzar(len(conteos))
+    return {"conteos_creados": len(conteos)}
+
+
+def _horizonte_planes(contexto):
+    """Quita de plan_ocurrencia las fechas pasadas y avanza el horizonte un día"""
+    from app.models.plan_ocurrencia import PlanOcurrencia
+
+    filas = PlanOcurrencia.regenerar_todo()
+    contexto.avanzar(filas)
+    return {"ocurrencias": filas}
+
+
+def _purgar_ejecuciones(contexto):
+    """Borra las ejecuciones terminadas hace más de PLANIFICADOR_RETENCION_DIAS"""
+    limite = datetime.now() - timedelta(
+        days=contexto.config["PLANIFICADOR_RETENCION_DIAS"]
+    )
+    borradas = EjecucionTrabajo.query.filter(
+        EjecucionTrabajo.estado.in_([COMPLETADO, ERROR]),
+        EjecucionTrabajo.fin < limite,
+    ).delete(synchronize_session=False)
+    contexto.avanzar(borradas)
+    return {"ejecuciones_borradas": borradas}
+
+
+def crear_trabajos(config):
+    """Trabajos con la programación de la configuración ("" = solo a petición)"""
+    trabajos = [
+        Trabajo(
+            "generar_ordenes",
+            _generar_ordenes,
+            hora=config.get("PLANIFICADOR_HORA_ORDENES") or None,
+            descripcion="Órdenes de planes con generación automática",
+        ),
+        Trabajo(
+            "generar_ordenes_manuales",
+            _generar_ordenes_manuales,
+            descripcion="Órdenes de todos los planes vencidos",
+        ),
+        Trabajo(
+            "conteos_aleatorios",
+            _conteos_aleatorios,
+            hora=config.get("PLANIFICADOR_HORA_CONTEOS") or None,
+            descripcion="Conteos aleatorios de inventario",
+        ),
+        Trabajo(
+            "horizonte_planes",
+            _horizonte_planes,
+            hora=config.get("PLANIFICADOR_HORA_HORIZONTE") or None,
+            descripcion="Avance del horizonte de ejecuciones de planes",
+        ),
+        Trabajo(
+            "purgar_ejecuciones",
+            _purgar_ejecuciones,
+            hora=config.get("PLANIFICADOR_HORA_PURGA") or None,
+            descripcion="Purga de ejecuciones antiguas",
+        ),
+    ]
+    return {trabajo.nombre: trabajo for trabajo in trabajos}
+
+
+# --- Planificador -------------------------------------------------------------
+
+
+class Planificador:
+    """
+    Hilo que cada `intervalo` segundos intenta ser líder y, si lo es, crea
+    las ejecuciones de las franjas vencidas y ejecuta las pendientes, las
+    caducadas y las fallidas con intentos restantes, de una en una.
+    """
+
+    def __init__(
+        self,
+        app,
+        trabajos,
+        cerrojo,
+        intervalo=30.0,
+        lote=200,
+        caducidad=600,
+        espera_reintento=300,
+        max_intentos=3,
+    ):
+        self.app = app
+        self.trabajos = trabajos
+        self.cerrojo = cerrojo
+        self.intervalo = intervalo
+        self.lote = lote
+        # Segundos sin latido tras los que una ejecución en curso se da por muerta
+        self.caducidad = caducidad
+        self.espera_reintento = espera_reintento
+        self.max_intentos = max_intentos
+        self.nodo = f"{socket.gethostname()}:{os.getpid()}"
+        self.habilitado = False
+        self._hilo = None
+        self._parar = threading.Event()
+        self._aviso = threading.Event()
+
+    # Ciclo
+
+    def ciclo(self, ahora=None):
+        """
+        Un paso del planificador.
+
+        Returns:
+            list: Ejecuciones procesadas (vacía si este proceso no es líder)
+        """
+        if not self.cerrojo.adquirir():
+            return []
+        with self.app.app_context():
+            try:
+                self.programar(ahora)
+                return self.ejecutar_pendientes(ahora)
+            finally:
+                db.session.remove()
+
+    def programar(self, ahora=None):
+        """Crea la ejecución de la franja vencida de cada trabajo programado"""
+        ahora = ahora or datetime.now()
+        creadas = 0
+        for trabajo in self.trabajos.values():
+            franja = trabajo.franja(ahora)
+            if franja is None:
+                continue
+            existe = (
+                db.session.query(EjecucionTrabajo.id)
+                .filter_by(trabajo=trabajo.nombre, programado_para=franja)
+                .first()
+            )
+            if existe:
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(
+                        EjecucionTrabajo(
+                            trabajo=trabajo.nombre,
+                            programado_para=franja,
+                            estado=PENDIENTE,
+                        )
+                    )
+                creadas += 1
+            except IntegrityError:
+                pass  # Otro proceso ya creó la franja
+        db.session.commit()
+        return creadas
+
+    def ejecutar_pendientes(self, ahora=None):
+        ahora = ahora or datetime.now()
+        caducada = ahora - timedelta(seconds=self.caducidad)
+        reintento = ahora - timedelta(seconds=self.espera_reintento)
+        # Estado e intentos leídos ahora: el UPDATE de _reclamar los exige
+        candidatas = (
+            db.session.query(
+                EjecucionTrabajo.id, EjecucionTrabajo.estado, EjecucionTrabajo.intentos
+            )
+            .filter(
+                EjecucionTrabajo.trabajo.in_(list(self.trabajos)),
+                db.or_(
+                    EjecucionTrabajo.estado == PENDIENTE,
+                    db.and_(
+                        EjecucionTrabajo.estado == EN_CURSO,
+                        EjecucionTrabajo.latido < caducada,
+                    ),
+                    db.and_(
+                        EjecucionTrabajo.estado == ERROR,
+                        EjecucionTrabajo.intentos < self.max_intentos,
+                        EjecucionTrabajo.fin < reintento,
+                    ),
+                ),
+            )
+            .order_by(EjecucionTrabajo.programado_para, EjecucionTrabajo.id)
+            .all()
+        )
+        procesadas = []
+        for id, estado, intentos in candidatas:
+            if self._parar.is_set() or not self.cerrojo.adquirir():
+                break
+            ejecucion = self.ejecutar(id, estado, intentos)
+            if ejecucion is not None:
+                procesadas.append(ejecucion)
+        return procesadas
+
+    def _reclamar(self, id, estado, intentos):
+        """Pasa la ejecución a en_curso si nadie la reclamó antes (un UPDATE)"""
+        ahora = datetime.now()
+        tabla = EjecucionTrabajo.__table__
+        reclamada = db.session.execute(
+            tabla.update()
+            .where(
+                tabla.c.id == id,
+                tabla.c.estado == estado,
+                tabla.c.intentos == intentos,
+            )
+            .values(
+                estado=EN_CURSO,
+                inicio=db.func.coalesce(tabla.c.inicio, ahora),
+                latido=ahora,
+                intentos=tabla.c.intentos + 1,
+                nodo=self.nodo,
+                error=None,
+            )
+        ).rowcount
+        db.session.commit()
+        return reclamada == 1
+
+    def ejecutar(self, id, estado, intentos):
+        """
+        Ejecuta (o reanuda desde su cursor) una ejecución vista con ese
+        estado e intentos.
+
+        Returns:
+            EjecucionTrabajo: La ejecución terminada, o None si otro proceso
+            la reclamó primero
+        """
+        if not self._reclamar(id, estado, intentos):
+            return None
+        ejecucion = db.session.get(EjecucionTrabajo, id)
+        trabajo = self.trabajos[ejecucion.trabajo]
+        contexto = ContextoTrabajo(ejecucion, self.lote, self.app.config)
+        logger.info(f"Ejecutando {ejecucion.trabajo} (ejecución {ejecucion.id})")
+        try:
+            resultado = trabajo.funcion(contexto)
+        except Exception as e:
+            logger.exception(f"Error en el trabajo {ejecucion.trabajo}")
+            db.session.rollback()
+            ejecucion.estado = ERROR
+            ejecucion.error = str(e)[:2000]
+            ejecucion.fin = datetime.now()
+            db.session.commit()
+            db.session.refresh(ejecucion)
+            return ejecucion
+
+        ejecucion.estado = COMPLETADO
+        ejecucion.resultado = json.dumps(resultado, default=str)
+        ejecucion.fin = ejecucion.latido = datetime.now()
+        db.session.commit()
+        # Cargada para poder leerla fuera de la sesión (ciclo la cierra)
+        db.session.refresh(ejecucion)
+        return ejecucion
+
+    # Hilo
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        self.habilitado = True
+        if self.activo:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="planificador", daemon=True
+        )
+        self._hilo.start()
+
+    def despertar(self):
+        """Adelanta el siguiente ciclo (p. ej. tras encolar una ejecución)"""
+        self._aviso.set()
+
+    def detener(self):
+        """
+        Para el hilo. El cerrojo lo suelta el propio hilo al salir: si está
+        ejecutando un trabajo, otro proceso no toma el relevo hasta que
+        termine.
+        """
+        self.habilitado = False
+        self._parar.set()
+        self._aviso.set()
+        if self._hilo is None:
+            self.cerrojo.liberar()
+            return
+        self._hilo.join(self.intervalo + 1)
+        if self._hilo.is_alive():
+            logger.warning("El planificador soltará el cerrojo al acabar el trabajo")
+            return
+        self._hilo = None
+
+    def _bucle(self):
+        try:
+            while not self._parar.is_set():
+                self._aviso.wait(self.intervalo)
+                self._aviso.clear()
+                if self._parar.is_set():
+                    break
+                try:
+                    self.ciclo()
+                except Exception as e:
+                    logger.warning(f"Error en el ciclo del planificador: {e}")
+        finally:
+            self.cerrojo.liberar()
+
+    def _tras_fork(self):
+        # El hilo no pasa al hijo y el cerrojo sigue siendo del padre; el
+        # hijo no arranca el suyo salvo que se lo pidan (post_worker_init)
+        self.habilitado = False
+        self._hilo = None
+        self._parar = threading.Event()
+        self._aviso = threading.Event()
+        self.nodo = f"{socket.gethostname()}:{os.getpid()}"
+        self.cerrojo._tras_fork()
+
+
+_planificador = None
+
+
+def _tras_fork():
+    if _planificador is not None:
+        _planificador._tras_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_tras_fork)
+
+
+def crear_planificador(app):
+    """Planificador con los trabajos, cerrojo y parámetros de la configuración"""
+    with app.app_context():
+        engine = db.engine
+    return Planificador(
+        app,
+        crear_trabajos(app.config),
+        CerrojoLider(engine, app.config["PLANIFICADOR_CERROJO"]),
+        intervalo=app.config["PLANIFICADOR_SEGUNDOS"],
+        lote=app.config["PLANIFICADOR_LOTE"],
+    )
+
+
+def registrar_planificador(app):
+    """Crea el planificador de este proceso sin arrancar su hilo (modo "proceso")"""
+    global _planificador
+    if _planificador is not None:
+        _planificador.detener()
+    _planificador = crear_planificador(app)
+    return _planificador
+
+
+def iniciar_planificador():
+    """
+    Arranca el hilo del planificador registrado. Solo lo llama el servidor
+    web: post_worker_init de gunicorn en cada worker, o run.py.
+    """
+    if _planificador is not None:
+        _planificador.iniciar()
+    return _planificador
+
+
+def obtener_planificador():
+    return _planificador
+
+
+def en_segundo_plano(app):
+    """
+    ¿Los trabajos largos se encolan en lugar de ejecutarse en la petición?
+    En modo "proceso", solo si este proceso tiene el hilo en marcha: sin él
+    (otro servidor, flask shell) se sigue generando en la petición.
+    """
+    modo = app.config.get("PLANIFICADOR_MODO")
+    if modo == "proceso":
+        return _planificador is not None and _planificador.activo
+    return modo == "externo"
+
+
+def encolar(nombre, solicitado_por=None, config=None):
+    """
+    Solicita una ejecución inmediata de un trabajo. Si ya hay una pendiente
+    o en curso, devuelve esa en lugar de crear otra.
+
+    Returns:
+        tuple: (EjecucionTrabajo, creada)
+    """
+    from flask import current_app
+
+    if nombre not in crear_trabajos(config or current_app.config):
+        raise ValueError(f"Trabajo desconocido: {nombre}")
+    existente = (
+        EjecucionTrabajo.query.filter(
+            EjecucionTrabajo.trabajo == nombre,
+            EjecucionTrabajo.estado.in_([PENDIENTE, EN_CURSO]),
+        )
+        .order_by(EjecucionTrabajo.id)
+        .first()
+    )
+    if existente:
+        return existente, False
+    ejecucion = EjecucionTrabajo(
+        trabajo=nombre,
+        programado_para=datetime.now(),
+        estado=PENDIENTE,
+        solicitado_por=solicitado_por,
+    )
+    db.session.add(ejecucion)
+    db.session.commit()
+    if _planificador is not None:
+        _planificador.despertar()
+    return ejecucion, True
@@ -7,15 +7,162 @@ from app.extensions import db
 from app.models.inventario import Inventario
 from app.models.lote_inventario import LoteInventario, MovimientoLote
 from app.models.movimiento_inventario import MovimientoInventario
+from app.models.stock_resumen import StockResumen
+from app.utils.metricas_multiproceso import incrementar as incrementar_metrica
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import List, Tuple, Optional
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Callable, List, Tuple, Optional, TypeVar
 import logging
+import random
+import time
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Estrategias de bloqueo para consumos y reservas concurrentes:
+# - optimista: sin bloqueo de lectura; la columna version de LoteInventario
+#   detecta escrituras concurrentes y la operación se repite
+# - pesimista: SELECT ... FOR UPDATE sobre los lotes del artículo
+# - skip_locked: FOR UPDATE SKIP LOCKED, salta los lotes que otra transacción
+#   está usando (más throughput, orden FIFO relajado)
+# Las dos últimas solo existen en PostgreSQL; en otros motores se usa "optimista".
+ESTRATEGIAS_BLOQUEO = ("optimista", "pesimista", "skip_locked")
+
+# SQLSTATE de PostgreSQL que indican conflicto entre transacciones
+_SQLSTATES_CONFLICTO = {"40001", "40P01", "55P03"}
+
+
+class ConflictoConcurrenciaFIFO(RuntimeError):
+    """Se agotaron los reintentos por modificaciones concurrentes de lotes"""
+
+
+def es_conflicto_concurrencia(error: Exception) -> bool:
+    """Indica si el error se debe a otra transacción que modificó los mismos datos"""
+    if isinstance(error, (StaleDataError, ConflictoConcurrenciaFIFO)):
+        return True
+    if isinstance(error, DBAPIError):
+        sqlstate = getattr(error.orig, "sqlstate", None) or getattr(
+            error.orig, "pgcode", None
+        )
+        if sqlstate in _SQLSTATES_CONFLICTO:
+            return True
+        # SQLite serializa las escrituras con un bloqueo de base de datos
+        return "database is locked" in str(error.orig).lower()
+    return False
+
+
+def _contar_operacion(operacion: str, cantidad: int = 1):
+    """Contador multiproceso de operaciones FIFO (expuesto en /metrics)"""
+    incrementar_metrica(
+        "gmao_fifo_operations_total", {"operation": operacion}, cantidad
+    )
+
+
+def _esperar_reintento(intento: int):
+    """Espera aleatoria creciente para no repetir el choque con la otra transacción"""
+    time.sleep(random.uniform(0, min(0.2, 0.005 * 2**intento)))
+
 
 class ServicioFIFO:
+    @staticmethod
+    def estrategia_bloqueo(bloqueo: Optional[str] = None) -> str:
+        """
+        Estrategia de bloqueo efectiva para una operación.
+
+        Args:
+            bloqueo: Estrategia pedida; si es None se usa FIFO_BLOQUEO
+
+        Returns:
+            str: "optimista", "pesimista" o "skip_locked"
+        """
+        estrategia = bloqueo or current_app.config.get("FIFO_BLOQUEO", "optimista")
+        if estrategia not in ESTRATEGIAS_BLOQUEO:
+            raise ValueError(f"Estrategia de bloqueo desconocida: {estrategia}")
+
+        if (
+            estrategia != "optimista"
+            and db.session.get_bind().dialect.name != "postgresql"
+        ):
+            return "optimista"
+        return estrategia
+
+    @staticmethod
+    def _ejecutar_con_reintentos(operacion: Callable[[], T], estrategia: str) -> T:
+        """
+        Ejecuta una operación sobre lotes dentro de la transacción actual.
+
+        En modo optimista sobre PostgreSQL la operación se aísla en un
+        SAVEPOINT y se repite (hasta FIFO_MAX_REINTENTOS veces) si el control
+        de versión detecta que otro proceso modificó alguno de sus lotes.
+        En SQLite los conflictos aparecen como bloqueo de la base de datos y
+        solo pueden resolverse repitiendo la transacción completa, ver
+        ejecutar_en_transaccion.
+        """
+        if (
+            estrategia != "optimista"
+            or db.session.get_bind().dialect.name != "postgresql"
+        ):
+            return operacion()
+
+        max_reintentos = current_app.config.get("FIFO_MAX_REINTENTOS", 5)
+        for intento in range(1, max_reintentos + 1):
+            try:
+                with db.session.begin_nested():
+                    return operacion()
+            except StaleDataError as e:
+                if intento == max_reintentos:
+                    raise ConflictoConcurrenciaFIFO(
+                        f"Lotes modificados concurrentemente tras {intento} intentos"
+                    ) from e
+                logger.info(f"Conflicto de versión en lotes, reintento {intento}")
+                incrementar_metrica("gmao_fifo_retries_total", {"scope": "savepoint"})
+                _esperar_reintento(intento)
+
+    @staticmethod
+    def ejecutar_en_transaccion(
+        operacion: Callable[[], T], max_reintentos: Optional[int] = None
+    ) -> T:
+        """
+        Ejecuta operacion() y confirma la transacción, repitiendo el bloque
+        completo si falla por una modificación concurrente de los mismos lotes.
+
+        Pensado para el nivel más alto (rutas, scripts, tareas): cualquier
+        otro error se propaga tras hacer rollback.
+
+        Args:
+            operacion: Función sin argumentos que realiza los cambios
+            max_reintentos: Intentos máximos (por defecto FIFO_MAX_REINTENTOS)
+
+        Returns:
+            El valor devuelto por operacion()
+
+        Raises:
+            ConflictoConcurrenciaFIFO: Si el conflicto persiste tras los reintentos
+        """
+        max_reintentos = max_reintentos or current_app.config.get(
+            "FIFO_MAX_REINTENTOS", 5
+        )
+        for intento in range(1, max_reintentos + 1):
+            try:
+                resultado = operacion()
+                db.session.commit()
+                return resultado
+            except Exception as e:
+                db.session.rollback()
+                if not es_conflicto_concurrencia(e):
+                    raise
+                if intento == max_reintentos:
+                    raise ConflictoConcurrenciaFIFO(
+                        f"Transacción FIFO abortada tras {intento} intentos: {e}"
+                    ) from e
+                logger.info(f"Conflicto de concurrencia FIFO, reintento {intento}")
+                incrementar_metrica("gmao_fifo_retries_total", {"scope": "transaction"})
+                _esperar_reintento(intento)
+
     @staticmethod
     def consumir_fifo(
         inventario_id: int,
@@ -24,6 +171,7 @@ class ServicioFIFO:
         documento_referencia: Optional[str] = None,
         usuario_id: Optional[str] = None,
         observaciones: Optional[str] = None,
+        bloqueo: Optional[str] = None,
     ) -> Tuple[List[Tuple[LoteInventario, float]], float]:
         """
         Consume stock siguiendo FIFO (First In, First Out).
@@ -35,6 +183,7 @@ class ServicioFIFO:
             documento_referencia: Documento de referencia
             usuario_id: ID del usuario que realiza el consumo
             observaciones: Observaciones adicionales
+            bloqueo: Estrategia de bloqueo (ver ESTRATEGIAS_BLOQUEO)
 
         Returns:
             Tuple[List[Tuple[LoteInventario, float]], float]:
@@ -48,43 +197,62 @@ class ServicioFIFO:
                     f"Artículo de inventario {inventario_id} no encontrado"
                 )
 
-            # Obtener lotes disponibles ordenados por FIFO
-            lotes_consumo, cantidad_faltante = LoteInventario.obtener_lotes_fifo(
-                inventario_id, cantidad_total
-            )
+            estrategia = ServicioFIFO.estrategia_bloqueo(bloqueo)
 
-            if cantidad_faltante > 0:
-                logger.warning(
-                    f"Stock insuficiente para artículo {inventario_id}: "
-                    f"solicitado {cantidad_total}, faltante {cantidad_faltante}"
+            def consumir():
+                # Obtener lotes disponibles ordenados por FIFO
+                lotes_consumo, cantidad_faltante = LoteInventario.obtener_lotes_fifo(
+                    inventario_id,
+                    cantidad_total,
+                    bloqueo=None if estrategia == "optimista" else estrategia,
                 )
 
-            # Registrar consumos
-            consumos_realizados = []
-            for lote, cantidad_a_consumir in lotes_consumo:
-                cantidad_consumida = lote.consumir(cantidad_a_consumir)
-
-                if cantidad_consumida > 0:
-                    # Registrar el movimiento del lote
-                    movimiento_lote = MovimientoLote(
-                        lote_id=lote.id,
-                        orden_trabajo_id=orden_trabajo_id,
-                        tipo_movimiento="consumo",
-                        cantidad=Decimal(str(cantidad_consumida)),
-                        documento_referencia=documento_referencia,
-                        observaciones=observaciones,
-                        usuario_id=usuario_id,
-                    )
-                    db.session.add(movimiento_lote)
-
-                    consumos_realizados.append((lote, cantidad_consumida))
-
-                    logger.info(
-                        f"Consumido {cantidad_consumida} del lote {lote.id} "
-                        f"(queda {lote.cantidad_actual})"
+                if cantidad_faltante > 0:
+                    logger.warning(
+                        f"Stock insuficiente para artículo {inventario_id}: "
+                        f"solicitado {cantidad_total}, faltante {cantidad_faltante}"
                     )
 
-            return consumos_realizados, cantidad_faltante
+                # Registrar consumos
+                consumos_realizados = []
+                cambios_stock = {}
+                for lote, cantidad_a_consumir in lotes_consumo:
+                    cantidad_consumida = lote.consumir(cantidad_a_consumir)
+
+                    if cantidad_consumida > 0:
+                        StockResumen.acumular(
+                            cambios_stock,
+                            lote.inventario_id,
+                            lote.precio_unitario,
+                            actual=-cantidad_consumida,
+                            numero_lotes=-1 if lote.esta_agotado else 0,
+                        )
+
+                        # Registrar el movimiento del lote
+                        movimiento_lote = MovimientoLote(
+                            lote_id=lote.id,
+                            orden_trabajo_id=orden_trabajo_id,
+                            tipo_movimiento="consumo",
+                            cantidad=Decimal(str(cantidad_consumida)),
+                            documento_referencia=documento_referencia,
+                            observaciones=observaciones,
+                            usuario_id=usuario_id,
+                        )
+                        db.session.add(movimiento_lote)
+
+                        consumos_realizados.append((lote, cantidad_consumida))
+
+                        logger.info(
+                            f"Consumido {cantidad_consumida} del lote {lote.id} "
+                            f"(queda {lote.cantidad_actual})"
+                        )
+
+                StockResumen.aplicar_cambios(cambios_stock)
+                return consumos_realizados, cantidad_faltante
+
+            resultado = ServicioFIFO._ejecutar_con_reintentos(consumir, estrategia)
+            _contar_operacion("consumo")
+            return resultado
 
         except Exception as e:
             logger.error(f"Error al consumir FIFO: {str(e)}")
@@ -148,7 +316,17 @@ class ServicioFIFO:
                 observaciones=observaciones,
             )
             db.session.add(lote)
+            StockResumen.aplicar_cambios(
+                StockResumen.acumular(
+                    {},
+                    inventario_id,
+                    lote.precio_unitario,
+                    actual=cantidad,
+                    numero_lotes=1,
+                )
+            )
             db.session.commit()
+            _contar_operacion("entrada")
             return lote
 
         except Exception as e:
@@ -163,6 +341,7 @@ class ServicioFIFO:
         documento_referencia: Optional[str] = None,
         usuario_id: Optional[str] = None,
         observaciones: Optional[str] = None,
+        bloqueo: Optional[str] = None,
     ) -> Tuple[List[Tuple[LoteInventario, float]], float]:
         """
         Reserva stock siguiendo FIFO sin consumirlo inmediatamente.
@@ -174,43 +353,62 @@ class ServicioFIFO:
             documento_referencia: Documento de referencia
             usuario_id: ID del usuario que realiza la reserva
             observaciones: Observaciones adicionales
+            bloqueo: Estrategia de bloqueo (ver ESTRATEGIAS_BLOQUEO)
 
         Returns:
             Tuple[List[Tuple[LoteInventario, float]], float]:
             Lista de (lote, cantidad_reservada) y cantidad no disponible
         """
         try:
-            # Obtener lotes disponibles ordenados por FIFO
-            lotes_reserva, cantidad_faltante = LoteInventario.obtener_lotes_fifo(
-                inventario_id, cantidad_total
-            )
-
-            # Registrar reservas
-            reservas_realizadas = []
-            for lote, cantidad_a_reservar in lotes_reserva:
-                cantidad_reservada = lote.reservar(cantidad_a_reservar)
-
-                if cantidad_reservada > 0:
-                    # Registrar el movimiento del lote
-                    movimiento_lote = MovimientoLote(
-                        lote_id=lote.id,
-                        orden_trabajo_id=orden_trabajo_id,
-                        tipo_movimiento="reserva",
-                        cantidad=Decimal(str(cantidad_reservada)),
-                        documento_referencia=documento_referencia,
-                        observaciones=observaciones,
-                        usuario_id=usuario_id,
-                    )
-                    db.session.add(movimiento_lote)
-
-                    reservas_realizadas.append((lote, cantidad_reservada))
-
-                    logger.info(
-                        f"Reservado {cantidad_reservada} del lote {lote.id} "
-                        f"(disponible {lote.cantidad_disponible})"
-                    )
+            estrategia = ServicioFIFO.estrategia_bloqueo(bloqueo)
+
+            def reservar():
+                # Obtener lotes disponibles ordenados por FIFO
+                lotes_reserva, cantidad_faltante = LoteInventario.obtener_lotes_fifo(
+                    inventario_id,
+                    cantidad_total,
+                    bloqueo=None if estrategia == "optimista" else estrategia,
+                )
 
-            return reservas_realizadas, cantidad_faltante
+                # Registrar reservas
+                reservas_realizadas = []
+                cambios_stock = {}
+                for lote, cantidad_a_reservar in lotes_reserva:
+                    cantidad_reservada = lote.reservar(cantidad_a_reservar)
+
+                    if cantidad_reservada > 0:
+                        StockResumen.acumular(
+                            cambios_stock,
+                            lote.inventario_id,
+                            lote.precio_unitario,
+                            reservado=cantidad_reservada,
+                        )
+
+                        # Registrar el movimiento del lote
+                        movimiento_lote = MovimientoLote(
+                            lote_id=lote.id,
+                            orden_trabajo_id=orden_trabajo_id,
+                            tipo_movimiento="reserva",
+                            cantidad=Decimal(str(cantidad_reservada)),
+                            documento_referencia=documento_referencia,
+                            observaciones=observaciones,
+                            usuario_id=usuario_id,
+                        )
+                        db.session.add(movimiento_lote)
+
+                        reservas_realizadas.append((lote, cantidad_reservada))
+
+                        logger.info(
+                            f"Reservado {cantidad_reservada} del lote {lote.id} "
+                            f"(disponible {lote.cantidad_disponible})"
+                        )
+
+                StockResumen.aplicar_cambios(cambios_stock)
+                return reservas_realizadas, cantidad_faltante
+
+            resultado = ServicioFIFO._ejecutar_con_reintentos(reservar, estrategia)
+            _contar_operacion("reserva")
+            return resultado
 
         except Exception as e:
             logger.error(f"Error al reservar stock: {str(e)}")
@@ -234,53 +432,104 @@ class ServicioFIFO:
             List[Tuple[LoteInventario, float]]: Lista de (lote, cantidad_liberada)
         """
         try:
-            # Buscar movimientos de reserva pendientes
-            movimientos_reserva = MovimientoLote.query.filter_by(
-                orden_trabajo_id=orden_trabajo_id, tipo_movimiento="reserva"
-            ).all()
-
-            liberaciones_realizadas = []
-
-            for movimiento in movimientos_reserva:
-                lote = movimiento.lote
-                cantidad_liberada = lote.liberar_reserva(float(movimiento.cantidad))
-
-                if cantidad_liberada > 0:
-                    # Registrar la liberación
-                    movimiento_liberacion = MovimientoLote(
-                        lote_id=lote.id,
-                        orden_trabajo_id=orden_trabajo_id,
-                        tipo_movimiento="liberacion",
-                        cantidad=Decimal(str(cantidad_liberada)),
-                        observaciones=observaciones,
-                        usuario_id=usuario_id,
-                    )
-                    db.session.add(movimiento_liberacion)
-
-                    liberaciones_realizadas.append((lote, cantidad_liberada))
-
-                    logger.info(
-                        f"Liberado {cantidad_liberada} del lote {lote.id} "
-                        f"para orden {orden_trabajo_id}"
-                    )
 
-            return liberaciones_realizadas
+            def liberar():
+                # Buscar movimientos de reserva pendientes
+                movimientos_reserva = MovimientoLote.query.filter_by(
+                    orden_trabajo_id=orden_trabajo_id, tipo_movimiento="reserva"
+                ).all()
+
+                liberaciones_realizadas = []
+                cambios_stock = {}
+
+                for movimiento in movimientos_reserva:
+                    lote = movimiento.lote
+                    cantidad_liberada = lote.liberar_reserva(float(movimiento.cantidad))
+
+                    if cantidad_liberada > 0:
+                        # El resumen solo cuenta lotes consumibles
+                        if lote.activo and not lote.esta_agotado:
+                            StockResumen.acumular(
+                                cambios_stock,
+                                lote.inventario_id,
+                                lote.precio_unitario,
+                                reservado=-cantidad_liberada,
+                            )
+
+                        # Registrar la liberación
+                        movimiento_liberacion = MovimientoLote(
+                            lote_id=lote.id,
+                            orden_trabajo_id=orden_trabajo_id,
+                            tipo_movimiento="liberacion",
+                            cantidad=Decimal(str(cantidad_liberada)),
+                            observaciones=observaciones,
+                            usuario_id=usuario_id,
+                        )
+                        db.session.add(movimiento_liberacion)
+
+                        liberaciones_realizadas.append((lote, cantidad_liberada))
+
+                        logger.info(
+                            f"Liberado {cantidad_liberada} del lote {lote.id} "
+                            f"para orden {orden_trabajo_id}"
+                        )
+
+                StockResumen.aplicar_cambios(cambios_stock)
+                return liberaciones_realizadas
+
+            resultado = ServicioFIFO._ejecutar_con_reintentos(liberar, "optimista")
+            _contar_operacion("liberacion")
+            return resultado
 
         except Exception as e:
             logger.error(f"Error al liberar reservas: {str(e)}")
             raise
 
     @staticmethod
-    def obtener_stock_disponible(inventario_id: int) -> dict:
+    def obtener_resumen_stock(inventario_id: int) -> dict:
+        """
+        Totales de stock de un artículo leídos de stock_resumen (una lectura
+        por clave primaria, sin recorrer los lotes).
+
+        Args:
+            inventario_id: ID del artículo de inventario
+
+        Returns:
+            dict: total_actual, total_reservado, total_disponible,
+            numero_lotes, valor_fifo y proximo_vencimiento
+        """
+        resumen = db.session.get(StockResumen, inventario_id)
+        if resumen is None:
+            # Artículo sin resumen todavía: se calcula sin guardarlo
+            fila = StockResumen.agregados_lotes([inventario_id]).first()
+            resumen = StockResumen(
+                inventario_id=inventario_id,
+                total_actual=fila.total_actual if fila else 0,
+                total_reservado=fila.total_reservado if fila else 0,
+                numero_lotes=fila.numero_lotes if fila else 0,
+                valor_fifo=fila.valor_fifo if fila else 0,
+                proximo_vencimiento=fila.proximo_vencimiento if fila else None,
+            )
+        return resumen.to_dict()
+
+    @staticmethod
+    def obtener_stock_disponible(
+        inventario_id: int, incluir_lotes: bool = True
+    ) -> dict:
         """
         Obtiene información detallada del stock disponible por lotes.
 
         Args:
             inventario_id: ID del artículo de inventario
+            incluir_lotes: Si False, devuelve solo los totales desde
+                stock_resumen (ver obtener_resumen_stock)
 
         Returns:
             dict: Información detallada del stock
         """
+        if not incluir_lotes:
+            return ServicioFIFO.obtener_resumen_stock(inventario_id)
+
         try:
             lotes = (
                 LoteInventario.query.filter_by(inventario_id=inventario_id, activo=True)
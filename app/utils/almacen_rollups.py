@@ -0,0 +1,344 @@
+"""
+Historial de rendimiento en disco con agregación 1m -> 1h -> 1d
+
+Cada operación (función monitorizada o endpoint) se guarda como cubetas de
+un minuto con conteo, suma, errores, máximo y el Histograma de latencias.
+Los registros se añaden al final de segmentos JSON Lines por resolución
+(<dir>/1m/<inicio>.jsonl: un segmento por día en 1m, por 30 días en 1h y
+por año en 1d); nunca se reescriben. Varios workers pueden escribir el
+mismo minuto de la misma operación: al leer se suman.
+
+Compactar (un único proceso a la vez, con flock no bloqueante) agrega los
+minutos de las horas ya cerradas en registros de 1h y las horas de los días
+cerrados en 1d, guardando en <dir>/<resolución>/.marca hasta dónde llegó,
+y borra los segmentos que superan la retención de su resolución.
+
+EscritorRollups es el hilo que, cada pocos segundos, vuelca los minutos
+cerrados que le entrega la aplicación y compacta.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from app.utils.histograma import Histograma
+from app.utils.series_temporales import Cubeta
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# resolución -> (ancho de cubeta, ancho de segmento, retención) en segundos
+RESOLUCIONES = {
+    "1m": (60, 86400, 7 * 86400),
+    "1h": (3600, 30 * 86400, 180 * 86400),
+    "1d": (86400, 365 * 86400, 5 * 365 * 86400),
+}
+COMPACTACIONES = (("1m", "1h"), ("1h", "1d"))
+
+
+def _a_registro(t, operacion, cubeta):
+    return {
+        "t": t,
+        "op": operacion,
+        "n": cubeta.total,
+        "s": cubeta.suma,
+        "e": cubeta.errores,
+        "m": cubeta.maximo,
+        "b": cubeta.histograma.cubetas if cubeta.histograma is not None else {},
+    }
+
+
+def _a_cubeta(registro):
+    return Cubeta.desde_dict(
+        {
+            "epoch": registro["t"],
+            "count": registro["n"],
+            "sum": registro["s"],
+            "errors": registro["e"],
+            "max": registro["m"],
+            "buckets": registro["b"],
+        }
+    )
+
+
+def _resumen(cubeta):
+    histograma = cubeta.histograma or Histograma()
+    return {
+        "count": cubeta.total,
+        "errors": cubeta.errores,
+        "avg": cubeta.suma / cubeta.total if cubeta.total else 0.0,
+        "max": cubeta.maximo,
+        "p50": histograma.percentil(50),
+        "p95": histograma.percentil(95),
+        "p99": histograma.percentil(99),
+    }
+
+
+class _Cerrojo:
+    """flock sobre un archivo; bloqueante o no"""
+
+    def __init__(self, ruta, bloqueante=True):
+        self.ruta = ruta
+        self.bloqueante = bloqueante
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.ruta, "a")
+        if fcntl is None:
+            return True
+        modo = fcntl.LOCK_EX if self.bloqueante else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._f, modo)
+        except BlockingIOError:
+            return False
+        return True
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+
+
+class AlmacenRollups:
+    """Segmentos append-only por resolución en un directorio"""
+
+    def __init__(self, directorio, retraso_compactacion=180):
+        self.directorio = directorio
+        # Margen para minutos que otros workers aún no han volcado
+        self.retraso_compactacion = retraso_compactacion
+        for resolucion in RESOLUCIONES:
+            os.makedirs(os.path.join(directorio, resolucion), exist_ok=True)
+
+    def _ruta_segmento(self, resolucion, t):
+        ancho_segmento = RESOLUCIONES[resolucion][1]
+        inicio = t // ancho_segmento * ancho_segmento
+        return os.path.join(self.directorio, resolucion, f"{inicio}.jsonl")
+
+    def _segmentos(self, resolucion):
+        """(inicio, ruta) de los segmentos existentes, ordenados"""
+        carpeta = os.path.join(self.directorio, resolucion)
+        segmentos = []
+        for nombre in os.listdir(carpeta):
+            if nombre.endswith(".jsonl") and nombre[:-6].isdigit():
+                segmentos.append((int(nombre[:-6]), os.path.join(carpeta, nombre)))
+        return sorted(segmentos)
+
+    # Escritura
+
+    def anadir(self, resolucion, registros):
+        """Añade registros {t, op, n, s, e, m, b} al final de sus segmentos"""
+        por_segmento = {}
+        for registro in registros:
+            ruta = self._ruta_segmento(resolucion, registro["t"])
+            linea = json.dumps(registro, separators=(",", ":"))
+            por_segmento.setdefault(ruta, []).append(linea)
+        for ruta, lineas in por_segmento.items():
+            with _Cerrojo(ruta + ".lock"):
+                with open(ruta, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lineas) + "\n")
+
+    def anadir_minutos(self, minutos):
+        """minutos: [(operación, Cubeta con época en minutos)]"""
+        self.anadir(
+            "1m",
+            [_a_registro(cubeta.epoca * 60, op, cubeta) for op, cubeta in minutos],
+        )
+
+    # Lectura
+
+    def _leer(self, resolucion, desde, hasta, operacion=None):
+        """Cubetas por (t, operación) en [desde, hasta), sumando duplicados"""
+        ancho_segmento = RESOLUCIONES[resolucion][1]
+        filtro = None
+        if operacion is not None:
+            filtro = '"op":' + json.dumps(operacion, separators=(",", ":")) + ","
+        resultado = {}
+        for inicio, ruta in self._segmentos(resolucion):
+            if inicio + ancho_segmento <= desde or inicio >= hasta:
+                continue
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    for linea in f:
+                        if filtro is not None and filtro not in linea:
+                            continue
+                        try:
+                            registro = json.loads(linea)
+                        except ValueError:
+                            continue  # Línea a medio escribir
+                        if not desde <= registro["t"] < hasta:
+                            continue
+                        clave = (registro["t"], registro["op"])
+                        cubeta = _a_cubeta(registro)
+                        if clave in resultado:
+                            resultado[clave].fusionar(cubeta)
+                        else:
+                            resultado[clave] = cubeta
+            except FileNotFoundError:
+                continue
+        return resultado
+
+    @staticmethod
+    def resolucion_para(desde, hasta):
+        duracion = hasta - desde
+        if duracion <= 12 * 3600:
+            return "1m"
+        if duracion <= 31 * 86400:
+            return "1h"
+        return "1d"
+
+    def consultar(self, operacion, desde, hasta, resolucion=None):
+        """Puntos de una operación entre dos instantes (epoch en segundos)"""
+        resolucion = resolucion or self.resolucion_para(desde, hasta)
+        cubetas = self._leer(resolucion, desde, hasta, operacion)
+        return [dict(_resumen(cubetas[clave]), t=clave[0]) for clave in sorted(cubetas)]
+
+    def agregado(self, operacion, desde, hasta):
+        """Resumen de todo un intervalo con la resolución más fina disponible"""
+        total = Cubeta(0, con_histograma=True)
+        for resolucion in ("1m", "1h", "1d"):
+            retencion = RESOLUCIONES[resolucion][2]
+            if desde >= time.time() - retencion or resolucion == "1d":
+                for cubeta in self._leer(resolucion, desde, hasta, operacion).values():
+                    total.fusionar(cubeta)
+                break
+        return _resumen(total)
+
+    def operaciones(self, desde, hasta):
+        # Todas las resoluciones: lo reciente aún no está compactado en las
+        # gruesas y lo antiguo ya no está en las finas
+        return sorted(
+            {
+                op
+                for resolucion in RESOLUCIONES
+                for _, op in self._leer(resolucion, desde, hasta)
+            }
+        )
+
+    # Compactación y retención
+
+    def _ruta_marca(self, resolucion):
+        return os.path.join(self.directorio, resolucion, ".marca")
+
+    def _leer_marca(self, resolucion):
+        try:
+            with open(self._ruta_marca(resolucion), "r") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _escribir_marca(self, resolucion, t):
+        temporal = self._ruta_marca(resolucion) + ".tmp"
+        with open(temporal, "w") as f:
+            f.write(str(t))
+        os.replace(temporal, self._ruta_marca(resolucion))
+
+    def compactar(self, ahora=None):
+        """
+        Agrega las cubetas finas de los intervalos gruesos ya cerrados.
+        Devuelve False si otro proceso está compactando.
+        """
+        ahora = time.time() if ahora is None else ahora
+        with _Cerrojo(
+            os.path.join(self.directorio, ".compactar.lock"), bloqueante=False
+        ) as obtenido:
+            if not obtenido:
+                return False
+            for fina, gruesa in COMPACTACIONES:
+                self._compactar(fina, gruesa, ahora)
+            self._aplicar_retencion(ahora)
+        return True
+
+    def _compactar(self, fina, gruesa, ahora):
+        ancho = RESOLUCIONES[gruesa][0]
+        limite = int(ahora - self.retraso_compactacion) // ancho * ancho
+        marca = self._leer_marca(gruesa)
+        if marca is None:
+            segmentos = self._segmentos(fina)
+            if not segmentos:
+                return
+            marca = segmentos[0][0] // ancho * ancho
+        if limite <= marca:
+            return
+
+        agregadas = {}
+        for (t, operacion), cubeta in self._leer(fina, marca, limite).items():
+            clave = (t // ancho * ancho, operacion)
+            if clave in agregadas:
+                agregadas[clave].fusionar(cubeta)
+            else:
+                cubeta.epoca = clave[0]
+                agregadas[clave] = cubeta
+        self.anadir(
+            gruesa,
+            [_a_registro(t, op, agregadas[(t, op)]) for t, op in sorted(agregadas)],
+        )
+        self._escribir_marca(gruesa, limite)
+
+    def _aplicar_retencion(self, ahora):
+        for resolucion, (_, ancho_segmento, retencion) in RESOLUCIONES.items():
+            for inicio, ruta in self._segmentos(resolucion):
+                if inicio + ancho_segmento < ahora - retencion:
+                    for archivo in (ruta, ruta + ".lock"):
+                        try:
+                            os.remove(archivo)
+                        except FileNotFoundError:
+                            pass
+
+
+class EscritorRollups:
+    """
+    Hilo que cada `intervalo` segundos pide a `extraer(forzar)` los minutos
+    cerrados [(operación, Cubeta)], los añade al almacén y compacta.
+    """
+
+    def __init__(self, almacen, extraer, intervalo=30.0):
+        self.almacen = almacen
+        self.extraer = extraer
+        self.intervalo = intervalo
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def volcar(self, forzar=False):
+        minutos = self.extraer(forzar)
+        if minutos:
+            self.almacen.anadir_minutos(minutos)
+        self.almacen.compactar()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        if self.activo:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="escritor-rollups", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(self.intervalo + 1)
+        self._hilo = None
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.volcar()
+            except Exception as e:
+                logger.warning(f"Error escribiendo el historial de rendimiento: {e}")
+
+    def _tras_fork(self):
+        estaba_activo = self._hilo is not None
+        self._hilo = None
+        self._parar = threading.Event()
+        if estaba_activo:
+            self.iniciar()
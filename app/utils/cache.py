@@ -0,0 +1,720 @@
+"""
+Caché de resultados en dos niveles
+
+- Nivel local: LRU acotado en memoria del proceso (rápido, por worker).
+- Nivel compartido (opcional): almacén común a todos los workers del host
+  (fichero SQLite) o de varios hosts (servidor compatible con Redis).
+
+Con nivel compartido, cada worker solo confía en su copia local durante
+CACHE_TTL_LOCAL segundos; pasado ese tiempo vuelve a leer del almacén común,
+de modo que un borrado hecho en un worker llega al resto en ese plazo. El
+almacén común guarda cada valor junto a sus etiquetas, y la copia local
+las conserva.
+
+Las entradas pueden registrar etiquetas (p. ej. "inventario:42",
+"inventario:list", "stats"); invalidar_tags elimina todas las entradas de
+una etiqueta con coste proporcional al número de etiquetas y claves
+afectadas, sin recorrer la caché.
+
+Para agregados caros, obtener_o_calcular coalesce los cálculos: cuando la
+entrada caduca, un solo llamador (por proceso y, con nivel compartido,
+entre workers) la recalcula mientras el resto recibe el valor anterior o
+espera al nuevo. Además puede refrescarse antes de caducar con probabilidad
+creciente según se acerca la expiración ("early probabilistic expiration").
+
+Configuración (app.config / variables de entorno):
+    CACHE_BACKEND       "memoria" (por defecto), "sqlite" o "redis"
+    CACHE_SQLITE_PATH   Ruta del fichero SQLite compartido
+    CACHE_REDIS_URL     URL del servidor Redis
+    CACHE_MAX_ENTRADAS  Máximo de entradas del nivel local
+    CACHE_MAX_BYTES     Máximo de bytes (valores serializados) del nivel local
+    CACHE_BARRIDO_SEGUNDOS  Intervalo del barrido de entradas caducadas
+    CACHE_TTL_LOCAL     Segundos que el nivel local sirve sin consultar el común
+"""
+
+import logging
+import math
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Marca de "no encontrado": None es un valor cacheable válido en los niveles
+AUSENTE = object()
+
+
+def tamano_valor(valor):
+    """Tamaño aproximado en bytes de un valor cacheado (serializado)"""
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(valor)
+
+
+class CacheLocal:
+    """
+    LRU en memoria con caducidad por entrada, seguro entre hilos.
+
+    Acotado por número de entradas y por bytes (tamaño serializado de los
+    valores). Las entradas caducadas se eliminan al leerlas y, además, con un
+    barrido completo cada intervalo_barrido segundos que se lanza desde las
+    propias escrituras (sin hilos: sobrevive al fork de gunicorn).
+    """
+
+    def __init__(
+        self, max_entradas=1000, max_bytes=64 * 1024 * 1024, intervalo_barrido=60
+    ):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.intervalo_barrido = intervalo_barrido
+        self._entradas = OrderedDict()  # clave -> (expira, valor, tags, bytes)
+        self._por_tag = {}  # tag -> {claves}
+        self._lock = threading.Lock()
+        self._proximo_barrido = time.time() + intervalo_barrido
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.expiradas = 0
+
+    def _quitar(self, clave):
+        """Elimina una entrada y su rastro en el índice de etiquetas (con lock)"""
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        self.bytes -= entrada[3]
+        for tag in entrada[2]:
+            claves = self._por_tag.get(tag)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_tag[tag]
+
+    def get(self, clave, ahora=None):
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return AUSENTE
+            if entrada[0] <= ahora:
+                self._quitar(clave)
+                self.expiradas += 1
+                self.fallos += 1
+                return AUSENTE
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def set(self, clave, valor, ttl, tags=()):
+        tags = tuple(tags)
+        tamano = tamano_valor(valor)
+        ahora = time.time()
+        with self._lock:
+            self._quitar(clave)
+            if tamano > self.max_bytes:
+                # Nunca cabría: no se expulsa el resto de la caché por ella
+                self.expulsiones += 1
+                return
+            self._entradas[clave] = (ahora + ttl, valor, tags, tamano)
+            self.bytes += tamano
+            for tag in tags:
+                self._por_tag.setdefault(tag, set()).add(clave)
+            if ahora >= self._proximo_barrido:
+                self._barrer(ahora)
+            while (
+                len(self._entradas) > self.max_entradas or self.bytes > self.max_bytes
+            ):
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+
+    def _barrer(self, ahora):
+        caducadas = [c for c, e in self._entradas.items() if e[0] <= ahora]
+        for clave in caducadas:
+            self._quitar(clave)
+        self.expiradas += len(caducadas)
+        self._proximo_barrido = ahora + self.intervalo_barrido
+        return len(caducadas)
+
+    def barrer(self):
+        """Elimina todas las entradas caducadas; devuelve cuántas"""
+        with self._lock:
+            return self._barrer(time.time())
+
+    def delete(self, clave):
+        with self._lock:
+            self._quitar(clave)
+
+    def invalidar_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for clave in list(self._por_tag.get(tag, ())):
+                    self._quitar(clave)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self._por_tag.clear()
+            self.bytes = 0
+
+    def contar_expiradas(self):
+        ahora = time.time()
+        with self._lock:
+            return sum(1 for entrada in self._entradas.values() if entrada[0] <= ahora)
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "ratio_aciertos": (
+                    round(self.aciertos / consultas, 4) if consultas else 0.0
+                ),
+                "expulsiones": self.expulsiones,
+                "expiradas": self.expiradas,
+            }
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class CacheCompartido(ABC):
+    """Interfaz del nivel compartido entre workers"""
+
+    nombre = "compartido"
+
+    @abstractmethod
+    def get(self, clave):
+        """Devuelve el valor o AUSENTE"""
+
+    @abstractmethod
+    def set(self, clave, valor, ttl, tags=()):
+        """Guarda el valor durante ttl segundos asociado a las etiquetas"""
+
+    @abstractmethod
+    def delete(self, clave):
+        """Elimina la clave si existe"""
+
+    @abstractmethod
+    def invalidar_tags(self, tags):
+        """Elimina las claves asociadas a cualquiera de las etiquetas"""
+
+    @abstractmethod
+    def clear(self):
+        """Elimina todas las claves de esta caché"""
+
+    def adquirir_bloqueo(self, clave, segundos):
+        """Intenta reservar el recálculo de una clave; True si lo consigue"""
+        return True
+
+    def liberar_bloqueo(self, clave):
+        """Libera la reserva de recálculo de una clave"""
+
+
+class CacheSQLite(CacheCompartido):
+    """
+    Nivel compartido en un fichero SQLite local (todos los workers del host).
+
+    Cada hilo de cada proceso abre su propia conexión; el fichero usa WAL para
+    que las lecturas no bloqueen a los escritores.
+    """
+
+    nombre = "sqlite"
+    PURGA_CADA = 200  # escrituras entre purgas de claves caducadas
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escrituras = 0
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " clave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira REAL NOT NULL)"
+        )
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS cache_tag ("
+            " tag TEXT NOT NULL, clave TEXT NOT NULL, PRIMARY KEY (tag, clave))"
+        )
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS cache_bloqueo ("
+            " clave TEXT PRIMARY KEY, expira REAL NOT NULL)"
+        )
+
+    def _conexion(self):
+        # Tras un fork (gunicorn preload_app) no se reutiliza la del padre
+        if getattr(self._local, "pid", None) != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return self._local.conexion
+
+    def get(self, clave):
+        fila = (
+            self._conexion()
+            .execute(
+                "SELECT valor FROM cache WHERE clave = ? AND expira > ?",
+                (clave, time.time()),
+            )
+            .fetchone()
+        )
+        return pickle.loads(fila[0]) if fila else AUSENTE
+
+    def set(self, clave, valor, ttl, tags=()):
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN")
+            conexion.execute(
+                "INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)",
+                (clave, pickle.dumps(valor), time.time() + ttl),
+            )
+            conexion.executemany(
+                "INSERT OR IGNORE INTO cache_tag (tag, clave) VALUES (?, ?)",
+                [(tag, clave) for tag in tags],
+            )
+        self._escrituras += 1
+        if self._escrituras % self.PURGA_CADA == 0:
+            self._purgar(conexion)
+
+    def _purgar(self, conexion):
+        with conexion:
+            conexion.execute("BEGIN")
+            conexion.execute("DELETE FROM cache WHERE expira <= ?", (time.time(),))
+            conexion.execute(
+                "DELETE FROM cache_tag WHERE clave NOT IN (SELECT clave FROM cache)"
+            )
+
+    def delete(self, clave):
+        self._conexion().execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+    def invalidar_tags(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        marcas = ", ".join("?" * len(tags))
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN")
+            conexion.execute(
+                "DELETE FROM cache WHERE clave IN ("
+                f" SELECT clave FROM cache_tag WHERE tag IN ({marcas}))",
+                tags,
+            )
+            conexion.execute(f"DELETE FROM cache_tag WHERE tag IN ({marcas})", tags)
+
+    def clear(self):
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN")
+            conexion.execute("DELETE FROM cache")
+            conexion.execute("DELETE FROM cache_tag")
+
+    def adquirir_bloqueo(self, clave, segundos):
+        ahora = time.time()
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            # Un bloqueo caducado (worker caído) deja de contar
+            conexion.execute(
+                "DELETE FROM cache_bloqueo WHERE clave = ? AND expira <= ?",
+                (clave, ahora),
+            )
+            cursor = conexion.execute(
+                "INSERT OR IGNORE INTO cache_bloqueo (clave, expira) VALUES (?, ?)",
+                (clave, ahora + segundos),
+            )
+            return cursor.rowcount == 1
+
+    def liberar_bloqueo(self, clave):
+        self._conexion().execute("DELETE FROM cache_bloqueo WHERE clave = ?", (clave,))
+
+
+class CacheRedis(CacheCompartido):
+    """
+    Nivel compartido en un servidor compatible con Redis.
+
+    Recibe cualquier cliente con get/set(ex=)/delete/scan_iter y
+    sadd/smembers/expire (índice de etiquetas), lo que permite sustituirlo
+    por un doble en los tests.
+    """
+
+    nombre = "redis"
+
+    def __init__(self, cliente, prefijo="gmao:cache:"):
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    @classmethod
+    def desde_url(cls, url, **kwargs):
+        import redis  # Dependencia opcional
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, clave):
+        valor = self.cliente.get(self.prefijo + clave)
+        return AUSENTE if valor is None else pickle.loads(valor)
+
+    def set(self, clave, valor, ttl, tags=()):
+        ttl = max(1, int(ttl))
+        self.cliente.set(self.prefijo + clave, pickle.dumps(valor), ex=ttl)
+        for tag in tags:
+            indice = self.prefijo + "tag:" + tag
+            self.cliente.sadd(indice, clave)
+            # El índice vive tanto como la entrada más duradera que contiene
+            if self.cliente.ttl(indice) < ttl:
+                self.cliente.expire(indice, ttl)
+
+    def delete(self, clave):
+        self.cliente.delete(self.prefijo + clave)
+
+    def invalidar_tags(self, tags):
+        for tag in tags:
+            indice = self.prefijo + "tag:" + tag
+            claves = self.cliente.smembers(indice)
+            self.cliente.delete(
+                indice,
+                *(
+                    self.prefijo + (c.decode() if isinstance(c, bytes) else c)
+                    for c in claves
+                ),
+            )
+
+    def clear(self):
+        claves = list(self.cliente.scan_iter(match=self.prefijo + "*"))
+        if claves:
+            self.cliente.delete(*claves)
+
+    def adquirir_bloqueo(self, clave, segundos):
+        return bool(
+            self.cliente.set(
+                self.prefijo + "lock:" + clave,
+                os.getpid(),
+                nx=True,
+                ex=max(1, int(math.ceil(segundos))),
+            )
+        )
+
+    def liberar_bloqueo(self, clave):
+        self.cliente.delete(self.prefijo + "lock:" + clave)
+
+
+class EntradaCalculada:
+    """Valor guardado por obtener_o_calcular con sus datos de refresco"""
+
+    __slots__ = ("valor", "expira", "duracion")
+
+    def __init__(self, valor, expira, duracion):
+        self.valor = valor
+        self.expira = expira  # Caducidad lógica (el dato se conserva después)
+        self.duracion = duracion  # Segundos que costó calcularlo
+
+    def __getstate__(self):
+        return (self.valor, self.expira, self.duracion)
+
+    def __setstate__(self, estado):
+        self.valor, self.expira, self.duracion = estado
+
+    def debe_refrescarse(self, ahora, beta):
+        """
+        Caducada, o refresco anticipado con probabilidad creciente
+        (XFetch: ahora - duracion * beta * ln(U) >= expira).
+        """
+        if ahora >= self.expira:
+            return True
+        if beta <= 0:
+            return False
+        return ahora - self.duracion * beta * math.log(random.random()) >= self.expira
+
+
+class CacheEscalonado:
+    """Caché local LRU con nivel compartido opcional detrás"""
+
+    # Espera máxima de un llamador sin valor previo mientras otro hilo o
+    # worker calcula
+    ESPERA_MAXIMA = 10.0
+
+    def __init__(self, local=None, compartido=None, ttl_local=5):
+        self.local = local if local is not None else CacheLocal()
+        self.compartido = compartido
+        self.ttl_local = ttl_local
+        self.aciertos_compartido = 0
+        self.fallos_compartido = 0
+        self.calculos = 0
+        self.valores_obsoletos_servidos = 0
+        # clave -> [Lock del cálculo en curso en este proceso, hilos que lo usan]
+        self._vuelos = {}
+        self._vuelos_lock = threading.Lock()
+
+    @property
+    def tipo(self):
+        if self.compartido is None:
+            return "memoria"
+        return f"memoria+{self.compartido.nombre}"
+
+    def _ttl_local(self, ttl):
+        return ttl if self.compartido is None else min(ttl, self.ttl_local)
+
+    def get(self, clave):
+        valor = self.local.get(clave)
+        if valor is not AUSENTE or self.compartido is None:
+            return valor
+        try:
+            valor, tags = self._get_compartido(clave)
+        except Exception as e:
+            logger.warning(f"Caché compartida no disponible (get): {e}")
+            return AUSENTE
+        if valor is AUSENTE:
+            self.fallos_compartido += 1
+        else:
+            self.aciertos_compartido += 1
+            # Con sus etiquetas: invalidar_tags en este worker también la borra
+            self.local.set(clave, valor, self.ttl_local, tags)
+        return valor
+
+    def _get_compartido(self, clave):
+        """(valor, tags) guardados en el nivel compartido o (AUSENTE, ())"""
+        guardado = self.compartido.get(clave)
+        if guardado is AUSENTE:
+            return AUSENTE, ()
+        return guardado
+
+    def set(self, clave, valor, ttl, tags=()):
+        tags = tuple(tags)
+        self.local.set(clave, valor, self._ttl_local(ttl), tags)
+        if self.compartido is not None:
+            try:
+                self.compartido.set(clave, (valor, tags), ttl, tags)
+            except Exception as e:
+                logger.warning(f"Caché compartida no disponible (set): {e}")
+
+    def invalidar_tags(self, tags):
+        tags = tuple(tags)
+        self.local.invalidar_tags(tags)
+        if self.compartido is not None:
+            try:
+                self.compartido.invalidar_tags(tags)
+            except Exception as e:
+                logger.warning(f"Caché compartida no disponible (tags): {e}")
+
+    def delete(self, clave):
+        self.local.delete(clave)
+        if self.compartido is not None:
+            try:
+                self.compartido.delete(clave)
+            except Exception as e:
+                logger.warning(f"Caché compartida no disponible (delete): {e}")
+
+    def obtener_o_calcular(
+        self, clave, calcular, ttl, tags=(), beta=1.0, ttl_obsoleto=None
+    ):
+        """
+        Devuelve (valor, desde_cache) calculando el valor una sola vez.
+
+        - Si hay una entrada vigente, se devuelve sin más (salvo que toque
+          refresco anticipado, ver EntradaCalculada.debe_refrescarse).
+        - Si hay que recalcular, solo un llamador lo hace: los hilos de este
+          proceso se coordinan con un lock por clave y los workers con el
+          bloqueo del nivel compartido. Quien no calcula recibe el valor
+          anterior si existe o espera al nuevo.
+        - El valor se conserva ttl_obsoleto segundos (por defecto ttl) más
+          allá de su caducidad para poder servirlo durante el recálculo.
+
+        Args:
+            clave: Clave de caché
+            calcular: Función sin argumentos que produce el valor
+            ttl: Vigencia del valor en segundos
+            tags: Etiquetas de invalidación
+            beta: Agresividad del refresco anticipado (0 lo desactiva)
+            ttl_obsoleto: Segundos extra que se conserva el valor caducado
+        """
+        entrada = self.get(clave)
+        if entrada is not AUSENTE and not isinstance(entrada, EntradaCalculada):
+            entrada = AUSENTE  # Clave escrita con set(): se recalcula
+        if entrada is not AUSENTE and not entrada.debe_refrescarse(time.time(), beta):
+            return entrada.valor, True
+
+        vuelo = self._entrar_vuelo(clave)
+        try:
+            if entrada is not AUSENTE:
+                # Hay valor que servir: si otro hilo ya recalcula, no esperar
+                if not vuelo.acquire(blocking=False):
+                    self.valores_obsoletos_servidos += 1
+                    return entrada.valor, True
+            elif vuelo.acquire(timeout=self.ESPERA_MAXIMA):
+                # Otro hilo pudo completar el cálculo mientras esperábamos
+                nueva = self.get(clave)
+                if isinstance(nueva, EntradaCalculada) and time.time() < nueva.expira:
+                    vuelo.release()
+                    return nueva.valor, True
+            else:
+                # El cálculo en curso no termina: calcular sin esperarlo más
+                return self._calcular_coordinado(
+                    clave, entrada, calcular, ttl, tags, ttl_obsoleto
+                )
+
+            try:
+                return self._calcular_coordinado(
+                    clave, entrada, calcular, ttl, tags, ttl_obsoleto
+                )
+            finally:
+                vuelo.release()
+        finally:
+            self._salir_vuelo(clave)
+
+    def _entrar_vuelo(self, clave):
+        """Lock del cálculo de la clave, anotando un hilo más que lo usa"""
+        with self._vuelos_lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is None:
+                vuelo = self._vuelos[clave] = [threading.Lock(), 0]
+            vuelo[1] += 1
+            return vuelo[0]
+
+    def _salir_vuelo(self, clave):
+        """Libera la entrada de la clave cuando ningún hilo la usa ya"""
+        with self._vuelos_lock:
+            vuelo = self._vuelos[clave]
+            vuelo[1] -= 1
+            if not vuelo[1]:
+                del self._vuelos[clave]
+
+    def _calcular_coordinado(self, clave, entrada, calcular, ttl, tags, ttl_obsoleto):
+        """Calcula con el bloqueo del nivel compartido (entre workers)"""
+        bloqueado = False
+        if self.compartido is not None:
+            try:
+                limite = time.monotonic() + self.ESPERA_MAXIMA
+                while not self.compartido.adquirir_bloqueo(clave, self.ESPERA_MAXIMA):
+                    if entrada is not AUSENTE:
+                        self.valores_obsoletos_servidos += 1
+                        return entrada.valor, True
+                    if time.monotonic() >= limite:
+                        break  # El otro worker no termina: calcular igualmente
+                    time.sleep(0.05)
+                    nueva, _ = self._get_compartido(clave)
+                    if isinstance(nueva, EntradaCalculada) and (
+                        time.time() < nueva.expira
+                    ):
+                        return nueva.valor, True
+                else:
+                    bloqueado = True
+            except Exception as e:
+                logger.warning(f"Caché compartida no disponible (bloqueo): {e}")
+
+        try:
+            inicio = time.perf_counter()
+            valor = calcular()
+            duracion = time.perf_counter() - inicio
+            self.calculos += 1
+            extra = ttl if ttl_obsoleto is None else ttl_obsoleto
+            self.set(
+                clave,
+                EntradaCalculada(valor, time.time() + ttl, duracion),
+                ttl + extra,
+                tags,
+            )
+            return valor, False
+        finally:
+            if bloqueado:
+                try:
+                    self.compartido.liberar_bloqueo(clave)
+                except Exception as e:
+                    logger.warning(f"Caché compartida no disponible (bloqueo): {e}")
+
+    def estadisticas(self):
+        """Contadores del nivel local y, si existe, del compartido"""
+        datos = self.local.estadisticas()
+        datos["tipo"] = self.tipo
+        datos["calculos"] = self.calculos
+        datos["valores_obsoletos_servidos"] = self.valores_obsoletos_servidos
+        if self.compartido is not None:
+            datos["aciertos_compartido"] = self.aciertos_compartido
+            datos["fallos_compartido"] = self.fallos_compartido
+        return datos
+
+    def clear(self):
+        self.local.clear()
+        if self.compartido is not None:
+            try:
+                self.compartido.clear()
+            except Exception as e:
+                logger.warning(f"Caché compartida no disponible (clear): {e}")
+
+
+def crear_cache(config):
+    """Construye la caché a partir de un mapeo de configuración"""
+    local = CacheLocal(
+        max_entradas=int(config.get("CACHE_MAX_ENTRADAS", 1000)),
+        max_bytes=int(config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        intervalo_barrido=float(config.get("CACHE_BARRIDO_SEGUNDOS", 60)),
+    )
+    backend = (config.get("CACHE_BACKEND") or "memoria").lower()
+    compartido = None
+
+    try:
+        if backend == "sqlite":
+            compartido = CacheSQLite(config["CACHE_SQLITE_PATH"])
+        elif backend == "redis":
+            compartido = CacheRedis.desde_url(config["CACHE_REDIS_URL"])
+        elif backend != "memoria":
+            logger.warning(f"CACHE_BACKEND desconocido: {backend}; se usa memoria")
+    except (ImportError, KeyError, OSError, sqlite3.Error) as e:
+        logger.warning(f"Caché compartida '{backend}' no disponible: {e}")
+
+    return CacheEscalonado(
+        local, compartido, ttl_local=float(config.get("CACHE_TTL_LOCAL", 5))
+    )
+
+
+_cache = CacheEscalonado()
+
+
+def obtener_cache():
+    """Devuelve la caché activa del proceso"""
+    return _cache
+
+
+# Etiquetas de invalidación de inventario
+TAG_LISTADO_INVENTARIO = "inventario:list"
+TAG_ESTADISTICAS = "stats"
+# Totales del listado de órdenes de trabajo
+TAG_LISTADO_ORDENES = "ordenes:list"
+
+
+def tag_inventario(inventario_id):
+    return f"inventario:{inventario_id}"
+
+
+def tags_inventario(inventario_ids):
+    """Etiquetas afectadas por un cambio de stock en los artículos dados"""
+    tags = {TAG_LISTADO_INVENTARIO, TAG_ESTADISTICAS}
+    tags.update(tag_inventario(i) for i in inventario_ids)
+    return tags
+
+
+def invalidar_tags(tags):
+    """Elimina de la caché activa las entradas con cualquiera de las etiquetas"""
+    _cache.invalidar_tags(tags)
+
+
+def configurar_cache(app):
+    """Sustituye la caché del proceso según la configuración de la app"""
+    global _cache
+    _cache = crear_cache(app.config)
+    app.extensions["cache_gmao"] = _cache
+    return _cache
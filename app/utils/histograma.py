@@ -0,0 +1,120 @@
+"""
+Histogramas de latencia de memoria constante
+
+Histograma agrupa los valores en cubetas logarítmicas (estilo HDR): cada
+potencia de 2 se divide en SUBDIVISIONES cubetas, de modo que el error
+relativo de los percentiles está acotado (< 4,5 % con 16 subdivisiones) y el
+número de cubetas no depende del número de muestras. Registrar es O(1).
+
+HistogramaVentana mantiene un anillo de histogramas parciales indexados por
+época entera (int(t // ancho)); al cambiar de época la ranura se reutiliza,
+así que la ventana "últimos 5 minutos" o "última hora" avanza sin recorrer
+muestras antiguas.
+"""
+
+import math
+import time
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histograma:
+    """Histograma logarítmico de valores positivos (p. ej. segundos)"""
+
+    SUBDIVISIONES = 16
+    MINIMO = 1e-6  # Resolución: valores menores caen en la primera cubeta
+
+    __slots__ = ("cubetas", "total", "suma", "minimo", "maximo")
+
+    def __init__(self):
+        self.cubetas = {}  # índice -> número de muestras (disperso)
+        self.total = 0
+        self.suma = 0.0
+        self.minimo = math.inf
+        self.maximo = 0.0
+
+    @classmethod
+    def indice(cls, valor):
+        if valor <= cls.MINIMO:
+            return 0
+        return int(math.log2(valor / cls.MINIMO) * cls.SUBDIVISIONES) + 1
+
+    @classmethod
+    def limite_superior(cls, indice):
+        return cls.MINIMO * 2 ** (indice / cls.SUBDIVISIONES)
+
+    def registrar(self, valor):
+        indice = self.indice(valor)
+        self.cubetas[indice] = self.cubetas.get(indice, 0) + 1
+        self.total += 1
+        self.suma += valor
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def fusionar(self, otro):
+        for indice, cuenta in otro.cubetas.items():
+            self.cubetas[indice] = self.cubetas.get(indice, 0) + cuenta
+        self.total += otro.total
+        self.suma += otro.suma
+        self.minimo = min(self.minimo, otro.minimo)
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def percentil(self, p):
+        """Valor por debajo del cual queda el p % de las muestras"""
+        if not self.total:
+            return 0.0
+        objetivo = max(1, math.ceil(self.total * p / 100))
+        acumulado = 0
+        for indice in sorted(self.cubetas):
+            acumulado += self.cubetas[indice]
+            if acumulado >= objetivo:
+                return min(max(self.limite_superior(indice), self.minimo), self.maximo)
+        return self.maximo
+
+    @property
+    def media(self):
+        return self.suma / self.total if self.total else 0.0
+
+    def resumen(self):
+        datos = {
+            "count": self.total,
+            "avg": self.media,
+            "min": self.minimo if self.total else 0.0,
+            "max": self.maximo,
+        }
+        for p in PERCENTILES:
+            datos[f"p{p}"] = self.percentil(p)
+        return datos
+
+
+class HistogramaVentana:
+    """Histograma de los últimos `duracion` segundos por rotación de ranuras"""
+
+    __slots__ = ("ancho", "_ranuras")
+
+    def __init__(self, duracion, ranuras):
+        self.ancho = duracion / ranuras
+        self._ranuras = [None] * ranuras  # (época, Histograma)
+
+    def _epoca(self, ahora):
+        return int((time.time() if ahora is None else ahora) // self.ancho)
+
+    def registrar(self, valor, ahora=None):
+        epoca = self._epoca(ahora)
+        posicion = epoca % len(self._ranuras)
+        ranura = self._ranuras[posicion]
+        if ranura is None or ranura[0] != epoca:
+            ranura = (epoca, Histograma())
+            self._ranuras[posicion] = ranura
+        ranura[1].registrar(valor)
+
+    def histograma(self, ahora=None):
+        """Fusión de las ranuras que siguen dentro de la ventana"""
+        epoca = self._epoca(ahora)
+        resultado = Histograma()
+        for ranura in self._ranuras:
+            if ranura is not None and epoca - ranura[0] < len(self._ranuras):
+                resultado.fusionar(ranura[1])
+        return resultado
@@ -0,0 +1,251 @@
+"""
+Instrumentación SQL por petición
+
+Los eventos before/after_cursor_execute de SQLAlchemy miden cada sentencia
+y la atribuyen al endpoint de Flask en curso: número de consultas, tiempo
+total en base de datos y huellas normalizadas (literales y parámetros
+sustituidos por "?", listas IN colapsadas) para agrupar sentencias iguales.
+
+Al terminar la petición los datos se acumulan por endpoint en memoria
+acotada. Con SQL_DETECTAR_N_MAS_1 activo (por defecto en modo debug), una
+huella repetida más de SQL_N_MAS_1_UMBRAL veces en una misma petición se
+registra como posible N+1 y se avisa en el log.
+"""
+
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.histograma import Histograma
+
+logger = logging.getLogger(__name__)
+
+MAX_HUELLAS = 50  # Huellas distintas conservadas por endpoint
+MAX_ENDPOINTS = 500
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_RE_PARAMETRO = re.compile(
+    r"%\(\w+\)s|%s|:\w+|\?|\$\d+|__\[POSTCOMPILE_\w+\]", re.ASCII
+)
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def huella_sentencia(sql):
+    """Normaliza una sentencia para agrupar las que solo difieren en valores"""
+    huella = _RE_CADENA.sub("?", sql)
+    huella = _RE_PARAMETRO.sub("?", huella)
+    huella = _RE_NUMERO.sub("?", huella)
+    huella = _RE_LISTA.sub("(?+)", huella)
+    return _RE_ESPACIOS.sub(" ", huella).strip()
+
+
+class ConsultasPeticion:
+    """Consultas de la petición en curso (se guarda en flask.g)"""
+
+    __slots__ = ("consultas", "tiempo", "huellas")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.huellas = {}  # huella -> [veces, segundos]
+
+    def registrar(self, sentencia, duracion):
+        self.consultas += 1
+        self.tiempo += duracion
+        datos = self.huellas.get(sentencia)
+        if datos is None:
+            self.huellas[sentencia] = [1, duracion]
+        else:
+            datos[0] += 1
+            datos[1] += duracion
+
+
+class EstadisticasSQLEndpoint:
+    """Acumulado por endpoint en memoria acotada"""
+
+    def __init__(self):
+        self.peticiones = 0
+        self.consultas_total = 0
+        self.tiempo_total = 0.0
+        self.consultas = Histograma()  # Consultas por petición
+        self.tiempo = Histograma()  # Segundos de BD por petición
+        self.huellas = {}  # huella -> [veces, segundos, máximo por petición]
+        self.n_mas_1 = {}  # huella -> {"veces_max", "detecciones", "ultima"}
+
+    def registrar(self, peticion, umbral_n_mas_1=None):
+        """Acumula una petición; devuelve las huellas sospechosas de N+1"""
+        self.peticiones += 1
+        self.consultas_total += peticion.consultas
+        self.tiempo_total += peticion.tiempo
+        self.consultas.registrar(peticion.consultas)
+        self.tiempo.registrar(peticion.tiempo)
+
+        # Sentencias con distinto texto pueden compartir huella (p. ej. IN)
+        por_huella = {}
+        for sentencia, (veces, segundos) in peticion.huellas.items():
+            datos = por_huella.setdefault(huella_sentencia(sentencia), [0, 0.0])
+            datos[0] += veces
+            datos[1] += segundos
+
+        sospechosas = []
+        for huella, (veces, segundos) in por_huella.items():
+            datos = self.huellas.setdefault(huella, [0, 0.0, 0])
+            datos[0] += veces
+            datos[1] += segundos
+            datos[2] = max(datos[2], veces)
+            if umbral_n_mas_1 is not None and veces > umbral_n_mas_1:
+                sospechosas.append((huella, veces))
+                aviso = self.n_mas_1.setdefault(
+                    huella, {"veces_max": 0, "detecciones": 0, "ultima": None}
+                )
+                aviso["veces_max"] = max(aviso["veces_max"], veces)
+                aviso["detecciones"] += 1
+                aviso["ultima"] = time.time()
+
+        if len(self.huellas) > 2 * MAX_HUELLAS:
+            # Se conservan las de más tiempo acumulado
+            conservar = sorted(self.huellas.items(), key=lambda h: -h[1][1])
+            self.huellas = dict(conservar[:MAX_HUELLAS])
+        return sospechosas
+
+    def resumen(self, top=10):
+        consultas = self.consultas.resumen()
+        tiempo = self.tiempo.resumen()
+        huellas = sorted(self.huellas.items(), key=lambda h: -h[1][1])[:top]
+        return {
+            "requests": self.peticiones,
+            "queries_total": self.consultas_total,
+            "queries_per_request_avg": consultas["avg"],
+            "queries_per_request_p95": consultas["p95"],
+            "queries_per_request_max": consultas["max"],
+            "db_time_total": self.tiempo_total,
+            "db_time_avg": tiempo["avg"],
+            "db_time_p95": tiempo["p95"],
+            "top_fingerprints": [
+                {
+                    "fingerprint": huella,
+                    "count": veces,
+                    "total_time": segundos,
+                    "max_per_request": maximo,
+                }
+                for huella, (veces, segundos, maximo) in huellas
+            ],
+            "n_plus_one": [
+                dict(aviso, fingerprint=huella)
+                for huella, aviso in self.n_mas_1.items()
+            ],
+        }
+
+
+_por_endpoint = {}
+_lock = threading.Lock()
+
+CLAVE_INICIO = "instrumentacion_sql_inicio"
+# (consultas, segundos) de la petición, para el middleware de tiempos
+CLAVE_ENTORNO_SQL = "gmao.sql"
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(CLAVE_INICIO, []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get(CLAVE_INICIO)
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    if not has_request_context():
+        return
+    peticion = g.get("_consultas_sql")
+    if peticion is None:
+        peticion = g._consultas_sql = ConsultasPeticion()
+    peticion.registrar(statement, duracion)
+
+
+def _al_fallar(contexto):
+    # La sentencia fallida no llega a after_cursor_execute
+    conexion = contexto.connection
+    inicios = conexion.info.get(CLAVE_INICIO) if conexion is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def consultas_peticion_actual():
+    """ConsultasPeticion de la petición en curso (o None)"""
+    if not has_request_context():
+        return None
+    return g.get("_consultas_sql")
+
+
+def _al_terminar_peticion(exc=None):
+    peticion = g.pop("_consultas_sql", None)
+    if peticion is None:
+        return
+    request.environ[CLAVE_ENTORNO_SQL] = (peticion.consultas, peticion.tiempo)
+    endpoint = request.endpoint or request.path
+    umbral = None
+    if current_app.config.get("SQL_DETECTAR_N_MAS_1"):
+        umbral = current_app.config.get("SQL_N_MAS_1_UMBRAL", 10)
+
+    with _lock:
+        estadisticas = _por_endpoint.get(endpoint)
+        if estadisticas is None:
+            if len(_por_endpoint) >= MAX_ENDPOINTS:
+                return
+            estadisticas = _por_endpoint[endpoint] = EstadisticasSQLEndpoint()
+        sospechosas = estadisticas.registrar(peticion, umbral)
+
+    for huella, veces in sospechosas:
+        logger.warning(
+            f"Posible N+1 en {endpoint}: {veces} ejecuciones de la misma "
+            f"consulta en una petición: {huella[:200]}"
+        )
+
+
+def resumen_sql(top=10):
+    """Resumen por endpoint, ordenado por tiempo total en base de datos"""
+    with _lock:
+        datos = {
+            endpoint: estadisticas.resumen(top)
+            for endpoint, estadisticas in _por_endpoint.items()
+        }
+    return dict(sorted(datos.items(), key=lambda e: -e[1]["db_time_total"]))
+
+
+def instantanea_sql():
+    """endpoint -> (consultas totales, copia del histograma de tiempo de BD)"""
+    with _lock:
+        datos = {}
+        for endpoint, estadisticas in _por_endpoint.items():
+            tiempo = Histograma()
+            tiempo.fusionar(estadisticas.tiempo)
+            datos[endpoint] = (estadisticas.consultas_total, tiempo)
+    return datos
+
+
+def limpiar_estadisticas_sql():
+    with _lock:
+        _por_endpoint.clear()
+
+
+def instalar_instrumentacion_sql(app):
+    """Registra los eventos de SQLAlchemy (una vez) y el cierre de petición"""
+    app.config.setdefault("SQL_DETECTAR_N_MAS_1", app.debug)
+    app.config.setdefault("SQL_N_MAS_1_UMBRAL", 10)
+    for nombre, funcion in (
+        ("before_cursor_execute", _antes_de_ejecutar),
+        ("after_cursor_execute", _despues_de_ejecutar),
+        ("handle_error", _al_fallar),
+    ):
+        if not event.contains(Engine, nombre, funcion):
+            event.listen(Engine, nombre, funcion)
+    app.teardown_request(_al_terminar_peticion)
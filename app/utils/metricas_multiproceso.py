@@ -0,0 +1,405 @@
+"""
+Métricas agregadas entre procesos en formato OpenMetrics
+
+Cada worker escribe sus contadores e histogramas en un archivo propio
+(metricas_<pid>.db) mapeado en memoria: pares clave -> float64 donde la
+clave es el nombre de la muestra con sus etiquetas, p. ej.
+'gmao_fifo_operations_total{operation="consumo"}'. Escribir es actualizar
+8 bytes en el mapa; no hay comunicación entre procesos.
+
+El worker que atiende /metrics lee los archivos de todos los procesos del
+directorio y suma los valores por clave, así cualquier scrape ve el total
+del servidor. El archivo de un proceso se borra al salir (atexit), desde el
+hook child_exit de gunicorn para workers que mueren sin ejecutar atexit y,
+al arrancar la app, si su PID ya no existe.
+"""
+
+import atexit
+import bisect
+import glob
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from app.utils.histograma import Histograma
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_ARCHIVO = "metricas_"
+EXTENSION = ".db"
+TIPO_CONTENIDO = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Límites (le) de los histogramas de duración exportados, en segundos
+LIMITES_SEGUNDOS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Familias conocidas: nombre -> (tipo, ayuda)
+FAMILIAS = {
+    "gmao_operation_duration_seconds": (
+        "histogram",
+        "Duración de las operaciones monitorizadas",
+    ),
+    "gmao_operation_failures": ("counter", "Operaciones monitorizadas fallidas"),
+    "gmao_http_requests": (
+        "counter",
+        "Peticiones HTTP por endpoint y código de estado",
+    ),
+    "gmao_http_response_bytes": ("counter", "Bytes enviados en respuestas HTTP"),
+    "gmao_db_queries": ("counter", "Consultas SQL ejecutadas por endpoint"),
+    "gmao_db_time_seconds": (
+        "histogram",
+        "Tiempo en base de datos por petición y endpoint",
+    ),
+    "gmao_cache_requests": ("counter", "Lecturas de la caché por nivel y resultado"),
+    "gmao_cache_hit_ratio": ("gauge", "Proporción de aciertos de la caché"),
+    "gmao_fifo_operations": ("counter", "Operaciones FIFO sobre lotes"),
+    "gmao_fifo_retries": (
+        "counter",
+        "Reintentos FIFO por conflicto de concurrencia",
+    ),
+}
+
+_SUFIJOS = ("_bucket", "_count", "_sum", "_total", "")
+
+_CABECERA = struct.Struct("<Q")  # Bytes usados del archivo
+_LONGITUD = struct.Struct("<I")
+_VALOR = struct.Struct("<d")
+
+
+def registrar_familia(nombre, tipo, ayuda):
+    FAMILIAS[nombre] = (tipo, ayuda)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def clave_muestra(muestra, etiquetas=None, le=None):
+    """'nombre{a="x",b="y"}' con las etiquetas en orden estable (le al final)"""
+    pares = [f'{k}="{_escapar(v)}"' for k, v in sorted((etiquetas or {}).items())]
+    if le is not None:
+        pares.append(f'le="{le}"')
+    return f"{muestra}{{{','.join(pares)}}}" if pares else muestra
+
+
+def _formato_limite(limite):
+    return "+Inf" if limite == math.inf else repr(float(limite))
+
+
+def _formato_valor(valor):
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    if valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor)
+
+
+class ArchivoMmap:
+    """
+    Diccionario clave -> float64 sobre un archivo mapeado en memoria.
+
+    Formato: 8 bytes con los bytes usados y, a continuación, entradas
+    [longitud de la clave (4 bytes)][clave utf-8 alineada a 8][valor]. La
+    cabecera se actualiza después de escribir la entrada, de modo que un
+    lector concurrente nunca ve una entrada a medias. Un único proceso
+    escribe en cada archivo.
+    """
+
+    TAMANO_INICIAL = 64 * 1024
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _CABECERA.size:
+            os.ftruncate(self._fd, self.TAMANO_INICIAL)
+        self._mapa = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self._usado = _CABECERA.unpack_from(self._mapa, 0)[0]
+        if self._usado == 0:
+            self._usado = _CABECERA.size
+            _CABECERA.pack_into(self._mapa, 0, self._usado)
+        self._posiciones = {
+            clave: posicion for clave, _, posicion in self._entradas(self._mapa)
+        }
+
+    @staticmethod
+    def _entradas(datos):
+        """(clave, valor, posición del valor) de un volcado del archivo"""
+        usado = _CABECERA.unpack_from(datos, 0)[0]
+        posicion = _CABECERA.size
+        while posicion < usado:
+            longitud = _LONGITUD.unpack_from(datos, posicion)[0]
+            inicio = posicion + _LONGITUD.size
+            clave = bytes(datos[inicio : inicio + longitud]).decode("utf-8")
+            posicion = inicio + longitud + (-(inicio + longitud) % 8)
+            yield clave, _VALOR.unpack_from(datos, posicion)[0], posicion
+            posicion += _VALOR.size
+
+    @classmethod
+    def leer(cls, ruta):
+        """Contenido de un archivo (de cualquier proceso) como dict"""
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        if len(datos) < _CABECERA.size:
+            return {}
+        return {clave: valor for clave, valor, _ in cls._entradas(datos)}
+
+    def _posicion(self, clave):
+        posicion = self._posiciones.get(clave)
+        if posicion is not None:
+            return posicion
+        codificada = clave.encode("utf-8")
+        inicio = self._usado + _LONGITUD.size
+        posicion = inicio + len(codificada) + (-(inicio + len(codificada)) % 8)
+        fin = posicion + _VALOR.size
+        if fin > len(self._mapa):
+            tamano = len(self._mapa)
+            while tamano < fin:
+                tamano *= 2
+            os.ftruncate(self._fd, tamano)
+            self._mapa.close()
+            self._mapa = mmap.mmap(self._fd, tamano)
+        _LONGITUD.pack_into(self._mapa, self._usado, len(codificada))
+        self._mapa[inicio : inicio + len(codificada)] = codificada
+        _VALOR.pack_into(self._mapa, posicion, 0.0)
+        self._usado = fin
+        _CABECERA.pack_into(self._mapa, 0, self._usado)
+        self._posiciones[clave] = posicion
+        return posicion
+
+    def valor(self, clave):
+        posicion = self._posiciones.get(clave)
+        if posicion is None:
+            return 0.0
+        return _VALOR.unpack_from(self._mapa, posicion)[0]
+
+    def establecer(self, clave, valor):
+        with self._lock:
+            posicion = self._posicion(clave)  # Puede sustituir el mapa al crecer
+            _VALOR.pack_into(self._mapa, posicion, valor)
+
+    def incrementar(self, clave, cantidad=1.0):
+        with self._lock:
+            posicion = self._posicion(clave)
+            actual = _VALOR.unpack_from(self._mapa, posicion)[0]
+            _VALOR.pack_into(self._mapa, posicion, actual + cantidad)
+
+    def cerrar(self):
+        with self._lock:
+            self._mapa.close()
+            os.close(self._fd)
+
+
+class AlmacenMultiproceso:
+    """Archivos de métricas de los procesos que comparten un directorio"""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._archivo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ruta_proceso(self, pid):
+        return os.path.join(self.directorio, f"{PREFIJO_ARCHIVO}{pid}{EXTENSION}")
+
+    def archivo(self):
+        """Archivo del proceso actual (se abre otro tras un fork)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # Un archivo previo con este PID es de un proceso muerto
+                    self.eliminar_proceso(pid)
+                    self._archivo = ArchivoMmap(self.ruta_proceso(pid))
+                    self._pid = pid
+        return self._archivo
+
+    def incrementar(self, muestra, etiquetas=None, cantidad=1.0):
+        self.archivo().incrementar(clave_muestra(muestra, etiquetas), cantidad)
+
+    def establecer(self, muestra, etiquetas=None, valor=0.0):
+        self.archivo().establecer(clave_muestra(muestra, etiquetas), valor)
+
+    def establecer_histograma(
+        self, familia, etiquetas, histograma, limites=LIMITES_SEGUNDOS
+    ):
+        """
+        Publica un Histograma acumulado como cubetas le= fijas. Cada cubeta
+        logarítmica cuenta en el primer límite que cubre su extremo superior
+        (error acotado por la resolución de Histograma).
+        """
+        cuentas = [0] * len(limites)
+        for indice, cuenta in histograma.cubetas.items():
+            superior = Histograma.limite_superior(indice)
+            posicion = bisect.bisect_left(limites, superior)
+            if posicion < len(limites):
+                cuentas[posicion] += cuenta
+        archivo = self.archivo()
+        cubeta = f"{familia}_bucket"
+        acumulado = 0
+        for limite, cuenta in zip(limites, cuentas):
+            acumulado += cuenta
+            archivo.establecer(
+                clave_muestra(cubeta, etiquetas, _formato_limite(limite)), acumulado
+            )
+        total = histograma.total
+        archivo.establecer(clave_muestra(cubeta, etiquetas, "+Inf"), total)
+        archivo.establecer(clave_muestra(f"{familia}_count", etiquetas), total)
+        archivo.establecer(clave_muestra(f"{familia}_sum", etiquetas), histograma.suma)
+
+    def rutas(self):
+        patron = os.path.join(self.directorio, f"{PREFIJO_ARCHIVO}*{EXTENSION}")
+        return sorted(glob.glob(patron))
+
+    def agregado(self):
+        """Suma por clave de los archivos de todos los procesos"""
+        total = {}
+        for ruta in self.rutas():
+            try:
+                valores = ArchivoMmap.leer(ruta)
+            except (OSError, struct.error, UnicodeDecodeError) as e:
+                logger.warning(f"Archivo de métricas ilegible {ruta}: {e}")
+                continue
+            for clave, valor in valores.items():
+                total[clave] = total.get(clave, 0.0) + valor
+        return total
+
+    def eliminar_proceso(self, pid):
+        try:
+            os.remove(self.ruta_proceso(pid))
+        except FileNotFoundError:
+            pass
+
+    def limpiar_huerfanos(self):
+        """Borra los archivos de procesos que ya no existen"""
+        for ruta in self.rutas():
+            nombre = os.path.basename(ruta)
+            try:
+                pid = int(nombre[len(PREFIJO_ARCHIVO) : -len(EXTENSION)])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _proceso_vivo(pid):
+                self.eliminar_proceso(pid)
+
+    def cerrar_proceso(self):
+        """Al salir el proceso: cierra y borra su archivo"""
+        if self._archivo is not None and self._pid == os.getpid():
+            self._archivo.cerrar()
+            self.eliminar_proceso(self._pid)
+            self._archivo = None
+            self._pid = None
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _familia(muestra):
+    for sufijo in _SUFIJOS:
+        if muestra.endswith(sufijo):
+            base = muestra[: len(muestra) - len(sufijo)] if sufijo else muestra
+            if base in FAMILIAS:
+                return base, sufijo
+    return None, None
+
+
+def _orden_muestra(clave):
+    """Orden de exposición: serie, cubetas por le, _count, _sum"""
+    muestra, _, etiquetas = clave.partition("{")
+    limite = 0.0
+    if muestra.endswith("_bucket") and 'le="' in etiquetas:
+        etiquetas, _, resto = etiquetas.rpartition('le="')
+        texto = resto.split('"', 1)[0]
+        limite = math.inf if texto == "+Inf" else float(texto)
+        etiquetas = etiquetas.rstrip(",")
+    return (etiquetas.rstrip("}"), _SUFIJOS.index(_familia(muestra)[1]), limite)
+
+
+def texto_openmetrics(valores):
+    """Exposición OpenMetrics de un dict clave de muestra -> valor"""
+    por_familia = {}
+    for clave, valor in valores.items():
+        familia, _ = _familia(clave.partition("{")[0])
+        if familia is None:
+            continue
+        por_familia.setdefault(familia, []).append((clave, valor))
+
+    lineas = []
+    for familia in sorted(por_familia):
+        tipo, ayuda = FAMILIAS[familia]
+        lineas.append(f"# TYPE {familia} {tipo}")
+        lineas.append(f"# HELP {familia} {_escapar(ayuda)}")
+        muestras = sorted(por_familia[familia], key=lambda m: _orden_muestra(m[0]))
+        for clave, valor in muestras:
+            lineas.append(f"{clave} {_formato_valor(float(valor))}")
+    lineas.append("# EOF")
+    return "\n".join(lineas) + "\n"
+
+
+_almacen = None
+
+
+def obtener_almacen():
+    """Almacén del servidor (None si no se ha configurado)"""
+    return _almacen
+
+
+def incrementar(muestra, etiquetas=None, cantidad=1.0):
+    """Incrementa un contador del proceso; sin almacén configurado no hace nada"""
+    if _almacen is None:
+        return
+    try:
+        _almacen.incrementar(muestra, etiquetas, cantidad)
+    except (OSError, ValueError) as e:
+        logger.debug(f"No se pudo registrar la métrica {muestra}: {e}")
+
+
+def _al_salir():
+    if _almacen is not None:
+        _almacen.cerrar_proceso()
+
+
+def configurar_metricas_multiproceso(app):
+    """Crea el almacén en METRICAS_MULTIPROCESO_DIR y limpia restos"""
+    global _almacen
+    directorio = app.config.get("METRICAS_MULTIPROCESO_DIR") or os.path.join(
+        tempfile.gettempdir(), "gmao_metricas"
+    )
+    if _almacen is not None and _almacen.directorio == directorio:
+        return _almacen
+    try:
+        almacen = AlmacenMultiproceso(directorio)
+        almacen.limpiar_huerfanos()
+    except OSError as e:
+        app.logger.warning(f"Métricas multiproceso desactivadas: {e}")
+        return None
+    if _almacen is None:
+        atexit.register(_al_salir)
+    else:
+        _almacen.cerrar_proceso()
+    _almacen = almacen
+    return almacen
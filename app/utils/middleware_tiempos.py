@@ -0,0 +1,122 @@
+"""
+Middleware WSGI de tiempos por endpoint
+
+Envuelve app.wsgi_app y mide cada petición de principio a fin: el reloj se
+detiene cuando el servidor cierra la respuesta, así que el envío de ficheros
+y las respuestas en streaming cuentan. Al terminar registra con
+record_request (el mismo almacén de histogramas que el dashboard de
+performance) la latencia, el código de estado, los bytes enviados y el
+número de consultas y tiempo en base de datos que anotó la instrumentación
+SQL en el entorno WSGI.
+
+Con METRICAS_PETICIONES_MUESTREO < 1 solo se mide esa fracción de las
+peticiones; el resto no paga más que una llamada a random().
+"""
+
+import random
+import time
+
+from flask import request
+
+from app.blueprints.performance_metrics import record_request
+from app.utils.instrumentacion_sql import CLAVE_ENTORNO_SQL
+
+CLAVE_ENDPOINT = "gmao.endpoint"
+SIN_ENDPOINT = "<sin_endpoint>"  # 404 y rutas sin regla: una sola serie
+
+
+class MiddlewareTiempos:
+    """Mide latencia, estado, bytes y tiempo de BD de cada petición"""
+
+    def __init__(self, wsgi_app, muestreo=1.0, registrar=record_request):
+        self.wsgi_app = wsgi_app
+        self.muestreo = muestreo
+        self.registrar = registrar
+
+    def __call__(self, environ, start_response):
+        if self.muestreo < 1.0 and random.random() >= self.muestreo:
+            return self.wsgi_app(environ, start_response)
+
+        inicio = time.perf_counter()
+        cabecera = [500, None]  # Código de estado, Content-Length
+
+        def start_response_medido(status, headers, exc_info=None):
+            cabecera[0] = int(status[:3])
+            for nombre, valor in headers:
+                if nombre.lower() == "content-length" and valor.isdigit():
+                    cabecera[1] = int(valor)
+                    break
+            return start_response(status, headers, exc_info)
+
+        try:
+            respuesta = self.wsgi_app(environ, start_response_medido)
+        except Exception:
+            self.finalizar(environ, inicio, 500, 0)
+            raise
+
+        envoltorio = environ.get("wsgi.file_wrapper")
+        if isinstance(envoltorio, type) and isinstance(respuesta, envoltorio):
+            # No se envuelve para no perder sendfile(); se mide hasta aquí
+            self.finalizar(environ, inicio, cabecera[0], cabecera[1] or 0)
+            return respuesta
+        return RespuestaMedida(respuesta, self, environ, inicio, cabecera)
+
+    def finalizar(self, environ, inicio, status, bytes_enviados):
+        consultas, tiempo_bd = environ.get(CLAVE_ENTORNO_SQL, (0, 0.0))
+        self.registrar(
+            environ.get(CLAVE_ENDPOINT) or SIN_ENDPOINT,
+            environ.get("REQUEST_METHOD", "GET"),
+            time.perf_counter() - inicio,
+            status,
+            bytes_enviados,
+            tiempo_bd,
+            consultas,
+        )
+
+
+class RespuestaMedida:
+    """Iterable de respuesta que registra la petición al cerrarse"""
+
+    __slots__ = ("_respuesta", "_middleware", "_environ", "_inicio", "_cabecera")
+
+    def __init__(self, respuesta, middleware, environ, inicio, cabecera):
+        self._respuesta = respuesta
+        self._middleware = middleware
+        self._environ = environ
+        self._inicio = inicio
+        self._cabecera = cabecera
+
+    def __iter__(self):
+        enviados = 0
+        for bloque in self._respuesta:
+            enviados += len(bloque)
+            yield bloque
+        if self._cabecera[1] is None:
+            self._cabecera[1] = enviados
+
+    def close(self):
+        try:
+            cerrar = getattr(self._respuesta, "close", None)
+            if cerrar is not None:
+                cerrar()
+        finally:
+            status, bytes_enviados = self._cabecera
+            self._middleware.finalizar(
+                self._environ, self._inicio, status, bytes_enviados or 0
+            )
+
+
+def _anotar_endpoint(exc=None):
+    request.environ[CLAVE_ENDPOINT] = request.endpoint
+
+
+def instalar_middleware_tiempos(app):
+    """Envuelve app.wsgi_app si METRICAS_PETICIONES está activo"""
+    app.config.setdefault("METRICAS_PETICIONES", True)
+    app.config.setdefault("METRICAS_PETICIONES_MUESTREO", 1.0)
+    if not app.config["METRICAS_PETICIONES"]:
+        return
+    app.teardown_request(_anotar_endpoint)
+    app.wsgi_app = MiddlewareTiempos(
+        app.wsgi_app, float(app.config["METRICAS_PETICIONES_MUESTREO"])
+    )
@@ -0,0 +1,211 @@
+"""
+Perfilador de peticiones lentas (opcional, PERFILADOR_LENTAS)
+
+Un hilo revisa cada PERFILADOR_INTERVALO_MS milisegundos las peticiones en
+curso; las que llevan más de PERFILADOR_UMBRAL_SEGUNDOS se muestrean con
+sys._current_frames(): la pila del hilo que las atiende se acumula en
+formato colapsado ("modulo:funcion;modulo:funcion N", el de flamegraph.pl y
+speedscope). Mientras ninguna petición supera el umbral no se toma ninguna
+pila, así que el coste en peticiones normales es un par de operaciones de
+diccionario.
+
+Se conservan las PERFILADOR_MAX_PETICIONES peticiones más lentas.
+"""
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import request
+
+MAX_PILAS_DISTINTAS = 500  # Por petición
+
+
+def pila_colapsada(marco, max_profundidad=64):
+    """Pila de raíz a hoja como 'modulo:funcion;modulo:funcion'"""
+    nombres = []
+    while marco is not None and len(nombres) < max_profundidad:
+        codigo = marco.f_code
+        modulo = marco.f_globals.get("__name__", "?")
+        nombres.append(f"{modulo}:{codigo.co_name}")
+        marco = marco.f_back
+    return ";".join(reversed(nombres))
+
+
+class PeticionEnCurso:
+    __slots__ = ("id", "metodo", "ruta", "endpoint", "inicio", "fecha", "pilas")
+
+    def __init__(self, id, metodo, ruta, endpoint):
+        self.id = id
+        self.metodo = metodo
+        self.ruta = ruta
+        self.endpoint = endpoint
+        self.inicio = time.perf_counter()
+        self.fecha = time.time()
+        self.pilas = Counter()
+
+
+class PerfiladorLentas:
+    """Muestreo de pilas de las peticiones que superan un umbral"""
+
+    def __init__(self, umbral=1.0, intervalo=0.005, max_peticiones=20):
+        self.umbral = umbral
+        self.intervalo = intervalo
+        self.max_peticiones = max_peticiones
+        self._activas = {}  # ident del hilo -> PeticionEnCurso
+        self._lentas = []  # min-heap (duración, id, registro)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def empezar(self, metodo, ruta, endpoint=None):
+        self._activas[threading.get_ident()] = PeticionEnCurso(
+            next(self._ids), metodo, ruta, endpoint
+        )
+
+    def terminar(self, status=None):
+        peticion = self._activas.pop(threading.get_ident(), None)
+        if peticion is None:
+            return
+        duracion = time.perf_counter() - peticion.inicio
+        if duracion < self.umbral:
+            return
+        registro = {
+            "id": peticion.id,
+            "method": peticion.metodo,
+            "path": peticion.ruta,
+            "endpoint": peticion.endpoint,
+            "status": status,
+            "duration": duracion,
+            "started_at": datetime.fromtimestamp(peticion.fecha).isoformat(),
+            "samples": sum(peticion.pilas.values()),
+            "stacks": dict(peticion.pilas),
+        }
+        with self._lock:
+            heapq.heappush(self._lentas, (duracion, peticion.id, registro))
+            if len(self._lentas) > self.max_peticiones:
+                heapq.heappop(self._lentas)
+
+    def muestrear(self):
+        """Toma la pila de cada petición en curso que supera el umbral"""
+        ahora = time.perf_counter()
+        vencidas = [
+            (ident, peticion)
+            for ident, peticion in list(self._activas.items())
+            if ahora - peticion.inicio >= self.umbral
+        ]
+        if not vencidas:
+            return
+        marcos = sys._current_frames()
+        for ident, peticion in vencidas:
+            marco = marcos.get(ident)
+            if marco is None:
+                continue
+            pila = pila_colapsada(marco)
+            if pila in peticion.pilas or len(peticion.pilas) < MAX_PILAS_DISTINTAS:
+                peticion.pilas[pila] += 1
+        del marcos
+
+    def lentas(self):
+        """Peticiones conservadas, de la más lenta a la más rápida"""
+        with self._lock:
+            return [registro for _, _, registro in sorted(self._lentas, reverse=True)]
+
+    def obtener(self, id):
+        with self._lock:
+            for _, id_registro, registro in self._lentas:
+                if id_registro == id:
+                    return registro
+        return None
+
+    def limpiar(self):
+        with self._lock:
+            self._lentas.clear()
+
+    @staticmethod
+    def texto_colapsado(registro):
+        """Entrada para flamegraph.pl / speedscope"""
+        return "".join(
+            f"{pila} {veces}\n"
+            for pila, veces in sorted(registro["stacks"].items(), key=lambda p: -p[1])
+        )
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        if self.activo:
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(
+            target=self._bucle, name="perfilador-lentas", daemon=True
+        )
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(1)
+        self._hilo = None
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            if self._activas:
+                try:
+                    self.muestrear()
+                except Exception as e:
+                    print(f"Error sampling slow requests: {e}")
+
+    def _tras_fork(self):
+        estaba_activo = self._hilo is not None
+        self._hilo = None
+        self._activas.clear()
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        if estaba_activo:
+            self.iniciar()
+
+
+_perfilador = PerfiladorLentas()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_perfilador._tras_fork)
+
+
+def obtener_perfilador():
+    return _perfilador
+
+
+def _empezar_peticion():
+    _perfilador.empezar(request.method, request.path, request.endpoint)
+
+
+def _terminar_peticion(respuesta):
+    _perfilador.terminar(respuesta.status_code)
+    return respuesta
+
+
+def _terminar_con_error(exc=None):
+    # Si after_request no llegó a ejecutarse (excepción no manejada)
+    if exc is not None:
+        _perfilador.terminar(500)
+
+
+def instalar_perfilador_lentas(app):
+    """Activa el perfilador si PERFILADOR_LENTAS está a True"""
+    app.config.setdefault("PERFILADOR_LENTAS", False)
+    if not app.config["PERFILADOR_LENTAS"]:
+        return
+    _perfilador.umbral = float(app.config.get("PERFILADOR_UMBRAL_SEGUNDOS", 1.0))
+    _perfilador.intervalo = float(app.config.get("PERFILADOR_INTERVALO_MS", 5)) / 1000
+    _perfilador.max_peticiones = int(app.config.get("PERFILADOR_MAX_PETICIONES", 20))
+    app.before_request(_empezar_peticion)
+    app.after_request(_terminar_peticion)
+    app.teardown_request(_terminar_con_error)
+    _perfilador.iniciar()
@@ -0,0 +1,370 @@
+"""
+Motor de recurrencia de los planes de mantenimiento
+
+La configuración de frecuencia de un plan (diaria, semanal con dias_semana,
+mensual por dia_mes o por dia_semana_mes, intervalos) se compila una vez en
+una Regla de enteros. Con ella se puede:
+
+- obtener la siguiente fecha posterior a un instante (siguientes), y
+- enumerar todas las fechas de una ventana (ocurrencias),
+
+para miles de reglas a la vez con aritmética de fechas de NumPy, sin bucles
+Python por plan ni por ocurrencia.
+
+Las fechas se manejan como días desde 1970-01-01 (datetime64[D]). Una regla
+no produce fechas anteriores a su ancla; los intervalos de semanas y meses
+se cuentan desde la semana o el mes del ancla, de modo que "cada 2 meses"
+no se desplaza aunque la orden se genere con retraso.
+
+Diferencias con calcular_proxima_ejecucion (que se mantiene para los
+formularios): el resultado es siempre la medianoche del día, dias_semana
+puede venir como lista o como JSON (así se guarda en el plan), un
+tipo_mensual vacío equivale a "dia_semana_mes" y semana_mes = 5 significa
+la última semana del mes.
+"""
+
+import json
+from datetime import date, datetime
+from typing import NamedTuple
+
+import numpy as np
+
+# Tipos de regla
+CADA_N_DIAS = 0
+SEMANAL = 1
+MENSUAL_DIA = 2
+MENSUAL_DIA_SEMANA = 3
+
+# Lunes = 0 ... domingo = 6 (nombres y números como los envía el frontend)
+DIAS_SEMANA = {
+    "lunes": 0,
+    "martes": 1,
+    "miercoles": 2,
+    "miércoles": 2,
+    "jueves": 3,
+    "viernes": 4,
+    "sabado": 5,
+    "sábado": 5,
+    "domingo": 6,
+    "1": 0,
+    "2": 1,
+    "3": 2,
+    "4": 3,
+    "5": 4,
+    "6": 5,
+    "0": 6,
+}
+
+# Frecuencias legacy (campo frecuencia) sin tipo_frecuencia
+FRECUENCIAS_DIAS = {
+    "Diario": 1,
+    "Semanal": 7,
+    "Quincenal": 15,
+    "Mensual": 30,
+    "Trimestral": 90,
+    "Anual": 365,
+}
+
+_ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+_SIN_FECHA = np.iinfo(np.int64).max
+
+
+class Regla(NamedTuple):
+    """
+    Frecuencia compilada. `ancla` es la primera fecha posible (días desde
+    1970-01-01); `mascara` los días de la semana (bit 0 = lunes); `dia` el
+    día del mes (MENSUAL_DIA) o de la semana (MENSUAL_DIA_SEMANA); `semana`
+    la semana del mes (1-5).
+    """
+
+    tipo: int
+    intervalo: int
+    ancla: int
+    mascara: int = 0
+    dia: int = 0
+    semana: int = 0
+
+    def siguiente(self, despues):
+        """Primera fecha (date) posterior al día de `despues`"""
+        return _a_fecha(siguientes([self], despues)[0])
+
+    def ocurrencias(self, desde, hasta):
+        """Fechas (date) de la regla entre desde y hasta, ambos incluidos"""
+        return [_a_fecha(d) for d in ocurrencias([self], desde, hasta)[1]]
+
+
+def _a_dia(valor):
+    """date, datetime o número de días -> días desde 1970-01-01"""
+    if isinstance(valor, (date, datetime)):
+        return valor.toordinal() - _ORDINAL_EPOCH
+    return int(valor)
+
+
+def _a_fecha(dia):
+    return date.fromordinal(int(np.asarray(dia).astype(np.int64)) + _ORDINAL_EPOCH)
+
+
+def _entero(valor, defecto, minimo=1, maximo=None):
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return defecto
+    valor = max(valor, minimo)
+    return min(valor, maximo) if maximo is not None else valor
+
+
+def _mascara_dias(dias_semana):
+    if isinstance(dias_semana, str):
+        try:
+            dias_semana = json.loads(dias_semana)
+        except ValueError:
+            dias_semana = dias_semana.split(",")
+    mascara = 0
+    for dia in dias_semana or ():
+        numero = DIAS_SEMANA.get(str(dia).strip().lower())
+        if numero is not None:
+            mascara |= 1 << numero
+    return mascara
+
+
+def compilar(datos, ancla=None):
+    """
+    Compila una configuración de frecuencia en una Regla.
+
+    Args:
+        datos: Dict con el formato de calcular_proxima_ejecucion
+            (tipo_frecuencia, dias_semana, tipo_mensual, dia_mes...)
+        ancla: Primera fecha posible (date o datetime); por defecto, hoy
+    """
+    ancla = _a_dia(ancla if ancla is not None else datetime.now())
+    tipo_frecuencia = datos.get("tipo_frecuencia", "mensual")
+
+    if tipo_frecuencia == "mensual":
+        intervalo = _entero(datos.get("intervalo_meses"), 1)
+        if datos.get("tipo_mensual") == "dia_mes":
+            dia = _entero(datos.get("dia_mes"), 1, maximo=31)
+            return Regla(MENSUAL_DIA, intervalo, ancla, dia=dia)
+        dia = DIAS_SEMANA.get(str(datos.get("dia_semana_mes") or "").lower(), 5)
+        semana = _entero(datos.get("semana_mes"), 1, maximo=5)
+        return Regla(MENSUAL_DIA_SEMANA, intervalo, ancla, dia=dia, semana=semana)
+
+    if tipo_frecuencia == "semanal":
+        intervalo = _entero(datos.get("intervalo_semanas"), 1)
+        mascara = _mascara_dias(datos.get("dias_semana"))
+        if not mascara:
+            return Regla(CADA_N_DIAS, 7 * intervalo, ancla)
+        return Regla(SEMANAL, intervalo, ancla, mascara=mascara)
+
+    if tipo_frecuencia == "diaria":
+        return Regla(CADA_N_DIAS, 1, ancla)
+
+    dias = FRECUENCIAS_DIAS.get(datos.get("frecuencia", "Mensual"), 30)
+    return Regla(CADA_N_DIAS, dias, ancla)
+
+
+def datos_frecuencia(plan):
+    """Configuración de frecuencia de un PlanMantenimiento"""
+    return {
+        "tipo_frecuencia": plan.tipo_frecuencia,
+        "intervalo_dias": plan.frecuencia_dias,
+        "intervalo_semanas": plan.intervalo_semanas,
+        "dias_semana": plan.dias_semana,
+        "tipo_mensual": plan.tipo_mensual,
+        "dia_mes": plan.dia_mes,
+        "semana_mes": plan.semana_mes,
+        "dia_semana_mes": plan.dia_semana_mes,
+        "intervalo_meses": plan.intervalo_meses,
+        "frecuencia": plan.frecuencia,
+    }
+
+
+def regla_de_plan(plan, ancla=None):
+    """
+    Regla de un plan, anclada por defecto en su próxima ejecución (la
+    fecha programada cuenta como inicio de los intervalos).
+    """
+    return compilar(datos_frecuencia(plan), ancla or plan.proxima_ejecucion)
+
+
+def proxima_ejecucion(plan, despues):
+    """Próxima ejecución (datetime a medianoche) de un plan tras `despues`"""
+    fecha = regla_de_plan(plan).siguiente(despues)
+    return datetime(fecha.year, fecha.month, fecha.day)
+
+
+# Evaluación vectorizada
+
+
+def _columnas(reglas):
+    tabla = np.array([tuple(r) for r in reglas], dtype=np.int64)
+    return {campo: tabla[:, i] for i, campo in enumerate(Regla._fields)}
+
+
+def _dias(valores, n):
+    """Escalar o secuencia de date/datetime -> array de días de longitud n"""
+    if isinstance(valores, (date, datetime, int, np.integer)):
+        return np.full(n, _a_dia(valores), dtype=np.int64)
+    return np.array([_a_dia(v) for v in valores], dtype=np.int64)
+
+
+def _mes(dias):
+    """Meses desde 1970-01 de cada día"""
+    return dias.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _inicio_mes(meses):
+    return meses.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+
+def _dia_semana(dias):
+    # 1970-01-01 fue jueves (3)
+    return (dias + 3) % 7
+
+
+def _techo(a, b):
+    return -(-a // b)
+
+
+def _dia_en_mes(meses, tipo, dia, semana):
+    """Fecha de la regla mensual dentro de cada mes"""
+    inicio = _inicio_mes(meses)
+    fin = _inicio_mes(meses + 1)
+    por_dia = inicio + np.minimum(dia, fin - inicio) - 1
+    primera = inicio + (dia - _dia_semana(inicio)) % 7
+    por_semana = primera + 7 * (semana - 1)
+    por_semana = np.where(por_semana >= fin, por_semana - 7, por_semana)
+    return np.where(tipo == MENSUAL_DIA, por_dia, por_semana)
+
+
+def _rejillas(c):
+    """
+    Reglas CADA_N_DIAS y SEMANAL como progresiones base + k * paso (una por
+    regla y día de la semana): índices de regla, bases y pasos.
+    """
+    periodicas = np.flatnonzero(c["tipo"] == CADA_N_DIAS)
+    indices = [periodicas]
+    bases = [c["ancla"][periodicas]]
+    pasos = [c["intervalo"][periodicas]]
+
+    semanales = np.flatnonzero(c["tipo"] == SEMANAL)
+    ancla = c["ancla"][semanales]
+    lunes = ancla - _dia_semana(ancla)
+    for dia in range(7):
+        con_dia = (c["mascara"][semanales] >> dia) & 1 == 1
+        indices.append(semanales[con_dia])
+        bases.append(lunes[con_dia] + dia)
+        pasos.append(7 * c["intervalo"][semanales][con_dia])
+    return np.concatenate(indices), np.concatenate(bases), np.concatenate(pasos)
+
+
+def siguientes(reglas, despues):
+    """
+    Primera fecha de cada regla posterior al día de `despues`.
+
+    Args:
+        reglas: Secuencia de Regla
+        despues: date/datetime común o una por regla
+
+    Returns:
+        np.ndarray datetime64[D] alineado con reglas
+    """
+    if not len(reglas):
+        return np.array([], dtype="datetime64[D]")
+    c = _columnas(reglas)
+    minimo = np.maximum(_dias(despues, len(c["tipo"])) + 1, c["ancla"])
+    resultado = np.full(len(c["tipo"]), _SIN_FECHA, dtype=np.int64)
+
+    indices, bases, pasos = _rejillas(c)
+    k = np.maximum(_techo(minimo[indices] - bases, pasos), 0)
+    np.minimum.at(resultado, indices, bases + k * pasos)
+
+    mensuales = np.flatnonzero(c["tipo"] >= MENSUAL_DIA)
+    if len(mensuales):
+        tipo, dia, semana, intervalo = (
+            c[campo][mensuales] for campo in ("tipo", "dia", "semana", "intervalo")
+        )
+        mes_ancla = _mes(c["ancla"][mensuales])
+        minimo_m = minimo[mensuales]
+        k = np.maximum(_techo(_mes(minimo_m) - mes_ancla, intervalo), 0)
+        mes = mes_ancla + k * intervalo
+        fecha = _dia_en_mes(mes, tipo, dia, semana)
+        tardia = fecha < minimo_m
+        fecha[tardia] = _dia_en_mes(
+            mes[tardia] + intervalo[tardia], tipo[tardia], dia[tardia], semana[tardia]
+        )
+        resultado[mensuales] = fecha
+
+    return resultado.astype("datetime64[D]")
+
+
+def _expandir(primero, paso, cuenta):
+    """Progresiones primero + i * paso (i < cuenta) concatenadas"""
+    grupo = np.repeat(np.arange(len(cuenta)), cuenta)
+    posicion = np.arange(cuenta.sum()) - np.repeat(np.cumsum(cuenta) - cuenta, cuenta)
+    return grupo, primero[grupo] + posicion * paso[grupo]
+
+
+def ocurrencias(reglas, desde, hasta):
+    """
+    Todas las fechas de las reglas en [desde, hasta] en una pasada.
+
+    Args:
+        reglas: Secuencia de Regla
+        desde, hasta: date/datetime (ambos incluidos)
+
+    Returns:
+        (np.ndarray de índices de regla, np.ndarray datetime64[D]) ordenados
+        por regla y fecha
+    """
+    if not len(reglas):
+        return np.array([], dtype=np.int64), np.array([], dtype="datetime64[D]")
+    c = _columnas(reglas)
+    hasta = _a_dia(hasta)
+    minimo = np.maximum(_a_dia(desde), c["ancla"])
+
+    indices, bases, pasos = _rejillas(c)
+    primero = bases + np.maximum(_techo(minimo[indices] - bases, pasos), 0) * pasos
+    cuenta = np.where(primero <= hasta, (hasta - primero) // pasos + 1, 0)
+    grupo, fechas = _expandir(primero, pasos, cuenta)
+    todas_indices = [indices[grupo]]
+    todas_fechas = [fechas]
+
+    mensuales = np.flatnonzero(c["tipo"] >= MENSUAL_DIA)
+    if len(mensuales):
+        intervalo = c["intervalo"][mensuales]
+        mes_ancla = _mes(c["ancla"][mensuales])
+        k = np.maximum(_techo(_mes(minimo[mensuales]) - mes_ancla, intervalo), 0)
+        primer_mes = mes_ancla + k * intervalo
+        ultimo_mes = _mes(np.array([hasta]))[0]
+        cuenta = np.maximum((ultimo_mes - primer_mes) // intervalo + 1, 0)
+        grupo, meses = _expandir(primer_mes, intervalo, cuenta)
+        regla = mensuales[grupo]
+        fechas = _dia_en_mes(
+            meses, c["tipo"][regla], c["dia"][regla], c["semana"][regla]
+        )
+        validas = (fechas >= minimo[regla]) & (fechas <= hasta)
+        todas_indices.append(regla[validas])
+        todas_fechas.append(fechas[validas])
+
+    indices = np.concatenate(todas_indices)
+    fechas = np.concatenate(todas_fechas)
+    orden = np.lexsort((fechas, indices))
+    return indices[orden], fechas[orden].astype("datetime64[D]")
+
+
+def ocurrencias_planes(planes, desde, hasta):
+    """
+    [(plan, date)] de los planes en [desde, hasta]: su próxima ejecución
+    programada (aunque se haya movido a mano) y las fechas de su regla a
+    partir de ella.
+    """
+    planes = [p for p in planes if p.proxima_ejecucion is not None]
+    indices, fechas = ocurrencias([regla_de_plan(p) for p in planes], desde, hasta)
+    resultado = {
+        (i, _a_fecha(d)) for i, d in zip(indices.tolist(), fechas.astype(np.int64))
+    }
+    inicio, fin = _a_dia(desde), _a_dia(hasta)
+    for i, plan in enumerate(planes):
+        if inicio <= _a_dia(plan.proxima_ejecucion) <= fin:
+            resultado.add((i, _a_fecha(_a_dia(plan.proxima_ejecucion))))
+    return [(planes[i], fecha) for i, fecha in sorted(resultado)]
@@ -0,0 +1,221 @@
+"""
+Series temporales de métricas en anillos por minuto y por hora
+
+AnilloTemporal guarda una cubeta (conteo, suma, errores, máximo y,
+opcionalmente, un Histograma) por intervalo, indexada por época entera
+int(t // ancho). Registrar es O(1) y leer la ventana completa es
+O(ranuras), sin recorrer métricas individuales ni parsear fechas.
+
+HistorialArchivo persiste los anillos en un JSON local para que un reinicio
+no borre las últimas 24 h. Cada proceso vuelca solo lo registrado desde su
+último volcado y lo suma a lo que ya hay en el archivo (con flock), así
+varios workers pueden compartir el mismo archivo sin contar dos veces.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.utils.histograma import Histograma
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class Cubeta:
+    """Agregado de las muestras de un intervalo"""
+
+    __slots__ = ("epoca", "total", "suma", "errores", "maximo", "histograma")
+
+    def __init__(self, epoca, con_histograma=False):
+        self.epoca = epoca
+        self.total = 0
+        self.suma = 0.0
+        self.errores = 0
+        self.maximo = 0.0
+        self.histograma = Histograma() if con_histograma else None
+
+    def registrar(self, valor, exito=True):
+        self.total += 1
+        self.suma += valor
+        if not exito:
+            self.errores += 1
+        if valor > self.maximo:
+            self.maximo = valor
+        if self.histograma is not None:
+            self.histograma.registrar(valor)
+
+    def fusionar(self, otra):
+        self.total += otra.total
+        self.suma += otra.suma
+        self.errores += otra.errores
+        self.maximo = max(self.maximo, otra.maximo)
+        if self.histograma is not None and otra.histograma is not None:
+            self.histograma.fusionar(otra.histograma)
+
+    def a_dict(self):
+        datos = {
+            "epoch": self.epoca,
+            "count": self.total,
+            "sum": self.suma,
+            "errors": self.errores,
+            "max": self.maximo,
+        }
+        if self.histograma is not None:
+            datos["buckets"] = self.histograma.cubetas
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos):
+        cubeta = cls(int(datos["epoch"]), con_histograma="buckets" in datos)
+        cubeta.total = int(datos["count"])
+        cubeta.suma = float(datos["sum"])
+        cubeta.errores = int(datos["errors"])
+        cubeta.maximo = float(datos["max"])
+        if cubeta.histograma is not None:
+            histograma = cubeta.histograma
+            histograma.cubetas = {int(i): n for i, n in datos["buckets"].items()}
+            histograma.total = cubeta.total
+            histograma.suma = cubeta.suma
+            histograma.maximo = cubeta.maximo
+            histograma.minimo = min(
+                (Histograma.limite_superior(i - 1) for i in histograma.cubetas),
+                default=0.0,
+            )
+        return cubeta
+
+
+class AnilloTemporal:
+    """Las últimas `ranuras` cubetas de `ancho` segundos"""
+
+    __slots__ = ("ancho", "con_histograma", "_ranuras")
+
+    def __init__(self, ancho, ranuras, con_histograma=False):
+        self.ancho = ancho
+        self.con_histograma = con_histograma
+        self._ranuras = [None] * ranuras
+
+    def epoca(self, ahora=None):
+        return int((time.time() if ahora is None else ahora) // self.ancho)
+
+    def registrar(self, valor, exito=True, ahora=None):
+        epoca = self.epoca(ahora)
+        posicion = epoca % len(self._ranuras)
+        cubeta = self._ranuras[posicion]
+        if cubeta is None or cubeta.epoca != epoca:
+            cubeta = self._ranuras[posicion] = Cubeta(epoca, self.con_histograma)
+        cubeta.registrar(valor, exito)
+
+    def fusionar_cubeta(self, otra, ahora=None):
+        """Suma una cubeta (p. ej. leída del archivo) si sigue en la ventana"""
+        if self.epoca(ahora) - otra.epoca >= len(self._ranuras):
+            return
+        posicion = otra.epoca % len(self._ranuras)
+        cubeta = self._ranuras[posicion]
+        if cubeta is None or cubeta.epoca < otra.epoca:
+            cubeta = self._ranuras[posicion] = Cubeta(otra.epoca, self.con_histograma)
+        elif cubeta.epoca > otra.epoca:
+            return
+        cubeta.fusionar(otra)
+
+    def cubetas(self, ahora=None):
+        """Cubetas vigentes, de la más antigua a la más reciente"""
+        epoca = self.epoca(ahora)
+        vigentes = [
+            c
+            for c in self._ranuras
+            if c is not None and 0 <= epoca - c.epoca < len(self._ranuras)
+        ]
+        return sorted(vigentes, key=lambda c: c.epoca)
+
+    def vaciar(self):
+        self._ranuras = [None] * len(self._ranuras)
+
+
+class HistorialArchivo:
+    """Archivo JSON con las cubetas de varios anillos (clave -> lista)"""
+
+    VERSION = 1
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def _leer(self, f):
+        f.seek(0)
+        contenido = f.read()
+        if not contenido:
+            return {}
+        datos = json.loads(contenido)
+        if datos.get("version") != self.VERSION:
+            return {}
+        return datos.get("series", {})
+
+    def cargar(self):
+        """clave -> [Cubeta]; {} si no existe o no se puede leer"""
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                series = self._leer(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Historial de métricas ilegible ({self.ruta}): {e}")
+            return {}
+        return {
+            clave: [Cubeta.desde_dict(c) for c in cubetas]
+            for clave, cubetas in series.items()
+        }
+
+    def volcar(self, pendientes, retencion, ahora=None):
+        """
+        Suma al archivo las cubetas pendientes de cada serie y descarta las
+        más antiguas que la retención (segundos) de esa serie.
+
+        Args:
+            pendientes: clave -> AnilloTemporal con lo registrado desde el
+                último volcado
+            retencion: clave -> segundos que se conservan en el archivo
+        """
+        ahora = time.time() if ahora is None else ahora
+        directorio = os.path.dirname(self.ruta) or "."
+        os.makedirs(directorio, exist_ok=True)
+        with open(self.ruta + ".lock", "a") as cerrojo:
+            if fcntl is not None:
+                fcntl.flock(cerrojo, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.ruta, "r", encoding="utf-8") as f:
+                        series = self._leer(f)
+                except (FileNotFoundError, ValueError):
+                    series = {}
+
+                resultado = {}
+                for clave, anillo in pendientes.items():
+                    limite = int((ahora - retencion[clave]) // anillo.ancho)
+                    por_epoca = {
+                        c.epoca: c
+                        for c in map(Cubeta.desde_dict, series.get(clave, []))
+                        if c.epoca > limite
+                    }
+                    for cubeta in anillo.cubetas(ahora):
+                        existente = por_epoca.get(cubeta.epoca)
+                        if existente is None:
+                            por_epoca[cubeta.epoca] = cubeta
+                        else:
+                            existente.fusionar(cubeta)
+                    resultado[clave] = [
+                        por_epoca[e].a_dict() for e in sorted(por_epoca)
+                    ]
+
+                fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": self.VERSION, "series": resultado}, f)
+                os.replace(temporal, self.ruta)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(cerrojo, fcntl.LOCK_UN)
@@ -30,3 +30,23 @@ preload_app = True
 
 # Graceful timeout
 graceful_timeout = 30
+
+
+def child_exit(server, worker):
+    """Borra el archivo de métricas de un worker terminado (incluso por SIGKILL)"""
+    from app.utils.metricas_multiproceso import obtener_almacen
+
+    almacen = obtener_almacen()
+    if almacen is not None:
+        almacen.eliminar_proceso(worker.pid)
+
+
+def post_worker_init(worker):
+    """
+    Arranca el hilo del planificador en cada worker ya con la aplicación
+    cargada (PLANIFICADOR_MODO=proceso); compiten por el cerrojo y solo uno
+    ejecuta. El maestro nunca lo arranca.
+    """
+    from app.services.planificador import iniciar_planificador
+
+    iniciar_planificador()
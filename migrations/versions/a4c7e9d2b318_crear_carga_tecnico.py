@@ -0,0 +1,44 @@
+"""crear_carga_tecnico
+
+Revision ID: a4c7e9d2b318
+Revises: e5b8c2a4f716
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a4c7e9d2b318"
+down_revision = "e5b8c2a4f716"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "carga_tecnico",
+        sa.Column("tecnico_id", sa.Integer(), nullable=False),
+        sa.Column("ordenes_abiertas", sa.Integer(), nullable=False),
+        sa.Column("fecha_actualizacion", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["tecnico_id"], ["usuario.id"]),
+        sa.PrimaryKeyConstraint("tecnico_id"),
+    )
+
+    # Carga inicial desde las órdenes abiertas (mismo cálculo que
+    # CargaTecnico.recalcular)
+    op.execute(
+        """
+        INSERT INTO carga_tecnico (tecnico_id, ordenes_abiertas, fecha_actualizacion)
+        SELECT tecnico_id, COUNT(id), CURRENT_TIMESTAMP
+        FROM orden_trabajo
+        WHERE tecnico_id IS NOT NULL AND estado IN ('Pendiente', 'En Proceso')
+        GROUP BY tecnico_id
+    """
+    )
+
+
+def downgrade():
+    op.drop_table("carga_tecnico")
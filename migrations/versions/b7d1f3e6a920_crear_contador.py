@@ -0,0 +1,31 @@
+"""crear_contador
+
+Revision ID: b7d1f3e6a920
+Revises: a4c7e9d2b318
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b7d1f3e6a920"
+down_revision = "a4c7e9d2b318"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Series de numeración en motores sin secuencias; en PostgreSQL
+    # app.services.numeracion crea una secuencia por serie al usarla
+    op.create_table(
+        "contador",
+        sa.Column("clave", sa.String(length=50), nullable=False),
+        sa.Column("valor", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("clave"),
+    )
+
+
+def downgrade():
+    op.drop_table("contador")
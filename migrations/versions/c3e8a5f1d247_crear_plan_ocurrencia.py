@@ -0,0 +1,38 @@
+"""crear_plan_ocurrencia
+
+Revision ID: c3e8a5f1d247
+Revises: b7d1f3e6a920
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c3e8a5f1d247"
+down_revision = "b7d1f3e6a920"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "plan_ocurrencia",
+        sa.Column("plan_id", sa.Integer(), nullable=False),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["plan_id"], ["plan_mantenimiento.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("plan_id", "fecha"),
+    )
+    op.create_index("ix_plan_ocurrencia_fecha", "plan_ocurrencia", ["fecha", "plan_id"])
+
+    # Sin carga inicial: la llena el trabajo "horizonte_planes" en la primera
+    # vuelta del planificador (crea la franja pendiente al arrancar) o
+    # scripts/regenerar_ocurrencias_planes.py
+
+
+def downgrade():
+    op.drop_index("ix_plan_ocurrencia_fecha", table_name="plan_ocurrencia")
+    op.drop_table("plan_ocurrencia")
@@ -0,0 +1,30 @@
+"""agregar_version_lote_inventario
+
+Revision ID: c4a7d1e9f203
+Revises: b99439cff2ef
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c4a7d1e9f203"
+down_revision = "b99439cff2ef"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Contador de versión para el bloqueo optimista de lotes FIFO
+    with op.batch_alter_table("lote_inventario", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("lote_inventario", schema=None) as batch_op:
+        batch_op.drop_column("version")
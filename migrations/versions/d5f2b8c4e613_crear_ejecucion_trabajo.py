@@ -0,0 +1,52 @@
+"""crear_ejecucion_trabajo
+
+Revision ID: d5f2b8c4e613
+Revises: c3e8a5f1d247
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d5f2b8c4e613"
+down_revision = "c3e8a5f1d247"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ejecucion_trabajo",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("trabajo", sa.String(length=50), nullable=False),
+        sa.Column("programado_para", sa.DateTime(), nullable=False),
+        sa.Column("estado", sa.String(length=20), nullable=False),
+        sa.Column("solicitado_por", sa.String(length=100), nullable=True),
+        sa.Column("fecha_creacion", sa.DateTime(), nullable=False),
+        sa.Column("inicio", sa.DateTime(), nullable=True),
+        sa.Column("fin", sa.DateTime(), nullable=True),
+        sa.Column("latido", sa.DateTime(), nullable=True),
+        sa.Column("intentos", sa.Integer(), nullable=False),
+        sa.Column("procesados", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("cursor", sa.Text(), nullable=True),
+        sa.Column("resultado", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("nodo", sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "trabajo", "programado_para", name="uq_ejecucion_trabajo_franja"
+        ),
+    )
+    op.create_index(
+        "ix_ejecucion_trabajo_estado",
+        "ejecucion_trabajo",
+        ["estado", "programado_para"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_ejecucion_trabajo_estado", table_name="ejecucion_trabajo")
+    op.drop_table("ejecucion_trabajo")
@@ -0,0 +1,58 @@
+"""agregar_indices_lotes_fifo
+
+Revision ID: d7e2b5f8a914
+Revises: c4a7d1e9f203
+Create Date: 2026-10-18 07:05:00.000000
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "d7e2b5f8a914"
+down_revision = "c4a7d1e9f203"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las consultas FIFO filtran por artículo, lotes activos con stock y
+    # ordenan por fecha de entrada. El índice parcial solo contiene lotes
+    # consumibles; el predicado debe coincidir con LoteInventario.filtro_consumible()
+    if op.get_bind().dialect.name == "postgresql":
+        predicado_fifo = "activo AND cantidad_actual > 0"
+    else:
+        predicado_fifo = "activo = 1 AND cantidad_actual > 0"
+
+    op.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_lote_inventario_fifo
+        ON lote_inventario (inventario_id, fecha_entrada, id)
+        WHERE {predicado_fifo}
+    """
+    )
+
+    # Índice para las consultas de vencimientos (solo lotes perecederos)
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_lote_inventario_vencimiento
+        ON lote_inventario (fecha_vencimiento)
+        WHERE fecha_vencimiento IS NOT NULL
+    """
+    )
+
+    # Reservas/consumos de una orden de trabajo (liberar_reservas, trazabilidad)
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_movimiento_lote_orden_tipo
+        ON movimiento_lote (orden_trabajo_id, tipo_movimiento)
+    """
+    )
+
+
+def downgrade():
+    # Eliminar índices en orden inverso
+    op.execute("DROP INDEX IF EXISTS ix_movimiento_lote_orden_tipo")
+    op.execute("DROP INDEX IF EXISTS ix_lote_inventario_vencimiento")
+    op.execute("DROP INDEX IF EXISTS ix_lote_inventario_fifo")
@@ -0,0 +1,59 @@
+"""crear_stock_resumen
+
+Revision ID: e5b8c2a4f716
+Revises: d7e2b5f8a914
+Create Date: 2026-10-18 08:10:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b8c2a4f716"
+down_revision = "d7e2b5f8a914"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stock_resumen",
+        sa.Column("inventario_id", sa.Integer(), nullable=False),
+        sa.Column("total_actual", sa.Numeric(14, 4), nullable=False),
+        sa.Column("total_reservado", sa.Numeric(14, 4), nullable=False),
+        sa.Column("numero_lotes", sa.Integer(), nullable=False),
+        sa.Column("valor_fifo", sa.Numeric(14, 2), nullable=False),
+        sa.Column("proximo_vencimiento", sa.DateTime(), nullable=True),
+        sa.Column("fecha_actualizacion", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["inventario_id"], ["inventario.id"]),
+        sa.PrimaryKeyConstraint("inventario_id"),
+    )
+
+    # Carga inicial desde los lotes consumibles (mismo cálculo que
+    # StockResumen.recalcular)
+    activo = "activo" if op.get_bind().dialect.name == "postgresql" else "activo = 1"
+    op.execute(
+        f"""
+        INSERT INTO stock_resumen (
+            inventario_id, total_actual, total_reservado, numero_lotes,
+            valor_fifo, proximo_vencimiento, fecha_actualizacion
+        )
+        SELECT
+            inventario_id,
+            COALESCE(SUM(cantidad_actual), 0),
+            COALESCE(SUM(cantidad_reservada), 0),
+            COUNT(id),
+            COALESCE(SUM(cantidad_actual * precio_unitario), 0),
+            MIN(fecha_vencimiento),
+            CURRENT_TIMESTAMP
+        FROM lote_inventario
+        WHERE {activo} AND cantidad_actual > 0
+        GROUP BY inventario_id
+    """
+    )
+
+
+def downgrade():
+    op.drop_table("stock_resumen")
@@ -0,0 +1,34 @@
+"""indices_orden_trabajo
+
+Revision ID: e7a4c9d1f852
+Revises: d5f2b8c4e613
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e7a4c9d1f852"
+down_revision = "d5f2b8c4e613"
+branch_labels = None
+depends_on = None
+
+INDICES = (
+    ("ix_orden_trabajo_estado", ["estado", "numero_orden", "id"]),
+    ("ix_orden_trabajo_tipo", ["tipo"]),
+    ("ix_orden_trabajo_prioridad", ["prioridad"]),
+    ("ix_orden_trabajo_tecnico_id", ["tecnico_id"]),
+    ("ix_orden_trabajo_activo_id", ["activo_id"]),
+    ("ix_orden_trabajo_fecha_programada", ["fecha_programada"]),
+)
+
+
+def upgrade():
+    for nombre, columnas in INDICES:
+        op.create_index(nombre, "orden_trabajo", columnas)
+
+
+def downgrade():
+    for nombre, _ in reversed(INDICES):
+        op.drop_index(nombre, table_name="orden_trabajo")
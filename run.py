@@ -14,4 +14,10 @@ if __name__ == "__main__":
     host = os.getenv("FLASK_HOST", "0.0.0.0")
     port = int(os.getenv("FLASK_PORT", "5000"))
 
+    # Planificador en el proceso que sirve (con el recargador, no en el vigilante)
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from app.services.planificador import iniciar_planificador
+
+        iniciar_planificador()
+
     app.run(debug=debug, host=host, port=port)
@@ -0,0 +1,68 @@
+"""
+Planificador de trabajos en un proceso aparte (PLANIFICADOR_MODO=externo).
+
+Ejecuta en primer plano el mismo ciclo que el hilo de los workers: genera
+las órdenes de los planes, los conteos aleatorios, el avance del horizonte
+de plan_ocurrencia y la purga de ejecuciones a su hora, y atiende las
+ejecuciones encoladas desde la web. Puede haber varios en marcha: solo el
+que obtiene el cerrojo trabaja.
+
+Uso:
+    python scripts/planificador.py            # bucle continuo
+    python scripts/planificador.py --una-vez  # un ciclo y termina
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Este proceso es el planificador: la aplicación no arranca su propio hilo
+os.environ["PLANIFICADOR_MODO"] = "externo"
+
+from app import create_app
+from app.services.planificador import crear_planificador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planificador de trabajos GMAO")
+    parser.add_argument(
+        "--una-vez", action="store_true", help="Ejecutar un solo ciclo y salir"
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    planificador = crear_planificador(app)
+
+    print("\n" + "=" * 60)
+    print("⏰ PLANIFICADOR DE TRABAJOS")
+    print("=" * 60)
+    for trabajo in planificador.trabajos.values():
+        programacion = trabajo.hora or "a petición"
+        print(f"   • {trabajo.nombre}: {programacion}")
+    print("=" * 60 + "\n")
+
+    if args.una_vez:
+        ejecuciones = planificador.ciclo()
+        if not planificador.cerrojo.es_lider:
+            print("⚠️ Otro proceso tiene el cerrojo del planificador")
+        for ejecucion in ejecuciones:
+            print(f"✅ {ejecucion.trabajo}: {ejecucion.estado}")
+        planificador.cerrojo.liberar()
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: planificador.detener())
+    planificador.iniciar()
+    try:
+        while planificador.activo:
+            planificador._hilo.join(1)
+    except KeyboardInterrupt:
+        planificador.detener()
+    print("👋 Planificador detenido")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
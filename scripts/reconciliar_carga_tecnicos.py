@@ -0,0 +1,64 @@
+"""
+Script para reconstruir la tabla carga_tecnico desde las órdenes de trabajo
+y reportar las diferencias encontradas.
+
+Uso:
+    python scripts/reconciliar_carga_tecnicos.py              # corrige
+    python scripts/reconciliar_carga_tecnicos.py --verificar  # solo reporta
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.extensions import db
+from app.models.carga_tecnico import CargaTecnico
+
+
+def reconciliar(solo_verificar=False):
+    """Reconstruye carga_tecnico y devuelve la lista de diferencias"""
+    diferencias = CargaTecnico.recalcular()
+    if solo_verificar:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return diferencias
+
+
+def main():
+    solo_verificar = "--verificar" in sys.argv
+
+    app = create_app()
+    with app.app_context():
+        diferencias = reconciliar(solo_verificar)
+
+        print("\n" + "=" * 60)
+        print("👥 RECONCILIACIÓN DE CARGA_TECNICO")
+        print("=" * 60)
+
+        if not diferencias:
+            print("\n✅ Las cargas coinciden con las órdenes abiertas")
+        else:
+            print(f"\n⚠️  Técnicos con diferencias: {len(diferencias)}")
+            for diferencia in diferencias:
+                antes = diferencia["antes"]
+                antes = "sin fila" if antes is None else antes
+                print(
+                    f"   - Técnico {diferencia['tecnico_id']}: "
+                    f"{antes} → {diferencia['despues']}"
+                )
+
+            if solo_verificar:
+                print("\n💡 Ejecuta sin --verificar para corregirlas")
+            else:
+                print("\n✅ Cargas reconstruidas")
+
+        print("\n" + "=" * 60 + "\n")
+
+    return 1 if diferencias and solo_verificar else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Script para reconstruir la tabla stock_resumen desde los lotes y reportar
+las diferencias encontradas.
+
+Uso:
+    python scripts/reconciliar_stock_resumen.py              # corrige
+    python scripts/reconciliar_stock_resumen.py --verificar  # solo reporta
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.extensions import db
+from app.models.stock_resumen import StockResumen
+
+CAMPOS = (
+    "total_actual",
+    "total_reservado",
+    "numero_lotes",
+    "valor_fifo",
+    "proximo_vencimiento",
+)
+
+
+def reconciliar(solo_verificar=False):
+    """Reconstruye stock_resumen y devuelve la lista de diferencias"""
+    diferencias = StockResumen.recalcular()
+    if solo_verificar:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return diferencias
+
+
+def main():
+    solo_verificar = "--verificar" in sys.argv
+
+    app = create_app()
+    with app.app_context():
+        diferencias = reconciliar(solo_verificar)
+
+        print("\n" + "=" * 60)
+        print("📊 RECONCILIACIÓN DE STOCK_RESUMEN")
+        print("=" * 60)
+
+        if not diferencias:
+            print("\n✅ El resumen coincide con los lotes")
+        else:
+            print(f"\n⚠️  Artículos con diferencias: {len(diferencias)}")
+            for diferencia in diferencias:
+                antes = diferencia["antes"]
+                despues = diferencia["despues"]
+                if antes is None:
+                    print(f"   - Artículo {diferencia['inventario_id']}: sin fila")
+                    continue
+                cambios = ", ".join(
+                    f"{campo} {antes[campo]} → {despues[campo]}"
+                    for campo in CAMPOS
+                    if antes[campo] != despues[campo]
+                )
+                print(f"   - Artículo {diferencia['inventario_id']}: {cambios}")
+
+            if solo_verificar:
+                print("\n💡 Ejecuta sin --verificar para corregirlas")
+            else:
+                print("\n✅ Resumen reconstruido")
+
+        print("\n" + "=" * 60 + "\n")
+
+    return 1 if diferencias and solo_verificar else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
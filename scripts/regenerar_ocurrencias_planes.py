@@ -0,0 +1,40 @@
+"""
+Script para reconstruir plan_ocurrencia (ejecuciones previstas de los planes
+durante los próximos 12 meses). La migración que crea la tabla la deja
+vacía: la llena y avanza cada día el trabajo "horizonte_planes" del
+planificador. El script sirve para llenarla justo tras migrar o rehacerla
+a mano (p. ej. tras escribir planes con SQL directo).
+
+Uso:
+    python scripts/regenerar_ocurrencias_planes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.extensions import db
+from app.models.plan_ocurrencia import HORIZONTE_DIAS, PlanOcurrencia
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        filas = PlanOcurrencia.regenerar_todo()
+        db.session.commit()
+
+        print("\n" + "=" * 60)
+        print("📅 REGENERACIÓN DE PLAN_OCURRENCIA")
+        print("=" * 60)
+        print(
+            f"\n✅ {filas} ejecuciones previstas en los próximos {HORIZONTE_DIAS} días"
+        )
+        print("\n" + "=" * 60 + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
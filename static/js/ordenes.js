@@ -10,6 +10,11 @@ let ordenEditando = null;
 let currentPage = 1;
 let perPage = 10;
 let paginacionOrdenes;
+// Cursor con el que empieza cada página ya alcanzada (next_cursor de la
+// anterior) y filtros a los que corresponden; evita el OFFSET en páginas
+// profundas
+let cursoresOrdenes = {};
+let firmaCursoresOrdenes = "";
 
 // Variable para selección masiva
 
@@ -182,6 +187,13 @@ async function cargarOrdenes(page = 1, perPageParam = null, filtros = {}) {
     if (filtros.tipo) params.append("tipo", filtros.tipo);
     if (filtros.prioridad) params.append("prioridad", filtros.prioridad);
 
+    const firma = JSON.stringify([perPage, filtros]);
+    if (firma !== firmaCursoresOrdenes) {
+      cursoresOrdenes = {};
+      firmaCursoresOrdenes = firma;
+    }
+    if (cursoresOrdenes[page]) params.append("cursor", cursoresOrdenes[page]);
+
     const response = await fetch(`/ordenes/api?${params}`);
 
     if (response.ok) {
@@ -191,6 +203,7 @@ async function cargarOrdenes(page = 1, perPageParam = null, filtros = {}) {
       if (contentType && contentType.includes("application/json")) {
         const data = await response.json();
         ordenes = data.items || [];
+        if (data.next_cursor) cursoresOrdenes[data.page + 1] = data.next_cursor;
         mostrarOrdenes();
         actualizarEstadisticas();
 
@@ -1647,6 +1647,25 @@ function generarOrdenesManual() {
   });
 }
 
+// Espera a que termine una ejecución encolada en el planificador y devuelve
+// su resultado con la misma forma que la respuesta directa
+async function esperarEjecucion(estadoUrl, intervaloMs = 2000) {
+  while (true) {
+    const response = await fetch(estadoUrl);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const { ejecucion } = await response.json();
+    if (ejecucion.estado === "completado") {
+      return { success: true, ...(ejecucion.resultado || {}) };
+    }
+    if (ejecucion.estado === "error") {
+      return { success: false, error: ejecucion.error };
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervaloMs));
+  }
+}
+
 // Función separada para ejecutar la generación después de la confirmación
 function ejecutarGeneracionManual() {
   console.log("—³ Ejecutando generación manual...");
@@ -1664,6 +1683,9 @@ function ejecutarGeneracionManual() {
       }
       return response.json();
     })
+    .then((result) =>
+      result.encolado ? esperarEjecucion(result.estado_url) : result
+    )
     .then((result) => {
       console.log("✅ Resultado generación manual:", result);
 
@@ -0,0 +1,139 @@
+"""
+Tests de la paginación por cursor del listado de órdenes (listar_ordenes_paginado)
+"""
+
+import random
+
+import pytest
+from sqlalchemy import event
+
+from app.controllers.ordenes_controller import (
+    listar_ordenes_paginado,
+    total_ordenes,
+)
+from app.extensions import db
+from app.models.orden_trabajo import OrdenTrabajo
+from app.services.invalidacion_cache import registrar_invalidacion_ordenes
+from app.utils.cache import TAG_LISTADO_ORDENES, invalidar_tags, obtener_cache
+
+
+@pytest.fixture
+def ordenes(db_session):
+    # Las tablas se recrean en cada test sin pasar por la sesión
+    invalidar_tags({TAG_LISTADO_ORDENES})
+    numeros = list(range(1, 24))
+    random.Random(5).shuffle(numeros)  # ids en distinto orden que los números
+    for n in numeros:
+        db.session.add(
+            OrdenTrabajo(
+                numero_orden=f"OT-{n:06d}",
+                tipo="Correctivo",
+                prioridad="Media",
+                estado="Pendiente" if n % 3 else "Completada",
+                descripcion=f"Orden {n}",
+            )
+        )
+    db.session.commit()
+    yield
+    invalidar_tags({TAG_LISTADO_ORDENES})
+
+
+def _recorrer(**filtros):
+    paginas, cursor, page = [], None, 1
+    while True:
+        resultado = listar_ordenes_paginado(page, 5, cursor=cursor, **filtros)
+        paginas.append(resultado)
+        if not resultado["has_next"]:
+            return paginas
+        cursor, page = resultado["next_cursor"], page + 1
+
+
+@pytest.mark.database
+def test_cursor_recorre_las_mismas_paginas_que_offset(ordenes):
+    por_cursor = _recorrer()
+    por_offset = [listar_ordenes_paginado(p, 5) for p in range(1, 6)]
+
+    assert [p["items"] for p in por_cursor] == [p["items"] for p in por_offset]
+    numeros = [o["numero_orden"] for p in por_cursor for o in p["items"]]
+    assert numeros == [f"OT-{n:06d}" for n in range(1, 24)]
+
+    ultima = por_cursor[-1]
+    assert (ultima["page"], ultima["total"], ultima["pages"]) == (5, 23, 5)
+    assert ultima["has_prev"] and not ultima["has_next"]
+    assert ultima["next_cursor"] is None
+
+
+@pytest.mark.database
+def test_cursor_con_filtros(ordenes):
+    paginas = _recorrer(estado="Completada")
+    numeros = [o["numero_orden"] for p in paginas for o in p["items"]]
+    assert numeros == [f"OT-{n:06d}" for n in range(3, 24, 3)]
+    assert paginas[0]["total"] == 7
+
+
+@pytest.mark.database
+def test_pagina_por_cursor_filtra_por_clave(ordenes):
+    cursor = listar_ordenes_paginado(1, 5)["next_cursor"]
+    sentencias = []
+
+    def capturar(conn, cursor_db, sql, *args):
+        sentencias.append(sql)
+
+    event.listen(db.engine, "before_cursor_execute", capturar)
+    try:
+        listar_ordenes_paginado(2, 5, cursor=cursor)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capturar)
+
+    # Total cacheado desde la primera página: una sola consulta, por clave
+    assert len(sentencias) == 1
+    assert "(orden_trabajo.numero_orden, orden_trabajo.id) >" in sentencias[0]
+
+
+@pytest.mark.database
+def test_total_cacheado_se_invalida_al_confirmar(ordenes):
+    assert total_ordenes() == 23
+
+    # INSERT con Core sin avisar: el total sigue siendo el cacheado
+    db.session.execute(
+        db.insert(OrdenTrabajo), [{"numero_orden": "OT-900001", "estado": "Pendiente"}]
+    )
+    db.session.commit()
+    assert total_ordenes() == 23
+
+    db.session.execute(
+        db.insert(OrdenTrabajo), [{"numero_orden": "OT-900002", "estado": "Pendiente"}]
+    )
+    registrar_invalidacion_ordenes()
+    db.session.commit()
+    assert total_ordenes() == 25
+
+    # Los cambios con el ORM invalidan solos
+    db.session.add(OrdenTrabajo(numero_orden="OT-900003", estado="Pendiente"))
+    db.session.commit()
+    assert total_ordenes() == 26
+    assert total_ordenes(estado="Pendiente") == 19
+
+
+@pytest.mark.database
+def test_busqueda_libre_no_se_cachea(ordenes):
+    cache = obtener_cache()
+    entradas = len(cache.local)
+
+    assert total_ordenes(q="Orden 1") == 11  # 1 y 10-19
+    assert total_ordenes(q="Orden 2") == 5  # 2 y 20-23
+    assert len(cache.local) == entradas
+    assert cache._vuelos == {}
+
+
+@pytest.mark.api
+def test_api_con_cursor(ordenes, authenticated_client):
+    primera = authenticated_client.get("/ordenes/api?page=1&per_page=10").get_json()
+    segunda = authenticated_client.get(
+        f"/ordenes/api?page=2&per_page=10&cursor={primera['next_cursor']}"
+    ).get_json()
+    assert segunda["items"][0]["numero_orden"] == "OT-000011"
+    assert {"items", "page", "per_page", "total", "pages"} <= set(segunda)
+
+    resp = authenticated_client.get("/ordenes/api?page=2&cursor=no-es-un-cursor")
+    assert resp.status_code == 400
@@ -0,0 +1,180 @@
+"""
+Tests de la generación automática de órdenes desde planes preventivos
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.controllers.planes_controller import (
+    asignar_tecnico_equilibrado,
+    generar_ordenes_automaticas,
+)
+from app.extensions import db
+from app.models.carga_tecnico import CargaTecnico
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.models.usuario import Usuario
+from app.services import numeracion
+from app.utils import recurrencia
+
+
+def _crear_tecnicos(n):
+    tecnicos = [
+        Usuario(
+            username=f"tecnico_{i}",
+            email=f"tecnico_{i}@test.com",
+            nombre=f"Técnico {i}",
+            rol="Técnico",
+        )
+        for i in range(n)
+    ]
+    db.session.add_all(tecnicos)
+    db.session.commit()
+    return tecnicos
+
+
+def _crear_planes(n, activo, inicio=0):
+    planes = [
+        PlanMantenimiento(
+            codigo_plan=f"PM-{inicio + i:04d}",
+            nombre=f"Plan {inicio + i}",
+            activo_id=activo.id,
+            tipo_frecuencia="diaria",
+            proxima_ejecucion=datetime.now() - timedelta(days=1),
+            estado="Activo",
+            generacion_automatica=True,
+        )
+        for i in range(n)
+    ]
+    db.session.add_all(planes)
+    db.session.commit()
+    return planes
+
+
+def _contar_consultas(funcion):
+    sentencias = []
+
+    def contar(conn, cursor, sentencia, parametros, contexto, executemany):
+        sentencias.append(sentencia)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        resultado = funcion()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    return resultado, len(sentencias)
+
+
+@pytest.mark.database
+class TestGenerarOrdenesAutomaticas:
+    def test_crea_ordenes_y_omite_planes_con_orden_abierta(
+        self, db_session, activo_test
+    ):
+        tecnicos = _crear_tecnicos(2)
+        plan_con_orden, plan_antiguo, plan_nuevo = _crear_planes(3, activo_test)
+        db_session.add_all(
+            [
+                OrdenTrabajo(
+                    numero_orden="OT-PREVIA-1",
+                    tipo="Mantenimiento Preventivo",
+                    estado="En Proceso",
+                    activo_id=activo_test.id,
+                    plan_mantenimiento_id=plan_con_orden.id,
+                    tecnico_id=tecnicos[0].id,
+                ),
+                # Orden anterior sin plan_mantenimiento_id
+                OrdenTrabajo(
+                    numero_orden="OT-PREVIA-2",
+                    tipo="Mantenimiento Preventivo",
+                    estado="Pendiente",
+                    activo_id=activo_test.id,
+                    descripcion=f"Mantenimiento preventivo - Plan: "
+                    f"{plan_antiguo.codigo_plan} - {plan_antiguo.nombre}",
+                ),
+            ]
+        )
+        db_session.commit()
+
+        resultado = generar_ordenes_automaticas()
+
+        assert resultado["success"] is True
+        assert [d["plan_codigo"] for d in resultado["detalles"]] == [
+            plan_nuevo.codigo_plan
+        ]
+        assert resultado["detalles"][0]["activo_nombre"] == activo_test.nombre
+        orden = OrdenTrabajo.query.filter_by(plan_mantenimiento_id=plan_nuevo.id).one()
+        # El técnico 0 ya tenía una orden abierta
+        assert orden.tecnico_id == tecnicos[1].id
+        assert orden.numero_orden == resultado["detalles"][0]["numero_orden"]
+        plan_nuevo = db_session.get(PlanMantenimiento, plan_nuevo.id)
+        assert plan_nuevo.proxima_ejecucion > datetime.now()
+
+        # Una segunda ejecución no duplica
+        assert generar_ordenes_automaticas()["ordenes_generadas"] == 0
+
+    def test_reparte_la_carga_entre_tecnicos(self, db_session, activo_test):
+        tecnicos = _crear_tecnicos(3)
+        _crear_planes(7, activo_test)
+
+        generar_ordenes_automaticas()
+
+        cargas = sorted(
+            OrdenTrabajo.query.filter_by(tecnico_id=t.id).count() for t in tecnicos
+        )
+        assert cargas == [2, 2, 3]
+        # El INSERT masivo también actualiza carga_tecnico
+        assert CargaTecnico.recalcular() == []
+        assert asignar_tecnico_equilibrado() in {t.id for t in tecnicos}
+
+    def test_regla_que_falla_usa_el_respaldo(self, db_session, activo_test, mocker):
+        roto, bueno = _crear_planes(2, activo_test)
+        siguientes = recurrencia.siguientes
+
+        def en_bloque(reglas, despues):
+            # Falla la evaluación del lote; la de un solo plan funciona
+            if len(reglas) > 1:
+                raise ValueError("regla desconocida")
+            return siguientes(reglas, despues)
+
+        proxima_ejecucion = recurrencia.proxima_ejecucion
+
+        def proxima(plan, despues):
+            if plan.codigo_plan == roto.codigo_plan:
+                raise ValueError("frecuencia ilegible")
+            return proxima_ejecucion(plan, despues)
+
+        mocker.patch.object(recurrencia, "siguientes", side_effect=en_bloque)
+        mocker.patch.object(recurrencia, "proxima_ejecucion", side_effect=proxima)
+        inicio = datetime.now()
+
+        resultado = generar_ordenes_automaticas()
+
+        assert resultado["success"] is True
+        assert resultado["ordenes_generadas"] == 2
+        roto = db_session.get(PlanMantenimiento, roto.id)
+        bueno = db_session.get(PlanMantenimiento, bueno.id)
+        assert roto.proxima_ejecucion - inicio >= timedelta(days=1)
+        assert roto.proxima_ejecucion - inicio < timedelta(days=1, minutes=1)
+        assert bueno.proxima_ejecucion == datetime.combine(
+            inicio.date() + timedelta(days=1), datetime.min.time()
+        )
+
+    def test_numero_de_consultas_no_depende_de_los_planes(
+        self, db_session, activo_test
+    ):
+        _crear_tecnicos(3)
+        _crear_planes(3, activo_test)
+        # Serie OT ya inicializada (su primer uso consulta las órdenes existentes)
+        numeracion.numero_orden()
+        db.session.commit()
+        resultado, pocas = _contar_consultas(generar_ordenes_automaticas)
+        assert resultado["ordenes_generadas"] == 3
+
+        _crear_planes(60, activo_test, inicio=100)
+        resultado, muchas = _contar_consultas(generar_ordenes_automaticas)
+        assert resultado["ordenes_generadas"] == 60
+
+        assert muchas == pocas
+        assert OrdenTrabajo.query.count() == 63
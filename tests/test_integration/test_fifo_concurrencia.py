@@ -0,0 +1,135 @@
+"""
+Prueba de estrés del consumo FIFO con varios procesos sobre la misma base de datos.
+
+Cada proceso crea su propia aplicación contra un SQLite en fichero y consume
+stock del mismo artículo; el control de versión de LoteInventario y los
+reintentos de ServicioFIFO deben evitar dobles consumos y stock negativo.
+"""
+
+import multiprocessing
+import os
+import time
+import pytest
+
+PROCESOS = 4
+CONSUMOS_POR_PROCESO = 25
+CANTIDAD_POR_CONSUMO = 3
+LOTES = [40, 40, 40, 40, 40]  # 200 unidades, menos que la demanda total (300)
+
+
+def _crear_app(ruta_bd):
+    """Aplicación apuntando a la base de datos compartida del test"""
+    os.environ.pop("PYTEST_CURRENT_TEST", None)
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{ruta_bd}"
+    os.environ["FIFO_MAX_REINTENTOS"] = "50"
+    # Sin PYTEST_CURRENT_TEST la fábrica usaría instance/: se redirige todo
+    directorio = os.path.dirname(ruta_bd)
+    os.environ["METRICAS_MULTIPROCESO_DIR"] = os.path.join(directorio, "metricas")
+    os.environ["METRICAS_HISTORIAL_PATH"] = ""
+    os.environ["METRICAS_ROLLUP_DIR"] = ""
+    os.environ["PLANIFICADOR_MODO"] = "desactivado"
+    os.environ["PLANIFICADOR_CERROJO"] = os.path.join(directorio, "planificador.lock")
+    from app.factory import create_app
+
+    return create_app()
+
+
+def _preparar_bd(ruta_bd):
+    from datetime import datetime, timedelta
+    from app.extensions import db
+    from app.models.inventario import Inventario
+    from app.services.servicio_fifo import ServicioFIFO
+
+    app = _crear_app(ruta_bd)
+    with app.app_context():
+        db.create_all()
+        articulo = Inventario(codigo="CONC-001", descripcion="Concurrencia")
+        db.session.add(articulo)
+        db.session.commit()
+        for i, cantidad in enumerate(LOTES):
+            lote = ServicioFIFO.crear_lote_entrada(
+                inventario_id=articulo.id,
+                cantidad=cantidad,
+                precio_unitario=1,
+                codigo_lote=f"CONC-{i}",
+            )
+            lote.fecha_entrada = datetime.now() - timedelta(days=len(LOTES) - i)
+        db.session.commit()
+
+
+def _trabajador(ruta_bd, resultados):
+    from app.extensions import db
+    from app.models.inventario import Inventario
+    from app.services.servicio_fifo import ServicioFIFO
+
+    app = _crear_app(ruta_bd)
+    consumido = 0.0
+    operaciones = 0
+    with app.app_context():
+        inventario_id = Inventario.query.filter_by(codigo="CONC-001").one().id
+        inicio = time.perf_counter()
+        for _ in range(CONSUMOS_POR_PROCESO):
+            consumos, _faltante = ServicioFIFO.ejecutar_en_transaccion(
+                lambda: ServicioFIFO.consumir_fifo(
+                    inventario_id, CANTIDAD_POR_CONSUMO, usuario_id=f"p{os.getpid()}"
+                )
+            )
+            consumido += sum(c for _, c in consumos)
+            operaciones += 1
+        resultados.put((consumido, operaciones, time.perf_counter() - inicio))
+        db.session.remove()
+
+
+@pytest.mark.integration
+@pytest.mark.fifo
+@pytest.mark.slow
+@pytest.mark.performance
+def test_consumo_concurrente_multiproceso(tmp_path):
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("fork" if "fork" in metodos else "spawn")
+    ruta_bd = str(tmp_path / "fifo_concurrencia.db")
+
+    preparacion = contexto.Process(target=_preparar_bd, args=(ruta_bd,))
+    preparacion.start()
+    preparacion.join(120)
+    assert preparacion.exitcode == 0
+
+    resultados = contexto.Queue()
+    procesos = [
+        contexto.Process(target=_trabajador, args=(ruta_bd, resultados))
+        for _ in range(PROCESOS)
+    ]
+    inicio = time.perf_counter()
+    for proceso in procesos:
+        proceso.start()
+    salidas = [resultados.get(timeout=300) for _ in procesos]
+    for proceso in procesos:
+        proceso.join(60)
+        assert proceso.exitcode == 0
+    duracion = time.perf_counter() - inicio
+
+    total_consumido = sum(s[0] for s in salidas)
+    total_operaciones = sum(s[1] for s in salidas)
+    print(
+        f"\n{total_operaciones} consumos en {PROCESOS} procesos: "
+        f"{total_operaciones / duracion:.1f} ops/s"
+    )
+
+    import sqlite3
+
+    with sqlite3.connect(ruta_bd) as conexion:
+        cantidades = [
+            row[0]
+            for row in conexion.execute("SELECT cantidad_actual FROM lote_inventario")
+        ]
+        movido = conexion.execute(
+            "SELECT COALESCE(SUM(cantidad), 0) FROM movimiento_lote "
+            "WHERE tipo_movimiento = 'consumo'"
+        ).fetchone()[0]
+
+    # La demanda supera el stock: se consume exactamente lo que había
+    assert total_operaciones == PROCESOS * CONSUMOS_POR_PROCESO
+    assert total_consumido == pytest.approx(sum(LOTES))
+    assert all(float(c) >= 0 for c in cantidades)
+    assert sum(float(c) for c in cantidades) == pytest.approx(0)
+    assert float(movido) == pytest.approx(sum(LOTES))
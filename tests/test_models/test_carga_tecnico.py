@@ -0,0 +1,90 @@
+"""
+Tests de la carga de órdenes abiertas por técnico (carga_tecnico)
+"""
+
+import pytest
+
+from app.controllers.planes_controller import asignar_tecnico_equilibrado
+from app.extensions import db
+from app.models.carga_tecnico import CargaTecnico
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.usuario import Usuario
+
+
+def _tecnico(nombre):
+    tecnico = Usuario(
+        username=nombre, email=f"{nombre}@test.com", nombre=nombre, rol="tecnico"
+    )
+    db.session.add(tecnico)
+    db.session.commit()
+    return tecnico
+
+
+def _orden(numero, tecnico, estado="Pendiente"):
+    orden = OrdenTrabajo(numero_orden=numero, estado=estado, tecnico_id=tecnico.id)
+    db.session.add(orden)
+    db.session.commit()
+    return orden
+
+
+def _carga(tecnico):
+    carga = db.session.get(CargaTecnico, tecnico.id)
+    return carga.ordenes_abiertas if carga else 0
+
+
+@pytest.mark.unit
+@pytest.mark.database
+class TestCargaTecnico:
+    def test_altas_cambios_de_estado_y_borrados(self, db_session):
+        ana = _tecnico("ana")
+        orden = _orden("OT-C-1", ana)
+        _orden("OT-C-2", ana, estado="Completada")
+        assert _carga(ana) == 1
+
+        orden.estado = "En Proceso"
+        db_session.commit()
+        assert _carga(ana) == 1
+
+        orden.estado = "Completada"
+        db_session.commit()
+        assert _carga(ana) == 0
+
+        orden.estado = "Pendiente"
+        db_session.commit()
+        db_session.delete(orden)
+        db_session.commit()
+        assert _carga(ana) == 0
+        assert CargaTecnico.recalcular() == []
+
+    def test_cambio_de_tecnico_con_atributos_expirados(self, db_session):
+        ana, luis = _tecnico("ana"), _tecnico("luis")
+        orden = _orden("OT-C-3", ana)
+
+        # Tras el commit los atributos están expirados
+        orden.tecnico_id = luis.id
+        db_session.commit()
+
+        assert (_carga(ana), _carga(luis)) == (0, 1)
+        assert CargaTecnico.recalcular() == []
+
+    def test_recalcular_corrige_diferencias(self, db_session):
+        ana = _tecnico("ana")
+        _orden("OT-C-4", ana)
+        db_session.get(CargaTecnico, ana.id).ordenes_abiertas = 7
+        db_session.flush()
+
+        [diferencia] = CargaTecnico.recalcular()
+
+        assert (diferencia["antes"], diferencia["despues"]) == (7, 1)
+        assert _carga(ana) == 1
+
+
+@pytest.mark.database
+def test_asignacion_equilibrada_en_un_lote_sin_confirmar(db_session):
+    ana, luis, eva = _tecnico("ana"), _tecnico("luis"), _tecnico("eva")
+    _orden("OT-C-5", ana)
+
+    # Sin commit entre llamadas: el montículo cuenta lo ya asignado
+    asignados = [asignar_tecnico_equilibrado() for _ in range(5)]
+
+    assert asignados == [luis.id, eva.id, ana.id, luis.id, eva.id]
@@ -0,0 +1,164 @@
+"""
+Tests unitarios para la asignación FIFO de LoteInventario
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from app.extensions import db
+from app.models.inventario import Inventario
+from app.models.lote_inventario import LoteInventario, MovimientoLote
+from app.services.fifo_optimizado import FIFOOptimizado
+
+
+def _lote(inventario_id, cantidad, dias, reservada=0, vencido=False):
+    return LoteInventario(
+        inventario_id=inventario_id,
+        codigo_lote=f"L-{dias}-{cantidad}",
+        fecha_entrada=datetime.now() - timedelta(days=dias),
+        fecha_vencimiento=(datetime.now() - timedelta(days=1)) if vencido else None,
+        cantidad_inicial=Decimal(str(cantidad)),
+        cantidad_actual=Decimal(str(cantidad)),
+        cantidad_reservada=Decimal(str(reservada)),
+        precio_unitario=Decimal("1.00"),
+        costo_total=Decimal(str(cantidad)),
+    )
+
+
+@pytest.fixture
+def articulo_con_lotes(db_session):
+    articulo = Inventario(codigo="LOT-FIFO-001", descripcion="Lotes FIFO")
+    db_session.add(articulo)
+    db_session.commit()
+    db_session.add_all(
+        [
+            _lote(articulo.id, 10, 50),
+            _lote(articulo.id, 5, 40, vencido=True),
+            _lote(articulo.id, 8, 30, reservada=8),  # sin disponible
+            _lote(articulo.id, 20, 20, reservada=5),
+            _lote(articulo.id, 30, 10),
+        ]
+        + [_lote(articulo.id, 1, d) for d in range(1, 9)]
+    )
+    db_session.commit()
+    return articulo
+
+
+@pytest.mark.unit
+@pytest.mark.fifo
+class TestObtenerLotesFIFO:
+    @pytest.mark.parametrize("cantidad", [1, 10, 11, 25, 26, 60, 1000])
+    def test_modo_sql_equivale_a_modo_python(self, articulo_con_lotes, cantidad):
+        sql, pendiente_sql = LoteInventario.obtener_lotes_fifo(
+            articulo_con_lotes.id, cantidad, modo="sql"
+        )
+        py, pendiente_py = LoteInventario.obtener_lotes_fifo(
+            articulo_con_lotes.id, cantidad, modo="python"
+        )
+
+        assert [(l.id, c) for l, c in sql] == [(l.id, c) for l, c in py]
+        assert pendiente_sql == pendiente_py
+
+    def test_modo_sql_solo_carga_los_lotes_tocados(self, articulo_con_lotes):
+        lotes, pendiente = LoteInventario.obtener_lotes_fifo(
+            articulo_con_lotes.id, 12, modo="sql"
+        )
+
+        # 10 del lote más antiguo + 2 del lote con 15 disponibles
+        assert [c for _, c in lotes] == [10, 2]
+        assert pendiente == 0
+
+    def test_modo_sql_es_una_sola_consulta(self, articulo_con_lotes):
+        inventario_id = articulo_con_lotes.id
+        sentencias = []
+
+        def contar(conn, cursor, statement, *args):
+            sentencias.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", contar)
+        try:
+            LoteInventario.obtener_lotes_fifo(inventario_id, 12)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", contar)
+
+        assert len(sentencias) == 1
+        assert "OVER" in sentencias[0].upper()
+
+    def test_incluir_vencidos(self, articulo_con_lotes):
+        lotes, _ = LoteInventario.obtener_lotes_fifo(
+            articulo_con_lotes.id, 12, incluir_vencidos=True
+        )
+
+        assert [c for _, c in lotes] == [10, 2]
+        assert lotes[1][0].codigo_lote == "L-40-5"
+
+
+def _plan(consulta):
+    """
+    Ejecuta consulta() capturando su primera sentencia SQL y devuelve el plan
+    de ejecución de esa misma sentencia (EXPLAIN QUERY PLAN en SQLite,
+    EXPLAIN con seqscan desactivado en PostgreSQL).
+    """
+    capturadas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        capturadas.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capturar)
+    try:
+        consulta()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capturar)
+
+    statement, parameters = capturadas[0]
+    conexion = db.session.connection()
+    if conexion.dialect.name == "postgresql":
+        # Con tablas pequeñas el planificador prefiere siempre el seqscan
+        conexion.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        filas = conexion.exec_driver_sql("EXPLAIN " + statement, parameters)
+    else:
+        filas = conexion.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return "\n".join(str(fila[-1]) for fila in filas)
+
+
+@pytest.mark.unit
+@pytest.mark.fifo
+@pytest.mark.database
+class TestIndicesLotes:
+    def test_obtener_lotes_fifo_usa_indice_parcial(self, articulo_con_lotes):
+        inventario_id = articulo_con_lotes.id
+
+        for modo in ("sql", "python"):
+            plan = _plan(
+                lambda: LoteInventario.obtener_lotes_fifo(inventario_id, 12, modo=modo)
+            )
+            assert "ix_lote_inventario_fifo" in plan, plan
+
+    def test_consulta_batch_usa_indice_parcial(self, articulo_con_lotes):
+        consulta = FIFOOptimizado._consulta_lotes_disponibles([articulo_con_lotes.id])
+
+        plan = _plan(lambda: db.session.execute(consulta).all())
+
+        assert "ix_lote_inventario_fifo" in plan, plan
+
+    def test_vencimientos_usan_indice_de_vencimiento(self, articulo_con_lotes):
+        plan = _plan(
+            lambda: LoteInventario.query.filter(
+                LoteInventario.fecha_vencimiento.isnot(None),
+                LoteInventario.fecha_vencimiento <= datetime.now(),
+            )
+            .order_by(LoteInventario.fecha_vencimiento.desc())
+            .all()
+        )
+
+        assert "ix_lote_inventario_vencimiento" in plan, plan
+
+    def test_movimientos_por_orden_usan_indice(self, db_session):
+        plan = _plan(
+            lambda: MovimientoLote.query.filter_by(
+                orden_trabajo_id=1, tipo_movimiento="reserva"
+            ).all()
+        )
+
+        assert "ix_movimiento_lote_orden_tipo" in plan, plan
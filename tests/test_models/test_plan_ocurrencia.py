@@ -0,0 +1,110 @@
+"""
+Tests del horizonte de ejecuciones previstas de los planes (plan_ocurrencia)
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.controllers.planes_controller import generar_ordenes_automaticas
+from app.extensions import db
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.models.plan_ocurrencia import HORIZONTE_DIAS, PlanOcurrencia
+
+
+def _plan(codigo, proxima, **frecuencia):
+    plan = PlanMantenimiento(
+        codigo_plan=codigo,
+        nombre=codigo,
+        proxima_ejecucion=proxima,
+        estado="Activo",
+        **frecuencia,
+    )
+    db.session.add(plan)
+    db.session.commit()
+    return plan
+
+
+def _fechas(plan):
+    return [
+        fecha
+        for (fecha,) in db.session.query(PlanOcurrencia.fecha)
+        .filter_by(plan_id=plan.id)
+        .order_by(PlanOcurrencia.fecha)
+    ]
+
+
+def _contenido():
+    return [
+        (o.plan_id, o.fecha)
+        for o in PlanOcurrencia.query.order_by(
+            PlanOcurrencia.plan_id, PlanOcurrencia.fecha
+        )
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.database
+class TestPlanOcurrencia:
+    def test_alta_materializa_el_horizonte(self, db_session):
+        manana = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        plan = _plan("PM-OC-1", manana, tipo_frecuencia="semanal", intervalo_semanas=1)
+
+        fechas = _fechas(plan)
+        assert fechas[0] == manana.date()
+        assert all(b - a == timedelta(days=7) for a, b in zip(fechas, fechas[1:]))
+        assert fechas[-1] <= date.today() + timedelta(days=HORIZONTE_DIAS)
+        assert len(fechas) in (52, 53)
+
+    def test_edicion_desactivacion_y_borrado(self, db_session):
+        hoy = datetime.combine(date.today(), datetime.min.time())
+        plan = _plan("PM-OC-2", hoy, tipo_frecuencia="diaria")
+        assert len(_fechas(plan)) == HORIZONTE_DIAS + 1
+
+        plan.tipo_frecuencia = "mensual"
+        plan.tipo_mensual = "dia_mes"
+        plan.dia_mes = 1
+        db.session.commit()
+        assert 12 <= len(_fechas(plan)) <= 14
+        assert all(f.day == 1 for f in _fechas(plan)[1:])
+
+        plan.estado = "Inactivo"
+        db.session.commit()
+        assert _fechas(plan) == []
+
+        plan.estado = "Activo"
+        db.session.commit()
+        db.session.delete(plan)
+        db.session.commit()
+        assert PlanOcurrencia.query.count() == 0
+
+    def test_conserva_la_proxima_ejecucion_vencida(self, db_session):
+        vencida = datetime.now() - timedelta(days=10)
+        plan = _plan("PM-OC-3", vencida, frecuencia="Mensual")
+
+        fechas = _fechas(plan)
+        assert fechas[0] == vencida.date()
+        # Las siguientes, cada 30 días desde la vencida, ya dentro del horizonte
+        assert fechas[1] == (vencida + timedelta(days=30)).date()
+
+    def test_generacion_de_ordenes_replanifica_y_coincide_con_reconstruir(
+        self, db_session, activo_test
+    ):
+        ayer = datetime.now() - timedelta(days=1)
+        for i in range(3):
+            plan = _plan(
+                f"PM-OC-G{i}",
+                ayer,
+                tipo_frecuencia="diaria",
+                generacion_automatica=True,
+            )
+            plan.activo_id = activo_test.id
+        db.session.commit()
+
+        assert generar_ordenes_automaticas()["ordenes_generadas"] == 3
+        incremental = _contenido()
+        assert min(fecha for _, fecha in incremental) > date.today()
+
+        PlanOcurrencia.regenerar_todo()
+        db.session.commit()
+        assert _contenido() == incremental
@@ -0,0 +1,142 @@
+"""
+Tests del resumen de stock por artículo (stock_resumen)
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from app.extensions import db
+from app.models.inventario import Inventario
+from app.models.lote_inventario import LoteInventario
+from app.models.stock_resumen import StockResumen
+from app.services.fifo_optimizado import FIFOOptimizado
+from app.services.servicio_fifo import ServicioFIFO
+
+
+def _crear_articulo(codigo, lotes):
+    """Crea un artículo con lotes (cantidad, precio, días hasta vencimiento)"""
+    articulo = Inventario(codigo=codigo, descripcion=codigo)
+    db.session.add(articulo)
+    db.session.commit()
+    for cantidad, precio, vence_en in lotes:
+        ServicioFIFO.crear_lote_entrada(
+            inventario_id=articulo.id,
+            cantidad=cantidad,
+            precio_unitario=precio,
+            fecha_vencimiento=(
+                datetime.now() + timedelta(days=vence_en) if vence_en else None
+            ),
+        )
+    return articulo.id
+
+
+def _sin_diferencias():
+    return StockResumen.recalcular() == []
+
+
+@pytest.mark.unit
+@pytest.mark.fifo
+class TestStockResumen:
+    def test_entradas_actualizan_resumen(self, db_session):
+        inventario_id = _crear_articulo(
+            "RES-001", [(10, 2, None), (5, 4, 30), (8, 1, 10)]
+        )
+
+        resumen = ServicioFIFO.obtener_resumen_stock(inventario_id)
+
+        assert resumen["total_actual"] == 23
+        assert resumen["numero_lotes"] == 3
+        assert resumen["valor_fifo"] == 48
+        assert resumen["proximo_vencimiento"][:10] == (
+            (datetime.now() + timedelta(days=10)).date().isoformat()
+        )
+        assert _sin_diferencias()
+
+    def test_consumo_reserva_y_liberacion(self, db_session):
+        inventario_id = _crear_articulo("RES-002", [(10, 2, 5), (10, 3, None)])
+
+        ServicioFIFO.consumir_fifo(inventario_id, 12)
+        db.session.commit()
+        resumen = ServicioFIFO.obtener_resumen_stock(inventario_id)
+        # El lote que vencía se agota: desaparece de numero_lotes y del vencimiento
+        assert resumen["total_actual"] == 8
+        assert resumen["numero_lotes"] == 1
+        assert resumen["valor_fifo"] == 24
+        assert resumen["proximo_vencimiento"] is None
+
+        ServicioFIFO.reservar_stock(inventario_id, 3, orden_trabajo_id=77)
+        db.session.commit()
+        assert (
+            ServicioFIFO.obtener_resumen_stock(inventario_id)["total_disponible"] == 5
+        )
+
+        ServicioFIFO.liberar_reservas(77)
+        db.session.commit()
+        assert ServicioFIFO.obtener_resumen_stock(inventario_id)["total_reservado"] == 0
+        assert _sin_diferencias()
+
+    def test_consumo_batch_actualiza_resumen(self, db_session):
+        a = _crear_articulo("RES-003", [(5, 1, None), (5, 1, None)])
+        b = _crear_articulo("RES-004", [(4, 10, None)])
+
+        FIFOOptimizado().consumir_fifo_batch(
+            [{"inventario_id": a, "cantidad": 7}, {"inventario_id": b, "cantidad": 1}]
+        )
+
+        assert ServicioFIFO.obtener_resumen_stock(a)["total_actual"] == 3
+        assert ServicioFIFO.obtener_resumen_stock(a)["numero_lotes"] == 1
+        assert ServicioFIFO.obtener_resumen_stock(b)["valor_fifo"] == 30
+        assert _sin_diferencias()
+
+    def test_lectura_es_por_clave_primaria(self, db_session):
+        inventario_id = _crear_articulo("RES-005", [(1, 1, None)] * 20)
+        db.session.expunge_all()
+        sentencias = []
+
+        def contar(conn, cursor, statement, *args):
+            sentencias.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", contar)
+        try:
+            ServicioFIFO.obtener_stock_disponible(inventario_id, incluir_lotes=False)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", contar)
+
+        assert len(sentencias) == 1
+        assert "lote_inventario" not in sentencias[0]
+
+    def test_recalcular_reporta_y_corrige_diferencias(self, db_session):
+        inventario_id = _crear_articulo("RES-006", [(10, 2, None)])
+        # Lote creado fuera del servicio: el resumen no lo ve
+        db.session.add(
+            LoteInventario(
+                inventario_id=inventario_id,
+                cantidad_inicial=Decimal("5"),
+                cantidad_actual=Decimal("5"),
+                cantidad_reservada=Decimal("0"),
+                precio_unitario=Decimal("2"),
+                costo_total=Decimal("10"),
+            )
+        )
+        db.session.commit()
+
+        diferencias = StockResumen.recalcular()
+        db.session.commit()
+
+        assert len(diferencias) == 1
+        assert diferencias[0]["antes"]["total_actual"] == 10
+        assert diferencias[0]["despues"]["total_actual"] == 15
+        assert ServicioFIFO.obtener_resumen_stock(inventario_id)["numero_lotes"] == 2
+        assert _sin_diferencias()
+
+    def test_articulo_sin_resumen_se_calcula_al_vuelo(self, db_session):
+        articulo = Inventario(codigo="RES-007", descripcion="sin resumen")
+        db.session.add(articulo)
+        db.session.commit()
+
+        resumen = ServicioFIFO.obtener_resumen_stock(articulo.id)
+
+        assert resumen["total_actual"] == 0
+        assert resumen["numero_lotes"] == 0
+        assert db.session.get(StockResumen, articulo.id) is None
@@ -1,5 +1,9 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.models.plan_ocurrencia import PlanOcurrencia
 
 
 def test_calendario_estadisticas_mes_success(authenticated_client):
@@ -16,4 +20,67 @@ def test_calendario_estadisticas_mes_success(authenticated_client):
     assert isinstance(data.get("total_ordenes"), int)
     assert isinstance(data.get("planes_programados"), int)
     assert isinstance(data.get("mes_nombre"), str)
-    assert isinstance(data.get("anio"), int)
\ No newline at end of file
+    assert isinstance(data.get("anio"), int)
+
+
+def test_calendario_muestra_todas_las_ejecuciones_del_mes(
+    db_session, authenticated_client, activo_test
+):
+    """Un plan semanal aparece en cada semana del mes, no solo en su próxima fecha."""
+    db.session.add(
+        PlanMantenimiento(
+            codigo_plan="PM-CAL-1",
+            nombre="Engrase semanal",
+            activo_id=activo_test.id,
+            tipo_frecuencia="semanal",
+            dias_semana='["lunes"]',
+            intervalo_semanas=1,
+            proxima_ejecucion=datetime(2030, 4, 1),
+            estado="Activo",
+        )
+    )
+    db.session.commit()
+
+    data = authenticated_client.get(
+        "/calendario/api/ordenes?year=2030&month=4"
+    ).get_json()
+    fechas = [e["start"] for e in data["eventos"] if e["tipo"] == "plan_futuro"]
+    assert fechas == [
+        "2030-04-01",
+        "2030-04-08",
+        "2030-04-15",
+        "2030-04-22",
+        "2030-04-29",
+    ]
+    assert {e["activo_nombre"] for e in data["eventos"]} == {"Compresor Test"}
+
+
+def test_calendario_lee_el_horizonte_materializado(
+    db_session, authenticated_client, activo_test
+):
+    """Dentro de los próximos 12 meses las ejecuciones salen de plan_ocurrencia."""
+    hoy = datetime.now()
+    inicio = datetime(hoy.year, hoy.month, 1) + timedelta(days=40)
+    plan = PlanMantenimiento(
+        codigo_plan="PM-CAL-2",
+        nombre="Revisión diaria",
+        activo_id=activo_test.id,
+        tipo_frecuencia="diaria",
+        proxima_ejecucion=inicio.replace(day=1),
+        estado="Activo",
+    )
+    db.session.add(plan)
+    db.session.commit()
+    # Una fila borrada a mano deja de aparecer: el calendario usa la tabla
+    PlanOcurrencia.query.filter_by(
+        plan_id=plan.id, fecha=inicio.replace(day=2).date()
+    ).delete()
+    db.session.commit()
+
+    data = authenticated_client.get(
+        f"/calendario/api/ordenes?year={inicio.year}&month={inicio.month}"
+    ).get_json()
+    fechas = [e["start"] for e in data["eventos"] if e["tipo"] == "plan_futuro"]
+    assert fechas[0] == inicio.replace(day=1).date().isoformat()
+    assert inicio.replace(day=2).date().isoformat() not in fechas
+    assert len(fechas) >= 27
@@ -0,0 +1,178 @@
+"""
+Tests de los endpoints de métricas de performance
+"""
+
+import time
+import timeit
+from datetime import datetime
+
+import pytest
+
+from app.blueprints import performance_metrics as pm
+
+
+@pytest.fixture
+def metricas_limpias():
+    with pm._lock:
+        pm._pendientes.clear()
+        pm._metrics.clear()
+        pm._operation_stats.clear()
+        pm._throughput_counters.clear()
+        for serie in pm._series.values():
+            serie.vaciar()
+    yield
+    with pm._lock:
+        pm._pendientes.clear()
+        pm._metrics.clear()
+        pm._operation_stats.clear()
+        pm._throughput_counters.clear()
+        for serie in pm._series.values():
+            serie.vaciar()
+
+
+@pytest.mark.api
+def test_stats_incluye_percentiles_y_ventanas(client, metricas_limpias):
+    for i in range(100):
+        pm.record_metric("op_prueba", 0.01 * (i + 1), records=1, success=i != 0)
+
+    datos = client.get("/api/performance/stats").get_json()
+    stats = datos["operation_stats"]["op_prueba"]
+
+    assert stats["count"] == 100
+    assert stats["min_duration"] == pytest.approx(0.01)
+    assert stats["max_duration"] == pytest.approx(1.0)
+    assert stats["p50_duration"] == pytest.approx(0.5, rel=0.05)
+    assert stats["p99_duration"] == pytest.approx(0.99, rel=0.05)
+    assert stats["success_rate"] == 99
+    assert stats["total_records"] == 100
+    assert stats["windows"]["5m"]["count"] == 100
+    assert stats["windows"]["1h"]["p95"] == pytest.approx(0.95, rel=0.05)
+
+
+@pytest.mark.api
+def test_operacion_y_dashboard(client, metricas_limpias):
+    pm.record_metric("op_a", 0.2)
+    pm.record_metric("op_b", 0.1)
+
+    operacion = client.get("/api/performance/operation/op_a").get_json()
+    assert operacion["total_executions"] == 1
+    assert len(operacion["recent_metrics"]) == 1
+
+    dashboard = client.get("/api/performance/dashboard").get_json()
+    assert [o["operation"] for o in dashboard["top_slowest_operations"]] == [
+        "op_a",
+        "op_b",
+    ]
+    assert client.get("/api/performance/operation/nada").status_code == 404
+
+
+@pytest.mark.api
+def test_dashboard_por_hora_y_minuto_desde_cubetas(client, metricas_limpias):
+    pm.record_metric("op_a", 0.2)
+    pm.record_metric("op_a", 0.4, success=False)
+
+    ahora = datetime.now()
+    dashboard = client.get("/api/performance/dashboard").get_json()
+    hora = dashboard["hourly_stats"][ahora.strftime("%Y-%m-%d %H:00")]
+    minutos = dashboard["minute_stats"].values()
+
+    assert (hora["count"], hora["errors"]) == (2, 1)
+    assert hora["avg_duration"] == pytest.approx(0.3)
+    assert hora["p95_duration"] == pytest.approx(0.4, rel=0.05)
+    assert sum(m["count"] for m in minutos) == 2
+    assert max(m["max_duration"] for m in minutos) == pytest.approx(0.4)
+
+
+@pytest.mark.unit
+def test_historial_sobrevive_a_un_reinicio(tmp_path, metricas_limpias, monkeypatch):
+    monkeypatch.setattr(pm, "_historial", None)
+    monkeypatch.setattr(pm, "_series_pendientes", pm._nuevas_series())
+    ruta = str(tmp_path / "historial.json")
+    pm.configurar_historial(ruta)
+    pm.record_metric("op_a", 0.1)
+    pm.record_metric("op_a", 0.3)
+    pm.volcar_historial(forzar=True)
+
+    # "Reinicio": series vacías y nueva carga del archivo
+    for serie in pm._series.values():
+        serie.vaciar()
+    pm.configurar_historial(ruta)
+
+    [hora] = pm._series["hours"].cubetas()
+    assert hora.total == 2
+    assert hora.suma == pytest.approx(0.4)
+    pm.configurar_historial(None)
+
+
+@pytest.mark.unit
+def test_registro_no_consulta_el_proceso(metricas_limpias, mocker):
+    proceso = mocker.patch.object(pm.psutil, "Process")
+    pm._muestreador._muestras.append((0.0, 123.0, 7.0))
+
+    pm.performance_monitor("op_rapida")(lambda: {"items": [1, 2]})()
+
+    proceso.assert_not_called()
+    consolidada = pm.get_current_stats()
+    assert consolidada["total_metrics"] == 1
+    metrica = pm._metrics[-1]
+    assert (metrica.memory_mb, metrica.cpu_percent) == (123.0, 7.0)
+    assert metrica.records_processed == 2
+
+
+@pytest.mark.performance
+def test_sobrecoste_del_decorador(metricas_limpias):
+    """Microbenchmark: coste añadido por performance_monitor a una llamada"""
+    objetivo_ns = 5000
+    n = 20000
+
+    def funcion():
+        return None
+
+    decorada = pm.performance_monitor("bench")(funcion)
+    base = min(timeit.repeat(funcion, number=n, repeat=5)) / n
+    medida = min(timeit.repeat(decorada, number=n, repeat=5)) / n
+    sobrecoste_ns = (medida - base) * 1e9
+
+    print(f"\nSobrecoste de performance_monitor: {sobrecoste_ns:.0f} ns/llamada")
+    assert sobrecoste_ns < objetivo_ns
+
+
+@pytest.mark.api
+def test_historial_compara_antes_y_despues_de_un_release(
+    client, tmp_path, metricas_limpias
+):
+    escritor = pm.configurar_rollups(str(tmp_path))
+    try:
+        release = (int(time.time()) // 60 - 30) * 60
+        for minutos, duracion in ((-20, 0.1), (-10, 0.1), (5, 0.4), (15, 0.4)):
+            pm._pendientes.append(
+                (release + minutos * 60, "GET ordenes.api", duracion, 0, True, None)
+            )
+        escritor.volcar(forzar=True)
+
+        datos = client.get(
+            "/api/performance/history/compare",
+            query_string={"operation": "GET ordenes.api", "release": release},
+        ).get_json()
+        assert (datos["before"]["count"], datos["after"]["count"]) == (2, 2)
+        assert datos["before"]["p95"] == pytest.approx(0.1, rel=0.05)
+        assert datos["after"]["p95"] == pytest.approx(0.4, rel=0.05)
+        assert datos["p95_change"] == pytest.approx(3.0, rel=0.1)
+
+        serie = client.get(
+            "/api/performance/history",
+            query_string={
+                "operation": "GET ordenes.api",
+                "from": release - 3600,
+                "to": release + 3600,
+            },
+        ).get_json()
+        assert serie["resolution"] == "1m"
+        assert [p["count"] for p in serie["points"]] == [1, 1, 1, 1]
+        assert client.get("/api/performance/history").get_json()["operations"] == [
+            "GET ordenes.api"
+        ]
+    finally:
+        pm.configurar_rollups(None)
+
+    assert client.get("/api/performance/history").status_code == 404
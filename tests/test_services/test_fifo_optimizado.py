@@ -0,0 +1,147 @@
+"""
+Tests para el motor FIFOOptimizado (consumo FIFO en lote)
+Incluye un benchmark frente al consumo por llamada de ServicioFIFO
+"""
+
+import time
+import pytest
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import event
+from app.services.fifo_optimizado import FIFOOptimizado
+from app.services.servicio_fifo import ServicioFIFO
+from app.models.inventario import Inventario
+from app.models.lote_inventario import LoteInventario, MovimientoLote
+from app.extensions import db
+
+
+def _crear_articulo(codigo, lotes):
+    """Crea un artículo con lotes (cantidad, días de antigüedad)"""
+    articulo = Inventario(codigo=codigo, descripcion=codigo, stock_actual=0)
+    db.session.add(articulo)
+    db.session.commit()
+    for cantidad, dias in lotes:
+        lote = ServicioFIFO.crear_lote_entrada(
+            inventario_id=articulo.id,
+            cantidad=cantidad,
+            precio_unitario=2.5,
+            codigo_lote=f"{codigo}-{dias}",
+        )
+        lote.fecha_entrada = datetime.now(timezone.utc) - timedelta(days=dias)
+    db.session.commit()
+    return articulo
+
+
+class _ContadorSQL:
+    """Cuenta las sentencias SQL enviadas al motor"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.total = 0
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._contar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._contar)
+
+
+@pytest.mark.fifo
+class TestFIFOOptimizado:
+    def test_consumo_batch_respeta_orden_fifo(self, client, db_session):
+        articulo = _crear_articulo("OPT-001", [(10, 10), (20, 5), (30, 1)])
+
+        resultados = FIFOOptimizado().consumir_fifo_batch(
+            [{"inventario_id": articulo.id, "cantidad": 25}], usuario_id="tester"
+        )
+
+        assert len(resultados) == 1
+        assert resultados[0].cantidad_procesada == 25
+        assert resultados[0].cantidad_faltante == 0
+        assert [c for _, c in resultados[0].lotes_afectados] == [10, 15]
+
+        lotes = (
+            LoteInventario.query.filter_by(inventario_id=articulo.id)
+            .order_by(LoteInventario.fecha_entrada)
+            .all()
+        )
+        assert [float(l.cantidad_actual) for l in lotes] == [0, 5, 30]
+        assert MovimientoLote.query.filter_by(tipo_movimiento="consumo").count() == 2
+
+    def test_operaciones_del_mismo_articulo_comparten_lotes(self, client, db_session):
+        articulo = _crear_articulo("OPT-002", [(10, 3), (10, 1)])
+        otro = _crear_articulo("OPT-003", [(5, 1)])
+
+        resultados = FIFOOptimizado().consumir_fifo_batch(
+            [
+                {"inventario_id": articulo.id, "cantidad": 8},
+                {"inventario_id": otro.id, "cantidad": 2},
+                {"inventario_id": articulo.id, "cantidad": 8},
+            ]
+        )
+
+        # La tercera operación continúa donde la primera dejó el lote antiguo
+        assert [r.inventario_id for r in resultados] == [
+            articulo.id,
+            otro.id,
+            articulo.id,
+        ]
+        assert [c for _, c in resultados[2].lotes_afectados] == [2, 6]
+        assert ServicioFIFO.obtener_stock_disponible(articulo.id)["total_actual"] == 4
+        assert ServicioFIFO.obtener_stock_disponible(otro.id)["total_actual"] == 3
+
+    def test_stock_insuficiente_reporta_faltante(self, client, db_session):
+        articulo = _crear_articulo("OPT-004", [(5, 1)])
+
+        resultado = FIFOOptimizado().consumir_fifo_batch(
+            [{"inventario_id": articulo.id, "cantidad": 8}]
+        )[0]
+
+        assert resultado.cantidad_procesada == 5
+        assert resultado.cantidad_faltante == 3
+
+    def test_lotes_optimizados_usan_cache_hasta_consumo(self, client, db_session):
+        articulo = _crear_articulo("OPT-005", [(10, 2)])
+        fifo = FIFOOptimizado()
+
+        assert fifo._obtener_lotes_optimizado(articulo.id)[0].cantidad_disponible == 10
+        fifo._obtener_lotes_optimizado(articulo.id)
+        assert fifo._stats["cache_hits"] == 1
+
+        fifo.consumir_fifo_batch([{"inventario_id": articulo.id, "cantidad": 4}])
+        assert fifo._obtener_lotes_optimizado(articulo.id)[0].cantidad_disponible == 6
+
+    @pytest.mark.performance
+    def test_benchmark_batch_vs_consumo_individual(self, client, db_session):
+        """El batch debe emitir muchas menos sentencias SQL que N llamadas"""
+        articulos = [
+            _crear_articulo(f"BENCH-{i:03d}", [(50, 3), (50, 2), (50, 1)])
+            for i in range(20)
+        ]
+        operaciones = [
+            {"inventario_id": a.id, "cantidad": 20} for a in articulos for _ in range(3)
+        ]
+
+        with _ContadorSQL(db.engine) as individual:
+            inicio = time.perf_counter()
+            for op in operaciones:
+                ServicioFIFO.consumir_fifo(op["inventario_id"], op["cantidad"])
+                db.session.commit()
+            tiempo_individual = time.perf_counter() - inicio
+
+        with _ContadorSQL(db.engine) as batch:
+            inicio = time.perf_counter()
+            FIFOOptimizado().consumir_fifo_batch(operaciones)
+            tiempo_batch = time.perf_counter() - inicio
+
+        print(
+            f"\nconsumir_fifo x{len(operaciones)}: {individual.total} sentencias, "
+            f"{tiempo_individual * 1000:.1f} ms | consumir_fifo_batch: "
+            f"{batch.total} sentencias, {tiempo_batch * 1000:.1f} ms"
+        )
+        assert batch.total * 10 < individual.total
+        for a in articulos:
+            assert ServicioFIFO.obtener_stock_disponible(a.id)["total_actual"] == 30
@@ -0,0 +1,102 @@
+"""
+Tests de la invalidación de caché de inventario al confirmar escrituras
+"""
+
+import pytest
+from app.extensions import db
+from app.models.inventario import Inventario
+from app.services.fifo_optimizado import FIFOOptimizado
+from app.services.servicio_fifo import ServicioFIFO
+from app.utils.cache import AUSENTE, obtener_cache, tag_inventario
+
+
+def _articulo(codigo):
+    articulo = Inventario(codigo=codigo, descripcion=codigo)
+    db.session.add(articulo)
+    db.session.commit()
+    return articulo.id
+
+
+def _cachear(inventario_id):
+    cache = obtener_cache()
+    cache.set("articulo", "a", 300, [tag_inventario(inventario_id)])
+    cache.set("otro", "o", 300, [tag_inventario(inventario_id + 1000)])
+    cache.set("lista", "l", 300, ["inventario:list"])
+    cache.set("stats", "s", 300, ["stats"])
+
+
+def _invalidadas():
+    cache = obtener_cache()
+    return {
+        c for c in ("articulo", "otro", "lista", "stats") if cache.get(c) is AUSENTE
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.fifo
+class TestInvalidacionCache:
+    def test_escritura_orm_invalida_al_confirmar(self, db_session):
+        inventario_id = _articulo("INV-C1")
+        _cachear(inventario_id)
+
+        ServicioFIFO.crear_lote_entrada(
+            inventario_id=inventario_id, cantidad=5, precio_unitario=1
+        )
+
+        assert _invalidadas() == {"articulo", "lista", "stats"}
+
+    def test_rollback_no_invalida(self, db_session):
+        inventario_id = _articulo("INV-C2")
+        _cachear(inventario_id)
+
+        articulo = db.session.get(Inventario, inventario_id)
+        articulo.stock_actual = 99
+        db.session.flush()
+        db.session.rollback()
+
+        assert _invalidadas() == set()
+
+    def test_savepoint_deshecho_conserva_lo_anotado(self, db_session):
+        inventario_id = _articulo("INV-C4")
+        _cachear(inventario_id)
+
+        articulo = db.session.get(Inventario, inventario_id)
+        articulo.stock_actual = 99
+        db.session.flush()
+        try:
+            with db.session.begin_nested():
+                db.session.add(Inventario(codigo="INV-C4", descripcion="duplicado"))
+        except Exception:
+            pass  # Código duplicado: solo se deshace el SAVEPOINT
+        db.session.commit()
+
+        assert _invalidadas() == {"articulo", "lista", "stats"}
+
+    def test_consumo_batch_core_invalida(self, db_session):
+        inventario_id = _articulo("INV-C3")
+        ServicioFIFO.crear_lote_entrada(
+            inventario_id=inventario_id, cantidad=5, precio_unitario=1
+        )
+        _cachear(inventario_id)
+
+        FIFOOptimizado().consumir_fifo_batch(
+            [{"inventario_id": inventario_id, "cantidad": 2}]
+        )
+
+        assert _invalidadas() == {"articulo", "lista", "stats"}
+
+    def test_listado_optimizado_no_sirve_stock_antiguo(self, app, db_session):
+        from app.controllers.inventario_controller_optimizado import (
+            listar_inventario_optimizado,
+        )
+
+        inventario_id = _articulo("INV-C4")
+        with app.test_request_context("/?q=INV-C4"):
+            assert listar_inventario_optimizado()["from_cache"] is False
+            assert listar_inventario_optimizado()["from_cache"] is True
+
+            ServicioFIFO.crear_lote_entrada(
+                inventario_id=inventario_id, cantidad=3, precio_unitario=1
+            )
+
+            assert listar_inventario_optimizado()["from_cache"] is False
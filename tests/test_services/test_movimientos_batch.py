@@ -0,0 +1,191 @@
+"""
+Tests del procesamiento de movimientos en lote (ServicioMovimientosBatch)
+"""
+
+import pytest
+from sqlalchemy import event
+from app.extensions import db
+from app.models.inventario import Inventario
+from app.models.lote_inventario import LoteInventario, MovimientoLote
+from app.models.movimiento_inventario import MovimientoInventario
+from app.services.movimientos_batch import ServicioMovimientosBatch
+from app.services.servicio_fifo import ServicioFIFO
+
+
+def _articulo(codigo, stock=0):
+    articulo = Inventario(codigo=codigo, descripcion=codigo, stock_actual=stock)
+    db.session.add(articulo)
+    db.session.commit()
+    return articulo.id
+
+
+class _ContadorSQL:
+    """Cuenta sentencias y commits enviados al motor"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.sentencias = 0
+        self.inserts = 0
+        self.commits = 0
+
+    def _sentencia(self, conn, cursor, statement, *args):
+        self.sentencias += 1
+        if statement.lstrip().upper().startswith("INSERT"):
+            self.inserts += 1
+
+    def _commit(self, *args, **kwargs):
+        self.commits += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._sentencia)
+        event.listen(self.engine, "commit", self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._sentencia)
+        event.remove(self.engine, "commit", self._commit)
+
+
+@pytest.mark.fifo
+class TestMovimientosBatch:
+    def test_entradas_y_salidas_en_una_transaccion(self, db_session):
+        a = _articulo("BAT-001")
+        b = _articulo("BAT-002")
+        movimientos = [
+            {
+                "inventario_id": a,
+                "tipo_movimiento": "entrada",
+                "cantidad": 10,
+                "precio_unitario": 2,
+            },
+            {
+                "inventario_id": b,
+                "tipo_movimiento": "compra",
+                "cantidad": 5,
+                "precio_unitario": 3,
+            },
+            {
+                "inventario_id": a,
+                "tipo_movimiento": "entrada",
+                "cantidad": 4,
+                "precio_unitario": 2,
+            },
+            {"inventario_id": a, "tipo_movimiento": "salida", "cantidad": 12},
+        ]
+
+        with _ContadorSQL(db.engine) as contador:
+            resultado = ServicioMovimientosBatch.procesar(movimientos)
+
+        assert resultado["exitosos"] == 4
+        assert resultado["errores"] == 0
+        assert contador.commits == 1
+        assert [r["index"] for r in resultado["resultados"]] == [0, 1, 2, 3]
+        assert resultado["resultados"][0]["lote_id"] is not None
+        assert resultado["resultados"][3]["cantidad_faltante"] == 0
+
+        assert float(db.session.get(Inventario, a).stock_actual) == 2
+        assert float(db.session.get(Inventario, b).stock_actual) == 5
+        assert ServicioFIFO.obtener_resumen_stock(a)["total_actual"] == 2
+        assert MovimientoInventario.query.count() == 4
+        consumo = MovimientoLote.query.filter_by(tipo_movimiento="consumo").all()
+        assert {m.movimiento_inventario_id for m in consumo} == {
+            resultado["resultados"][3]["movimiento_id"]
+        }
+
+    def test_todo_o_nada_no_escribe_si_una_linea_falla(self, db_session):
+        a = _articulo("BAT-003", stock=5)
+
+        resultado = ServicioMovimientosBatch.procesar(
+            [
+                {"inventario_id": a, "tipo_movimiento": "entrada", "cantidad": 3},
+                {"inventario_id": a, "tipo_movimiento": "salida", "cantidad": 50},
+                {"inventario_id": 9999, "tipo_movimiento": "entrada", "cantidad": 1},
+            ],
+            modo="todo_o_nada",
+        )
+
+        assert resultado["exitosos"] == 0
+        assert resultado["errores"] == 3
+        assert "Stock insuficiente" in resultado["resultados"][1]["error"]
+        assert MovimientoInventario.query.count() == 0
+        assert LoteInventario.query.count() == 0
+        assert float(db.session.get(Inventario, a).stock_actual) == 5
+
+    def test_por_fila_descarta_solo_las_lineas_erroneas(self, db_session, mocker):
+        a = _articulo("BAT-004")
+        crear_lotes = ServicioMovimientosBatch._crear_lotes
+
+        def crear_lotes_fallando(entradas, ahora):
+            if entradas[0].indice == 1:
+                raise RuntimeError("fallo simulado")
+            return crear_lotes(entradas, ahora)
+
+        mocker.patch.object(
+            ServicioMovimientosBatch, "_crear_lotes", side_effect=crear_lotes_fallando
+        )
+
+        resultado = ServicioMovimientosBatch.procesar(
+            [
+                {"inventario_id": a, "tipo_movimiento": "entrada", "cantidad": 3},
+                {"inventario_id": a, "tipo_movimiento": "entrada", "cantidad": 7},
+                {"inventario_id": a, "tipo_movimiento": "baja", "cantidad": 1},
+                {"inventario_id": a, "tipo_movimiento": "entrada", "cantidad": 2},
+            ],
+            modo="por_fila",
+        )
+
+        assert [r["success"] for r in resultado["resultados"]] == [
+            True,
+            False,
+            False,
+            True,
+        ]
+        assert resultado["resultados"][1]["error"] == "fallo simulado"
+        assert MovimientoInventario.query.count() == 2
+        assert LoteInventario.query.count() == 2
+        assert float(db.session.get(Inventario, a).stock_actual) == 5
+
+    @pytest.mark.performance
+    def test_sentencias_no_crecen_con_el_tamano_del_batch(self, db_session):
+        articulos = [_articulo(f"BAT-P{i:02d}") for i in range(10)]
+        movimientos = [
+            {
+                "inventario_id": articulos[i % 10],
+                "tipo_movimiento": "entrada",
+                "cantidad": 5,
+                "precio_unitario": 1,
+            }
+            for i in range(200)
+        ] + [
+            {
+                "inventario_id": articulos[i % 10],
+                "tipo_movimiento": "salida",
+                "cantidad": 2,
+            }
+            for i in range(100)
+        ]
+
+        with _ContadorSQL(db.engine) as contador:
+            resultado = ServicioMovimientosBatch.procesar(movimientos)
+
+        assert resultado["exitosos"] == 300
+        assert contador.commits == 1
+        assert contador.sentencias - contador.inserts < 20
+        if db.engine.dialect.name == "postgresql":
+            # PostgreSQL: INSERT ... RETURNING ordenado en bloque
+            assert contador.sentencias < 20
+        for inventario_id in articulos:
+            assert float(db.session.get(Inventario, inventario_id).stock_actual) == 80
+
+    def test_actualizar_stock_es_una_sentencia(self, db_session):
+        ids = [_articulo(f"BAT-S{i}", stock=10) for i in range(3)]
+
+        with _ContadorSQL(db.engine) as contador:
+            ServicioMovimientosBatch.actualizar_stock(
+                {ids[0]: 5, ids[1]: -2.5, ids[2]: 0}
+            )
+        db.session.commit()
+
+        assert contador.sentencias == 1
+        stocks = [float(db.session.get(Inventario, i).stock_actual) for i in ids]
+        assert stocks == [15, 7.5, 10]
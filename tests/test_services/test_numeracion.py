@@ -0,0 +1,79 @@
+"""
+Tests del servicio de numeración (app.services.numeracion)
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.controllers.planes_controller import generar_codigo_plan
+from app.extensions import db
+from app.models.categoria import Categoria
+from app.models.contador import Contador
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.services import numeracion
+
+
+@pytest.mark.database
+class TestNumeracion:
+    def test_series_independientes_y_correlativas(self, db_session):
+        assert [numeracion.siguiente("A") for _ in range(3)] == [1, 2, 3]
+        assert numeracion.siguiente("B") == 1
+        db.session.commit()
+        assert db.session.get(Contador, "A").valor == 3
+
+    def test_valor_inicial_solo_en_el_primer_uso(self, db_session):
+        llamadas = []
+
+        def inicial():
+            llamadas.append(1)
+            return 41
+
+        assert numeracion.siguiente("C", inicial) == 42
+        assert numeracion.siguiente("C", inicial) == 43
+        assert len(llamadas) == 1
+
+    def test_reserva_de_bloque(self, db_session):
+        assert numeracion.reservar("D", 0) == []
+        assert numeracion.reservar("D", 5) == [1, 2, 3, 4, 5]
+        assert numeracion.reservar("D", 2) == [6, 7]
+
+    def test_numero_orden_continua_la_numeracion_existente(self, db_session):
+        db.session.add(
+            OrdenTrabajo(
+                numero_orden="OT-000120",
+                tipo="Correctivo",
+                prioridad="Media",
+                estado="Pendiente",
+                descripcion="Orden previa",
+            )
+        )
+        db.session.commit()
+        assert numeracion.numero_orden() == "OT-000121"
+        assert numeracion.numeros_orden(2) == ["OT-000122", "OT-000123"]
+
+    def test_codigo_plan_continua_el_año_en_curso(self, db_session):
+        año = datetime.now().year
+        db.session.add(PlanMantenimiento(codigo_plan=f"PM-{año}-0007", nombre="P"))
+        db.session.commit()
+        assert generar_codigo_plan() == f"PM-{año}-0008"
+
+    def test_codigo_de_categoria_sin_commit(self, db_session):
+        categoria = Categoria(nombre="Rodamientos", prefijo="ROD", ultimo_numero=4)
+        db.session.add(categoria)
+        db.session.commit()
+        año = datetime.now().year
+
+        assert categoria.generar_proximo_codigo() == f"ROD-{año}-005"
+        assert categoria.ultimo_numero == 5
+        assert categoria in db.session.dirty
+        # No confirma la transacción: al deshacerla el número vuelve a quedar libre
+        db.session.rollback()
+        categoria = db.session.get(Categoria, categoria.id)
+        assert categoria.ultimo_numero == 4
+        assert categoria.generar_proximo_codigo() == f"ROD-{año}-005"
+        # Al confirmar, ultimo_numero se guarda con la transacción del llamador
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(Categoria, categoria.id).ultimo_numero == 5
@@ -0,0 +1,295 @@
+"""
+Tests del planificador de trabajos en segundo plano (app.services.planificador)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models.control_generacion import ControlGeneracion
+from app.models.ejecucion_trabajo import (
+    COMPLETADO,
+    EN_CURSO,
+    ERROR,
+    PENDIENTE,
+    EjecucionTrabajo,
+)
+from app.models.orden_trabajo import OrdenTrabajo
+from app.models.plan_mantenimiento import PlanMantenimiento
+from app.services import planificador
+from app.services.planificador import (
+    CerrojoLider,
+    Planificador,
+    Trabajo,
+    crear_trabajos,
+)
+
+
+def _planificador(app, tmp_path, trabajos, nombre="lider.lock", **opciones):
+    return Planificador(
+        app,
+        {trabajo.nombre: trabajo for trabajo in trabajos},
+        CerrojoLider(ruta=str(tmp_path / nombre)),
+        **opciones,
+    )
+
+
+def _ejecuciones(trabajo):
+    db.session.expire_all()
+    return EjecucionTrabajo.query.filter_by(trabajo=trabajo).all()
+
+
+@pytest.mark.unit
+class TestProgramacion:
+    def test_franja_diaria(self):
+        trabajo = Trabajo("diario", None, hora="06:00")
+        assert trabajo.franja(datetime(2026, 10, 18, 5, 59)) == datetime(
+            2026, 10, 17, 6, 0
+        )
+        assert trabajo.franja(datetime(2026, 10, 18, 6, 0)) == datetime(
+            2026, 10, 18, 6, 0
+        )
+        assert trabajo.franja(datetime(2026, 10, 18, 23, 0)) == datetime(
+            2026, 10, 18, 6, 0
+        )
+
+    def test_franja_cada_n_minutos_y_a_peticion(self):
+        trabajo = Trabajo("cuarto", None, cada_minutos=15)
+        assert trabajo.franja(datetime(2026, 10, 18, 10, 7, 30)) == datetime(
+            2026, 10, 18, 10, 0
+        )
+        assert Trabajo("manual", None).franja(datetime.now()) is None
+
+    def test_cerrojo_de_archivo_es_exclusivo(self, tmp_path):
+        ruta = str(tmp_path / "lider.lock")
+        primero, segundo = CerrojoLider(ruta=ruta), CerrojoLider(ruta=ruta)
+
+        assert primero.adquirir() and primero.adquirir()
+        assert not segundo.adquirir()
+        primero.liberar()
+        assert segundo.adquirir()
+        segundo.liberar()
+
+
+@pytest.mark.database
+class TestEjecuciones:
+    def test_cada_franja_se_ejecuta_una_vez(self, app, db_session, tmp_path):
+        llamadas = []
+        trabajo = Trabajo(
+            "diario", lambda contexto: llamadas.append(1) or {"ok": True}, "06:00"
+        )
+        ahora = datetime(2026, 10, 18, 7, 0)
+
+        lider = _planificador(app, tmp_path, [trabajo])
+        assert len(lider.ciclo(ahora)) == 1
+        assert lider.ciclo(ahora + timedelta(hours=1)) == []
+        lider.cerrojo.liberar()
+
+        # Otro proceso que toma el relevo no repite la franja
+        relevo = _planificador(app, tmp_path, [trabajo], "relevo.lock")
+        assert relevo.ciclo(ahora) == []
+        relevo.cerrojo.liberar()
+
+        (ejecucion,) = _ejecuciones("diario")
+        assert llamadas == [1]
+        assert ejecucion.estado == COMPLETADO
+        assert ejecucion.to_dict()["resultado"] == {"ok": True}
+        assert ejecucion.programado_para == datetime(2026, 10, 18, 6, 0)
+
+    def test_sin_cerrojo_no_ejecuta(self, app, db_session, tmp_path):
+        trabajo = Trabajo("diario", lambda contexto: {}, "06:00")
+        lider = _planificador(app, tmp_path, [trabajo])
+        otro = _planificador(app, tmp_path, [trabajo])
+
+        assert lider.cerrojo.adquirir()
+        assert otro.ciclo(datetime(2026, 10, 18, 7, 0)) == []
+        assert _ejecuciones("diario") == []
+        lider.cerrojo.liberar()
+
+    def test_error_se_reanuda_desde_el_cursor(self, app, db_session, tmp_path):
+        vistos = []
+        fallos = ["una vez"]
+
+        def por_lotes(contexto):
+            inicio = (contexto.cursor or {}).get("siguiente", 0)
+            for desde in range(inicio, 10, contexto.lote):
+                if desde >= 6 and fallos:
+                    fallos.pop()
+                    raise RuntimeError("conexión perdida")
+                lote = list(range(desde, min(desde + contexto.lote, 10)))
+                vistos.extend(lote)
+                contexto.avanzar(len(lote), {"siguiente": lote[-1] + 1}, total=10)
+            return {"vistos": len(vistos)}
+
+        lider = _planificador(
+            app, tmp_path, [Trabajo("lotes", por_lotes)], lote=3, espera_reintento=60
+        )
+        db.session.add(
+            EjecucionTrabajo(trabajo="lotes", programado_para=datetime.now())
+        )
+        db.session.commit()
+
+        lider.ciclo()
+        (ejecucion,) = _ejecuciones("lotes")
+        assert ejecucion.estado == ERROR
+        assert "conexión perdida" in ejecucion.error
+        assert (ejecucion.procesados, ejecucion.progreso) == (6, 60.0)
+
+        # Antes de la espera de reintento no se toca; después continúa
+        assert lider.ciclo() == []
+        lider.ciclo(datetime.now() + timedelta(minutes=2))
+        lider.cerrojo.liberar()
+
+        (ejecucion,) = _ejecuciones("lotes")
+        assert ejecucion.estado == COMPLETADO
+        assert vistos == list(range(10))
+        assert (ejecucion.procesados, ejecucion.intentos) == (10, 2)
+
+    def test_en_curso_solo_se_retoma_si_caduca_el_latido(
+        self, app, db_session, tmp_path
+    ):
+        llamadas = []
+        lider = _planificador(
+            app,
+            tmp_path,
+            [Trabajo("largo", lambda contexto: llamadas.append(1) or {})],
+            caducidad=600,
+        )
+        hace = datetime.now() - timedelta(minutes=5)
+        db.session.add(
+            EjecucionTrabajo(
+                trabajo="largo",
+                programado_para=hace,
+                estado=EN_CURSO,
+                latido=hace,
+                intentos=1,
+            )
+        )
+        db.session.commit()
+
+        assert lider.ciclo() == []
+        assert len(lider.ciclo(datetime.now() + timedelta(minutes=6))) == 1
+        lider.cerrojo.liberar()
+        assert llamadas == [1]
+        assert _ejecuciones("largo")[0].intentos == 2
+
+
+@pytest.mark.database
+class TestHilo:
+    def test_detener_no_suelta_el_cerrojo_con_un_trabajo_en_marcha(
+        self, app, db_session, tmp_path
+    ):
+        import threading
+
+        empezado, terminar = threading.Event(), threading.Event()
+
+        def largo(contexto):
+            empezado.set()
+            terminar.wait(10)
+            return {}
+
+        lider = _planificador(app, tmp_path, [Trabajo("largo", largo)], intervalo=0.05)
+        db.session.add(
+            EjecucionTrabajo(trabajo="largo", programado_para=datetime.now())
+        )
+        db.session.commit()
+        lider.iniciar()
+        assert empezado.wait(10)
+
+        lider.detener()
+        relevo = CerrojoLider(ruta=str(tmp_path / "lider.lock"))
+        assert lider.activo
+        assert not relevo.adquirir()
+
+        terminar.set()
+        lider._hilo.join(10)
+        assert relevo.adquirir()
+        relevo.liberar()
+
+    def test_en_modo_proceso_solo_encola_con_el_hilo_en_marcha(
+        self, app, tmp_path, monkeypatch
+    ):
+        lider = _planificador(app, tmp_path, [], intervalo=60)
+        monkeypatch.setattr(planificador, "_planificador", lider)
+        monkeypatch.setitem(app.config, "PLANIFICADOR_MODO", "proceso")
+
+        assert not planificador.en_segundo_plano(app)
+        planificador.iniciar_planificador()
+        try:
+            assert planificador.en_segundo_plano(app)
+        finally:
+            lider.detener()
+        assert not lider.activo
+
+
+@pytest.mark.database
+def test_generacion_de_ordenes_por_lotes(app, db_session, tmp_path, activo_test):
+    ayer = datetime.now() - timedelta(days=1)
+    for i in range(5):
+        db.session.add(
+            PlanMantenimiento(
+                codigo_plan=f"PM-PL-{i}",
+                nombre=f"Plan {i}",
+                activo_id=activo_test.id,
+                tipo_frecuencia="diaria",
+                proxima_ejecucion=ayer,
+                estado="Activo",
+                generacion_automatica=True,
+            )
+        )
+    db.session.commit()
+
+    ejecucion, creada = planificador.encolar("generar_ordenes", "admin")
+    assert creada and ejecucion.estado == PENDIENTE
+    assert planificador.encolar("generar_ordenes")[0].id == ejecucion.id
+
+    # Solo la ejecución encolada: sin franjas programadas
+    sin_horario = {c: "" for c in app.config if c.startswith("PLANIFICADOR_HORA_")}
+    lider = Planificador(
+        app,
+        crear_trabajos({**app.config, **sin_horario}),
+        CerrojoLider(ruta=str(tmp_path / "lider.lock")),
+        lote=2,
+    )
+    (terminada,) = lider.ciclo()
+    lider.cerrojo.liberar()
+
+    assert terminada.estado == COMPLETADO
+    assert terminada.to_dict()["resultado"] == {"ordenes_generadas": 5}
+    assert terminada.procesados == 5
+    assert OrdenTrabajo.query.count() == 5
+    assert ControlGeneracion.ya_generado_hoy()
+
+
+@pytest.mark.api
+def test_rutas_encolan_en_segundo_plano(app, db_session, authenticated_client):
+    modo = app.config["PLANIFICADOR_MODO"]
+    app.config["PLANIFICADOR_MODO"] = "externo"
+    try:
+        resp = authenticated_client.post("/planes/api/generar-ordenes-manual")
+        assert resp.status_code == 202
+        datos = resp.get_json()
+        assert datos["success"] and datos["encolado"] and datos["nueva"]
+
+        repetida = authenticated_client.post("/planes/api/generar-ordenes-manual")
+        assert repetida.get_json()["ejecucion"]["id"] == datos["ejecucion"]["id"]
+
+        estado = authenticated_client.get(datos["estado_url"]).get_json()
+        assert estado["ejecucion"]["trabajo"] == "generar_ordenes_manuales"
+        assert estado["ejecucion"]["estado"] == PENDIENTE
+        assert estado["ejecucion"]["solicitado_por"] == "admin"
+
+        resp = authenticated_client.post(
+            "/planes/generar-ordenes", json={"modo": "automatico"}
+        )
+        assert resp.status_code == 202
+        assert resp.get_json()["ejecucion"]["trabajo"] == "generar_ordenes"
+    finally:
+        app.config["PLANIFICADOR_MODO"] = modo
+
+    resp = authenticated_client.post("/trabajos/api/desconocido/ejecutar")
+    assert resp.status_code == 404
+
+    trabajos = authenticated_client.get("/trabajos/api").get_json()["trabajos"]
+    assert {t["nombre"] for t in trabajos} == set(crear_trabajos(app.config))
@@ -0,0 +1,100 @@
+"""
+Tests del historial de rendimiento en disco (rollups 1m -> 1h -> 1d)
+"""
+
+import os
+import time
+
+import pytest
+
+from app.utils.almacen_rollups import AlmacenRollups, EscritorRollups
+from app.utils.series_temporales import Cubeta
+
+T0 = 1_699_920_000  # Inicio de un día UTC
+
+
+def _minuto(t, *duraciones, errores=0):
+    cubeta = Cubeta(t // 60, con_histograma=True)
+    for i, duracion in enumerate(duraciones):
+        cubeta.registrar(duracion, exito=i >= errores)
+    return cubeta
+
+
+@pytest.mark.unit
+class TestAlmacenRollups:
+    def test_workers_que_escriben_el_mismo_minuto_se_suman(self, tmp_path):
+        almacen = AlmacenRollups(str(tmp_path))
+        almacen.anadir_minutos([("GET ordenes.api", _minuto(T0, 0.1, 0.2))])
+        almacen.anadir_minutos([("GET ordenes.api", _minuto(T0, 0.4, errores=1))])
+        almacen.anadir_minutos([("GET otra", _minuto(T0, 9.0))])
+
+        [punto] = almacen.consultar("GET ordenes.api", T0, T0 + 60)
+        assert (punto["t"], punto["count"], punto["errors"]) == (T0, 3, 1)
+        assert punto["max"] == pytest.approx(0.4)
+        assert punto["p95"] == pytest.approx(0.4, rel=0.05)
+        assert almacen.operaciones(T0, T0 + 60) == ["GET ordenes.api", "GET otra"]
+
+    def test_compacta_horas_y_dias_cerrados(self, tmp_path):
+        almacen = AlmacenRollups(str(tmp_path), retraso_compactacion=0)
+        almacen.anadir_minutos(
+            [
+                ("op", _minuto(T0 + h * 3600 + 60 * m, 0.01 * (h + 1)))
+                for h in (0, 1)
+                for m in range(3)
+            ]
+        )
+        # Hora en curso: aún no se compacta
+        almacen.anadir_minutos([("op", _minuto(T0 + 2 * 3600, 5.0))])
+
+        assert almacen.compactar(ahora=T0 + 2 * 3600 + 30)
+        horas = almacen.consultar("op", T0, T0 + 86400, "1h")
+        assert [(p["t"], p["count"]) for p in horas] == [(T0, 3), (T0 + 3600, 3)]
+
+        # Una segunda pasada no duplica lo ya compactado
+        almacen.compactar(ahora=T0 + 2 * 3600 + 90)
+        assert len(almacen.consultar("op", T0, T0 + 86400, "1h")) == 2
+
+        almacen.compactar(ahora=T0 + 86400 + 3600)
+        [dia] = almacen.consultar("op", T0, T0 + 86400, "1d")
+        assert (dia["t"], dia["count"]) == (T0, 7)
+        assert dia["max"] == pytest.approx(5.0)
+
+    def test_retencion_borra_segmentos_antiguos(self, tmp_path):
+        almacen = AlmacenRollups(str(tmp_path))
+        almacen.anadir_minutos([("op", _minuto(T0, 0.1))])
+
+        almacen.compactar(ahora=T0 + 8 * 86400 + 3600)
+
+        assert almacen.consultar("op", T0, T0 + 60, "1m") == []
+        # Antes de borrarlo se agregó en 1h
+        assert almacen.consultar("op", T0, T0 + 3600, "1h")[0]["count"] == 1
+
+    def test_linea_a_medio_escribir_se_ignora(self, tmp_path):
+        almacen = AlmacenRollups(str(tmp_path))
+        almacen.anadir_minutos([("op", _minuto(T0, 0.1))])
+        with open(os.path.join(str(tmp_path), "1m", f"{T0}.jsonl"), "a") as f:
+            f.write('{"t":' + str(T0) + ',"op":"op","n')
+
+        assert almacen.consultar("op", T0, T0 + 60)[0]["count"] == 1
+
+    def test_resolucion_segun_el_rango(self):
+        assert AlmacenRollups.resolucion_para(0, 3600) == "1m"
+        assert AlmacenRollups.resolucion_para(0, 7 * 86400) == "1h"
+        assert AlmacenRollups.resolucion_para(0, 90 * 86400) == "1d"
+
+
+@pytest.mark.unit
+def test_escritor_vuelca_lo_extraido(tmp_path):
+    almacen = AlmacenRollups(str(tmp_path))
+    llamadas = []
+
+    def extraer(forzar):
+        llamadas.append(forzar)
+        return [("op", _minuto(ahora, 0.2))]
+
+    # Con un minuto reciente: el escritor compacta con la hora real
+    ahora = int(time.time()) // 60 * 60
+    EscritorRollups(almacen, extraer).volcar(forzar=True)
+
+    assert llamadas == [True]
+    assert almacen.consultar("op", ahora, ahora + 60)[0]["count"] == 1
@@ -0,0 +1,418 @@
+"""
+Tests de la caché en dos niveles (app.utils.cache)
+"""
+
+import fnmatch
+import random
+import threading
+import time
+
+import pytest
+
+from app.utils.cache import (
+    AUSENTE,
+    CacheEscalonado,
+    CacheLocal,
+    CacheRedis,
+    CacheSQLite,
+    EntradaCalculada,
+    crear_cache,
+    tamano_valor,
+)
+
+
+class FakeRedis:
+    """Doble mínimo de un cliente Redis"""
+
+    def __init__(self):
+        self.datos = {}
+
+    def get(self, clave):
+        return self.datos.get(clave)
+
+    def set(self, clave, valor, ex=None, nx=False):
+        if nx and clave in self.datos:
+            return None
+        self.datos[clave] = valor
+        return True
+
+    def delete(self, *claves):
+        for clave in claves:
+            self.datos.pop(clave, None)
+
+    def scan_iter(self, match="*"):
+        return [c for c in list(self.datos) if fnmatch.fnmatch(c, match)]
+
+    def sadd(self, clave, *miembros):
+        self.datos.setdefault(clave, set()).update(miembros)
+
+    def smembers(self, clave):
+        return set(self.datos.get(clave, set()))
+
+    def ttl(self, clave):
+        return -1 if clave in self.datos else -2
+
+    def expire(self, clave, segundos):
+        return True
+
+
+@pytest.mark.unit
+class TestCacheLocal:
+    def test_lru_descarta_la_menos_usada(self):
+        cache = CacheLocal(max_entradas=2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is AUSENTE
+        assert cache.get("c") == 3
+
+    def test_invalidar_por_etiqueta(self):
+        cache = CacheLocal()
+        cache.set("lista", 1, 60, tags=["inventario:list"])
+        cache.set("art1", 2, 60, tags=["inventario:1"])
+        cache.set("art2", 3, 60, tags=["inventario:2"])
+
+        cache.invalidar_tags(["inventario:list", "inventario:1"])
+
+        assert cache.get("lista") is AUSENTE
+        assert cache.get("art1") is AUSENTE
+        assert cache.get("art2") == 3
+
+    def test_expulsion_lru_limpia_el_indice_de_etiquetas(self):
+        cache = CacheLocal(max_entradas=1)
+        cache.set("a", 1, 60, tags=["t"])
+        cache.set("b", 2, 60)
+
+        assert cache._por_tag == {}
+
+    def test_entrada_caducada(self):
+        cache = CacheLocal()
+        cache.set("a", 1, 0.01)
+        time.sleep(0.02)
+
+        assert cache.get("a") is AUSENTE
+        assert len(cache) == 0
+
+    def test_limite_de_bytes(self):
+        valor = "x" * 1000
+        cache = CacheLocal(max_bytes=tamano_valor(valor) * 3)
+        for i in range(10):
+            cache.set(f"q{i}", valor, 60)
+
+        assert len(cache) == 3
+        assert cache.bytes <= cache.max_bytes
+        assert cache.estadisticas()["expulsiones"] == 7
+        assert cache.get("q9") == valor
+
+    def test_valor_mayor_que_el_limite_no_vacia_la_cache(self):
+        cache = CacheLocal(max_bytes=200)
+        cache.set("a", 1, 60)
+        cache.set("grande", "x" * 1000, 60)
+
+        assert cache.get("a") == 1
+        assert cache.get("grande") is AUSENTE
+
+    def test_barrido_periodico_elimina_caducadas_sin_leerlas(self):
+        cache = CacheLocal(intervalo_barrido=0)
+        for i in range(50):
+            cache.set(f"busqueda-{i}", i, 0.01)
+        time.sleep(0.02)
+
+        cache.set("nueva", 1, 60)
+
+        assert len(cache) == 1
+        assert cache.estadisticas()["expiradas"] == 50
+
+    def test_contadores(self):
+        cache = CacheLocal()
+        cache.set("a", 1, 60)
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+
+        stats = cache.estadisticas()
+        assert (stats["aciertos"], stats["fallos"]) == (2, 1)
+        assert stats["ratio_aciertos"] == pytest.approx(2 / 3, abs=1e-3)
+        assert stats["bytes"] == tamano_valor(1)
+
+
+@pytest.mark.unit
+class TestCacheCompartida:
+    def test_sqlite_compartida_entre_workers(self, tmp_path):
+        ruta = str(tmp_path / "cache.sqlite3")
+        # Dos "workers": cada uno con su nivel local y el mismo fichero
+        worker_a = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=60)
+        worker_b = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=0.05)
+
+        worker_a.set("stats", {"total": 5}, 300)
+        assert worker_b.get("stats") == {"total": 5}
+
+        worker_a.clear()
+        time.sleep(0.06)
+        assert worker_b.get("stats") is AUSENTE
+
+    def test_sqlite_invalida_etiquetas_para_todos_los_workers(self, tmp_path):
+        ruta = str(tmp_path / "cache.sqlite3")
+        worker_a = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=0)
+        worker_b = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=0)
+        worker_a.set("art1", "x", 300, tags=["inventario:1"])
+        worker_a.set("art2", "y", 300, tags=["inventario:2"])
+
+        worker_b.invalidar_tags(["inventario:1"])
+
+        assert worker_a.get("art1") is AUSENTE
+        assert worker_a.get("art2") == "y"
+
+    def test_copia_local_desde_el_compartido_conserva_etiquetas(self, tmp_path):
+        ruta = str(tmp_path / "cache.sqlite3")
+        worker_a = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=60)
+        worker_b = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=60)
+        worker_b.set("art1", "viejo", 300, tags=["inventario:1"])
+        assert worker_a.get("art1") == "viejo"  # Copiado al nivel local de A
+
+        worker_a.invalidar_tags(["inventario:1"])
+
+        assert worker_a.local.get("art1") is AUSENTE
+        assert worker_a.get("art1") is AUSENTE
+
+    def test_redis_con_cliente_sustituible(self):
+        cliente = FakeRedis()
+        cache = CacheEscalonado(compartido=CacheRedis(cliente), ttl_local=0)
+
+        cache.set("k", [1, 2], 60)
+        assert "gmao:cache:k" in cliente.datos
+        cache.local.clear()
+        assert cache.get("k") == [1, 2]
+
+        cache.set("j", 1, 60, tags=["stats"])
+        cache.invalidar_tags(["stats"])
+        assert "gmao:cache:j" not in cliente.datos
+        assert "gmao:cache:tag:stats" not in cliente.datos
+
+        assert cache.compartido.adquirir_bloqueo("stats", 10)
+        assert not cache.compartido.adquirir_bloqueo("stats", 10)
+        cache.compartido.liberar_bloqueo("stats")
+        assert cache.compartido.adquirir_bloqueo("stats", 10)
+
+        cache.clear()
+        assert cliente.datos == {}
+
+    def test_fallo_del_nivel_compartido_no_rompe_lecturas(self):
+        class Caido(FakeRedis):
+            def get(self, clave):
+                raise ConnectionError("sin servidor")
+
+        cache = CacheEscalonado(compartido=CacheRedis(Caido()), ttl_local=0)
+
+        assert cache.get("k") is AUSENTE
+
+    def test_limites_de_la_configuracion_llegan_al_nivel_local(self):
+        cache = crear_cache(
+            {
+                "CACHE_MAX_ENTRADAS": 5,
+                "CACHE_MAX_BYTES": 1234,
+                "CACHE_BARRIDO_SEGUNDOS": 7,
+            }
+        )
+
+        assert len(cache.local) == 0
+        assert cache.local.max_entradas == 5
+        assert cache.local.max_bytes == 1234
+        assert cache.local.intervalo_barrido == 7
+
+    def test_backend_no_disponible_usa_memoria(self):
+        cache = crear_cache({"CACHE_BACKEND": "redis"})  # sin CACHE_REDIS_URL
+
+        assert cache.compartido is None
+        assert cache.tipo == "memoria"
+
+
+@pytest.mark.api
+def test_simple_cache_usa_la_cache_de_la_app(app, client):
+    from app.blueprints.cached_inventario_simple import cache_key, simple_cache
+
+    with app.app_context():
+        clave = cache_key("prueba", 1)
+        assert simple_cache(clave) is None
+        simple_cache(clave, {"x": 1}, ttl=60)
+        assert simple_cache(clave) == {"x": 1}
+
+    stats = client.get("/api/cached/cache/stats").get_json()
+    assert stats["active_keys"] >= 1
+    assert stats["cache_type"] == "memoria"
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+    assert stats["bytes"] > 0
+    assert {"evictions", "max_bytes", "max_keys"} <= set(stats)
+
+    client.post("/api/cached/cache/clear")
+    with app.app_context():
+        assert simple_cache(clave) is None
+
+
+@pytest.mark.unit
+class TestCalculoUnico:
+    def _lanzar(self, n, funcion):
+        barrera = threading.Barrier(n)
+        resultados = []
+
+        def ejecutar():
+            barrera.wait()
+            resultados.append(funcion())
+
+        hilos = [threading.Thread(target=ejecutar) for _ in range(n)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(5)
+        return resultados
+
+    def test_llamadas_concurrentes_calculan_una_vez(self):
+        cache = CacheEscalonado()
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.1)
+            return {"total": 42}
+
+        resultados = self._lanzar(
+            20, lambda: cache.obtener_o_calcular("stats", calcular, 300)
+        )
+
+        assert len(calculos) == 1
+        assert [r[0] for r in resultados] == [{"total": 42}] * 20
+        assert sum(1 for _, desde_cache in resultados if not desde_cache) == 1
+
+    def test_valor_caducado_se_sirve_mientras_otro_recalcula(self):
+        cache = CacheEscalonado()
+        cache.set("stats", EntradaCalculada("viejo", time.time() - 1, 0.01), 60)
+        empezado, terminar = threading.Event(), threading.Event()
+
+        def calcular_lento():
+            empezado.set()
+            terminar.wait(5)
+            return "nuevo"
+
+        hilo = threading.Thread(
+            target=cache.obtener_o_calcular, args=("stats", calcular_lento, 60)
+        )
+        hilo.start()
+        empezado.wait(5)
+
+        assert cache.obtener_o_calcular("stats", lambda: "otro", 60) == (
+            "viejo",
+            True,
+        )
+        terminar.set()
+        hilo.join(5)
+        assert cache.obtener_o_calcular("stats", lambda: "otro", 60) == (
+            "nuevo",
+            True,
+        )
+
+    def test_no_quedan_locks_por_clave(self):
+        cache = CacheEscalonado(CacheLocal(max_entradas=10))
+        for i in range(5000):
+            cache.obtener_o_calcular(f"clave:{i}", lambda: i, 60)
+
+        assert cache._vuelos == {}
+        resultados = self._lanzar(
+            10, lambda: cache.obtener_o_calcular("nueva", lambda: time.sleep(0.05), 60)
+        )
+        assert len(resultados) == 10
+        assert cache._vuelos == {}
+
+    def test_calculo_atascado_no_bloquea_indefinidamente(self):
+        cache = CacheEscalonado()
+        cache.ESPERA_MAXIMA = 0.1
+        empezado, terminar = threading.Event(), threading.Event()
+
+        def calcular_atascado():
+            empezado.set()
+            terminar.wait(5)
+            return "tarde"
+
+        hilo = threading.Thread(
+            target=cache.obtener_o_calcular, args=("stats", calcular_atascado, 60)
+        )
+        hilo.start()
+        empezado.wait(5)
+
+        inicio = time.monotonic()
+        assert cache.obtener_o_calcular("stats", lambda: "propio", 60) == (
+            "propio",
+            False,
+        )
+        assert time.monotonic() - inicio < 2
+        terminar.set()
+        hilo.join(5)
+        assert cache._vuelos == {}
+
+    def test_refresco_anticipado(self, monkeypatch):
+        cache = CacheEscalonado()
+        # Vigente 1 s más, pero su cálculo costó 10 s
+        cache.set("stats", EntradaCalculada("viejo", time.time() + 1, 10), 60)
+
+        monkeypatch.setattr(random, "random", lambda: 0.5)
+        assert cache.obtener_o_calcular("stats", lambda: "nuevo", 60, beta=0) == (
+            "viejo",
+            True,
+        )
+        assert cache.obtener_o_calcular("stats", lambda: "nuevo", 60) == (
+            "nuevo",
+            False,
+        )
+
+    def test_otro_worker_con_el_bloqueo_no_provoca_recalculo(self, tmp_path):
+        ruta = str(tmp_path / "cache.sqlite3")
+        worker_a = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=0)
+        worker_b = CacheEscalonado(compartido=CacheSQLite(ruta), ttl_local=0)
+        worker_a.set("stats", EntradaCalculada("viejo", time.time() - 1, 0.01), 60)
+
+        assert worker_a.compartido.adquirir_bloqueo("stats", 30)
+        assert worker_b.obtener_o_calcular("stats", lambda: "nuevo", 60) == (
+            "viejo",
+            True,
+        )
+        assert worker_b.calculos == 0
+
+        worker_a.compartido.liberar_bloqueo("stats")
+        assert worker_b.obtener_o_calcular("stats", lambda: "nuevo", 60) == (
+            "nuevo",
+            False,
+        )
+
+
+@pytest.mark.api
+def test_peticiones_concurrentes_a_stats_calculan_una_vez(app, mocker):
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        time.sleep(0.1)
+        return {"total_inventarios": 3}
+
+    mocker.patch(
+        "app.blueprints.cached_inventario_simple._calcular_inventario_stats",
+        side_effect=calcular,
+    )
+    barrera = threading.Barrier(10)
+    respuestas = []
+
+    def pedir():
+        cliente = app.test_client()
+        barrera.wait()
+        respuestas.append(cliente.get("/api/cached/inventario/stats").get_json())
+
+    hilos = [threading.Thread(target=pedir) for _ in range(10)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert len(calculos) == 1
+    assert len(respuestas) == 10
+    assert all(r["total_inventarios"] == 3 for r in respuestas)
@@ -0,0 +1,72 @@
+"""
+Tests de los histogramas de latencia (app.utils.histograma)
+"""
+
+import random
+
+import pytest
+
+from app.utils.histograma import Histograma, HistogramaVentana
+
+
+@pytest.mark.unit
+class TestHistograma:
+    def test_percentiles_con_error_relativo_acotado(self):
+        generador = random.Random(7)
+        valores = [generador.expovariate(1 / 0.05) for _ in range(20000)]
+        histograma = Histograma()
+        for valor in valores:
+            histograma.registrar(valor)
+
+        ordenados = sorted(valores)
+        for p in (50, 95, 99):
+            exacto = ordenados[int(len(ordenados) * p / 100) - 1]
+            assert histograma.percentil(p) == pytest.approx(exacto, rel=0.05)
+        assert histograma.minimo == min(valores)
+        assert histograma.maximo == max(valores)
+        assert histograma.media == pytest.approx(sum(valores) / len(valores))
+
+    def test_memoria_constante(self):
+        histograma = Histograma()
+        for i in range(100000):
+            histograma.registrar(0.001 + (i % 1000) * 1e-5)
+
+        assert histograma.total == 100000
+        assert len(histograma.cubetas) < 100
+
+    def test_fusionar(self):
+        a, b = Histograma(), Histograma()
+        a.registrar(0.1)
+        b.registrar(0.3)
+        a.fusionar(b)
+
+        assert a.total == 2
+        assert (a.minimo, a.maximo) == (0.1, 0.3)
+
+    def test_vacio(self):
+        resumen = Histograma().resumen()
+
+        assert resumen["count"] == 0
+        assert resumen["p99"] == 0.0
+        assert resumen["min"] == 0.0
+
+
+@pytest.mark.unit
+class TestHistogramaVentana:
+    def test_muestras_salen_de_la_ventana_al_rotar(self):
+        ventana = HistogramaVentana(duracion=300, ranuras=10)
+        ventana.registrar(1.0, ahora=1000)
+        ventana.registrar(2.0, ahora=1100)
+
+        assert ventana.histograma(ahora=1100).total == 2
+        assert ventana.histograma(ahora=1320).total == 1  # 1000 ya no cuenta
+        assert ventana.histograma(ahora=2000).total == 0
+
+    def test_ranura_reutilizada_no_mezcla_epocas(self):
+        ventana = HistogramaVentana(duracion=60, ranuras=6)
+        ventana.registrar(1.0, ahora=0)
+        ventana.registrar(5.0, ahora=60)  # Misma ranura, otra época
+
+        histograma = ventana.histograma(ahora=60)
+        assert histograma.total == 1
+        assert histograma.maximo == 5.0
@@ -0,0 +1,100 @@
+"""
+Tests de la instrumentación SQL por endpoint (app.utils.instrumentacion_sql)
+"""
+
+import pytest
+from sqlalchemy import text
+
+from app.extensions import db
+from app.utils.instrumentacion_sql import (
+    ConsultasPeticion,
+    EstadisticasSQLEndpoint,
+    huella_sentencia,
+    limpiar_estadisticas_sql,
+    resumen_sql,
+)
+
+
+@pytest.fixture
+def sql_limpio():
+    limpiar_estadisticas_sql()
+    yield
+    limpiar_estadisticas_sql()
+
+
+@pytest.mark.unit
+class TestHuella:
+    def test_literales_y_parametros(self):
+        assert huella_sentencia(
+            "SELECT * FROM activo WHERE id = 5 AND nombre = 'Bomba ''A'''"
+        ) == huella_sentencia("SELECT * FROM activo WHERE id = :id_1 AND nombre = ?")
+
+    def test_listas_in_colapsadas(self):
+        assert huella_sentencia("SELECT 1 FROM t WHERE id IN (?, ?, ?)") == (
+            "SELECT ? FROM t WHERE id IN (?+)"
+        )
+        assert huella_sentencia("SELECT 1 FROM t WHERE id IN (%s, %s)") == (
+            huella_sentencia("SELECT 1 FROM t WHERE id IN (1, 2, 3, 4)")
+        )
+
+    def test_identificadores_con_digitos_se_conservan(self):
+        assert "tabla_2024" in huella_sentencia("SELECT a FROM tabla_2024")
+
+
+@pytest.mark.unit
+def test_estadisticas_agrupan_por_huella_y_detectan_n_mas_1():
+    peticion = ConsultasPeticion()
+    for i in range(12):
+        peticion.registrar(f"SELECT * FROM activo WHERE id = {i}", 0.001)
+    peticion.registrar("SELECT count(*) FROM orden_trabajo", 0.01)
+
+    estadisticas = EstadisticasSQLEndpoint()
+    sospechosas = estadisticas.registrar(peticion, umbral_n_mas_1=10)
+    resumen = estadisticas.resumen()
+
+    assert sospechosas == [("SELECT * FROM activo WHERE id = ?", 12)]
+    assert resumen["requests"] == 1
+    assert resumen["queries_total"] == 13
+    assert resumen["db_time_total"] == pytest.approx(0.022)
+    assert resumen["top_fingerprints"][0]["max_per_request"] == 12
+    assert resumen["n_plus_one"][0]["veces_max"] == 12
+
+    # Sin umbral (detección desactivada) no hay avisos nuevos
+    assert EstadisticasSQLEndpoint().registrar(peticion) == []
+
+
+@pytest.mark.database
+def test_peticion_atribuye_consultas_y_avisa_de_n_mas_1(app, sql_limpio, caplog):
+    app.config.update(SQL_DETECTAR_N_MAS_1=True, SQL_N_MAS_1_UMBRAL=5)
+    try:
+        with app.test_request_context("/prueba/n-mas-1"):
+            for i in range(8):
+                db.session.execute(text("SELECT :x"), {"x": i})
+            with caplog.at_level("WARNING"):
+                app.do_teardown_request()
+    finally:
+        app.config.update(SQL_DETECTAR_N_MAS_1=False)
+
+    datos = resumen_sql()["/prueba/n-mas-1"]
+    assert datos["requests"] == 1
+    assert datos["queries_total"] == 8
+    assert datos["db_time_total"] > 0
+    assert datos["n_plus_one"][0]["fingerprint"] == "SELECT ?"
+    assert "Posible N+1" in caplog.text
+
+
+@pytest.mark.api
+def test_endpoint_sql_de_performance(app, client, sql_limpio):
+    with app.test_request_context("/prueba/sql"):
+        db.session.execute(text("SELECT 1"))
+        app.do_teardown_request()
+
+    datos = client.get("/api/performance/sql").get_json()
+    assert datos["endpoints"]["/prueba/sql"]["queries_total"] == 1
+    assert datos["n_plus_one_alerts"] == []
+
+    stats = client.get("/api/performance/stats").get_json()
+    assert "top_fingerprints" not in stats["database_stats"]["/prueba/sql"]
+
+    client.post("/api/performance/clear")
+    assert client.get("/api/performance/sql").get_json()["endpoints"] == {}
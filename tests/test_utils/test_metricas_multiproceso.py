@@ -0,0 +1,125 @@
+"""
+Tests de las métricas multiproceso y la exposición OpenMetrics
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from app.blueprints import performance_metrics as pm
+from app.utils import metricas_multiproceso
+from app.utils.histograma import Histograma
+from app.utils.metricas_multiproceso import (
+    AlmacenMultiproceso,
+    ArchivoMmap,
+    texto_openmetrics,
+)
+
+
+def _trabajo_worker(directorio, veces):
+    almacen = AlmacenMultiproceso(directorio)
+    for _ in range(veces):
+        almacen.incrementar("gmao_fifo_operations_total", {"operation": "consumo"})
+    os._exit(0)  # Como un worker que muere sin ejecutar atexit
+
+
+@pytest.mark.unit
+class TestArchivoMmap:
+    def test_valores_persisten_y_se_releen(self, tmp_path):
+        ruta = str(tmp_path / "metricas_1.db")
+        archivo = ArchivoMmap(ruta)
+        archivo.incrementar("a_total", 2)
+        archivo.incrementar("a_total", 3)
+        archivo.establecer('b{x="1"}', 0.25)
+
+        assert ArchivoMmap.leer(ruta) == {"a_total": 5.0, 'b{x="1"}': 0.25}
+        archivo.cerrar()
+        assert ArchivoMmap(ruta).valor("a_total") == 5.0
+
+    def test_crece_al_llenarse(self, tmp_path):
+        ruta = str(tmp_path / "metricas_1.db")
+        archivo = ArchivoMmap(ruta)
+        for i in range(3000):
+            archivo.establecer(f'serie_larga_de_prueba{{i="{i}"}}', i)
+
+        assert os.path.getsize(ruta) > ArchivoMmap.TAMANO_INICIAL
+        valores = ArchivoMmap.leer(ruta)
+        assert len(valores) == 3000
+        assert valores['serie_larga_de_prueba{i="2999"}'] == 2999
+
+
+@pytest.mark.unit
+def test_agregado_suma_los_procesos_y_limpia_los_muertos(tmp_path):
+    directorio = str(tmp_path)
+    contexto = multiprocessing.get_context("fork")
+    procesos = [
+        contexto.Process(target=_trabajo_worker, args=(directorio, n)) for n in (3, 4)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(10)
+
+    almacen = AlmacenMultiproceso(directorio)
+    almacen.incrementar("gmao_fifo_operations_total", {"operation": "consumo"})
+    clave = 'gmao_fifo_operations_total{operation="consumo"}'
+    assert almacen.agregado()[clave] == 8
+    assert len(almacen.rutas()) == 3
+
+    almacen.limpiar_huerfanos()
+    assert almacen.rutas() == [almacen.ruta_proceso(os.getpid())]
+    assert almacen.agregado()[clave] == 1
+
+    almacen.cerrar_proceso()
+    assert almacen.rutas() == []
+
+
+@pytest.mark.unit
+def test_texto_openmetrics_de_histograma(tmp_path):
+    almacen = AlmacenMultiproceso(str(tmp_path))
+    histograma = Histograma()
+    for valor in (0.003, 0.02, 0.02, 0.7):
+        histograma.registrar(valor)
+    almacen.establecer_histograma(
+        "gmao_operation_duration_seconds", {"operation": "listar"}, histograma
+    )
+
+    lineas = texto_openmetrics(almacen.agregado()).splitlines()
+    cubeta = 'gmao_operation_duration_seconds_bucket{operation="listar",le='
+
+    assert lineas[0] == "# TYPE gmao_operation_duration_seconds histogram"
+    assert f'{cubeta}"0.005"}} 1' in lineas
+    assert f'{cubeta}"0.025"}} 3' in lineas
+    assert f'{cubeta}"1.0"}} 4' in lineas
+    assert lineas.index(f'{cubeta}"0.005"}} 1') < lineas.index(f'{cubeta}"+Inf"}} 4')
+    assert lineas[-3] == 'gmao_operation_duration_seconds_count{operation="listar"} 4'
+    assert lineas[-2].startswith("gmao_operation_duration_seconds_sum")
+    assert lineas[-1] == "# EOF"
+
+
+@pytest.mark.api
+def test_endpoint_metrics(app, client, tmp_path, monkeypatch):
+    almacen = AlmacenMultiproceso(str(tmp_path))
+    monkeypatch.setattr(metricas_multiproceso, "_almacen", almacen)
+    # Otro worker ya publicó sus contadores
+    otro = ArchivoMmap(almacen.ruta_proceso(999999))
+    otro.establecer('gmao_cache_requests_total{result="hit",tier="local"}', 9)
+    otro.incrementar('gmao_fifo_operations_total{operation="entrada"}', 2)
+    pm.record_metric("op_metricas", 0.05)
+
+    respuesta = client.get("/metrics")
+    texto = respuesta.get_data(as_text=True)
+
+    assert respuesta.status_code == 200
+    assert respuesta.content_type.startswith("application/openmetrics-text")
+    assert 'gmao_fifo_operations_total{operation="entrada"} 2' in texto
+    assert 'gmao_operation_duration_seconds_count{operation="op_metricas"} 1' in texto
+    assert 'gmao_cache_hit_ratio{tier="local"}' in texto
+    assert texto.endswith("# EOF\n")
+
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "secreto")
+    assert client.get("/metrics").status_code == 401
+    cabeceras = {"Authorization": "Bearer secreto"}
+    assert client.get("/metrics", headers=cabeceras).status_code == 200
+    almacen.cerrar_proceso()
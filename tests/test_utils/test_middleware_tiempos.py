@@ -0,0 +1,112 @@
+"""
+Tests del middleware WSGI de tiempos por endpoint
+"""
+
+import timeit
+
+import pytest
+
+from app.blueprints import performance_metrics as pm
+from app.utils.instrumentacion_sql import CLAVE_ENTORNO_SQL
+from app.utils.middleware_tiempos import CLAVE_ENDPOINT, MiddlewareTiempos
+
+
+def _app_wsgi(environ, start_response):
+    environ[CLAVE_ENDPOINT] = "prueba.listar"
+    environ[CLAVE_ENTORNO_SQL] = (3, 0.002)
+    start_response("201 CREATED", [("Content-Type", "text/plain")])
+    return [b"hola ", b"mundo"]
+
+
+def _llamar(middleware, metodo="GET"):
+    respuesta = middleware({"REQUEST_METHOD": metodo}, lambda *args: None)
+    cuerpo = b"".join(respuesta)
+    if hasattr(respuesta, "close"):
+        respuesta.close()
+    return cuerpo
+
+
+@pytest.fixture
+def metricas_limpias():
+    with pm._lock:
+        pm._pendientes.clear()
+        pm._metrics.clear()
+        pm._operation_stats.clear()
+        pm._throughput_counters.clear()
+        for serie in pm._series.values():
+            serie.vaciar()
+    yield
+    with pm._lock:
+        pm._pendientes.clear()
+        pm._metrics.clear()
+        pm._operation_stats.clear()
+        pm._throughput_counters.clear()
+        for serie in pm._series.values():
+            serie.vaciar()
+
+
+@pytest.mark.unit
+def test_registra_estado_bytes_y_tiempo_de_bd():
+    registros = []
+    middleware = MiddlewareTiempos(
+        _app_wsgi, registrar=lambda *args: registros.append(args)
+    )
+
+    assert _llamar(middleware, "POST") == b"hola mundo"
+
+    [(endpoint, metodo, duracion, status, enviados, tiempo_bd, consultas)] = registros
+    assert (endpoint, metodo, status, enviados) == ("prueba.listar", "POST", 201, 10)
+    assert (consultas, tiempo_bd) == (3, 0.002)
+    assert duracion > 0
+
+
+@pytest.mark.unit
+def test_excepcion_de_la_app_cuenta_como_500():
+    registros = []
+
+    def falla(environ, start_response):
+        raise RuntimeError("fallo")
+
+    middleware = MiddlewareTiempos(falla, registrar=lambda *a: registros.append(a))
+    with pytest.raises(RuntimeError):
+        middleware({"REQUEST_METHOD": "GET"}, lambda *args: None)
+
+    assert registros[0][0] == "<sin_endpoint>"
+    assert registros[0][3] == 500
+
+
+@pytest.mark.unit
+def test_muestreo_cero_no_registra():
+    registros = []
+    middleware = MiddlewareTiempos(
+        _app_wsgi, muestreo=0.0, registrar=lambda *a: registros.append(a)
+    )
+
+    assert b"".join(middleware({}, lambda *args: None)) == b"hola mundo"
+    assert registros == []
+
+
+@pytest.mark.performance
+def test_sobrecoste_por_peticion(metricas_limpias):
+    middleware = MiddlewareTiempos(_app_wsgi)
+    n = 5000
+    directo = min(timeit.repeat(lambda: _llamar(_app_wsgi), number=n, repeat=3))
+    medido = min(timeit.repeat(lambda: _llamar(middleware), number=n, repeat=3))
+
+    # Microsegundos añadidos por petición (reloj, cierre y append a la cola)
+    assert (medido - directo) / n * 1e6 < 25
+
+
+@pytest.mark.api
+def test_todas_las_rutas_alimentan_el_almacen(client, metricas_limpias):
+    # buffered: el cliente cierra la respuesta como haría el servidor WSGI
+    client.get("/api/performance/stats", buffered=True)
+    client.get("/no-existe-esta-ruta", buffered=True)
+
+    operaciones = client.get("/api/performance/stats").get_json()["operation_stats"]
+
+    stats = operaciones["GET performance.get_performance_stats"]
+    assert stats["count"] == 1
+    assert stats["http"]["status_codes"] == {"200": 1}
+    assert stats["http"]["bytes_total"] > 0
+    assert operaciones["GET <sin_endpoint>"]["http"]["status_codes"] == {"404": 1}
@@ -0,0 +1,109 @@
+"""
+Tests del perfilador de peticiones lentas
+"""
+
+import time
+
+import pytest
+
+from app.utils.perfilador_lentas import PerfiladorLentas, obtener_perfilador
+
+
+def _trabajo_lento(segundos):
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def perfilador_global():
+    perfilador = obtener_perfilador()
+    umbral = perfilador.umbral
+    perfilador.limpiar()
+    yield perfilador
+    perfilador.umbral = umbral
+    perfilador.limpiar()
+
+
+@pytest.mark.unit
+class TestPerfiladorLentas:
+    def test_muestrea_solo_las_que_superan_el_umbral(self):
+        perfilador = PerfiladorLentas(umbral=0.03, intervalo=0.002)
+        perfilador.iniciar()
+        try:
+            perfilador.empezar("GET", "/rapida", "rapida")
+            perfilador.terminar(200)
+            perfilador.empezar("GET", "/lenta", "lenta")
+            _trabajo_lento(0.15)
+            perfilador.terminar(200)
+        finally:
+            perfilador.detener()
+
+        [registro] = perfilador.lentas()
+        assert registro["path"] == "/lenta"
+        assert registro["duration"] >= 0.15
+        assert registro["samples"] > 0
+        assert any(
+            pila.endswith("_trabajo_lento") or ":_trabajo_lento;" in pila
+            for pila in registro["stacks"]
+        )
+        texto = perfilador.texto_colapsado(registro)
+        assert texto.splitlines()[0].rsplit(" ", 1)[1].isdigit()
+
+    def test_conserva_las_mas_lentas(self):
+        perfilador = PerfiladorLentas(umbral=0, max_peticiones=2)
+        for espera in (0.01, 0.03, 0.02):
+            perfilador.empezar("GET", f"/{espera}")
+            time.sleep(espera)
+            perfilador.terminar(200)
+
+        assert [r["path"] for r in perfilador.lentas()] == ["/0.03", "/0.02"]
+
+    def test_sin_peticiones_vencidas_no_toma_pilas(self, monkeypatch):
+        perfilador = PerfiladorLentas(umbral=10)
+        perfilador.empezar("GET", "/x")
+        monkeypatch.setattr(
+            "sys._current_frames", lambda: pytest.fail("no debía muestrear")
+        )
+
+        perfilador.muestrear()
+        perfilador.terminar(200)
+
+
+@pytest.mark.api
+def test_endpoint_slow_exige_administrador_o_token(app, perfilador_global):
+    # Contexto propio: flask.g no debe heredar un usuario de otro test
+    with app.app_context():
+        cliente = app.test_client()
+        assert cliente.get("/api/performance/slow").status_code == 403
+
+        app.config["METRICS_TOKEN"] = "secreto"
+        try:
+            respuesta = cliente.get(
+                "/api/performance/slow",
+                headers={"Authorization": "Bearer secreto"},
+            )
+        finally:
+            app.config["METRICS_TOKEN"] = None
+        assert respuesta.status_code == 200
+
+
+@pytest.mark.api
+def test_endpoint_slow_devuelve_pilas(authenticated_client, perfilador_global):
+    perfilador_global.umbral = 0
+    perfilador_global.empezar("GET", "/exportar", "exportar")
+    perfilador_global.terminar(200)
+    [registro] = perfilador_global.lentas()
+
+    datos = authenticated_client.get("/api/performance/slow").get_json()
+    assert datos["requests"][0]["id"] == registro["id"]
+
+    respuesta = authenticated_client.get(
+        f"/api/performance/slow/{registro['id']}/collapsed"
+    )
+    assert respuesta.status_code == 200
+    assert respuesta.content_type.startswith("text/plain")
+    assert (
+        authenticated_client.get("/api/performance/slow/999999/collapsed").status_code
+        == 404
+    )
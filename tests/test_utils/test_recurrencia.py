@@ -0,0 +1,226 @@
+"""
+Tests del motor de recurrencia de planes (app.utils.recurrencia)
+"""
+
+import contextlib
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.controllers.planes_controller import calcular_proxima_ejecucion
+from app.utils import recurrencia
+from app.utils.recurrencia import (
+    CADA_N_DIAS,
+    MENSUAL_DIA,
+    SEMANAL,
+    compilar,
+    ocurrencias,
+    siguientes,
+)
+
+DIAS = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+
+
+def _configuracion_aleatoria(rnd, con_intervalos=False):
+    intervalo = (lambda: rnd.randint(1, 4)) if con_intervalos else (lambda: 1)
+    tipo = rnd.choice(["diaria", "semanal", "semanal_sin_dias", "dia_mes", "semana"])
+    if tipo == "diaria":
+        return {"tipo_frecuencia": "diaria"}
+    if tipo == "semanal":
+        dias = rnd.sample(range(7), rnd.randint(1, 7))
+        return {
+            "tipo_frecuencia": "semanal",
+            "dias_semana": [DIAS[d] for d in sorted(dias)],
+            "intervalo_semanas": intervalo(),
+        }
+    if tipo == "semanal_sin_dias":
+        return {"tipo_frecuencia": "semanal", "intervalo_semanas": rnd.randint(1, 4)}
+    if tipo == "dia_mes":
+        return {
+            "tipo_frecuencia": "mensual",
+            "tipo_mensual": "dia_mes",
+            "dia_mes": rnd.randint(1, 31),
+            "intervalo_meses": intervalo(),
+        }
+    return {
+        "tipo_frecuencia": "mensual",
+        "tipo_mensual": "dia_semana_mes",
+        "semana_mes": rnd.randint(1, 4),
+        "dia_semana_mes": rnd.choice(DIAS + ["0", "1", "6"]),
+        "intervalo_meses": intervalo(),
+    }
+
+
+def _fecha_aleatoria(rnd):
+    return datetime(2020, 1, 1) + timedelta(
+        days=rnd.randrange(3650), hours=rnd.randrange(24), minutes=rnd.randrange(60)
+    )
+
+
+def _legacy(datos, fecha_base):
+    # La función original imprime trazas de depuración en la rama semanal
+    with contextlib.redirect_stdout(io.StringIO()):
+        return calcular_proxima_ejecucion(dict(datos), fecha_base)
+
+
+def _coincide(regla, dia):
+    """Oráculo día a día: ¿cae `dia` en la regla?"""
+    ancla = date(1970, 1, 1) + timedelta(days=regla.ancla)
+    if dia < ancla:
+        return False
+    if regla.tipo == CADA_N_DIAS:
+        return (dia - ancla).days % regla.intervalo == 0
+    if regla.tipo == SEMANAL:
+        semanas = (
+            (dia - timedelta(days=dia.weekday()))
+            - (ancla - timedelta(days=ancla.weekday()))
+        ).days // 7
+        return semanas % regla.intervalo == 0 and regla.mascara >> dia.weekday() & 1
+    meses = (dia.year - ancla.year) * 12 + dia.month - ancla.month
+    if meses % regla.intervalo:
+        return False
+    if regla.tipo == MENSUAL_DIA:
+        siguiente_mes = (dia.replace(day=1) + timedelta(days=32)).replace(day=1)
+        ultimo = (siguiente_mes - timedelta(days=1)).day
+        return dia.day == min(regla.dia, ultimo)
+    mismos = [
+        d
+        for d in range(1, 32)
+        if d <= 28 or _existe(dia.year, dia.month, d)
+        if date(dia.year, dia.month, d).weekday() == regla.dia
+    ]
+    return dia.day == mismos[min(regla.semana, len(mismos)) - 1]
+
+
+def _existe(año, mes, dia):
+    try:
+        date(año, mes, dia)
+        return True
+    except ValueError:
+        return False
+
+
+@pytest.mark.unit
+class TestEquivalenciaConCalculoActual:
+    def test_siguiente_coincide_con_calcular_proxima_ejecucion(self):
+        """
+        Sin intervalos (donde la función actual es correcta) la primera fecha
+        de la regla anclada en fecha_base es la que devuelve la función.
+        """
+        rnd = random.Random(20261018)
+        for _ in range(2000):
+            datos = _configuracion_aleatoria(rnd)
+            fecha_base = _fecha_aleatoria(rnd)
+            esperado = _legacy(datos, fecha_base).date()
+            assert compilar(datos, fecha_base).siguiente(fecha_base) == esperado, (
+                datos,
+                fecha_base,
+            )
+
+    @pytest.mark.parametrize("frecuencia", sorted(recurrencia.FRECUENCIAS_DIAS))
+    def test_frecuencias_legacy(self, frecuencia):
+        datos = {"tipo_frecuencia": None, "frecuencia": frecuencia}
+        fecha_base = datetime(2026, 2, 27, 15, 30)
+        esperado = _legacy(datos, fecha_base).date()
+        assert compilar(datos, fecha_base).siguiente(fecha_base) == esperado
+
+
+@pytest.mark.unit
+class TestOcurrencias:
+    def test_ventana_coincide_con_oraculo_dia_a_dia(self):
+        rnd = random.Random(7)
+        reglas = [
+            compilar(_configuracion_aleatoria(rnd, True), _fecha_aleatoria(rnd))
+            for _ in range(300)
+        ]
+        desde, hasta = date(2024, 11, 20), date(2026, 3, 10)
+        indices, fechas = ocurrencias(reglas, desde, hasta)
+        obtenidas = {}
+        for i, fecha in zip(indices.tolist(), fechas.tolist()):
+            obtenidas.setdefault(i, []).append(fecha)
+
+        dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+        for i, regla in enumerate(reglas):
+            esperadas = [d for d in dias if _coincide(regla, d)]
+            assert obtenidas.get(i, []) == esperadas, regla
+
+    def test_siguientes_es_la_primera_ocurrencia_posterior(self):
+        rnd = random.Random(11)
+        reglas = [
+            compilar(_configuracion_aleatoria(rnd, True), _fecha_aleatoria(rnd))
+            for _ in range(500)
+        ]
+        despues = [_fecha_aleatoria(rnd) for _ in reglas]
+        for regla, fecha, proxima in zip(
+            reglas, despues, siguientes(reglas, despues).tolist()
+        ):
+            ancla = date(1970, 1, 1) + timedelta(days=regla.ancla)
+            inicio = max(fecha.date() + timedelta(days=1), ancla)
+            assert proxima == regla.ocurrencias(inicio, inicio + timedelta(days=500))[0]
+
+    def test_intervalo_mensual_anclado(self):
+        regla = compilar(
+            {
+                "tipo_frecuencia": "mensual",
+                "tipo_mensual": "dia_mes",
+                "dia_mes": 31,
+                "intervalo_meses": 2,
+            },
+            date(2026, 1, 15),
+        )
+        assert regla.ocurrencias(date(2026, 1, 1), date(2026, 7, 31)) == [
+            date(2026, 1, 31),
+            date(2026, 3, 31),
+            date(2026, 5, 31),
+            date(2026, 7, 31),
+        ]
+        # Aunque se genere con retraso, sigue en los meses impares
+        assert regla.siguiente(date(2026, 4, 2)) == date(2026, 5, 31)
+
+    def test_dias_semana_guardados_como_json(self):
+        regla = compilar(
+            {"tipo_frecuencia": "semanal", "dias_semana": '["lunes", "jueves"]'},
+            date(2026, 10, 14),
+        )
+        assert regla.ocurrencias(date(2026, 10, 12), date(2026, 10, 25)) == [
+            date(2026, 10, 15),
+            date(2026, 10, 19),
+            date(2026, 10, 22),
+        ]
+
+    def test_sin_reglas(self):
+        assert len(siguientes([], date.today())) == 0
+        indices, fechas = ocurrencias([], date(2026, 1, 1), date(2026, 12, 31))
+        assert len(indices) == len(fechas) == 0
+
+
+@pytest.mark.performance
+def test_benchmark_lote_vs_calculo_por_plan():
+    rnd = random.Random(3)
+    configuraciones = [_configuracion_aleatoria(rnd) for _ in range(5000)]
+    ahora = datetime(2026, 10, 18, 9, 0)
+
+    inicio = time.perf_counter()
+    for datos in configuraciones:
+        _legacy(datos, ahora)
+    tiempo_actual = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    reglas = [compilar(datos, ahora) for datos in configuraciones]
+    siguientes(reglas, ahora)
+    tiempo_lote = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indices, _ = ocurrencias(reglas, ahora, ahora + timedelta(days=365))
+    tiempo_ventana = time.perf_counter() - inicio
+
+    print(
+        f"\ncalcular_proxima_ejecucion x{len(configuraciones)}: "
+        f"{tiempo_actual * 1000:.1f} ms | compilar + siguientes: "
+        f"{tiempo_lote * 1000:.1f} ms | ocurrencias 12 meses "
+        f"({len(indices)} fechas): {tiempo_ventana * 1000:.1f} ms"
+    )
+    assert tiempo_lote < tiempo_actual
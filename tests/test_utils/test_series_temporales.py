@@ -0,0 +1,77 @@
+"""
+Tests de los anillos por minuto/hora y su historial en disco
+"""
+
+import pytest
+
+from app.utils.series_temporales import AnilloTemporal, Cubeta, HistorialArchivo
+
+T0 = 1_700_000_000  # Múltiplo de 60 s para que las cuentas sean exactas
+
+
+@pytest.mark.unit
+class TestAnilloTemporal:
+    def test_agrupa_por_epoca_y_descarta_lo_antiguo(self):
+        anillo = AnilloTemporal(60, 3)
+        anillo.registrar(0.1, ahora=T0)
+        anillo.registrar(0.3, exito=False, ahora=T0 + 30)
+        anillo.registrar(0.2, ahora=T0 + 60)
+
+        [primera, segunda] = anillo.cubetas(ahora=T0 + 60)
+        assert (primera.total, primera.errores, primera.maximo) == (2, 1, 0.3)
+        assert primera.suma == pytest.approx(0.4)
+        assert segunda.epoca == primera.epoca + 1
+
+        # Tres minutos después la primera cubeta sale de la ventana
+        assert [c.total for c in anillo.cubetas(ahora=T0 + 180)] == [1]
+
+    def test_ranura_reutilizada_empieza_de_cero(self):
+        anillo = AnilloTemporal(60, 2)
+        anillo.registrar(1.0, ahora=T0)
+        anillo.registrar(2.0, ahora=T0 + 120)
+
+        [cubeta] = anillo.cubetas(ahora=T0 + 120)
+        assert (cubeta.total, cubeta.suma) == (1, 2.0)
+
+    def test_cubeta_con_histograma_ida_y_vuelta(self):
+        cubeta = Cubeta(10, con_histograma=True)
+        for valor in (0.01, 0.02, 0.5):
+            cubeta.registrar(valor)
+
+        copia = Cubeta.desde_dict(cubeta.a_dict())
+        assert copia.histograma.percentil(95) == pytest.approx(0.5, rel=0.05)
+        assert copia.total == 3
+
+
+@pytest.mark.unit
+class TestHistorialArchivo:
+    def test_volcados_de_varios_workers_se_suman(self, tmp_path):
+        historial = HistorialArchivo(str(tmp_path / "historial.json"))
+        retencion = {"minutes": 3600}
+        for valores in ((0.1, 0.2), (0.3,)):  # Dos workers
+            pendientes = {"minutes": AnilloTemporal(60, 60)}
+            for valor in valores:
+                pendientes["minutes"].registrar(valor, ahora=T0)
+            historial.volcar(pendientes, retencion, ahora=T0)
+
+        [cubeta] = historial.cargar()["minutes"]
+        assert cubeta.total == 3
+        assert cubeta.suma == pytest.approx(0.6)
+
+    def test_retencion(self, tmp_path):
+        historial = HistorialArchivo(str(tmp_path / "historial.json"))
+        anillo = AnilloTemporal(60, 60)
+        anillo.registrar(0.1, ahora=T0)
+        historial.volcar({"minutes": anillo}, {"minutes": 3600}, ahora=T0)
+
+        historial.volcar(
+            {"minutes": AnilloTemporal(60, 60)}, {"minutes": 3600}, ahora=T0 + 7200
+        )
+
+        assert historial.cargar() == {"minutes": []}
+
+    def test_archivo_corrupto_no_rompe_la_carga(self, tmp_path):
+        ruta = tmp_path / "historial.json"
+        ruta.write_text("{no es json")
+
+        assert HistorialArchivo(str(ruta)).cargar() == {}